@@ -4,14 +4,16 @@ Local GUI for managing buyback rates, viewing inventory, and deploying updates.
 """
 import tkinter as tk
 from tkinter import ttk, messagebox
-import sqlite3
 import subprocess
 import os
 import sys
 from datetime import datetime, timezone
 
-DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mydatabase.db')
 PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'scripts'))
+
+import db
+from name_resolver import load_name_index
 
 # Map DB category names to display names (must match generate_buyback_data.py)
 CATEGORY_DISPLAY = {
@@ -727,7 +729,7 @@ class AdminDashboard:
         """Load buyback rates from tracked_market_items."""
         self.rates_tree.delete(*self.rates_tree.get_children())
 
-        conn = sqlite3.connect(DB_PATH)
+        conn = db.connect(readonly=True)
         cursor = conn.cursor()
         cursor.execute("""
             SELECT id, type_id, type_name, category, price_percentage, alliance_discount
@@ -752,7 +754,7 @@ class AdminDashboard:
         """Load current inventory from database."""
         self.inv_tree.delete(*self.inv_tree.get_children())
 
-        conn = sqlite3.connect(DB_PATH)
+        conn = db.connect(readonly=True)
         cursor = conn.cursor()
 
         # Get latest inventory via the view
@@ -767,7 +769,7 @@ class AdminDashboard:
         rows = cursor.fetchall()
 
         # Also get timestamp
-        cursor.execute("SELECT MAX(snapshot_timestamp) FROM lx_zoj_inventory")
+        cursor.execute("SELECT MAX(snapshot_ts) FROM lx_zoj_inventory_snapshots")
         ts = cursor.fetchone()
         conn.close()
 
@@ -783,7 +785,7 @@ class AdminDashboard:
 
         if ts and ts[0]:
             self.last_updated_label.configure(
-                text=f"Last inventory update: {ts[0]}"
+                text=f"Last inventory update: {db.format_ts(ts[0])}"
             )
 
     # ===== BUYBACK PROGRAM =====
@@ -831,7 +833,7 @@ class AdminDashboard:
         self.bb_tree.delete(*self.bb_tree.get_children())
         self.unsaved_buyback_changes = {}
 
-        conn = sqlite3.connect(DB_PATH)
+        conn = db.connect()
         cursor = conn.cursor()
 
         # Ensure site_config table exists for category visibility
@@ -1120,7 +1122,7 @@ class AdminDashboard:
                                     f"Save these buyback changes?\n\n{changes_text}"):
             return
 
-        conn = sqlite3.connect(DB_PATH)
+        conn = db.connect()
         cursor = conn.cursor()
 
         for change in self.unsaved_buyback_changes.values():
@@ -1201,7 +1203,7 @@ class AdminDashboard:
 
     def load_blueprint_settings(self):
         """Load calculator params and blueprint list."""
-        conn = sqlite3.connect(DB_PATH)
+        conn = db.connect()
         cursor = conn.cursor()
         self._ensure_bp_tables(cursor, conn)
 
@@ -1261,6 +1263,9 @@ class AdminDashboard:
                 'type': bp_type, 'group': group, 'hidden': hidden
             })
 
+        # Typo-tolerant fallback for the blueprint search box
+        self.name_index = load_name_index(conn)
+
         conn.close()
         self.unsaved_bp_changes = {}
         self.filter_blueprint_list()
@@ -1275,9 +1280,17 @@ class AdminDashboard:
         shown = 0
         total = len(self.all_blueprints)
 
+        # No blueprint contains the text: show the closest names instead
+        closest = None
+        if search and not any(search in bp['name'].lower() for bp in self.all_blueprints):
+            closest = {type_id for type_id, _, _ in self.name_index.search(search, limit=50)}
+
         for bp in self.all_blueprints:
             # Search filter
-            if search and search not in bp['name'].lower():
+            if closest is not None:
+                if bp['type_id'] not in closest:
+                    continue
+            elif search and search not in bp['name'].lower():
                 continue
             # Type filter
             if type_filter != 'All' and bp['type'] != type_filter:
@@ -1304,7 +1317,8 @@ class AdminDashboard:
             shown += 1
 
         visible_count = sum(1 for bp in self.all_blueprints if not bp['hidden'])
-        self.bp_count_label.configure(text=f"Visible: {visible_count}/{total}  |  Showing: {shown}")
+        closest_note = " (closest matches)" if closest is not None else ""
+        self.bp_count_label.configure(text=f"Visible: {visible_count}/{total}  |  Showing: {shown}{closest_note}")
 
     def toggle_bp_visibility(self):
         """Toggle visibility of selected blueprints."""
@@ -1367,7 +1381,7 @@ class AdminDashboard:
 
     def save_blueprint_settings(self):
         """Save calculator params and visibility changes."""
-        conn = sqlite3.connect(DB_PATH)
+        conn = db.connect()
         cursor = conn.cursor()
         self._ensure_bp_tables(cursor, conn)
 
@@ -1538,7 +1552,7 @@ class AdminDashboard:
                                     f"Save these changes?\n\n{changes_text}"):
             return
 
-        conn = sqlite3.connect(DB_PATH)
+        conn = db.connect()
         cursor = conn.cursor()
 
         for change in self.unsaved_changes.values():
@@ -0,0 +1,416 @@
+"""
+fixtures.py
+
+Synthetic database for the benchmark suite.
+
+Builds a database with the init_database.py schema and realistic volumes:
+
+    market_orders               ~380k orders (a full The Forge book), 55% at Jita
+    bwf_market_orders           ~8k orders at the BWF-ZZ keepstar
+    market_price_snapshots_*    30-minute snapshots of the tracked items for
+                                --days days, rolled up and pruned the way
+                                track_market_orders.py leaves them
+    market_history              a year of daily history per traded type
+    wallet_transactions/journal ~50k rows each for the main character
+    character_orders            a few hundred active and historic orders
+    doctrine_fits               60 fits of ~25 items
+    character_blueprints, lx_zoj_inventory_snapshots, tracked_market_items,
+    price_averages, market_top_of_book / market_book_levels
+
+scale multiplies every row count (0.1 gives a quick smoke-test database).
+Generation is deterministic for a given (scale, days, seed), and the result
+is cached under benchmarks/.fixtures/ so only the first run pays for it.
+
+Two objects that live in the production database but are created outside
+init_database.py (freighting_services, v_my_trading_fees) get minimal
+stand-ins so the quote and breakeven paths run.
+
+Usage:
+    python fixtures.py                           # build the default fixture
+    python fixtures.py --scale 0.1 --force
+"""
+
+import argparse
+import contextlib
+import io
+import math
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(PROJECT_DIR / 'scripts'))
+sys.path.insert(0, str(PROJECT_DIR / 'scripts' / 'initialization'))
+
+from init_database import init_database
+from order_loader import create_staging_table, create_staging_indexes
+from top_of_book import rebuild_top_of_book
+from snapshot_rollups import refresh_rollups, prune_snapshots, RAW_TABLE
+from price_averages import refresh_price_averages
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────────
+
+FIXTURE_DIR = BENCH_DIR / '.fixtures'
+
+# Bump when the generated data changes shape so cached fixtures are rebuilt
+FIXTURE_VERSION = 1
+
+CHARACTER_ID = 2114278577
+THE_FORGE = 10000002
+JITA = 60003760
+BWF_STRUCTURE_ID = 1051346234914
+BWF_REGION_ID = 10000039
+LX_ZOJ_STRUCTURE_ID = 1027625808467
+
+# Row counts at scale 1.0
+TYPES = 4000
+FORGE_ORDERS = 380_000
+BWF_ORDERS = 8_000
+HISTORY_TYPES = 3000
+HISTORY_DAYS = 365
+TRACKED_ITEMS = 400
+WALLET_ROWS = 50_000
+CHARACTER_ORDERS = 400
+DOCTRINE_FITS = 60
+BLUEPRINTS = 600
+INVENTORY_ITEMS = 60
+
+SNAPSHOT_INTERVAL = 1800
+DEFAULT_DAYS = 90
+
+TRACKED_CATEGORIES = ('minerals', 'ice_products', 'moon_materials', 'salvaged_materials', 'other')
+
+
+def scaled(count, scale):
+    return max(1, int(count * scale))
+
+
+def iso(dt):
+    return dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+# ─── STATIC DATA ──────────────────────────────────────────────────────────────
+
+def build_static(conn, rng, scale):
+    """inv_* / sde_types. Returns {type_id: base_price} for market types."""
+    categories = [(c, f"Category {c}", None, 1) for c in range(1, 11)]
+    groups = [(g, (g % 10) + 1, f"Group {g}", None, 0, 0, 0, 0, 1) for g in range(1, 201)]
+    market_groups = [(m, None if m <= 15 else (m % 15) + 1, f"Market Group {m}", None, None, 1) for m in range(1, 151)]
+    conn.executemany("INSERT INTO inv_categories VALUES (?, ?, ?, ?)", categories)
+    conn.executemany("INSERT INTO inv_groups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", groups)
+    conn.executemany(
+        "INSERT INTO inv_market_groups (market_group_id, parent_group_id, market_group_name, description, icon_id, has_types) "
+        "VALUES (?, ?, ?, ?, ?, ?)", market_groups
+    )
+
+    prices = {}
+    types = []
+    for type_id in range(1, scaled(TYPES, scale) + 1):
+        # Log-uniform base price from 1 ISK to 5B ISK
+        base = math.exp(rng.uniform(0, math.log(5e9)))
+        prices[type_id] = base
+        volume = round(math.exp(rng.uniform(math.log(0.01), math.log(5000))), 2)
+        types.append((type_id, rng.randint(1, 200), f"Item {type_id}", None, None, volume, None, 1,
+                      None, base, 1, rng.randint(16, 150), None, None, None))
+    conn.executemany(f"INSERT INTO inv_types VALUES ({', '.join('?' * 15)})", types)
+    conn.executemany(
+        "INSERT INTO sde_types (type_id, packaged_volume, last_updated) VALUES (?, ?, ?)",
+        [(t[0], t[5], iso(datetime.now(timezone.utc))) for t in types if rng.random() < 0.3]
+    )
+    return prices
+
+
+def build_stand_ins(conn):
+    """Objects the production database has but init_database.py doesn't create."""
+    conn.executescript(f"""
+        CREATE TABLE IF NOT EXISTS freighting_services (
+            service_name TEXT, route_from TEXT, route_to TEXT, cost_per_m3 REAL,
+            collateral_fee_percent REAL, minimum_reward REAL, is_active INTEGER
+        );
+        INSERT INTO freighting_services VALUES ('TEST Freight', 'Jita', 'BWF-ZZ', 800, 0.01, 5000000, 1);
+
+        CREATE VIEW IF NOT EXISTS v_my_trading_fees AS
+        SELECT {CHARACTER_ID} AS character_id,
+               1.5 AS broker_fee_percent,
+               3.37 AS sales_tax_percent,
+               1.015 AS buy_cost_multiplier,
+               0.95125 AS sell_revenue_multiplier;
+    """)
+
+# ─── MARKET ───────────────────────────────────────────────────────────────────
+
+def order_rows(rng, prices, count, region_id, locations, weights, first_order_id, now):
+    """ESI-shaped order rows for a staging table, popular types getting more orders."""
+    type_ids = list(prices)
+    # Zipf-ish popularity: a few hundred types carry most of the book
+    popularity = [1 / (rank + 1) ** 0.8 for rank in range(len(type_ids))]
+    chosen_types = rng.choices(type_ids, popularity, k=count)
+    chosen_locations = rng.choices(locations, weights, k=count)
+    loaded_at = now.isoformat()
+    for n, (type_id, location_id) in enumerate(zip(chosen_types, chosen_locations)):
+        is_buy = rng.random() < 0.45
+        base = prices[type_id]
+        price = round(base * (rng.uniform(0.6, 0.99) if is_buy else rng.uniform(1.01, 1.6)), 2)
+        volume_total = rng.choice((1, 1, 5, 10, 100, 1000, 100_000))
+        yield (
+            first_order_id + n, region_id, type_id, location_id, int(is_buy), price,
+            rng.randint(1, volume_total), volume_total,
+            iso(now - timedelta(seconds=rng.randint(0, 90 * 86400))), rng.choice((30, 90, 90, 90)),
+            rng.choice(('station', 'region', 'solarsystem')) if is_buy else 'region',
+            1, loaded_at,
+        )
+
+
+def build_market(conn, rng, prices, scale, now):
+    """market_orders and bwf_market_orders, indexed like the live tables, plus top of book."""
+    forge_locations = [JITA] + [60000000 + n for n in range(1, 41)]
+    forge_weights = [55] + [45 / 40] * 40
+
+    for table, index_prefix, count, region_id, locations, weights, first_id in (
+        ('market_orders', 'idx_temp_market_orders', scaled(FORGE_ORDERS, scale),
+         THE_FORGE, forge_locations, forge_weights, 6_000_000_000),
+        ('bwf_market_orders', 'idx_temp_bwf_orders', scaled(BWF_ORDERS, scale),
+         BWF_REGION_ID, [BWF_STRUCTURE_ID], [1], 7_000_000_000),
+    ):
+        create_staging_table(conn, table)
+        conn.executemany(
+            f"INSERT INTO {table} VALUES ({', '.join('?' * 13)})",
+            order_rows(rng, prices, count, region_id, locations, weights, first_id, now)
+        )
+        create_staging_indexes(conn, table, index_prefix)
+        rebuild_top_of_book(conn, table)
+    conn.commit()
+
+
+def build_history(conn, rng, prices, scale, now):
+    """A year of daily market_history for the most traded types."""
+    type_ids = list(prices)[:scaled(HISTORY_TYPES, scale)]
+    today = now.date()
+
+    def rows():
+        for type_id in type_ids:
+            price = prices[type_id]
+            volume = max(1, int(1e6 / math.sqrt(price)))
+            for day in range(HISTORY_DAYS, 0, -1):
+                price *= rng.uniform(0.97, 1.03)
+                yield (type_id, THE_FORGE, (today - timedelta(days=day)).isoformat(),
+                       round(price, 2), round(price * 1.05, 2), round(price * 0.95, 2),
+                       rng.randint(1, 500), rng.randint(0, volume * 2))
+
+    conn.executemany("INSERT INTO market_history VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows())
+    conn.commit()
+
+
+def build_tracked_items(conn, rng, prices, scale):
+    """tracked_market_items. Returns {type_id: type_name}."""
+    type_ids = rng.sample(list(prices)[:1000], min(scaled(TRACKED_ITEMS, scale), min(1000, len(prices))))
+    rows = []
+    for n, type_id in enumerate(type_ids):
+        category = TRACKED_CATEGORIES[n % len(TRACKED_CATEGORIES)]
+        rows.append((type_id, f"Item {type_id}", category, n // len(TRACKED_CATEGORIES) + 1,
+                     rng.choice((85, 90, 95)), 0, 1, None, 0))
+    conn.executemany("""
+        INSERT INTO tracked_market_items
+            (type_id, type_name, category, display_order, price_percentage,
+             alliance_discount, buyback_accepted, buyback_rate, buyback_quota)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    conn.executemany("INSERT INTO site_config (key, value) VALUES (?, ?)", [
+        ('buyback_category_minerals', '1'),
+        ('buyback_category_reaction_materials', '1'),
+        ('buyback_category_salvaged_materials', '0'),
+    ])
+    conn.commit()
+    return {type_id: f"Item {type_id}" for type_id in type_ids}
+
+
+def build_snapshots(conn, rng, prices, tracked, days, now):
+    """
+    30-minute snapshots of the tracked items for `days` days, then the
+    rollups and retention pruning track_market_orders.py applies, so the
+    tiers look like a database that has been running that long.
+    """
+    end = int(now.timestamp()) // SNAPSHOT_INTERVAL * SNAPSHOT_INTERVAL
+    start = end - days * 86400
+
+    def rows():
+        for type_id in tracked:
+            price = prices[type_id]
+            for ts in range(start, end, SNAPSHOT_INTERVAL):
+                price *= rng.uniform(0.995, 1.005)
+                buy, sell = price * 0.97, price * 1.03
+                yield (type_id, ts, round(buy, 2), round(sell, 2), round((sell - buy) / buy * 100, 4),
+                       rng.randint(0, 10**7), rng.randint(0, 10**7))
+
+    conn.executemany(f"""
+        INSERT INTO {RAW_TABLE} (type_id, ts, best_buy, best_sell, spread_pct, buy_volume, sell_volume)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, rows())
+    refresh_rollups(conn, start)
+    prune_snapshots(conn)
+    refresh_price_averages(conn)
+    conn.commit()
+
+# ─── CHARACTER ────────────────────────────────────────────────────────────────
+
+def build_character(conn, rng, prices, scale, now):
+    """Wallet, character orders, blueprints, LX-ZOJ inventory and doctrine fits."""
+    type_ids = list(prices)[:2000]
+    wallet_rows = scaled(WALLET_ROWS, scale)
+
+    conn.executemany("""
+        INSERT INTO wallet_transactions
+            (transaction_id, character_id, date, type_id, location_id, quantity, unit_price,
+             client_id, is_buy, is_personal, journal_ref_id, last_updated)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        (n, CHARACTER_ID, iso(now - timedelta(minutes=rng.randint(0, 365 * 1440))), type_id, JITA,
+         rng.randint(1, 1000), round(prices[type_id] * rng.uniform(0.9, 1.1), 2), 90000000 + n % 5000,
+         int(rng.random() < 0.5), int(rng.random() < 0.9), 20_000_000_000 + n, iso(now))
+        for n, type_id in enumerate(rng.choices(type_ids, k=wallet_rows), 1)
+    ))
+    conn.executemany("""
+        INSERT INTO wallet_journal
+            (id, character_id, date, ref_type, amount, balance, description)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (
+        (20_000_000_000 + n, CHARACTER_ID, iso(now - timedelta(minutes=rng.randint(0, 365 * 1440))),
+         rng.choice(('market_transaction', 'brokers_fee', 'transaction_tax', 'player_donation')),
+         round(rng.uniform(-1e9, 1e9), 2), round(rng.uniform(0, 1e11), 2), 'synthetic')
+        for n in range(1, wallet_rows + 1)
+    ))
+
+    order_count = scaled(CHARACTER_ORDERS, scale)
+    conn.executemany("""
+        INSERT INTO character_orders
+            (order_id, character_id, type_id, region_id, location_id, is_buy_order, is_corporation,
+             price, volume_total, volume_remain, issued, duration, escrow, min_volume, range, state, last_updated)
+        VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?, ?, ?, ?, NULL, 1, 'station', ?, ?)
+    """, (
+        (5_000_000_000 + n, CHARACTER_ID, type_id, THE_FORGE, JITA, int(n % 4 == 0),
+         round(prices[type_id] * rng.uniform(0.9, 1.2), 2), 100, rng.randint(1, 100),
+         iso(now - timedelta(hours=rng.randint(0, 2000))), rng.choice((0, 90)),
+         'active' if n % 3 else 'expired', iso(now))
+        for n, type_id in enumerate(rng.choices(type_ids[:500], k=order_count), 1)
+    ))
+
+    conn.executemany("""
+        INSERT INTO character_blueprints
+            (item_id, type_id, type_name, location_id, location_flag, quantity,
+             time_efficiency, material_efficiency, runs, last_updated)
+        VALUES (?, ?, ?, ?, 'Hangar', ?, ?, ?, ?, ?)
+    """, (
+        (1_000_000_000_000 + n, type_id, f"Item {type_id} Blueprint", LX_ZOJ_STRUCTURE_ID,
+         -1 if n % 2 else 1, rng.choice((0, 10, 20)), rng.choice((0, 5, 10)),
+         -1 if n % 2 else rng.randint(1, 10), iso(now))
+        for n, type_id in enumerate(rng.choices(type_ids, k=scaled(BLUEPRINTS, scale)), 1)
+    ))
+
+    inventory_types = type_ids[:INVENTORY_ITEMS]
+    end = int(now.timestamp()) // 3600 * 3600
+    conn.executemany(
+        "INSERT INTO lx_zoj_inventory_snapshots (snapshot_ts, type_id, quantity, location_id) VALUES (?, ?, ?, ?)",
+        ((ts, type_id, rng.randint(0, 50_000), LX_ZOJ_STRUCTURE_ID)
+         for ts in range(end - 30 * 86400, end + 1, 3600) for type_id in inventory_types)
+    )
+
+    created = iso(now)
+    for fit_id in range(1, scaled(DOCTRINE_FITS, scale) + 1):
+        conn.execute("INSERT INTO doctrine_fits (fit_id, fit_name, ship_type, created_at) VALUES (?, ?, ?, ?)",
+                     (fit_id, f"Doctrine Fit {fit_id}", f"Item {rng.choice(type_ids)}", created))
+        conn.executemany(
+            "INSERT INTO doctrine_fit_items (fit_id, type_id, quantity) VALUES (?, ?, ?)",
+            [(fit_id, type_id, rng.randint(1, 3000)) for type_id in rng.sample(type_ids, 25)]
+        )
+    conn.commit()
+
+# ─── BUILD ────────────────────────────────────────────────────────────────────
+
+def fixture_path(scale=1.0, days=DEFAULT_DAYS, seed=1):
+    """Cache location for one fixture configuration."""
+    return FIXTURE_DIR / f"fixture_v{FIXTURE_VERSION}_s{scale:g}_d{days}_seed{seed}.db"
+
+
+def build_fixture(path, scale=1.0, days=DEFAULT_DAYS, seed=1):
+    """Generates the synthetic database at path (overwriting it)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(f"{path}{suffix}"):
+            os.remove(f"{path}{suffix}")
+
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_database(str(path))
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+
+    start = time.perf_counter()
+    prices = build_static(conn, rng, scale)
+    build_stand_ins(conn)
+    conn.commit()
+    print(f"  static data        {time.perf_counter() - start:6.1f}s")
+
+    for label, step in (
+        ("order books",     lambda: build_market(conn, rng, prices, scale, now)),
+        ("market history",  lambda: build_history(conn, rng, prices, scale, now)),
+        ("snapshots",       lambda: build_snapshots(conn, rng, prices, build_tracked_items(conn, rng, prices, scale), days, now)),
+        ("character data",  lambda: build_character(conn, rng, prices, scale, now)),
+    ):
+        start = time.perf_counter()
+        step()
+        print(f"  {label:<18} {time.perf_counter() - start:6.1f}s")
+
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    return path
+
+
+def fixture_stats(path):
+    """Row counts of the tables the benchmarks lean on."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    counts = {}
+    for table in ('market_orders', 'bwf_market_orders', RAW_TABLE, 'market_price_snapshots_hourly',
+                  'market_price_snapshots_daily', 'market_history', 'wallet_transactions',
+                  'wallet_journal', 'character_orders', 'doctrine_fit_items', 'market_top_of_book'):
+        counts[table] = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    conn.close()
+    counts['file_bytes'] = os.path.getsize(path)
+    return counts
+
+
+def get_fixture(scale=1.0, days=DEFAULT_DAYS, seed=1, force=False):
+    """Path to a cached fixture, building it first if needed."""
+    path = fixture_path(scale, days, seed)
+    if force or not path.exists():
+        print(f"\n  Building fixture {path.name} (scale {scale:g}, {days} days)...")
+        build_fixture(path, scale, days, seed)
+    return path
+
+# ─── MAIN ─────────────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the synthetic benchmark database.")
+    parser.add_argument("--scale", type=float, default=1.0,          help="Row-count multiplier (default 1.0)")
+    parser.add_argument("--days",  type=int,   default=DEFAULT_DAYS, help="Days of price snapshots (default 90)")
+    parser.add_argument("--seed",  type=int,   default=1,            help="Random seed (default 1)")
+    parser.add_argument("--force", action="store_true",              help="Rebuild even if cached")
+    args = parser.parse_args()
+
+    path = get_fixture(args.scale, args.days, args.seed, args.force)
+    print(f"\n  {path}")
+    for table, count in fixture_stats(path).items():
+        print(f"  {table:<32} {count:>14,}")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,528 @@
+"""
+run_benchmarks.py
+
+Times the ingest and analytics entry points against a synthetic database
+(see fixtures.py) and writes the results as JSON, so a change can be
+compared with the commit before it.
+
+Benchmarks:
+    order_load           OrderBulkLoader: the whole Forge book into a staging table + indexes
+    swap_tables          update_market_orders.swap_tables (event diff, rename, top of book)
+    take_snapshot        track_market_orders.take_snapshot (raw insert, rollups, averages)
+    breakeven_cache      refresh_breakeven_cache
+    opportunity_scanner  market_opportunity_scanner.run
+    generate_quote       generate_quote_v4.generate_quote for a 25-line order (warm QuoteEngine)
+    simulate_fills       fill_simulator.simulate_fills: a 200-line order walked through Jita depth
+    resolve_names        name_resolver: up to 2,000 pasted names (exact, wrong case, typos) against the name index
+    buyback_data         generate_buyback_data.get_buyback_data
+    blueprint_html       generate_corrected_html blueprint + inventory data
+    decode_orders_dicts  ESI order pages: json.loads + order_to_row (the old path)
+    decode_orders_rows   ESI order pages: esi_decode.decode_orders
+    decode_history       ESI history responses: esi_decode.decode_history
+
+Every benchmark runs on its own copy of the fixture. Setup (building a
+staging table to swap in, say) is not timed; the script output is
+captured and discarded. Each benchmark runs once to warm up and then
+--repeat times. Wall and CPU time are recorded for every run; benchmarks
+registered with a unit (the decode benchmarks: one ESI page) also get
+CPU time per unit and the peak traced allocation of one extra run under
+tracemalloc.
+
+Results go to benchmarks/results/<timestamp>_<commit>.json.
+
+Usage:
+    python run_benchmarks.py                               # full-size fixture, all benchmarks
+    python run_benchmarks.py --scale 0.1 --repeat 3        # quick run
+    python run_benchmarks.py --only swap_tables,take_snapshot
+    python run_benchmarks.py --compare results/OLD.json    # run, then compare to OLD
+    python run_benchmarks.py --compare OLD.json NEW.json   # compare two saved runs
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from types import ModuleType, SimpleNamespace
+
+BENCH_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = BENCH_DIR.parent
+for folder in ('config', 'buyback', 'market', 'scripts', ''):
+    sys.path.insert(0, str(PROJECT_DIR / folder))
+sys.path.insert(0, str(BENCH_DIR))
+
+import fixtures
+from fixtures import get_fixture, fixture_stats, DEFAULT_DAYS, THE_FORGE
+
+# The market scripts import their ids from config/setup.py, the user's
+# git-ignored identity file. Stand in the fixture's ids so the suite runs
+# in a checkout without one (and never against the user's own ids).
+setup_stub = ModuleType('setup')
+setup_stub.CHARACTER_ID = fixtures.CHARACTER_ID
+setup_stub.CORPORATION_ID = None
+setup_stub.ALLIANCE_ID = None
+setup_stub.HOME_REGION_ID = fixtures.THE_FORGE
+setup_stub.OPS_REGION_ID = fixtures.BWF_REGION_ID
+setup_stub.HOME_STATION_ID = fixtures.JITA
+sys.modules['setup'] = setup_stub
+
+import db
+from order_loader import OrderBulkLoader, create_staging_table, create_staging_indexes, order_to_row
+from quote_engine import close_engines
+import esi_decode
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────────
+
+RESULTS_DIR = BENCH_DIR / 'results'
+
+# A benchmark whose median grows by more than this is reported as a regression
+REGRESSION_THRESHOLD_PCT = 10.0
+
+QUOTE_LINES = 25
+FILL_LINES = 200
+RESOLVE_NAMES = 2000
+
+# Synthetic ESI responses for the decode benchmarks
+DECODE_PAGES = 50
+DECODE_PAGE_SIZE = 1000
+DECODE_HISTORY_TYPES = 200
+DECODE_HISTORY_DAYS = 30
+
+BENCHMARKS = {}
+
+
+def benchmark(name, description, unit=None):
+    """
+    Registers a benchmark. The decorated function does the untimed setup
+    for one repetition and returns the zero-argument callable to time.
+    It receives a ctx with the working copy's path, an open connection
+    and a dict that persists across repetitions. Benchmarks with a unit
+    set ctx.units to the number of units one run processes.
+    """
+    def register(setup):
+        BENCHMARKS[name] = (description, setup, unit)
+        return setup
+    return register
+
+
+def load_module(name, **attrs):
+    """Imports a script module and points its module-level settings (DB_PATH) at the fixture."""
+    module = importlib.import_module(name)
+    for attr, value in attrs.items():
+        setattr(module, attr, value)
+    return module
+
+# ─── BENCHMARKS ───────────────────────────────────────────────────────────────
+
+@benchmark('order_load', "OrderBulkLoader: whole Forge book into a staging table + indexes")
+def order_load(ctx):
+    if 'orders' not in ctx.cache:
+        columns = ('order_id', 'type_id', 'location_id', 'is_buy_order', 'price', 'volume_remain',
+                   'volume_total', 'issued', 'duration', 'range', 'min_volume')
+        rows = ctx.conn.execute(f"SELECT {', '.join(columns)} FROM market_orders").fetchall()
+        ctx.cache['orders'] = [
+            dict(zip(columns, row), is_buy_order=bool(row[3])) for row in rows
+        ]
+    orders = ctx.cache['orders']
+
+    def run():
+        create_staging_table(ctx.conn, 'bench_orders_load')
+        loader = OrderBulkLoader(ctx.conn, 'bench_orders_load', THE_FORGE)
+        loader.load(orders)
+        loader.finish('idx_bench_orders_load')
+    return run
+
+
+@benchmark('swap_tables', "update_market_orders.swap_tables: event diff, swap, top of book")
+def swap_tables(ctx):
+    module = load_module('update_market_orders', DB_PATH=ctx.path)
+
+    # A refreshed book: ~2% of orders gone, ~5% repriced, ~1% new
+    conn = ctx.conn
+    create_staging_table(conn, module.TEMP_TABLE)
+    conn.execute(f"""
+        INSERT INTO {module.TEMP_TABLE}
+        SELECT order_id, region_id, type_id, location_id, is_buy_order,
+               CASE WHEN order_id % 20 = 0 THEN price * 1.01 ELSE price END,
+               volume_remain, volume_total, issued, duration, range, min_volume, last_updated
+        FROM market_orders
+        WHERE order_id % 50 <> 7
+    """)
+    conn.execute(f"""
+        INSERT INTO {module.TEMP_TABLE}
+        SELECT order_id + (SELECT MAX(order_id) FROM market_orders), region_id, type_id,
+               location_id, is_buy_order, price * 0.99, volume_remain, volume_total, issued, duration, range, min_volume, last_updated
+        FROM market_orders
+        WHERE order_id % 100 = 3
+    """)
+    create_staging_indexes(conn, module.TEMP_TABLE, module.TEMP_INDEX_PREFIX)
+    conn.commit()
+    return lambda: module.swap_tables(conn)
+
+
+@benchmark('take_snapshot', "track_market_orders.take_snapshot: raw insert, rollups, price averages")
+def take_snapshot(ctx):
+    module = load_module('track_market_orders', DB_PATH=ctx.path)
+    items = dict(ctx.conn.execute("SELECT type_id, type_name FROM tracked_market_items").fetchall())
+    module.init_db(ctx.conn)
+    return lambda: module.take_snapshot(ctx.conn, items)
+
+
+@benchmark('breakeven_cache', "refresh_breakeven_cache: breakeven prices for active sell orders")
+def breakeven_cache(ctx):
+    module = load_module('refresh_breakeven_cache', DB_PATH=ctx.path)
+    # Skip the @timed_script banner
+    return module.refresh_breakeven_cache.__wrapped__
+
+
+@benchmark('opportunity_scanner', "market_opportunity_scanner.run: Jita spread ranking")
+def opportunity_scanner(ctx):
+    module = load_module('market_opportunity_scanner', DB_PATH=ctx.path)
+    return module.run
+
+
+@benchmark('generate_quote', f"generate_quote_v4.generate_quote: {QUOTE_LINES}-line order")
+def generate_quote(ctx):
+    name_index(ctx)
+    module = load_module('generate_quote_v4', DB_PATH=ctx.path)
+    items = ctx.conn.execute(f"""
+        SELECT t.type_name, 1 + t.type_id % 500
+        FROM market_top_of_book tob
+        JOIN inv_types t ON t.type_id = tob.type_id
+        WHERE tob.location_id = 60003760 AND tob.best_buy IS NOT NULL AND tob.best_sell IS NOT NULL
+        ORDER BY tob.type_id
+        LIMIT {QUOTE_LINES}
+    """).fetchall()
+    return lambda: module.generate_quote(items, "Benchmark")
+
+
+@benchmark('simulate_fills', f"fill_simulator.simulate_fills: {FILL_LINES}-line order through Jita depth", unit='line')
+def simulate_fills(ctx):
+    module = load_module('fill_simulator')
+    # Half of each item's sell side, so most lines walk several levels
+    lines = ctx.conn.execute(f"""
+        SELECT type_id, MAX(1, sell_volume / 2)
+        FROM market_top_of_book
+        WHERE location_id = 60003760 AND best_sell IS NOT NULL
+        ORDER BY type_id
+        LIMIT {FILL_LINES}
+    """).fetchall()
+    ctx.units = len(lines)
+    return lambda: module.simulate_fills(ctx.conn, lines)
+
+
+def name_index(ctx):
+    """Points name_resolver at an index file next to the working copy, so the real one is left alone."""
+    return load_module('name_resolver', NAME_INDEX_PATH=Path(ctx.path).with_suffix('.names.npz'))
+
+
+@benchmark('resolve_names', f"name_resolver.NameIndex.resolve: up to {RESOLVE_NAMES:,} pasted names", unit='name')
+def resolve_names(ctx):
+    module = name_index(ctx)
+    if 'names' not in ctx.cache:
+        type_names = [name for (name,) in ctx.conn.execute(
+            "SELECT type_name FROM inv_types WHERE published = 1 ORDER BY type_id LIMIT ?", (RESOLVE_NAMES,)
+        )]
+        # Mostly exact, a quarter in lower case, one in ten with a letter dropped
+        ctx.cache['names'] = [
+            name[:len(name) // 2] + name[len(name) // 2 + 1:] if i % 10 == 0 else
+            name.lower() if i % 4 == 0 else name
+            for i, name in enumerate(type_names)
+        ]
+    names = ctx.cache['names']
+    ctx.units = len(names)
+    index = module.load_name_index(ctx.conn)
+    return lambda: index.resolve(names)
+
+
+@benchmark('buyback_data', "generate_buyback_data.get_buyback_data: buyback page data")
+def buyback_data(ctx):
+    module = load_module('generate_buyback_data', DB_PATH=ctx.path)
+    return module.get_buyback_data
+
+
+@benchmark('blueprint_html', "generate_corrected_html: blueprint and inventory data for index.html")
+def blueprint_html(ctx):
+    # Reads through db.connect(), whose default path is db.DB_PATH
+    db.DB_PATH = ctx.path
+    module = load_module('generate_corrected_html')
+
+    def run():
+        module.get_blueprints_with_metadata()
+        module.get_inventory_data()
+    return run
+
+def order_pages(ctx):
+    """DECODE_PAGES order pages as ESI would send them (bytes), cached across repetitions."""
+    if 'order_pages' not in ctx.cache:
+        columns = esi_decode.ORDER_FIELDS
+        rows = ctx.conn.execute(
+            f"SELECT {', '.join(columns)} FROM market_orders ORDER BY order_id LIMIT ?",
+            (DECODE_PAGES * DECODE_PAGE_SIZE,)
+        ).fetchall()
+        orders = [dict(zip(columns, row), is_buy_order=bool(row[3])) for row in rows]
+        ctx.cache['order_pages'] = [
+            json.dumps(orders[i:i + DECODE_PAGE_SIZE]).encode()
+            for i in range(0, len(orders), DECODE_PAGE_SIZE)
+        ]
+    ctx.units = len(ctx.cache['order_pages'])
+    return ctx.cache['order_pages']
+
+
+@benchmark('decode_orders_dicts', "ESI order pages: json.loads + order_to_row per order", unit='page')
+def decode_orders_dicts(ctx):
+    pages = order_pages(ctx)
+
+    def run():
+        for body in pages:
+            rows = [order_to_row(order, THE_FORGE, 'now') for order in json.loads(body)]
+        return rows
+    return run
+
+
+@benchmark('decode_orders_rows', f"ESI order pages: esi_decode.decode_orders ({esi_decode.PARSER})", unit='page')
+def decode_orders_rows(ctx):
+    pages = order_pages(ctx)
+
+    def run():
+        for body in pages:
+            rows = esi_decode.decode_orders(body)
+        return rows
+    return run
+
+
+@benchmark('decode_history', f"ESI history: esi_decode.decode_history, {DECODE_HISTORY_DAYS}-day window", unit='response')
+def decode_history(ctx):
+    if 'history' not in ctx.cache:
+        columns = ('type_id', *esi_decode.HISTORY_FIELDS)
+        rows = ctx.conn.execute(f"""
+            SELECT {', '.join(columns)} FROM market_history
+            WHERE region_id = ? AND type_id IN (
+                SELECT DISTINCT type_id FROM market_history WHERE region_id = ?
+                ORDER BY type_id LIMIT {DECODE_HISTORY_TYPES}
+            )
+            ORDER BY type_id, date
+        """, (THE_FORGE, THE_FORGE)).fetchall()
+        by_type = {}
+        for row in rows:
+            by_type.setdefault(row[0], []).append(dict(zip(columns[1:], row[1:])))
+        # Window relative to the newest day, so an older cached fixture still has one
+        latest = max((row[1] for row in rows), default=datetime.now().date().isoformat())
+        since = (datetime.fromisoformat(latest) - timedelta(days=DECODE_HISTORY_DAYS)).date().isoformat()
+        ctx.cache['history'] = (since, [(type_id, json.dumps(days).encode()) for type_id, days in by_type.items()])
+    since, responses = ctx.cache['history']
+    ctx.units = len(responses)
+
+    def run():
+        for type_id, body in responses:
+            esi_decode.decode_history(body, type_id, THE_FORGE, since)
+    return run
+
+# ─── RUNNER ───────────────────────────────────────────────────────────────────
+
+def run_benchmark(name, fixture, workdir, repeat):
+    """Runs one benchmark on a fresh copy of the fixture; returns its result dict."""
+    description, setup, unit = BENCHMARKS[name]
+    path = Path(workdir) / f"{name}.db"
+    shutil.copyfile(fixture, path)
+
+    ctx = SimpleNamespace(path=str(path), conn=db.connect(path), cache={}, units=None)
+    original_db_path = db.DB_PATH
+    runs = []
+    cpu_runs = []
+    result = {'description': description}
+    try:
+        for i in range(repeat + 1):
+            with contextlib.redirect_stdout(io.StringIO()):
+                run = setup(ctx)
+                start, cpu_start = time.perf_counter(), time.process_time()
+                run()
+                elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+            if i:  # first run is the warm-up
+                runs.append(elapsed * 1000)
+                cpu_runs.append(cpu * 1000)
+
+        if unit and ctx.units:
+            # Separate run: tracemalloc slows allocation-heavy code too much to time
+            with contextlib.redirect_stdout(io.StringIO()):
+                run = setup(ctx)
+                tracemalloc.start()
+                try:
+                    run()
+                    peak = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+            result.update({
+                'unit': unit,
+                'units': ctx.units,
+                'cpu_us_per_unit': round(statistics.median(cpu_runs) * 1000 / ctx.units, 3),
+                'peak_alloc_kb': round(peak / 1024, 1),
+            })
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    finally:
+        db.DB_PATH = original_db_path
+        ctx.conn.rollback()
+        ctx.conn.close()
+        close_engines()
+        db.close_all()
+        for suffix in ('', '-wal', '-shm'):
+            Path(f"{path}{suffix}").unlink(missing_ok=True)
+
+    if runs:
+        result.update({
+            'runs_ms': [round(ms, 3) for ms in runs],
+            'min_ms': round(min(runs), 3),
+            'median_ms': round(statistics.median(runs), 3),
+            'mean_ms': round(statistics.mean(runs), 3),
+            'stdev_ms': round(statistics.stdev(runs), 3) if len(runs) > 1 else 0.0,
+            'cpu_median_ms': round(statistics.median(cpu_runs), 3),
+        })
+    return result
+
+
+def git_info():
+    """Current commit (short hash) and whether the tree has local changes."""
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=PROJECT_DIR, capture_output=True,
+                                  text=True, timeout=30).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ''
+    return {
+        'commit': git('rev-parse', '--short', 'HEAD') or 'unknown',
+        'subject': git('log', '-1', '--format=%s'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+    }
+
+# ─── REPORTING ────────────────────────────────────────────────────────────────
+
+def print_results(report):
+    print(f"\n  {'=' * 92}")
+    print(f"  {report['meta']['commit']}{' (dirty)' if report['meta']['dirty'] else ''}  "
+          f"scale {report['meta']['scale']:g}, best/median of {report['meta']['repeat']}")
+    print(f"  {'-' * 92}")
+    print(f"  {'Benchmark':<22} {'Min':>12} {'Median':>12} {'Stdev':>10} {'CPU':>12}  Description")
+    for name, result in report['results'].items():
+        if 'error' in result:
+            print(f"  {name:<22} {'[ERROR] ' + result['error']}")
+            continue
+        print(f"  {name:<22} {result['min_ms']:>9.1f} ms {result['median_ms']:>9.1f} ms "
+              f"{result['stdev_ms']:>7.1f} ms {result.get('cpu_median_ms', 0):>9.1f} ms  {result['description']}")
+        if 'unit' in result:
+            print(f"  {'':<22} per {result['unit']}: {result['cpu_us_per_unit']:,.1f} us CPU, "
+                  f"peak {result['peak_alloc_kb']:,.1f} KB traced ({result['units']:,} {result['unit']}s per run)")
+    print()
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD_PCT):
+    """Prints median deltas between two reports; returns the names that regressed."""
+    print(f"\n  {'=' * 92}")
+    print(f"  {baseline['meta']['commit']} -> {current['meta']['commit']}  "
+          f"(regression = median > {threshold:g}% slower)")
+    if baseline['meta'].get('scale') != current['meta'].get('scale'):
+        print(f"  [WARNING] fixture scales differ ({baseline['meta'].get('scale')} vs {current['meta'].get('scale')})")
+    print(f"  {'-' * 92}")
+    print(f"  {'Benchmark':<22} {'Before':>12} {'After':>12} {'Change':>9}")
+
+    regressions = []
+    for name in sorted(set(baseline['results']) | set(current['results'])):
+        before = baseline['results'].get(name, {}).get('median_ms')
+        after = current['results'].get(name, {}).get('median_ms')
+        if before is None or after is None:
+            before_txt = f"{before:.1f} ms" if before is not None else '-'
+            after_txt = f"{after:.1f} ms" if after is not None else '-'
+            print(f"  {name:<22} {before_txt:>12} {after_txt:>12}")
+            continue
+        change = (after - before) / before * 100 if before else 0.0
+        mark = ''
+        if change > threshold:
+            mark = '  REGRESSION'
+            regressions.append(name)
+        elif change < -threshold:
+            mark = '  faster'
+        print(f"  {name:<22} {before:>9.1f} ms {after:>9.1f} ms {change:>+8.1f}%{mark}")
+    print()
+    return regressions
+
+# ─── MAIN ─────────────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ingest and analytics entry points.")
+    parser.add_argument("--scale",     type=float, default=1.0,          help="Fixture row-count multiplier (default 1.0)")
+    parser.add_argument("--days",      type=int,   default=DEFAULT_DAYS, help="Days of price snapshots in the fixture")
+    parser.add_argument("--seed",      type=int,   default=1,            help="Fixture random seed")
+    parser.add_argument("--repeat",    type=int,   default=5,            help="Timed runs per benchmark (after one warm-up)")
+    parser.add_argument("--only",      type=str,   default=None,         help="Comma-separated benchmark names")
+    parser.add_argument("--rebuild",   action="store_true",              help="Regenerate the cached fixture")
+    parser.add_argument("--output",    type=str,   default=None,         help="Result file (default results/<timestamp>_<commit>.json)")
+    parser.add_argument("--compare",   type=str,   nargs='+', metavar='JSON',
+                        help="Baseline result file, optionally followed by the file to compare it with")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD_PCT, help="Regression threshold in %%")
+    parser.add_argument("--list",      action="store_true",              help="List benchmarks and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, (description, _, _) in BENCHMARKS.items():
+            print(f"  {name:<22} {description}")
+        return 0
+
+    if args.compare and len(args.compare) == 2:
+        baseline, current = (json.loads(Path(p).read_text(encoding='utf-8')) for p in args.compare)
+        return 1 if compare(baseline, current, args.threshold) else 0
+
+    names = list(BENCHMARKS)
+    if args.only:
+        names = [n.strip() for n in args.only.split(',')]
+        unknown = [n for n in names if n not in BENCHMARKS]
+        if unknown:
+            parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    fixture = get_fixture(args.scale, args.days, args.seed, args.rebuild)
+    meta = {
+        **git_info(),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'scale': args.scale,
+        'days': args.days,
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'fixture': fixture_stats(fixture),
+    }
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in names:
+            print(f"  {name}...", flush=True)
+            results[name] = run_benchmark(name, fixture, workdir, args.repeat)
+    report = {'meta': meta, 'results': results}
+
+    output = Path(args.output) if args.output else \
+        RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{meta['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding='utf-8')
+
+    print_results(report)
+    print(f"  [OK] Results written to {output}\n")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare[0]).read_text(encoding='utf-8'))
+        return 1 if compare(baseline, report, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,17 +8,20 @@ Pricing Formula:
 - At 100% quality (ME 10 / TE 20): per run = 1% of Jita best sell
 
 Price Source:
-- Primary: 7-day average of best_sell snapshots from market_price_snapshots
+- Primary: 7-day average of best_sell snapshots (price_averages cache)
 - Fallback: MIN(price) from current market_orders (for items without snapshot history)
 """
 import sqlite3
 import os
-from datetime import datetime, timezone, timedelta
+import sys
 
 # Configuration
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
 DB_PATH = os.path.join(PROJECT_DIR, 'mydatabase.db')
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'scripts'))
+
+from price_averages import get_price_averages
 JITA_STATION_ID = 60003760  # Jita IV - Moon 4 - Caldari Navy Assembly Plant
 BASE_PERCENTAGE = 0.01  # 1% of Jita best sell at 100% quality
 
@@ -33,21 +36,13 @@ def get_jita_sell_prices():
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
 
-    seven_days_ago = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
-
-    # Primary: 7-day avg of best_sell from snapshots
-    cursor.execute("""
-        SELECT type_id, AVG(best_sell) as avg_best_sell, COUNT(*) as snapshots
-        FROM market_price_snapshots
-        WHERE timestamp >= ? AND best_sell IS NOT NULL
-        GROUP BY type_id
-    """, (seven_days_ago,))
-
+    # Primary: 7-day avg of best_sell from the price_averages cache
     prices = {}
     snapshot_count = 0
-    for type_id, avg_best_sell, count in cursor.fetchall():
-        prices[type_id] = avg_best_sell
-        snapshot_count += 1
+    for type_id, averages in get_price_averages(conn, 7).items():
+        if averages['avg_sell'] is not None:
+            prices[type_id] = averages['avg_sell']
+            snapshot_count += 1
 
     # Fallback: MIN(price) from current market_orders for items not in snapshots
     cursor.execute("""
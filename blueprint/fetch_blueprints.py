@@ -17,6 +17,7 @@ sys.path.insert(0, str(PROJECT_DIR / 'scripts'))
 sys.path.insert(0, str(PROJECT_DIR / 'config'))
 
 from token_manager import get_token, CHARACTER_ID
+from esi_cache import ESICache, cached_get
 
 try:
     from script_utils import timed_script
@@ -39,8 +40,8 @@ except ImportError:
 # ============================================
 DB_PATH = str(PROJECT_DIR / 'mydatabase.db')
 
-ESI_BASE_URL = 'https://esi.evetech.net/latest'
-ESI_VERIFY_URL = 'https://esi.evetech.net/verify/'
+ESI_BASE_URL = os.environ.get('ESI_BASE_URL', 'https://esi.evetech.net/latest')
+ESI_VERIFY_URL = os.environ.get('ESI_VERIFY_URL', 'https://esi.evetech.net/verify/')
 
 # ============================================
 # ESI API FUNCTIONS
@@ -66,8 +67,11 @@ def resolve_character_identity(access_token, fallback_character_id=CHARACTER_ID)
             "Set CHARACTER_ID in config/token_manager.py or ensure ESI /verify is reachable."
         )
 
-def fetch_character_blueprints(character_id, access_token):
-    """Fetch all blueprints for a character from ESI."""
+def fetch_character_blueprints(character_id, access_token, cache=None):
+    """
+    Fetch all blueprints for a character from ESI.
+    With an ESICache, unchanged pages are answered from disk (ETag / Expires).
+    """
     url = f"{ESI_BASE_URL}/characters/{character_id}/blueprints/"
 
     headers = {
@@ -81,7 +85,7 @@ def fetch_character_blueprints(character_id, access_token):
 
     while True:
         params = {'page': page}
-        response = requests.get(url, headers=headers, params=params, timeout=30)
+        response = cached_get(cache, url, params=params, headers=headers, timeout=30)
 
         if response.status_code == 200:
             blueprints = response.json()
@@ -189,7 +193,10 @@ def main():
     print(f"Character Name: {character_name}")
 
     # Fetch blueprints from ESI
-    blueprints = fetch_character_blueprints(character_id, access_token)
+    cache = ESICache()
+    blueprints = fetch_character_blueprints(character_id, access_token, cache)
+    cache.report()
+    cache.close()
 
     if not blueprints:
         print("[!] No blueprints found")
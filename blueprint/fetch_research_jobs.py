@@ -1,6 +1,7 @@
 """
 Fetch currently researching blueprints from ESI.
 """
+import os
 import sys
 from pathlib import Path
 
@@ -14,7 +15,8 @@ import sqlite3
 from datetime import datetime
 
 DB_PATH = str(PROJECT_DIR / 'mydatabase.db')
-ESI_VERIFY_URL = 'https://esi.evetech.net/verify/'
+ESI_BASE_URL = os.environ.get('ESI_BASE_URL', 'https://esi.evetech.net/latest')
+ESI_VERIFY_URL = os.environ.get('ESI_VERIFY_URL', 'https://esi.evetech.net/verify/')
 
 
 def resolve_character_id(access_token, fallback_character_id=CHARACTER_ID):
@@ -44,7 +46,7 @@ def get_research_jobs():
     character_id = resolve_character_id(access_token)
 
     # Fetch industry jobs
-    url = f'https://esi.evetech.net/latest/characters/{character_id}/industry/jobs/'
+    url = f'{ESI_BASE_URL}/characters/{character_id}/industry/jobs/'
     headers = {'Authorization': f'Bearer {access_token}'}
 
     response = requests.get(url, headers=headers, timeout=30)
@@ -5,10 +5,15 @@ a JavaScript data file with item rates, quotas, and 7-day avg Jita buy prices.
 """
 import sqlite3
 import os
+import sys
 import json
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 
-DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'mydatabase.db')
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(PROJECT_DIR, 'mydatabase.db')
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'scripts'))
+
+from price_averages import get_price_averages
 
 # Map DB category names to display names
 CATEGORY_DISPLAY = {
@@ -49,15 +54,9 @@ def get_buyback_data():
     """)
     items = cursor.fetchall()
 
-    # Get 7-day average Jita buy prices from snapshots
-    seven_days_ago = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
-    cursor.execute("""
-        SELECT type_id, AVG(best_buy) as avg_buy
-        FROM market_price_snapshots
-        WHERE timestamp >= ?
-        GROUP BY type_id
-    """, (seven_days_ago,))
-    avg_prices = {row[0]: round(row[1], 2) for row in cursor.fetchall() if row[1] is not None}
+    # Get 7-day average Jita buy prices from the price_averages cache
+    averages = get_price_averages(conn, 7)
+    avg_prices = {type_id: round(a['avg_buy'], 2) for type_id, a in averages.items() if a['avg_buy'] is not None}
 
     # Get category visibility from site_config
     # Admin stores keys like: buyback_category_minerals, buyback_category_reaction_materials
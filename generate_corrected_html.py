@@ -6,11 +6,14 @@ Generate corrected HTML with:
 - UTC timezone
 - No "Research Time Remaining" column
 """
-import sqlite3
 import os
+import sys
 from datetime import datetime, timezone
 
-DB_PATH = os.path.join(os.path.dirname(__file__), 'mydatabase.db')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+
+import db
+
 ORIGINAL_HTML = os.path.join(os.path.dirname(__file__), 'index.html')
 
 # The exact 35 items from original index.html
@@ -34,7 +37,7 @@ MOON_MATERIALS = {
 
 def get_inventory_data():
     """Get current inventory for all tracked items."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = db.connect(readonly=True)
     cursor = conn.cursor()
 
     cursor.execute("SELECT type_name, quantity FROM lx_zoj_current_inventory")
@@ -125,7 +128,7 @@ def get_blueprint_category_by_market_group(cursor, market_group_id):
 def get_blueprints_with_metadata():
     """Get all BPOs with proper categorization using market groups.
     Deduplicates: keeps best ME/TE version (prefer 10/20, else highest ME)."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = db.connect(readonly=True)
     cursor = conn.cursor()
 
     query = """
@@ -183,7 +186,7 @@ def get_blueprints_with_metadata():
 
 def get_category_override(type_id):
     """Check if there's a manual category override for this blueprint."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = db.connect(readonly=True)
     cursor = conn.cursor()
 
     cursor.execute("""
@@ -449,7 +452,7 @@ def get_subcategory(group_name, bp_name, market_path=None, type_id=None):
 
 def get_last_updated():
     """Get last updated timestamp for blueprints in UTC (EVE Time)."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = db.connect(readonly=True)
     cursor = conn.cursor()
 
     cursor.execute("SELECT MAX(last_updated) FROM character_blueprints")
@@ -482,31 +485,16 @@ def get_last_updated():
 
 def get_inventory_last_updated():
     """Get last updated timestamp for inventory in UTC (EVE Time)."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = db.connect(readonly=True)
     cursor = conn.cursor()
 
-    cursor.execute("SELECT MAX(snapshot_timestamp) FROM lx_zoj_inventory")
+    cursor.execute("SELECT MAX(snapshot_ts) FROM lx_zoj_inventory_snapshots")
     result = cursor.fetchone()
     conn.close()
 
     if result and result[0]:
-        # Parse ISO format timestamp from database
-        timestamp_str = result[0]
-
-        # Handle different ISO format variations
-        if 'Z' in timestamp_str:
-            dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-        elif '+' in timestamp_str or timestamp_str.endswith('00:00'):
-            dt = datetime.fromisoformat(timestamp_str)
-        else:
-            # No timezone info, assume UTC
-            dt = datetime.fromisoformat(timestamp_str).replace(tzinfo=timezone.utc)
-
-        # Convert to UTC if it's not already
-        if dt.tzinfo is not None and dt.tzinfo != timezone.utc:
-            dt = dt.astimezone(timezone.utc)
-        elif dt.tzinfo is None:
-            dt = dt.replace(tzinfo=timezone.utc)
+        # Epoch seconds, already UTC
+        dt = datetime.fromtimestamp(result[0], timezone.utc)
 
         # Format as EVE Time (UTC) - 24-hour format
         return dt.strftime('%b %d, %Y %H:%M') + ' EVE'
@@ -1,44 +1,92 @@
 """
 Market Updates Orchestrator
-Runs market data updates in optimal order with error handling.
+Runs market data updates as a dependency graph with error handling.
 All updates use temporary tables for ZERO DOWNTIME.
+
+Each stage declares the tables it reads (inputs) and writes (outputs).
+A stage depends on every other stage that outputs one of its inputs and
+starts as soon as those have finished; stages with no pending inputs run
+in parallel. Total run time approaches the longest dependency chain
+instead of the sum of all stages.
+
+Usage:
+    python run_market_updates.py                  # parallel DAG run
+    python run_market_updates.py --plan           # show stages and dependencies only
+    python run_market_updates.py --max-parallel 1 # old one-at-a-time behaviour
 """
+import argparse
 import subprocess
 import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime
 from pathlib import Path
 
 SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = SCRIPT_DIR.parent
 
-# Market data scripts in optimal execution order
+# Market data stages. 'inputs'/'outputs' are database tables; inputs that
+# no stage outputs are read as they already are in the database.
 SCRIPTS = [
     {
         'name': 'Market Orders Update',
         'file': 'update_market_orders.py',
         'description': 'Updates Jita 4-4 market orders (takes 30-45 min)',
-        'critical': True  # If this fails, skip others
+        'inputs': [],
+        'outputs': ['market_orders', 'order_book_events'],
+        'critical': True  # If this fails, start nothing new
+    },
+    {
+        'name': 'BWF-ZZ Market Orders Update',
+        'file': 'update_bwf_market_orders.py',
+        'description': 'Updates BWF-ZZ Market Orders (25-30 min)',
+        'inputs': [],
+        'outputs': ['bwf_market_orders', 'order_book_events'],
+        'critical': False
+    },
+    {
+        'name': 'Market History Update',
+        'file': 'market_history_ingest.py',
+        'dir': PROJECT_DIR / 'scripts',
+        'args': ['--sets', 'priority'],
+        'description': 'Daily + backfill history for priority items (<1 min)',
+        'inputs': ['character_orders'],
+        'outputs': ['market_history', 'market_history_tracking'],
+        'critical': False
+    },
+    {
+        'name': 'BWF-ZZ Market History Update',
+        'file': 'market_history_ingest.py',
+        'dir': PROJECT_DIR / 'scripts',
+        'args': ['--sets', 'bwf'],
+        'description': 'History for every item traded in BWF-ZZ (<1 min)',
+        'inputs': ['bwf_market_orders'],
+        'outputs': ['bwf_market_history'],
+        'critical': False
     },
     {
         'name': 'Market Price Snapshot',
         'file': 'track_market_orders.py',
         'description': 'Snapshots best buy/sell for tracked items (<1 min)',
+        'inputs': ['market_orders', 'character_blueprints', 'inv_types'],
+        'outputs': ['market_price_snapshots', 'market_price_snapshots_hourly', 'market_price_snapshots_daily',
+                    'price_averages'],
         'critical': False
     },
     {
         'name': 'Breakeven Cache Refresh',
         'file': 'refresh_breakeven_cache.py',
         'description': 'Recalculates profit margins (<1 min)',
-        'critical': False
-    },
-    {
-        'name': 'BWF-ZZ Market Orders Update',
-        'file': 'update_bwf_market_orders.py',
-        'description': 'Updates BWF-ZZ Market Orders (25-30 min)',
+        'inputs': ['character_orders', 'wallet_transactions', 'inv_types'],
+        'outputs': ['breakeven_cache'],
         'critical': False
     }
 ]
 
+# Serialises stage output so parallel stages don't interleave
+_print_lock = threading.Lock()
+
 def log_message(message):
     """Print message with timestamp."""
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -48,33 +96,89 @@ def log_separator(char='=', length=70):
     """Print a separator line."""
     print(char * length)
 
+def build_dependencies(stages):
+    """
+    Map each stage name to the names of the stages it waits for: every
+    other stage that outputs one of its inputs. Raises ValueError on a cycle.
+    """
+    producers = {}
+    for stage in stages:
+        for table in stage['outputs']:
+            producers.setdefault(table, []).append(stage['name'])
+
+    dependencies = {
+        stage['name']: {
+            producer
+            for table in stage['inputs']
+            for producer in producers.get(table, [])
+            if producer != stage['name']
+        }
+        for stage in stages
+    }
+
+    # Kahn's algorithm - anything left over is part of a cycle
+    remaining = {name: set(deps) for name, deps in dependencies.items()}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Dependency cycle between stages: {', '.join(sorted(remaining))}")
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+    return dependencies
+
+def print_plan(stages, dependencies):
+    """Print each stage with what it waits for."""
+    log_separator('=', 70)
+    log_message("MARKET UPDATES - EXECUTION PLAN")
+    log_separator('=', 70)
+    for stage in stages:
+        waits_for = ', '.join(sorted(dependencies[stage['name']])) or 'nothing (starts immediately)'
+        log_message(f"{stage['name']}")
+        log_message(f"  reads:     {', '.join(stage['inputs']) or '-'}")
+        log_message(f"  writes:    {', '.join(stage['outputs'])}")
+        log_message(f"  waits for: {waits_for}")
+    log_separator('=', 70)
+
 def run_script(script_info):
     """
     Run a script and return success status.
-    Captures output and displays it in real-time.
+    Output is captured and printed as one block when the stage finishes,
+    so stages running in parallel don't interleave.
     """
     script_name = script_info['name']
     script_file = script_info['file']
-    script_path = SCRIPT_DIR / script_file
+    script_path = Path(script_info.get('dir', SCRIPT_DIR)) / script_file
     
-    log_separator()
-    log_message(f"STARTING: {script_name}")
-    log_separator()
-    log_message(f"Description: {script_info['description']}")
-    log_message(f"Script: {script_file}")
-    log_separator()
+    with _print_lock:
+        log_message(f"STARTING: {script_name} ({script_file})")
     
     start_time = datetime.now()
     
     try:
-        # Run the script with real-time output
         result = subprocess.run(
-            [sys.executable, str(script_path)],
+            [sys.executable, str(script_path), *script_info.get('args', [])],
             capture_output=True,
             text=True,
             encoding='utf-8',
             errors='replace'
         )
+    except Exception as e:
+        with _print_lock:
+            log_message(f"[ERROR] FAILED to run {script_name}: {e}")
+        return False
+    
+    duration = datetime.now() - start_time
+    
+    with _print_lock:
+        log_separator()
+        log_message(f"FINISHED: {script_name}")
+        log_separator()
+        log_message(f"Description: {script_info['description']}")
+        log_message(f"Script: {script_file} {' '.join(script_info.get('args', []))}")
+        log_separator()
         
         # Print the script's output
         if result.stdout:
@@ -87,46 +191,96 @@ def run_script(script_info):
                 print(result.stderr)
             return False
         
-        end_time = datetime.now()
-        duration = end_time - start_time
-        
         log_separator()
         log_message(f"[OK] SUCCESS: {script_name} (Duration: {duration})")
         log_separator()
-        return True
-        
-    except Exception as e:
-        log_message(f"[ERROR] FAILED to run {script_name}: {e}")
-        return False
+        print("\n")
+    return True
+
+def run_pipeline(stages, dependencies, max_parallel):
+    """
+    Start every stage whose dependencies have succeeded, up to max_parallel
+    at a time. Stages downstream of a failure are skipped; a critical
+    failure stops any new stage from starting.
+    Returns {stage name: True/False/None (skipped)}.
+    """
+    by_name = {stage['name']: stage for stage in stages}
+    results = {}
+    pending = [stage['name'] for stage in stages]
+    running = {}
+    halted = False
+
+    with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        while pending or running:
+            # Skip stages whose inputs can no longer be produced
+            for name in list(pending):
+                failed = [dep for dep in dependencies[name] if dep in results and results[dep] is not True]
+                if failed or halted:
+                    pending.remove(name)
+                    results[name] = None
+                    reason = f"depends on {', '.join(sorted(failed))}" if failed else "critical failure"
+                    with _print_lock:
+                        log_message(f"[WARNING] SKIPPING: {name} ({reason})")
+
+            # Start everything that is ready
+            for name in list(pending):
+                if len(running) >= max_parallel:
+                    break
+                if all(results.get(dep) is True for dep in dependencies[name]):
+                    pending.remove(name)
+                    running[executor.submit(run_script, by_name[name])] = name
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                results[name] = future.result()
+                if not results[name] and by_name[name].get('critical', False):
+                    with _print_lock:
+                        log_message(f"[WARNING] CRITICAL FAILURE in {name}")
+                        log_message("[WARNING] Not starting any further scripts")
+                    halted = True
+
+    # Keep the declared order for the summary
+    return {stage['name']: results.get(stage['name']) for stage in stages}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run market data updates as a dependency graph.")
+    parser.add_argument(
+        "--max-parallel", type=int, default=len(SCRIPTS),
+        help="Maximum stages running at once (1 = sequential)"
+    )
+    parser.add_argument(
+        "--plan", action="store_true",
+        help="Print stages and their dependencies without running anything"
+    )
+    args = parser.parse_args()
+    if args.max_parallel < 1:
+        parser.error("--max-parallel must be at least 1")
+    return args
 
 def main():
     """
     Main orchestrator function.
-    Runs all market update scripts in sequence.
+    Runs all market update scripts, in parallel where their inputs allow.
     """
+    args = parse_args()
+    dependencies = build_dependencies(SCRIPTS)
+    
+    if args.plan:
+        print_plan(SCRIPTS, dependencies)
+        return
+    
     overall_start = datetime.now()
     
     log_separator('=', 70)
     log_message("AUTOMATED MARKET DATA UPDATE - STARTING")
+    log_message(f"Stages: {len(SCRIPTS)}, max parallel: {args.max_parallel}")
     log_separator('=', 70)
     
-    results = {}
-    
-    for script_info in SCRIPTS:
-        script_name = script_info['name']
-        
-        # Run the script
-        success = run_script(script_info)
-        results[script_name] = success
-        
-        # If a critical script fails, stop execution
-        if not success and script_info.get('critical', False):
-            log_message(f"[WARNING] CRITICAL FAILURE in {script_name}")
-            log_message("[WARNING] Skipping remaining scripts")
-            break
-        
-        # Add spacing between scripts
-        print("\n")
+    results = run_pipeline(SCRIPTS, dependencies, args.max_parallel)
     
     # Print summary
     overall_end = datetime.now()
@@ -143,7 +297,10 @@ def main():
     # Results table
     log_message("Results:")
     for script_name, success in results.items():
-        status = "[OK] SUCCESS" if success else "[ERROR] FAILED"
+        if success is None:
+            status = "[WARNING] SKIPPED"
+        else:
+            status = "[OK] SUCCESS" if success else "[ERROR] FAILED"
         log_message(f"  {script_name}: {status}")
     
     log_separator('=', 70)
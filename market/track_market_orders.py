@@ -21,23 +21,26 @@ Tracked Items:
 
 Database:
     Reads from:  market_orders          (populated by update_market_orders.py)
-    Writes to:   market_price_snapshots (append-only time series)
-    Both tables live in mydatabase.db.
+    Writes to:   market_price_snapshots (raw time series) and its hourly /
+                 daily rollups (see scripts/snapshot_rollups.py)
+    All tables live in mydatabase.db.
 """
 
-import sqlite3
 import argparse
 import csv
 import os
 import sys
-from datetime import datetime, timedelta, timezone
+import time
 from pathlib import Path
 
 SCRIPT_DIR = Path(__file__).resolve().parent
 PROJECT_DIR = SCRIPT_DIR.parent
 sys.path.insert(0, str(PROJECT_DIR / 'scripts'))
 
-from script_utils import timed_script
+from script_utils import timed_script, stage
+from snapshot_rollups import RAW_TABLE, get_snapshot_stats, init_snapshot_tables, prune_snapshots, refresh_rollups
+from price_averages import init_price_averages_table, refresh_price_averages
+import db
 
 # ─── CONFIG ───────────────────────────────────────────────────────────────────
 
@@ -112,22 +115,9 @@ def resolve_item_names(conn, type_ids: list[int]) -> dict[int, str]:
 # ─── DATABASE ─────────────────────────────────────────────────────────────────
 
 def init_db(conn):
-    """Creates market_price_snapshots table and indexes if they don't exist."""
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS market_price_snapshots (
-            id          INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp   TEXT NOT NULL,
-            type_id     INTEGER NOT NULL,
-            best_buy    REAL,
-            best_sell   REAL,
-            spread_pct  REAL,
-            buy_volume  INTEGER,
-            sell_volume INTEGER
-        )
-    """)
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_mps_timestamp ON market_price_snapshots(timestamp)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_mps_type      ON market_price_snapshots(type_id)")
+    """Creates the snapshot tiers and price_averages cache if they don't exist."""
+    init_snapshot_tables(conn)
+    init_price_averages_table(conn)
     conn.commit()
 
 
@@ -135,43 +125,47 @@ def init_db(conn):
 
 def take_snapshot(conn, items: dict[int, str]):
     """
-    Queries market_orders for best buy/sell across all tracked items,
-    then inserts one snapshot row per item into market_price_snapshots.
+    Reads best buy/sell for all tracked items from market_top_of_book
+    (rebuilt with every market_orders refresh), then inserts one snapshot
+    row per item into market_price_snapshots_raw, refreshes the current hour
+    and day rollups and the price_averages cache, and drops rows past
+    retention.
     Items with zero orders in the current book are skipped.
     """
     type_ids     = list(items.keys())
     placeholders = ",".join("?" * len(type_ids))
     cursor       = conn.cursor()
 
-    print(f"\n  Snapshotting {len(type_ids)} tracked items from market_orders...")
+    print(f"\n  Snapshotting {len(type_ids)} tracked items from market_top_of_book...")
 
-    # Single query — derives best buy/sell/volume for every tracked item at once
+    # Indexed lookups — best buy/sell/volume is materialized at each order refresh
     cursor.execute(f"""
-        SELECT
-            type_id,
-            MAX(CASE WHEN is_buy_order = 1 THEN price END)                     AS best_buy,
-            MIN(CASE WHEN is_buy_order = 0 THEN price END)                     AS best_sell,
-            SUM(CASE WHEN is_buy_order = 1 THEN volume_remain ELSE 0 END)      AS buy_volume,
-            SUM(CASE WHEN is_buy_order = 0 THEN volume_remain ELSE 0 END)      AS sell_volume
-        FROM market_orders
-        WHERE type_id IN ({placeholders})
-        GROUP BY type_id
+        SELECT type_id, best_buy, best_sell, buy_volume, sell_volume
+        FROM market_top_of_book
+        WHERE source = 'market_orders'
+          AND type_id IN ({placeholders})
     """, type_ids)
 
-    rows      = cursor.fetchall()
-    timestamp = datetime.now(timezone.utc).isoformat()
+    rows = cursor.fetchall()
+    ts   = int(time.time())
 
     # Build insert batch
     inserts = []
     for type_id, best_buy, best_sell, buy_vol, sell_vol in rows:
         spread_pct = ((best_sell - best_buy) / best_buy * 100) if best_buy and best_sell else None
-        inserts.append((timestamp, type_id, best_buy, best_sell, spread_pct, buy_vol, sell_vol))
-
-    cursor.executemany("""
-        INSERT INTO market_price_snapshots
-            (timestamp, type_id, best_buy, best_sell, spread_pct, buy_volume, sell_volume)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, inserts)
+        inserts.append((type_id, ts, best_buy, best_sell, spread_pct, buy_vol, sell_vol))
+
+    with stage('snapshot', rows=len(inserts)):
+        cursor.executemany(f"""
+            INSERT OR REPLACE INTO {RAW_TABLE}
+                (type_id, ts, best_buy, best_sell, spread_pct, buy_volume, sell_volume)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, inserts)
+    with stage('rollups', rows=len(inserts)):
+        refresh_rollups(conn, ts)
+        raw_pruned, hourly_pruned = prune_snapshots(conn)
+    with stage('averages') as s:
+        averages = s.rows = refresh_price_averages(conn)
     conn.commit()
 
     # ── Print summary ──────────────────────────────────────────────────────────
@@ -196,7 +190,10 @@ def take_snapshot(conn, items: dict[int, str]):
         print(f"  {len(missing)} tracked item(s) had no orders -- skipped.")
 
     print(f"  {'-' * sep_len}")
-    print(f"  {len(inserts)} snapshots saved to market_price_snapshots")
+    print(f"  {len(inserts)} snapshots saved to {RAW_TABLE}")
+    print(f"  {averages} rolling averages refreshed in price_averages")
+    if raw_pruned or hourly_pruned:
+        print(f"  Retention: pruned {raw_pruned:,} raw rows, {hourly_pruned:,} hourly buckets")
 
 
 # ─── ANALYSIS ─────────────────────────────────────────────────────────────────
@@ -205,8 +202,7 @@ def analyze_spreads(conn, items: dict[int, str], days: int):
     """
     Pulls the last N days of snapshots and calculates average buy/sell/spread.
     """
-    cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
-    cursor = conn.cursor()
+    stats = get_snapshot_stats(conn, days, items.keys())
 
     max_name_len = max((len(n) for n in items.values()), default=12)
     max_name_len = max(max_name_len, 12)
@@ -219,17 +215,10 @@ def analyze_spreads(conn, items: dict[int, str], days: int):
     print(f"  {'-' * sep_len}")
 
     for type_id, name in sorted(items.items(), key=lambda x: x[1]):
-        cursor.execute("""
-            SELECT AVG(best_buy), AVG(best_sell), AVG(spread_pct), COUNT(*)
-            FROM market_price_snapshots
-            WHERE type_id = ? AND timestamp >= ?
-              AND best_buy IS NOT NULL AND best_sell IS NOT NULL
-        """, (type_id, cutoff))
-
-        row = cursor.fetchone()
-        if row and row[3] > 0:
-            avg_buy, avg_sell, avg_spread, count = row
-            print(f"  {name:<{max_name_len}} {avg_buy:>12,.2f} {avg_sell:>12,.2f} {avg_spread:>13.2f}% {count:>12}")
+        row = stats.get(type_id)
+        if row and row['avg_buy'] is not None and row['avg_sell'] is not None:
+            print(f"  {name:<{max_name_len}} {row['avg_buy']:>12,.2f} {row['avg_sell']:>12,.2f} "
+                  f"{row['avg_spread'] or 0:>13.2f}% {row['samples']:>12}")
         else:
             print(f"  {name:<{max_name_len}} {'-- no data --':>40}")
 
@@ -240,7 +229,7 @@ def show_timeline(conn, type_id: int, days: int):
     """
     Shows a timeline of best buy/sell for a specific item.
     """
-    cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    cutoff = int(time.time()) - days * 86400
     cursor = conn.cursor()
 
     # Resolve item name from inv_types
@@ -248,11 +237,11 @@ def show_timeline(conn, type_id: int, days: int):
     row       = cursor.fetchone()
     item_name = row[0] if row else f"Type {type_id}"
 
-    cursor.execute("""
-        SELECT timestamp, best_buy, best_sell, spread_pct, buy_volume, sell_volume
-        FROM market_price_snapshots
-        WHERE type_id = ? AND timestamp >= ?
-        ORDER BY timestamp DESC
+    cursor.execute(f"""
+        SELECT ts, best_buy, best_sell, spread_pct, buy_volume, sell_volume
+        FROM {RAW_TABLE}
+        WHERE type_id = ? AND ts >= ?
+        ORDER BY ts DESC
         LIMIT 50
     """, (type_id, cutoff))
 
@@ -269,7 +258,7 @@ def show_timeline(conn, type_id: int, days: int):
     print(f"  {'-' * 80}")
 
     for ts, buy, sell, spread, bvol, svol in rows:
-        ts_short = ts[:16].replace("T", " ")
+        ts_short = db.format_ts(ts)[:16].replace("T", " ")
         print(f"  {ts_short:<20} {buy or 0:>12,.2f} {sell or 0:>12,.2f} {spread or 0:>9.2f}% {bvol or 0:>12,} {svol or 0:>12,}")
 
     print(f"  {'-' * 80}\n")
@@ -281,16 +270,16 @@ def export_to_csv(filepath: str, conn, items: dict[int, str], days: int):
     """
     Exports snapshots from the last N days to CSV.
     """
-    cutoff       = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    cutoff       = int(time.time()) - days * 86400
     type_ids     = list(items.keys())
     placeholders = ",".join("?" * len(type_ids))
     cursor       = conn.cursor()
 
     cursor.execute(f"""
-        SELECT timestamp, type_id, best_buy, best_sell, spread_pct, buy_volume, sell_volume
-        FROM market_price_snapshots
-        WHERE type_id IN ({placeholders}) AND timestamp >= ?
-        ORDER BY timestamp DESC
+        SELECT ts, type_id, best_buy, best_sell, spread_pct, buy_volume, sell_volume
+        FROM {RAW_TABLE}
+        WHERE type_id IN ({placeholders}) AND ts >= ?
+        ORDER BY ts DESC
     """, (*type_ids, cutoff))
 
     rows = cursor.fetchall()
@@ -300,7 +289,7 @@ def export_to_csv(filepath: str, conn, items: dict[int, str], days: int):
         writer.writerow(["timestamp", "type_id", "item_name", "best_buy",
                          "best_sell", "spread_pct", "buy_volume", "sell_volume"])
         for ts, tid, buy, sell, spread, bvol, svol in rows:
-            writer.writerow([ts, tid, items.get(tid, f"Type {tid}"), buy, sell, spread, bvol, svol])
+            writer.writerow([db.format_ts(ts), tid, items.get(tid, f"Type {tid}"), buy, sell, spread, bvol, svol])
 
     print(f"\n  Exported {len(rows)} snapshots to {filepath}\n")
 
@@ -325,7 +314,7 @@ def main():
         return
 
     # Connect to database
-    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn = db.connect(DB_PATH)
     init_db(conn)
 
     # Also track BPC product items (for BPC pricing calculator)
@@ -382,7 +371,9 @@ if __name__ == "__main__":
 # refreshed by update_market_orders.py (Jita 4-4 only, location_id 60003760).
 #
 # Each run: one GROUP BY query extracts best buy/sell for all tracked items,
-# then appends one row per item to market_price_snapshots. Over time this
+# then appends one row per item to market_price_snapshots_raw. Over time this
 # builds the historical price series that ESI doesn't provide natively.
+# Raw rows are kept for 14 days; older data lives on as hourly (90 days)
+# and daily (forever) min/max/avg buckets, which --report reads from.
 #
 # ─────────────────────────────────────────────────────────────────────────────
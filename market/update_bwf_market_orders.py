@@ -1,8 +1,8 @@
+import argparse
+import asyncio
+import os
 import requests
-import sqlite3
 import sys
-import time
-from datetime import datetime, timezone
 from pathlib import Path
 
 SCRIPT_DIR = Path(__file__).resolve().parent
@@ -10,7 +10,14 @@ PROJECT_DIR = SCRIPT_DIR.parent
 sys.path.insert(0, str(PROJECT_DIR / 'scripts'))
 sys.path.insert(0, str(PROJECT_DIR / 'config'))
 
-from script_utils import timed_script
+from script_utils import timed_script, stage
+import db
+from esi_cache import ESICache
+from esi_client import ESIClient, ESIError
+from esi_decode import decode_orders
+from order_events import record_order_events
+from top_of_book import rebuild_top_of_book
+from order_loader import OrderBulkLoader, create_staging_table, sync_orders_diff, table_exists
 
 # Import token manager
 from token_manager import get_token
@@ -19,11 +26,12 @@ from token_manager import get_token
 # CONFIGURATION
 # ============================================
 DB_PATH = str(PROJECT_DIR / 'mydatabase.db')
-ESI_BASE_URL = 'https://esi.evetech.net/latest'
-ESI_VERIFY_URL = 'https://esi.evetech.net/verify/'
+ESI_BASE_URL = os.environ.get('ESI_BASE_URL', 'https://esi.evetech.net/latest')
+ESI_VERIFY_URL = os.environ.get('ESI_VERIFY_URL', 'https://esi.evetech.net/verify/')
 REQUEST_TIMEOUT = 30
-MAX_RETRIES = 3
 REQUIRED_SCOPE = 'esi-markets.structure_markets.v1'
+TEMP_TABLE = 'bwf_market_orders_temp'
+TEMP_INDEX_PREFIX = 'idx_temp_bwf_orders'
 
 # ============================================
 # BWF-ZZ KEEPSTAR CONFIGURATION
@@ -78,154 +86,55 @@ def verify_token_scopes(headers):
             print("[WARNING] No scopes reported by ESI verify")
 
 
-def request_structure_orders_page(headers, page):
-    """Fetch a single structure-orders page with retry handling for transient failures."""
-    url = f'{ESI_BASE_URL}/markets/structures/{STRUCTURE_ID}/'
-    params = {'page': page}
-    last_error = None
-
-    for attempt in range(1, MAX_RETRIES + 1):
-        try:
-            response = requests.get(url, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
-        except requests.RequestException as error:
-            last_error = error
-            wait_seconds = attempt * 2
-            print(f"[WARNING] Request failed on page {page} (attempt {attempt}/{MAX_RETRIES}): {error}")
-            if attempt < MAX_RETRIES:
-                print(f"[WARNING] Retrying in {wait_seconds}s...")
-                time.sleep(wait_seconds)
-            continue
-
-        if response.status_code in (420, 502, 503, 504):
-            wait_seconds = attempt * 2
-            print(
-                f"[WARNING] Transient ESI error {response.status_code} on page {page} "
-                f"(attempt {attempt}/{MAX_RETRIES})"
-            )
-            if attempt < MAX_RETRIES:
-                print(f"[WARNING] Retrying in {wait_seconds}s...")
-                time.sleep(wait_seconds)
-                continue
-
-        return response
-
-    raise RuntimeError(f"Failed to fetch page {page} after {MAX_RETRIES} attempts: {last_error}")
-
 # ============================================
 # FUNCTIONS
 # ============================================
 
-def get_structure_market_orders(headers):
+async def fetch_structure_orders(cache=None):
+    """
+    Fetch every page of the structure market through the shared ESI client
+    (X-Pages fan-out, authenticated, error budget and back-off shared).
+    Pages are decoded straight into esi_decode.ORDER_FIELDS tuples.
+    """
+    async with ESIClient(cache=cache, base_url=ESI_BASE_URL) as esi:
+        orders = await esi.get_pages(
+            f'/markets/structures/{STRUCTURE_ID}/', auth=True, decode=decode_orders
+        )
+    esi.report()
+    return orders
+
+
+def get_structure_market_orders(cache=None):
     """
     Get market orders using the DIRECT structure endpoint.
     This is the key - using /markets/structures/{id}/ instead of region scan.
+    Returns None on authentication/access errors.
     """
-    all_orders = []
-    page = 1
-    
     print(f"\nFetching orders from BWF-ZZ Keepstar (direct endpoint)...")
     
-    while True:
-        response = request_structure_orders_page(headers, page)
-        
-        if response.status_code == 200:
-            orders = response.json()
-            
-            if not orders:
-                break
-            
-            all_orders.extend(orders)
-            
-            if len(all_orders) % 1000 == 0:
-                print(f"Progress: {len(all_orders)} orders fetched...")
-            
-            page += 1
-            
-        elif response.status_code == 404:
-            # End of pages
-            break
-            
-        elif response.status_code == 401:
-            print(f"[ERROR] Unauthorized (401) on page {page}")
+    try:
+        return asyncio.run(fetch_structure_orders(cache))
+    
+    except ESIError as error:
+        if error.status == 401:
+            print(f"[ERROR] Unauthorized (401): {error.url}")
             print(f"[ERROR] Token may be missing {REQUIRED_SCOPE} or no longer valid")
-            return None
-            
-        elif response.status_code == 403:
-            print(f"[ERROR] Access denied (403) on page {page}")
+        elif error.status == 403:
+            print(f"[ERROR] Access denied (403): {error.url}")
             print("You may not have docking/market access to this structure")
-            return None
-            
         else:
-            print(f"[WARNING] Error on page {page}: {response.status_code}")
-            print(response.text[:300])
-            return None
-    
-    return all_orders
+            print(f"[WARNING] {error}")
+        return None
 
-def create_temp_table(conn):
-    """Create temporary table for BWF-ZZ market orders."""
-    cursor = conn.cursor()
-    
-    cursor.execute('DROP TABLE IF EXISTS bwf_market_orders_temp')
-    
-    cursor.execute('''
-        CREATE TABLE bwf_market_orders_temp (
-            order_id INTEGER PRIMARY KEY,
-            region_id INTEGER NOT NULL,
-            type_id INTEGER NOT NULL,
-            location_id INTEGER NOT NULL,
-            is_buy_order INTEGER NOT NULL,
-            price REAL NOT NULL,
-            volume_remain INTEGER NOT NULL,
-            volume_total INTEGER NOT NULL,
-            issued TEXT NOT NULL,
-            duration INTEGER NOT NULL,
-            range TEXT NOT NULL,
-            min_volume INTEGER,
-            last_updated TEXT NOT NULL
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_temp_bwf_orders_type_region 
-        ON bwf_market_orders_temp(type_id, region_id, is_buy_order)
-    ''')
-    
-    cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_temp_bwf_orders_location 
-        ON bwf_market_orders_temp(location_id)
-    ''')
-    
-    conn.commit()
+def create_temp_table(conn, temporary=False):
+    """
+    Create temporary table for BWF-ZZ market orders.
+    Indexes are added after the load by OrderBulkLoader.finish().
+    temporary=True stages in SQLite's TEMP schema (used by --diff).
+    """
+    create_staging_table(conn, TEMP_TABLE, temporary=temporary)
     print("[OK] Temporary table created")
 
-def insert_order_into_temp(conn, order):
-    """Insert order into temporary table."""
-    cursor = conn.cursor()
-    current_time = datetime.now(timezone.utc).isoformat()
-    
-    cursor.execute('''
-        INSERT OR REPLACE INTO bwf_market_orders_temp (
-            order_id, region_id, type_id, location_id,
-            is_buy_order, price, volume_remain, volume_total, 
-            issued, duration, range, min_volume, last_updated
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        order['order_id'],
-        REGION_ID,
-        order['type_id'],
-        order['location_id'],
-        1 if order['is_buy_order'] else 0,
-        order['price'],
-        order['volume_remain'],
-        order['volume_total'],
-        order['issued'],
-        order['duration'],
-        order.get('range', 'station'),
-        order.get('min_volume', 1),
-        current_time
-    ))
-
 def swap_tables(conn):
     """
     Atomically swap temp table to production.
@@ -253,10 +162,16 @@ def swap_tables(conn):
         for view_name, _ in views:
             cursor.execute(f'DROP VIEW IF EXISTS {view_name}')
         
+        # Log what changed since the last refresh before the old book goes away
+        counts = record_order_events(conn, 'bwf_market_orders', 'bwf_market_orders_temp', 'bwf_market_orders')
+        
         # Swap tables
         cursor.execute('DROP TABLE IF EXISTS bwf_market_orders')
         cursor.execute('ALTER TABLE bwf_market_orders_temp RENAME TO bwf_market_orders')
         
+        # Rebuild best buy/sell and price levels from the new book
+        top_rows = rebuild_top_of_book(conn, 'bwf_market_orders')
+        
         # Recreate views (with error handling)
         failed_views = []
         for view_name, view_sql in views:
@@ -269,6 +184,12 @@ def swap_tables(conn):
         
         conn.commit()
         print("[OK] Tables swapped and views restored - BWF-ZZ DATA NOW LIVE!")
+        print(f"[OK] Top of book rebuilt for {top_rows:,} items")
+        if counts:
+            print(
+                f"[OK] Changes logged: {counts['new']:,} new, {counts['repriced']:,} repriced, "
+                f"{counts['filled']:,} filled, {counts['cancelled']:,} cancelled"
+            )
         
         if failed_views:
             print(f"[WARNING] {len(failed_views)} views failed to recreate:")
@@ -285,12 +206,27 @@ def swap_tables(conn):
 # MAIN SCRIPT
 # ============================================
 
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Refresh BWF-ZZ Keepstar market orders with zero downtime."
+    )
+    parser.add_argument(
+        "--diff", action="store_true",
+        help="Apply only new/changed/vanished orders to bwf_market_orders instead of swapping"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="Skip the on-disk ESI ETag cache and download every page"
+    )
+    return parser.parse_args()
+
 @timed_script
 def main():
     """
     Update BWF-ZZ Keepstar market orders with authentication.
     Uses the direct structure market endpoint for accurate data.
     """
+    args = parse_args()
     
     print(f"Target: {STRUCTURE_NAME}")
     print(f"Structure ID: {STRUCTURE_ID}")
@@ -307,14 +243,22 @@ def main():
 
     verify_token_scopes(headers)
     
-    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn = db.connect(DB_PATH)
+    cache = None if args.no_cache else ESICache()
     
     try:
+        # Diff mode needs an existing live table to diff against
+        diff_mode = args.diff and table_exists(conn, 'bwf_market_orders')
+        if args.diff and not diff_mode:
+            print("[INFO] bwf_market_orders does not exist yet - falling back to full swap")
+
         # Create temp table
-        create_temp_table(conn)
+        create_temp_table(conn, temporary=diff_mode)
         
         # Fetch orders using direct structure endpoint
-        orders = get_structure_market_orders(headers)
+        with stage('fetch') as s:
+            orders = get_structure_market_orders(cache)
+            s.rows = len(orders or [])
 
         if orders is None:
             raise RuntimeError(
@@ -335,16 +279,22 @@ def main():
         
         # Insert into temp table
         print(f"Inserting orders into temporary table...")
-        for i, order in enumerate(orders, 1):
-            insert_order_into_temp(conn, order)
-            
-            if i % 500 == 0 or i == len(orders):
-                print(f"  Progress: {i}/{len(orders)} ({i/len(orders)*100:.1f}%)")
+        loader = OrderBulkLoader(conn, TEMP_TABLE, REGION_ID)
+        with stage('load', rows=len(orders)):
+            loader.load_rows(orders)
         
-        conn.commit()
-        
-        # Swap tables
-        swap_tables(conn)
+        if diff_mode:
+            # Only order_id lookups are needed for the merge
+            loader.finish()
+            with stage('diff', rows=len(orders)):
+                sync_orders_diff(conn, TEMP_TABLE, 'bwf_market_orders')
+        else:
+            with stage('index', rows=len(orders)):
+                loader.finish(TEMP_INDEX_PREFIX)
+            
+            # Swap tables
+            with stage('swap', rows=len(orders)):
+                swap_tables(conn)
         
         conn.close()
         
@@ -361,6 +311,11 @@ def main():
             pass
         conn.close()
         raise
+    
+    finally:
+        if cache:
+            cache.report()
+            cache.close()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -1,7 +1,8 @@
-import requests
-import sqlite3
+import argparse
+import asyncio
+import os
 import sys
-from datetime import datetime, timezone
+import time
 from pathlib import Path
 
 SCRIPT_DIR = Path(__file__).resolve().parent
@@ -9,13 +10,25 @@ PROJECT_DIR = SCRIPT_DIR.parent
 sys.path.insert(0, str(PROJECT_DIR / 'scripts'))
 sys.path.insert(0, str(PROJECT_DIR / 'config'))
 
-from script_utils import timed_script
+from script_utils import timed_script, stage
+import db
+from esi_cache import ESICache
+from esi_client import ESIClient
+from esi_decode import loads, order_rows
+from order_events import record_order_events
+from top_of_book import rebuild_top_of_book
+from order_loader import OrderBulkLoader, create_staging_table, sync_orders_diff, table_exists
 
 # ============================================
 # CONFIGURATION
 # ============================================
 DB_PATH = str(PROJECT_DIR / 'mydatabase.db')
-ESI_BASE_URL = 'https://esi.evetech.net/latest'
+ESI_BASE_URL = os.environ.get('ESI_BASE_URL', 'https://esi.evetech.net/latest')
+TEMP_TABLE = 'market_orders_temp'
+TEMP_INDEX_PREFIX = 'idx_temp_market_orders'
+
+# Maximum simultaneous page requests to ESI (override with --concurrency)
+MAX_CONCURRENCY = 20
 
 from setup import HOME_REGION_ID as THE_FORGE_REGION_ID, HOME_STATION_ID as JITA_STATION_ID
 
@@ -23,128 +36,89 @@ from setup import HOME_REGION_ID as THE_FORGE_REGION_ID, HOME_STATION_ID as JITA
 # FUNCTIONS
 # ============================================
 
-def get_market_orders_for_region(region_id):
+async def fetch_region_orders(region_id, concurrency, on_page, cache=None, decode=loads):
+    """
+    Fetch every page of a region's order book through the shared ESI client
+    (bounded concurrency, global error budget, back-off + jitter, ETag cache).
+    Each page is decoded by decode(body) and handed to on_page(page, orders)
+    as soon as it arrives, so the caller decides whether to buffer or stream it.
+    Returns the total number of pages. Raises ESIError on persistent failure
+    so a partial order book is never swapped into production.
+    """
+    async with ESIClient(concurrency=concurrency, cache=cache, base_url=ESI_BASE_URL) as esi:
+        total_pages = await esi.stream_pages(
+            f'/markets/{region_id}/orders/', {'order_type': 'all'}, on_page, decode=decode
+        )
+    esi.report()
+    return total_pages
+
+
+def get_market_orders_for_region(region_id, concurrency=MAX_CONCURRENCY, cache=None):
     """
     Get all market orders for a region.
-    ESI paginates this endpoint - need to fetch all pages.
+    ESI paginates this endpoint - page 1 tells us how many pages exist,
+    the rest are fetched in parallel with bounded concurrency.
     """
+    print(f"\nFetching market orders from ESI (concurrency={concurrency})...")
+    start = time.time()
+
+    pages = {}
+    asyncio.run(fetch_region_orders(region_id, concurrency, pages.__setitem__, cache))
+
+    # Flatten in page order so the result matches a sequential walk
     all_orders = []
-    page = 1
-    
-    print("\nFetching market orders from ESI...")
-    
-    while True:
-        url = f'{ESI_BASE_URL}/markets/{region_id}/orders/'
-        params = {
-            'order_type': 'all',
-            'page': page
-        }
-        
-        response = requests.get(url, params=params)
-        
-        if response.status_code == 200:
-            orders = response.json()
-            
-            if not orders:
-                break
-            
-            all_orders.extend(orders)
-            
-            # Progress indicator every 1000 orders
-            if len(all_orders) % 1000 == 0:
-                print(f"Progress: {len(all_orders)} orders fetched...")
-            
-            page += 1
-            
-        elif response.status_code == 404:
-            # End of pages
-            break
-        else:
-            print(f"Error fetching page {page}: {response.status_code}")
-            break
-    
-    print(f"Total orders fetched: {len(all_orders)}")
+    for page in sorted(pages):
+        all_orders.extend(pages[page])
+
+    elapsed = time.time() - start
+    print(f"Total orders fetched: {len(all_orders)} from {len(pages)} pages in {elapsed:.1f}s")
     return all_orders
 
+
+def stream_station_orders_into_temp(loader, region_id, station_id, concurrency=MAX_CONCURRENCY, cache=None):
+    """
+    Streaming alternative to get_market_orders_for_region + filter_jita_orders.
+    Each page is decoded straight into station_id's row tuples (esi_decode)
+    and handed to the bulk loader as it arrives, so peak memory is bounded
+    by page size rather than by the size of the whole region.
+    Returns (region_order_count, station_order_count).
+    """
+    print(f"\nStreaming market orders from ESI into temporary table (concurrency={concurrency})...")
+    print(">>> Production table remains fully accessible during this time!")
+    start = time.time()
+    counts = {'region': 0, 'station': 0}
+
+    def decode_page(body):
+        orders = loads(body)
+        counts['region'] += len(orders)
+        return order_rows(orders, station_id)
+
+    def load_page(page, rows):
+        counts['station'] += loader.load_rows(rows)
+
+    pages = asyncio.run(fetch_region_orders(region_id, concurrency, load_page, cache, decode_page))
+
+    elapsed = time.time() - start
+    print(f"Total orders fetched: {counts['region']} from {pages} pages in {elapsed:.1f}s")
+    print(f"Filtered to Jita 4-4: {counts['station']} orders")
+    return counts['region'], counts['station']
+
 def filter_jita_orders(orders, jita_station_id):
     """Filter orders to only include Jita 4-4."""
     jita_orders = [order for order in orders if order['location_id'] == jita_station_id]
     print(f"Filtered to Jita 4-4: {len(jita_orders)} orders")
     return jita_orders
 
-def create_temp_table(conn):
+def create_temp_table(conn, temporary=False):
     """
     Create temporary table with same structure as market_orders.
     This allows us to load data without disrupting the live table.
+    Indexes are added after the load by OrderBulkLoader.finish().
+    temporary=True stages in SQLite's TEMP schema (used by --diff).
     """
-    cursor = conn.cursor()
-    
     print("\n>>> Creating temporary staging table...")
-    
-    # Drop temp table if it exists from a previous failed run
-    cursor.execute('DROP TABLE IF EXISTS market_orders_temp')
-    
-    # Create temp table with exact same structure as market_orders
-    cursor.execute('''
-        CREATE TABLE market_orders_temp (
-            order_id INTEGER PRIMARY KEY,
-            region_id INTEGER NOT NULL,
-            type_id INTEGER NOT NULL,
-            location_id INTEGER NOT NULL,
-            is_buy_order INTEGER NOT NULL,
-            price REAL NOT NULL,
-            volume_remain INTEGER NOT NULL,
-            volume_total INTEGER NOT NULL,
-            issued TEXT NOT NULL,
-            duration INTEGER NOT NULL,
-            range TEXT NOT NULL,
-            min_volume INTEGER,
-            last_updated TEXT NOT NULL
-        )
-    ''')
-    
-    # Create indexes on temp table for better performance during swap
-    cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_temp_market_orders_type_region 
-        ON market_orders_temp(type_id, region_id, is_buy_order)
-    ''')
-    
-    cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_temp_market_orders_location 
-        ON market_orders_temp(location_id)
-    ''')
-    
-    conn.commit()
-    print("[OK] Temporary table created with indexes")
-
-def insert_order_into_temp(conn, order, region_id):
-    """
-    Insert a market order into the TEMPORARY table.
-    Production table remains untouched during data loading.
-    """
-    cursor = conn.cursor()
-    current_time = datetime.now(timezone.utc).isoformat()
-    
-    cursor.execute('''
-        INSERT OR REPLACE INTO market_orders_temp (
-            order_id, region_id, type_id, location_id, is_buy_order, price,
-            volume_remain, volume_total, issued, duration, range, min_volume, last_updated
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        order['order_id'],
-        region_id,
-        order['type_id'],
-        order['location_id'],
-        1 if order['is_buy_order'] else 0,
-        order['price'],
-        order['volume_remain'],
-        order['volume_total'],
-        order['issued'],
-        order['duration'],
-        order.get('range', 'station'),
-        order.get('min_volume', 1),
-        current_time
-    ))
+    create_staging_table(conn, TEMP_TABLE, temporary=temporary)
+    print("[OK] Temporary table created")
 
 def swap_tables(conn):
     """
@@ -174,10 +148,16 @@ def swap_tables(conn):
         for view_name, _ in views:
             cursor.execute(f'DROP VIEW IF EXISTS {view_name}')
         
+        # Log what changed since the last refresh before the old book goes away
+        counts = record_order_events(conn, 'market_orders', 'market_orders_temp', 'market_orders')
+        
         # Swap tables
         cursor.execute('DROP TABLE IF EXISTS market_orders')
         cursor.execute('ALTER TABLE market_orders_temp RENAME TO market_orders')
         
+        # Rebuild best buy/sell and price levels from the new book
+        top_rows = rebuild_top_of_book(conn, 'market_orders')
+        
         # Recreate views (with error handling for dependencies)
         failed_views = []
         for view_name, view_sql in views:
@@ -192,6 +172,12 @@ def swap_tables(conn):
         conn.commit()
         
         print("[OK] Tables swapped and views restored - NEW DATA NOW LIVE!")
+        print(f"[OK] Top of book rebuilt for {top_rows:,} items")
+        if counts:
+            print(
+                f"[OK] Changes logged: {counts['new']:,} new, {counts['repriced']:,} repriced, "
+                f"{counts['filled']:,} filled, {counts['cancelled']:,} cancelled"
+            )
         
         if failed_views:
             print(f"[WARNING] {len(failed_views)} views failed to recreate:")
@@ -208,72 +194,131 @@ def swap_tables(conn):
 # MAIN SCRIPT
 # ============================================
 
+def load_buffered(loader, concurrency, cache=None):
+    """
+    Original load path: download the whole region, filter to Jita 4-4,
+    then bulk-insert into the temporary table. Returns the number of orders loaded.
+    """
+    # STEP 2: Fetch all region orders (production stays live)
+    all_orders = get_market_orders_for_region(THE_FORGE_REGION_ID, concurrency, cache)
+    
+    if not all_orders:
+        print("\n[ERROR] No orders fetched. Exiting without changes.")
+        return 0
+    
+    # STEP 3: Filter to Jita only (production stays live)
+    print("\nFiltering for Jita 4-4...")
+    jita_orders = filter_jita_orders(all_orders, JITA_STATION_ID)
+    
+    if not jita_orders:
+        print("\n[ERROR] No Jita orders found. Exiting without changes.")
+        return 0
+    
+    # STEP 4: Insert orders into TEMP table (production stays live)
+    print("\n>>> Inserting orders into TEMPORARY table...")
+    print(">>> Production table remains fully accessible during this time!")
+    total = loader.load(jita_orders)
+    print(f"[OK] All {total} orders loaded into temporary table")
+    return total
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Refresh Jita 4-4 market orders with zero downtime."
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=MAX_CONCURRENCY,
+        help=f"Maximum simultaneous ESI page requests (default: {MAX_CONCURRENCY})"
+    )
+    parser.add_argument(
+        "--buffered", action="store_true",
+        help="Download the whole region before filtering (default: stream page by page)"
+    )
+    parser.add_argument(
+        "--diff", action="store_true",
+        help="Apply only new/changed/vanished orders to market_orders instead of swapping"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="Skip the on-disk ESI ETag cache and download every page"
+    )
+    parser.add_argument(
+        "--esi-base-url", default=ESI_BASE_URL,
+        help="ESI root URL, e.g. a local esi_simulator.py (default: $ESI_BASE_URL or the live ESI)"
+    )
+    args = parser.parse_args()
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    return args
+
 @timed_script
 def main():
     """
     Update market orders with zero downtime using temporary table staging.
     Downloads all Jita 4-4 market orders and swaps atomically.
     """
+    global ESI_BASE_URL
+    args = parse_args()
+    ESI_BASE_URL = args.esi_base_url
+
     # Connect to database
     print(f"\nConnecting to database: {DB_PATH}")
-    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn = db.connect(DB_PATH)
+    cache = None if args.no_cache else ESICache()
     
     try:
+        # Diff mode needs an existing live table to diff against
+        diff_mode = args.diff and table_exists(conn, 'market_orders')
+        if args.diff and not diff_mode:
+            print("\n[INFO] market_orders does not exist yet - falling back to full swap")
+
         # STEP 1: Create temporary table (production stays live)
-        create_temp_table(conn)
-        
-        # STEP 2: Fetch all region orders (production stays live)
-        all_orders = get_market_orders_for_region(THE_FORGE_REGION_ID)
-        
-        if not all_orders:
-            print("\n[ERROR] No orders fetched. Exiting without changes.")
-            cursor = conn.cursor()
-            cursor.execute('DROP TABLE IF EXISTS market_orders_temp')
-            conn.commit()
-            conn.close()
-            return
-        
-        # STEP 3: Filter to Jita only (production stays live)
-        print("\nFiltering for Jita 4-4...")
-        jita_orders = filter_jita_orders(all_orders, JITA_STATION_ID)
+        create_temp_table(conn, temporary=diff_mode)
+        loader = OrderBulkLoader(conn, TEMP_TABLE, THE_FORGE_REGION_ID)
         
-        if not jita_orders:
-            print("\n[ERROR] No Jita orders found. Exiting without changes.")
+        if args.buffered:
+            with stage('fetch_load') as s:
+                jita_count = s.rows = load_buffered(loader, args.concurrency, cache)
+        else:
+            # STEP 2-4: Fetch, filter and insert page by page (production stays live)
+            with stage('fetch_load') as s:
+                region_count, jita_count = stream_station_orders_into_temp(
+                    loader, THE_FORGE_REGION_ID, JITA_STATION_ID, args.concurrency, cache
+                )
+                s.rows = jita_count
+            if not region_count:
+                print("\n[ERROR] No orders fetched. Exiting without changes.")
+            elif not jita_count:
+                print("\n[ERROR] No Jita orders found. Exiting without changes.")
+            else:
+                print(f"[OK] All {jita_count} orders loaded into temporary table")
+
+        if not jita_count:
             cursor = conn.cursor()
             cursor.execute('DROP TABLE IF EXISTS market_orders_temp')
             conn.commit()
             conn.close()
             return
         
-        # STEP 4: Insert orders into TEMP table (production stays live)
-        print("\n>>> Inserting orders into TEMPORARY table...")
-        print(">>> Production table remains fully accessible during this time!")
-        total = len(jita_orders)
-        
-        for index, order in enumerate(jita_orders, 1):
-            insert_order_into_temp(conn, order, THE_FORGE_REGION_ID)
+        if diff_mode:
+            # Only order_id lookups are needed for the merge
+            loader.finish()
             
-            # Progress indicator every 500 orders
-            if index % 500 == 0 or index == total:
-                percentage = (index / total) * 100
-                print(f"Progress: {index}/{total} orders ({percentage:.1f}%) - Production still live!")
+            # STEP 5: Apply only the changes in one transaction
+            with stage('diff', rows=jita_count):
+                sync_orders_diff(conn, TEMP_TABLE, 'market_orders')
+        else:
+            # Build indexes and restore normal PRAGMAs before going live
+            with stage('index', rows=jita_count):
+                loader.finish(TEMP_INDEX_PREFIX)
             
-            # Commit every 1000 orders to save progress
-            if index % 1000 == 0:
-                conn.commit()
-        
-        # Final commit for temp table
-        print("\n>>> Finalizing temporary table...")
-        conn.commit()
-        print(f"[OK] All {len(jita_orders)} orders loaded into temporary table")
-        
-        # STEP 5: ATOMIC SWAP (happens in milliseconds)
-        swap_tables(conn)
+            # STEP 5: ATOMIC SWAP (happens in milliseconds)
+            with stage('swap', rows=jita_count):
+                swap_tables(conn)
         
         conn.close()
         
         # Summary - will be wrapped by @timed_script decorator
-        print(f"\nTotal orders now live: {len(jita_orders):,}")
+        print(f"\nTotal orders now live: {jita_count:,}")
         print("Production table was accessible throughout the entire update!")
         
     except Exception as e:
@@ -287,6 +332,11 @@ def main():
             pass
         conn.close()
         raise
+    
+    finally:
+        if cache:
+            cache.report()
+            cache.close()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
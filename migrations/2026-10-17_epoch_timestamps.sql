@@ -0,0 +1,223 @@
+-- Migration: Integer epoch timestamps for the time-series tables
+-- Date: 2026-10-17
+-- Reason: ISO-text timestamps made range filters compare strings and bloated
+--         rows. Storage moves to INTEGER epoch seconds (UTC) in WITHOUT ROWID
+--         tables clustered on the natural key; the old table names become
+--         read-only views with the same columns (timestamps rendered as ISO
+--         text) so ad-hoc SQL in queries/ keeps working.
+--
+--   market_price_snapshots    -> market_price_snapshots_raw  (type_id, ts)
+--   lx_zoj_inventory          -> lx_zoj_inventory_snapshots  (snapshot_ts, type_id)
+--   character_orders_history  -> character_order_snapshots   (order_id, snapshot_ts)
+--   market_price_snapshots_hourly / _daily: bucket TEXT -> INTEGER bucket start
+--
+-- Apply with:  sqlite3 mydatabase.db < migrations/2026-10-17_epoch_timestamps.sql
+-- then:        sqlite3 mydatabase.db "VACUUM"
+-- Measure first (on a copy) with: python scripts/benchmark_epoch_timestamps.py
+--
+-- The old text-timestamp tables must exist (run init_database.py before the
+-- upgrade). Naive timestamps (no offset) are taken as UTC, except the local-time
+-- character_orders_history.snapshot_date (see below).
+
+BEGIN IMMEDIATE;
+
+-- ─── market_price_snapshots ──────────────────────────────────────────────────
+
+CREATE TABLE market_price_snapshots_raw (
+    type_id      INTEGER NOT NULL,
+    ts           INTEGER NOT NULL,
+    best_buy     REAL,
+    best_sell    REAL,
+    spread_pct   REAL,
+    buy_volume   INTEGER,
+    sell_volume  INTEGER,
+    PRIMARY KEY (type_id, ts)
+) WITHOUT ROWID;
+
+INSERT OR REPLACE INTO market_price_snapshots_raw
+    (type_id, ts, best_buy, best_sell, spread_pct, buy_volume, sell_volume)
+SELECT type_id, CAST(strftime('%s', timestamp) AS INTEGER),
+       best_buy, best_sell, spread_pct, buy_volume, sell_volume
+FROM market_price_snapshots
+ORDER BY id;
+
+DROP TABLE market_price_snapshots;
+CREATE INDEX idx_mpsr_ts ON market_price_snapshots_raw (ts);
+
+CREATE VIEW market_price_snapshots AS
+SELECT type_id, ts,
+       strftime('%Y-%m-%dT%H:%M:%S+00:00', ts, 'unixepoch') AS timestamp,
+       best_buy, best_sell, spread_pct, buy_volume, sell_volume
+FROM market_price_snapshots_raw;
+
+-- ─── snapshot rollups ────────────────────────────────────────────────────────
+-- Text bucket keys were 'YYYY-MM-DDTHH' (hourly) and 'YYYY-MM-DD' (daily).
+-- The CREATE IF NOT EXISTS lets this run on databases that predate rollups.
+
+CREATE TABLE IF NOT EXISTS market_price_snapshots_hourly (
+    type_id INTEGER, bucket TEXT, samples INTEGER,
+    buy_min REAL, buy_max REAL, buy_avg REAL, buy_count INTEGER,
+    sell_min REAL, sell_max REAL, sell_avg REAL, sell_count INTEGER,
+    spread_avg REAL, spread_count INTEGER, buy_volume_avg REAL, sell_volume_avg REAL
+);
+CREATE TABLE IF NOT EXISTS market_price_snapshots_daily (
+    type_id INTEGER, bucket TEXT, samples INTEGER,
+    buy_min REAL, buy_max REAL, buy_avg REAL, buy_count INTEGER,
+    sell_min REAL, sell_max REAL, sell_avg REAL, sell_count INTEGER,
+    spread_avg REAL, spread_count INTEGER, buy_volume_avg REAL, sell_volume_avg REAL
+);
+
+CREATE TABLE market_price_snapshots_hourly_new (
+    type_id          INTEGER NOT NULL,
+    bucket           INTEGER NOT NULL,
+    samples          INTEGER NOT NULL,
+    buy_min          REAL,
+    buy_max          REAL,
+    buy_avg          REAL,
+    buy_count        INTEGER NOT NULL DEFAULT 0,
+    sell_min         REAL,
+    sell_max         REAL,
+    sell_avg         REAL,
+    sell_count       INTEGER NOT NULL DEFAULT 0,
+    spread_avg       REAL,
+    spread_count     INTEGER NOT NULL DEFAULT 0,
+    buy_volume_avg   REAL,
+    sell_volume_avg  REAL,
+    PRIMARY KEY (type_id, bucket)
+) WITHOUT ROWID;
+
+CREATE TABLE market_price_snapshots_daily_new (
+    type_id          INTEGER NOT NULL,
+    bucket           INTEGER NOT NULL,
+    samples          INTEGER NOT NULL,
+    buy_min          REAL,
+    buy_max          REAL,
+    buy_avg          REAL,
+    buy_count        INTEGER NOT NULL DEFAULT 0,
+    sell_min         REAL,
+    sell_max         REAL,
+    sell_avg         REAL,
+    sell_count       INTEGER NOT NULL DEFAULT 0,
+    spread_avg       REAL,
+    spread_count     INTEGER NOT NULL DEFAULT 0,
+    buy_volume_avg   REAL,
+    sell_volume_avg  REAL,
+    PRIMARY KEY (type_id, bucket)
+) WITHOUT ROWID;
+
+INSERT INTO market_price_snapshots_hourly_new
+SELECT h.type_id, CAST(strftime('%s', h.bucket || ':00:00') AS INTEGER), h.samples,
+       h.buy_min, h.buy_max, h.buy_avg, h.buy_count,
+       h.sell_min, h.sell_max, h.sell_avg, h.sell_count,
+       h.spread_avg, h.spread_count, h.buy_volume_avg, h.sell_volume_avg
+FROM market_price_snapshots_hourly h;
+
+INSERT INTO market_price_snapshots_daily_new
+SELECT d.type_id, CAST(strftime('%s', d.bucket) AS INTEGER), d.samples,
+       d.buy_min, d.buy_max, d.buy_avg, d.buy_count,
+       d.sell_min, d.sell_max, d.sell_avg, d.sell_count,
+       d.spread_avg, d.spread_count, d.buy_volume_avg, d.sell_volume_avg
+FROM market_price_snapshots_daily d;
+
+DROP TABLE market_price_snapshots_hourly;
+DROP TABLE market_price_snapshots_daily;
+ALTER TABLE market_price_snapshots_hourly_new RENAME TO market_price_snapshots_hourly;
+ALTER TABLE market_price_snapshots_daily_new  RENAME TO market_price_snapshots_daily;
+CREATE INDEX idx_market_price_snapshots_hourly_bucket ON market_price_snapshots_hourly (bucket);
+CREATE INDEX idx_market_price_snapshots_daily_bucket  ON market_price_snapshots_daily (bucket);
+
+-- ─── lx_zoj_inventory ────────────────────────────────────────────────────────
+-- type_name / location_name are no longer stored: the view joins inv_types,
+-- and every row was written with location_name 'LX-ZOJ'.
+
+CREATE TABLE lx_zoj_inventory_snapshots (
+    snapshot_ts        INTEGER NOT NULL,
+    type_id            INTEGER NOT NULL,
+    quantity           INTEGER NOT NULL DEFAULT 0,
+    location_id        INTEGER,
+    PRIMARY KEY (snapshot_ts, type_id)
+) WITHOUT ROWID;
+
+INSERT OR REPLACE INTO lx_zoj_inventory_snapshots (snapshot_ts, type_id, quantity, location_id)
+SELECT CAST(strftime('%s', snapshot_timestamp) AS INTEGER), type_id, quantity, location_id
+FROM lx_zoj_inventory
+ORDER BY id;
+
+DROP VIEW IF EXISTS lx_zoj_current_inventory;
+DROP TABLE lx_zoj_inventory;
+CREATE INDEX idx_lz_type ON lx_zoj_inventory_snapshots (type_id, snapshot_ts);
+
+CREATE VIEW lx_zoj_inventory AS
+SELECT s.snapshot_ts,
+       strftime('%Y-%m-%dT%H:%M:%S+00:00', s.snapshot_ts, 'unixepoch') AS snapshot_timestamp,
+       s.type_id, t.type_name, s.quantity, s.location_id,
+       'LX-ZOJ' AS location_name
+FROM lx_zoj_inventory_snapshots s
+LEFT JOIN inv_types t ON t.type_id = s.type_id;
+
+CREATE VIEW lx_zoj_current_inventory AS
+SELECT s.type_id, t.type_name, s.quantity, s.location_id,
+       'LX-ZOJ' AS location_name,
+       strftime('%Y-%m-%dT%H:%M:%S+00:00', s.snapshot_ts, 'unixepoch') AS snapshot_timestamp
+FROM lx_zoj_inventory_snapshots s
+LEFT JOIN inv_types t ON t.type_id = s.type_id
+WHERE s.snapshot_ts = (
+    SELECT MAX(snapshot_ts) FROM lx_zoj_inventory_snapshots
+);
+
+-- ─── character_orders_history ────────────────────────────────────────────────
+
+CREATE TABLE character_order_snapshots (
+    snapshot_ts     INTEGER NOT NULL,
+    order_id        INTEGER NOT NULL,
+    character_id    INTEGER NOT NULL,
+    type_id         INTEGER NOT NULL,
+    location_id     INTEGER NOT NULL,
+    region_id       INTEGER,
+    is_buy_order    INTEGER NOT NULL,
+    price           REAL NOT NULL,
+    volume_remain   INTEGER NOT NULL,
+    volume_total    INTEGER NOT NULL,
+    issued          INTEGER NOT NULL,
+    duration        INTEGER,
+    state           TEXT NOT NULL,
+    PRIMARY KEY (order_id, snapshot_ts)
+) WITHOUT ROWID;
+
+-- The old update_character_orders_history.py wrote state into duration and
+-- last_updated into state, and stamped snapshot_date with naive local time
+-- (datetime.now().isoformat()). Rows with a non-numeric duration get the
+-- state back and no duration; naive snapshot dates are converted from local
+-- time ('utc' modifier), ones carrying an offset as they are.
+INSERT OR REPLACE INTO character_order_snapshots
+SELECT CAST(CASE
+           WHEN snapshot_date LIKE '%Z' OR snapshot_date GLOB '*[+-][0-9][0-9]:[0-9][0-9]'
+           THEN strftime('%s', snapshot_date)
+           ELSE strftime('%s', snapshot_date, 'utc')
+       END AS INTEGER),
+       order_id, character_id, type_id,
+       location_id, region_id, is_buy_order, price, volume_remain, volume_total,
+       CAST(strftime('%s', issued) AS INTEGER),
+       CASE WHEN duration_ok THEN CAST(duration AS INTEGER) END,
+       CASE WHEN duration_ok THEN state ELSE duration END
+FROM (
+    SELECT *,
+           typeof(duration) = 'integer'
+           OR (typeof(duration) = 'text' AND duration GLOB '[0-9]*' AND duration NOT GLOB '*[^0-9]*')
+           AS duration_ok
+    FROM character_orders_history
+);
+
+DROP TABLE character_orders_history;
+CREATE INDEX idx_cos_ts      ON character_order_snapshots (snapshot_ts);
+CREATE INDEX idx_cos_type_ts ON character_order_snapshots (type_id, snapshot_ts);
+
+CREATE VIEW character_orders_history AS
+SELECT strftime('%Y-%m-%dT%H:%M:%S+00:00', snapshot_ts, 'unixepoch') AS snapshot_date,
+       order_id, character_id, type_id, location_id, region_id, is_buy_order,
+       price, volume_remain, volume_total,
+       strftime('%Y-%m-%dT%H:%M:%SZ', issued, 'unixepoch') AS issued,
+       duration, state, snapshot_ts
+FROM character_order_snapshots;
+
+COMMIT;
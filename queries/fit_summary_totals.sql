@@ -36,17 +36,15 @@ WITH combined_results AS (
     JOIN inv_types it ON it.type_id = dfi.type_id
 
     LEFT JOIN (
-        SELECT 
-            type_id, 
-            MAX(CASE WHEN is_buy_order = 1 THEN price END) AS best_buy_price,
-            MIN(CASE WHEN is_buy_order = 0 THEN price END) AS best_sell_price
-        FROM market_orders
-        GROUP BY type_id
+        SELECT type_id, best_buy AS best_buy_price, best_sell AS best_sell_price
+        FROM market_top_of_book
+        WHERE source = 'market_orders'
     ) jita ON jita.type_id = dfi.type_id
 
     LEFT JOIN (
-        SELECT type_id, MIN(CASE WHEN is_buy_order = 0 THEN price END) AS lowest_sell_price
-        FROM bwf_market_orders
+        SELECT type_id, MIN(best_sell) AS lowest_sell_price
+        FROM market_top_of_book
+        WHERE source = 'bwf_market_orders'
         GROUP BY type_id
     ) bwf ON bwf.type_id = dfi.type_id
 
@@ -82,17 +80,15 @@ WITH combined_results AS (
     JOIN inv_types it ON it.type_id = dfi.type_id
 
     LEFT JOIN (
-        SELECT 
-            type_id, 
-            MAX(CASE WHEN is_buy_order = 1 THEN price END) AS best_buy_price,
-            MIN(CASE WHEN is_buy_order = 0 THEN price END) AS best_sell_price
-        FROM market_orders
-        GROUP BY type_id
+        SELECT type_id, best_buy AS best_buy_price, best_sell AS best_sell_price
+        FROM market_top_of_book
+        WHERE source = 'market_orders'
     ) jita ON jita.type_id = dfi.type_id
 
     LEFT JOIN (
-        SELECT type_id, MIN(CASE WHEN is_buy_order = 0 THEN price END) AS lowest_sell_price
-        FROM bwf_market_orders
+        SELECT type_id, MIN(best_sell) AS lowest_sell_price
+        FROM market_top_of_book
+        WHERE source = 'bwf_market_orders'
         GROUP BY type_id
     ) bwf ON bwf.type_id = dfi.type_id
 
@@ -118,9 +114,9 @@ WITH combined_results AS (
     JOIN doctrine_fits df ON df.fit_id = dfi.fit_id
     JOIN inv_types it ON it.type_id = dfi.type_id
     LEFT JOIN (
-        SELECT type_id, MAX(CASE WHEN is_buy_order = 1 THEN price END) AS best_buy_price
-        FROM market_orders
-        GROUP BY type_id
+        SELECT type_id, best_buy AS best_buy_price
+        FROM market_top_of_book
+        WHERE source = 'market_orders'
     ) jita ON jita.type_id = dfi.type_id
     WHERE df.fit_name = 'Nightmare - WC-EN - DPS Nightmare v1.3'
     
@@ -143,9 +139,9 @@ WITH combined_results AS (
     JOIN doctrine_fits df ON df.fit_id = dfi.fit_id
     JOIN inv_types it ON it.type_id = dfi.type_id
     LEFT JOIN (
-        SELECT type_id, MAX(CASE WHEN is_buy_order = 1 THEN price END) AS best_buy_price
-        FROM market_orders
-        GROUP BY type_id
+        SELECT type_id, best_buy AS best_buy_price
+        FROM market_top_of_book
+        WHERE source = 'market_orders'
     ) jita ON jita.type_id = dfi.type_id
     WHERE df.fit_name = 'Nightmare - WC-EN - DPS Nightmare v1.3'
     
@@ -171,9 +167,9 @@ WITH combined_results AS (
     JOIN doctrine_fits df ON df.fit_id = dfi.fit_id
     JOIN inv_types it ON it.type_id = dfi.type_id
     LEFT JOIN (
-        SELECT type_id, MAX(CASE WHEN is_buy_order = 1 THEN price END) AS best_buy_price
-        FROM market_orders
-        GROUP BY type_id
+        SELECT type_id, best_buy AS best_buy_price
+        FROM market_top_of_book
+        WHERE source = 'market_orders'
     ) jita ON jita.type_id = dfi.type_id
     WHERE df.fit_name = 'Nightmare - WC-EN - DPS Nightmare v1.3'
     
@@ -200,9 +196,9 @@ WITH combined_results AS (
     JOIN doctrine_fits df ON df.fit_id = dfi.fit_id
     JOIN inv_types it ON it.type_id = dfi.type_id
     LEFT JOIN (
-        SELECT type_id, MAX(CASE WHEN is_buy_order = 1 THEN price END) AS best_buy_price
-        FROM market_orders
-        GROUP BY type_id
+        SELECT type_id, best_buy AS best_buy_price
+        FROM market_top_of_book
+        WHERE source = 'market_orders'
     ) jita ON jita.type_id = dfi.type_id
     WHERE df.fit_name = 'Nightmare - WC-EN - DPS Nightmare v1.3'
     
@@ -228,13 +224,14 @@ WITH combined_results AS (
     JOIN doctrine_fits df ON df.fit_id = dfi.fit_id
     JOIN inv_types it ON it.type_id = dfi.type_id
     LEFT JOIN (
-        SELECT type_id, MIN(CASE WHEN is_buy_order = 0 THEN price END) AS best_sell_price
-        FROM market_orders
-        GROUP BY type_id
+        SELECT type_id, best_sell AS best_sell_price
+        FROM market_top_of_book
+        WHERE source = 'market_orders'
     ) jita ON jita.type_id = dfi.type_id
     LEFT JOIN (
-        SELECT type_id, MIN(CASE WHEN is_buy_order = 0 THEN price END) AS lowest_sell_price
-        FROM bwf_market_orders
+        SELECT type_id, MIN(best_sell) AS lowest_sell_price
+        FROM market_top_of_book
+        WHERE source = 'bwf_market_orders'
         GROUP BY type_id
     ) bwf ON bwf.type_id = dfi.type_id
     WHERE df.fit_name = 'Nightmare - WC-EN - DPS Nightmare v1.3'
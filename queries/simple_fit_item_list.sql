@@ -24,17 +24,15 @@ JOIN doctrine_fits df ON df.fit_id = dfi.fit_id
 JOIN inv_types it ON it.type_id = dfi.type_id
 
 LEFT JOIN (
-    SELECT 
-        type_id, 
-        MAX(CASE WHEN is_buy_order = 1 THEN price END) AS best_buy_price,
-        MIN(CASE WHEN is_buy_order = 0 THEN price END) AS best_sell_price
-    FROM market_orders
-    GROUP BY type_id
+    SELECT type_id, best_buy AS best_buy_price, best_sell AS best_sell_price
+    FROM market_top_of_book
+    WHERE source = 'market_orders'
 ) jita ON jita.type_id = dfi.type_id
 
 LEFT JOIN (
-    SELECT type_id, MIN(CASE WHEN is_buy_order = 0 THEN price END) AS lowest_sell_price
-    FROM bwf_market_orders
+    SELECT type_id, MIN(best_sell) AS lowest_sell_price
+    FROM market_top_of_book
+    WHERE source = 'bwf_market_orders'
     GROUP BY type_id
 ) bwf ON bwf.type_id = dfi.type_id
 
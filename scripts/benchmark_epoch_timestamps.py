@@ -0,0 +1,258 @@
+"""
+benchmark_epoch_timestamps.py
+
+Measures what migrations/2026-10-17_epoch_timestamps.sql buys: database
+size and range-query latency before and after moving the time-series tables
+to INTEGER epoch timestamps.
+
+Never touches the live database - it copies it (or builds a synthetic one
+with the old schema), measures, applies the migration to the copy, VACUUMs
+and measures again.
+
+Usage:
+    python benchmark_epoch_timestamps.py                    # copy of mydatabase.db
+    python benchmark_epoch_timestamps.py --synthetic 30     # 30 days of synthetic data
+    python benchmark_epoch_timestamps.py --repeat 50
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = SCRIPT_DIR.parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from script_utils import timed_script
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────────
+
+DB_PATH = str(PROJECT_DIR / 'mydatabase.db')
+MIGRATION_FILE = PROJECT_DIR / 'migrations' / '2026-10-17_epoch_timestamps.sql'
+
+WINDOW_DAYS = 7
+
+# (label, query on the old schema, query on the new schema, cutoff kind)
+# Old queries compare ISO text, new ones epoch seconds.
+QUERIES = [
+    ("7d avg per item",
+     "SELECT type_id, AVG(best_buy), AVG(best_sell) FROM market_price_snapshots "
+     "WHERE timestamp >= :iso GROUP BY type_id",
+     "SELECT type_id, AVG(best_buy), AVG(best_sell) FROM market_price_snapshots_raw "
+     "WHERE ts >= :epoch GROUP BY type_id"),
+    ("7d avg per item (compat view)",
+     None,
+     "SELECT type_id, AVG(best_buy), AVG(best_sell) FROM market_price_snapshots "
+     "WHERE timestamp >= :iso GROUP BY type_id"),
+    ("one item, 7d timeline",
+     "SELECT timestamp, best_buy, best_sell FROM market_price_snapshots "
+     "WHERE type_id = :type_id AND timestamp >= :iso ORDER BY timestamp DESC",
+     "SELECT ts, best_buy, best_sell FROM market_price_snapshots_raw "
+     "WHERE type_id = :type_id AND ts >= :epoch ORDER BY ts DESC"),
+    ("latest LX-ZOJ snapshot",
+     "SELECT type_id, quantity FROM lx_zoj_current_inventory",
+     "SELECT type_id, quantity FROM lx_zoj_current_inventory"),
+    ("order lifetimes, 7d",
+     "SELECT order_id, MIN(snapshot_date), MAX(snapshot_date) FROM character_orders_history "
+     "WHERE snapshot_date >= :iso GROUP BY order_id",
+     "SELECT order_id, MIN(snapshot_ts), MAX(snapshot_ts) FROM character_order_snapshots "
+     "WHERE snapshot_ts >= :epoch GROUP BY order_id"),
+]
+
+# ─── SYNTHETIC DATA ───────────────────────────────────────────────────────────
+
+def build_synthetic(path, days, items=300, seed=1):
+    """Creates a database with the pre-migration schema and `days` of data."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE market_price_snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, type_id INTEGER NOT NULL,
+            best_buy REAL, best_sell REAL, spread_pct REAL, buy_volume INTEGER, sell_volume INTEGER
+        );
+        CREATE INDEX idx_mps_timestamp ON market_price_snapshots(timestamp);
+        CREATE INDEX idx_mps_type      ON market_price_snapshots(type_id);
+        CREATE INDEX idx_mps_type_ts   ON market_price_snapshots(type_id, timestamp);
+
+        CREATE TABLE inv_types (type_id INTEGER PRIMARY KEY, type_name TEXT);
+        CREATE TABLE lx_zoj_inventory (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, snapshot_timestamp TEXT NOT NULL, type_id INTEGER NOT NULL,
+            type_name TEXT, quantity INTEGER NOT NULL DEFAULT 0, location_id INTEGER, location_name TEXT
+        );
+        CREATE INDEX idx_lz_snapshot ON lx_zoj_inventory (snapshot_timestamp);
+        CREATE INDEX idx_lz_type     ON lx_zoj_inventory (type_id);
+        CREATE VIEW lx_zoj_current_inventory AS
+            SELECT type_id, type_name, quantity, location_id, location_name, snapshot_timestamp
+            FROM lx_zoj_inventory
+            WHERE snapshot_timestamp = (SELECT MAX(snapshot_timestamp) FROM lx_zoj_inventory);
+
+        CREATE TABLE character_orders_history (
+            snapshot_date TEXT NOT NULL, order_id INTEGER NOT NULL, character_id INTEGER NOT NULL,
+            type_id INTEGER NOT NULL, location_id INTEGER NOT NULL, region_id INTEGER NOT NULL,
+            is_buy_order INTEGER NOT NULL, price REAL NOT NULL, volume_remain INTEGER NOT NULL,
+            volume_total INTEGER NOT NULL, issued TEXT NOT NULL, duration INTEGER NOT NULL,
+            state TEXT NOT NULL, PRIMARY KEY (snapshot_date, order_id)
+        );
+    """)
+    conn.executemany("INSERT INTO inv_types VALUES (?, ?)", [(t, f"Item {t}") for t in range(1, items + 1)])
+
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    start = now - timedelta(days=days)
+
+    # Price snapshots every 30 minutes
+    t = start
+    while t < now:
+        iso = t.isoformat()
+        rows = []
+        for type_id in range(1, items + 1):
+            buy = rng.uniform(10, 1000)
+            sell = buy * rng.uniform(1.01, 1.2)
+            rows.append((iso, type_id, buy, sell, (sell - buy) / buy * 100, rng.randint(0, 10**7), rng.randint(0, 10**7)))
+        conn.executemany("""
+            INSERT INTO market_price_snapshots
+                (timestamp, type_id, best_buy, best_sell, spread_pct, buy_volume, sell_volume)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        t += timedelta(minutes=30)
+
+    # Hourly inventory snapshots for 60 items, order-history snapshots for 200 orders
+    t = start
+    while t < now:
+        iso = t.isoformat()
+        conn.executemany("""
+            INSERT INTO lx_zoj_inventory
+                (snapshot_timestamp, type_id, type_name, quantity, location_id, location_name)
+            VALUES (?, ?, ?, ?, 1027625808467, 'LX-ZOJ')
+        """, [(iso, type_id, f"Item {type_id}", rng.randint(0, 50000)) for type_id in range(1, 61)])
+        conn.executemany("""
+            INSERT INTO character_orders_history VALUES (?, ?, 2114278577, ?, 60003760, 10000002, ?, ?, ?, 1000, ?, 90, 'active')
+        """, [
+            (iso, order_id, order_id % items + 1, order_id % 2, rng.uniform(10, 1000),
+             rng.randint(0, 1000), (start + timedelta(hours=order_id)).strftime('%Y-%m-%dT%H:%M:%SZ'))
+            for order_id in range(1, 201)
+        ])
+        t += timedelta(hours=1)
+
+    conn.commit()
+    conn.close()
+
+# ─── MEASURE ──────────────────────────────────────────────────────────────────
+
+def table_sizes(conn):
+    """Bytes per table (indexes included), or {} if dbstat isn't compiled in."""
+    try:
+        rows = conn.execute("""
+            SELECT COALESCE(m.tbl_name, s.name), SUM(s.pgsize)
+            FROM dbstat s LEFT JOIN sqlite_master m ON m.name = s.name
+            GROUP BY 1
+        """).fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    return dict(rows)
+
+
+def time_query(conn, sql, params, repeat):
+    """Best-of-N wall time in milliseconds, or None if the query can't run."""
+    try:
+        conn.execute(sql, params).fetchall()
+    except sqlite3.OperationalError:
+        return None
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def measure(path, phase, repeat):
+    """Returns (file size, table sizes, {label: ms}) for one side of the migration."""
+    conn = sqlite3.connect(path)
+    conn.execute("VACUUM")
+    size = os.path.getsize(path)
+    sizes = table_sizes(conn)
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=WINDOW_DAYS)
+    params = {
+        'iso': cutoff.isoformat(),
+        'epoch': int(cutoff.timestamp()),
+        'type_id': 1,
+    }
+    timings = {}
+    for label, before_sql, after_sql in QUERIES:
+        sql = before_sql if phase == 'before' else after_sql
+        if sql:
+            timings[label] = time_query(conn, sql, params, repeat)
+    conn.close()
+    return size, sizes, timings
+
+# ─── MAIN ─────────────────────────────────────────────────────────────────────
+
+@timed_script
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the epoch-timestamp migration on a copy of the database."
+    )
+    parser.add_argument("--db",        type=str, default=DB_PATH, help="Database to copy (default: mydatabase.db)")
+    parser.add_argument("--synthetic", type=int, default=None,    help="Build N days of synthetic data instead")
+    parser.add_argument("--repeat",    type=int, default=20,      help="Timing repetitions per query (best of N)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+
+        if args.synthetic:
+            print(f"\n  Building {args.synthetic} days of synthetic data...")
+            build_synthetic(path, args.synthetic)
+        else:
+            print(f"\n  Copying {args.db}...")
+            src = sqlite3.connect(f'file:{args.db}?mode=ro', uri=True)
+            dst = sqlite3.connect(path)
+            src.backup(dst)
+            src.close()
+            dst.close()
+
+        before_size, before_tables, before = measure(path, 'before', args.repeat)
+
+        print(f"  Applying {MIGRATION_FILE.name}...")
+        conn = sqlite3.connect(path)
+        conn.executescript(MIGRATION_FILE.read_text(encoding='utf-8'))
+        conn.close()
+
+        after_size, after_tables, after = measure(path, 'after', args.repeat)
+
+    print(f"\n  {'=' * 72}")
+    print(f"  DATABASE SIZE")
+    print(f"  {'-' * 72}")
+    print(f"  {'File':<40} {before_size / 1e6:>10.1f} MB {after_size / 1e6:>10.1f} MB "
+          f"{(1 - after_size / before_size) * 100:>6.1f}% smaller")
+    renames = {
+        'market_price_snapshots': 'market_price_snapshots_raw',
+        'lx_zoj_inventory': 'lx_zoj_inventory_snapshots',
+        'character_orders_history': 'character_order_snapshots',
+    }
+    for old, new in renames.items():
+        if old in before_tables and new in after_tables:
+            print(f"  {old:<40} {before_tables[old] / 1e6:>10.1f} MB {after_tables[new] / 1e6:>10.1f} MB")
+
+    print(f"\n  {'=' * 72}")
+    print(f"  RANGE QUERIES (best of {args.repeat}, {WINDOW_DAYS}-day window)")
+    print(f"  {'-' * 72}")
+    print(f"  {'Query':<32} {'Before':>12} {'After':>12} {'Speedup':>10}")
+    for label, _, _ in QUERIES:
+        b, a = before.get(label), after.get(label)
+        b_txt = f"{b:.2f} ms" if b is not None else '-'
+        a_txt = f"{a:.2f} ms" if a is not None else '-'
+        speedup = f"{b / a:.1f}x" if b and a else ''
+        print(f"  {label:<32} {b_txt:>12} {a_txt:>12} {speedup:>10}")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+db.py
+
+Shared SQLite access layer.
+
+connect() hands out pooled connections to mydatabase.db that are already
+tuned:
+
+  - WAL journal: readers never block the long-running order/history
+    writers and vice versa (set once, persists in the database file)
+  - synchronous=NORMAL: safe with WAL, far fewer fsyncs than FULL
+  - 64 MB page cache, 256 MB mmap, temp_store=MEMORY
+  - 30 s busy timeout instead of failing straight away on a lock
+
+readonly=True opens the file with mode=ro and query_only, for analytics
+and UI readers that must never take a write lock.
+
+Connections come from a small per-mode pool. close() returns the
+connection to the pool instead of closing it (any uncommitted transaction
+is rolled back first, same as a real close), so helpers that open a
+connection per lookup stop paying the connect + PRAGMA cost each time.
+A returned connection is reset to what a fresh one would look like: its
+TEMP tables are dropped and CONNECTION_PRAGMAS re-applied, so a bulk
+loader that relaxed synchronous and bailed out before restoring it can't
+leave the next caller writing unsynchronized.
+
+Time-series tables store timestamps as INTEGER epoch seconds (UTC);
+to_epoch() / format_ts() convert to and from the ISO strings ESI and the
+compatibility views use.
+
+Usage:
+    import db
+    conn = db.connect()                  # read/write
+    ...
+    conn.close()                         # back to the pool
+
+    with db.connection(readonly=True) as conn:
+        rows = conn.execute("SELECT ...").fetchall()
+"""
+
+import atexit
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = SCRIPT_DIR.parent
+
+# ============================================
+# CONFIGURATION
+# ============================================
+DB_PATH = str(PROJECT_DIR / 'mydatabase.db')
+
+BUSY_TIMEOUT = 30
+
+# Applied to every connection when it is created
+CONNECTION_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'cache_size': -65536,        # 64 MB page cache
+    'mmap_size': 268435456,      # 256 MB memory-mapped I/O
+    'temp_store': 'MEMORY',
+}
+
+# Idle connections kept per (path, mode)
+POOL_SIZE = 4
+
+# ============================================
+# POOL
+# ============================================
+
+class PooledConnection(sqlite3.Connection):
+    """
+    sqlite3 connection whose close() returns it to the pool. Closing twice
+    is a no-op, as with a plain sqlite3 connection, so the same connection
+    can't end up in the idle list twice and be handed to two borrowers.
+    """
+
+    _pool_key = None
+    _released = False
+
+    def close(self):
+        if self._pool_key is None:
+            super().close()
+        elif not self._released:
+            _release(self)
+
+    def really_close(self):
+        super().close()
+
+
+_pool = {}
+_pool_lock = threading.Lock()
+_wal_checked = set()
+
+
+def _open(path, readonly):
+    if readonly:
+        conn = sqlite3.connect(
+            f'file:{path}?mode=ro', uri=True, timeout=BUSY_TIMEOUT,
+            check_same_thread=False, factory=PooledConnection
+        )
+        conn.execute('PRAGMA query_only = ON')
+    else:
+        conn = sqlite3.connect(
+            path, timeout=BUSY_TIMEOUT, check_same_thread=False, factory=PooledConnection
+        )
+        # journal_mode is stored in the file - only needs setting once per run
+        if path not in _wal_checked:
+            conn.execute('PRAGMA journal_mode = WAL')
+            _wal_checked.add(path)
+
+    for name, value in CONNECTION_PRAGMAS.items():
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+
+def _reset(conn):
+    """Undo per-connection state a borrower may have left behind."""
+    if conn.in_transaction:
+        conn.rollback()
+    conn.row_factory = None
+
+    # Read-only connections can't create TEMP objects (query_only)
+    if not conn._pool_key[1]:
+        temp = conn.execute(
+            "SELECT type, name FROM sqlite_temp_master WHERE type IN ('table', 'view')"
+        ).fetchall()
+        for kind, name in temp:
+            conn.execute(f'DROP {kind.upper()} IF EXISTS temp."{name}"')
+
+    # Unchanged values are no-ops (temp_store only drops TEMP tables on a change)
+    for name, value in CONNECTION_PRAGMAS.items():
+        conn.execute(f'PRAGMA {name} = {value}')
+
+
+def _release(conn):
+    conn._released = True
+    try:
+        _reset(conn)
+    except sqlite3.Error:
+        conn.really_close()
+        return
+
+    with _pool_lock:
+        idle = _pool.setdefault(conn._pool_key, [])
+        if len(idle) < POOL_SIZE:
+            idle.append(conn)
+            return
+    conn.really_close()
+
+
+def connect(path=None, readonly=False):
+    """
+    Get a tuned connection from the pool (or open a new one).
+    Call close() when done to hand it back. path defaults to DB_PATH,
+    read at call time so a tool can point the whole process elsewhere.
+    """
+    if path is None:
+        path = DB_PATH
+    key = (str(path), readonly)
+    with _pool_lock:
+        idle = _pool.get(key)
+        conn = idle.pop() if idle else None
+
+    if conn is None:
+        conn = _open(str(path), readonly)
+        conn._pool_key = key
+    conn._released = False
+    return conn
+
+
+@contextmanager
+def connection(path=None, readonly=False):
+    """
+    Pooled connection as a context manager: commits on success, rolls back
+    on error, and always returns the connection to the pool.
+    """
+    conn = connect(path, readonly)
+    try:
+        yield conn
+        if not readonly:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def close_all():
+    """Close every idle pooled connection."""
+    with _pool_lock:
+        idle = [conn for conns in _pool.values() for conn in conns]
+        _pool.clear()
+    for conn in idle:
+        conn.really_close()
+
+
+atexit.register(close_all)
+
+# ============================================
+# EPOCH TIMESTAMPS
+# ============================================
+
+def to_epoch(value):
+    """ISO-8601 string (ESI 'Z' suffix or offset; naive = UTC) -> epoch seconds."""
+    dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def format_ts(ts):
+    """Epoch seconds -> ISO-8601 UTC string, same format as the compatibility views."""
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S+00:00')
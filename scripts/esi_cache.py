@@ -0,0 +1,206 @@
+"""
+esi_cache.py
+
+On-disk conditional-request cache shared by the ESI pagers.
+
+ESI sends an ETag and an Expires header with every response. This cache
+stores both alongside the body, keyed by URL + query params:
+
+  - entry still within Expires   -> served from disk, no request at all
+  - entry expired                -> request sent with If-None-Match;
+                                    a 304 returns the cached body
+  - no entry / 200 response      -> body downloaded and stored
+
+The cache lives in its own SQLite file (esi_cache.db) so it never competes
+for locks with the writers on mydatabase.db. Authorization headers are
+sent but never stored.
+
+Usage (requests-based scripts):
+    cache = ESICache()
+    response = cached_get(cache, url, params={'page': 1}, headers=headers)
+    ...
+    cache.report()
+"""
+
+import json
+import sqlite3
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from urllib.parse import urlencode
+
+import requests
+
+from script_utils import record_http
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = SCRIPT_DIR.parent
+
+# ============================================
+# CONFIGURATION
+# ============================================
+CACHE_PATH = str(PROJECT_DIR / 'esi_cache.db')
+REQUEST_TIMEOUT = 30
+
+# ============================================
+# CACHE
+# ============================================
+
+class ESICache:
+    """ETag / Expires cache for ESI GET requests, with hit/miss counters."""
+
+    def __init__(self, path=CACHE_PATH):
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS esi_http_cache (
+                cache_key   TEXT PRIMARY KEY,
+                etag        TEXT,
+                expires     REAL,
+                x_pages     INTEGER,
+                body        BLOB NOT NULL,
+                fetched_at  TEXT NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+        self.fresh_hits = 0       # served within Expires, no request sent
+        self.not_modified = 0     # 304 - revalidated, cached body reused
+        self.misses = 0           # full 200 download
+        self.bytes_saved = 0
+
+    @staticmethod
+    def make_key(url, params=None):
+        """Cache key: URL plus sorted query params."""
+        if not params:
+            return url
+        return f"{url}?{urlencode(sorted(params.items()))}"
+
+    def lookup(self, key):
+        """Return (etag, expires, x_pages, body) for a key, or None."""
+        return self.conn.execute(
+            "SELECT etag, expires, x_pages, body FROM esi_http_cache WHERE cache_key = ?",
+            (key,)
+        ).fetchone()
+
+    @staticmethod
+    def is_fresh(entry):
+        return entry is not None and entry[1] is not None and entry[1] > time.time()
+
+    @staticmethod
+    def conditional_headers(entry):
+        """If-None-Match header for a cached entry (empty if no ETag)."""
+        if entry is None or not entry[0]:
+            return {}
+        return {'If-None-Match': entry[0]}
+
+    def store(self, key, headers, body):
+        """Store a 200 response body with its ETag / Expires / X-Pages headers."""
+        self.misses += 1
+        self.conn.execute("""
+            INSERT OR REPLACE INTO esi_http_cache
+                (cache_key, etag, expires, x_pages, body, fetched_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (
+            key,
+            headers.get('ETag'),
+            parse_expires(headers.get('Expires')),
+            int(headers['X-Pages']) if headers.get('X-Pages') else None,
+            body,
+            datetime.now(timezone.utc).isoformat(),
+        ))
+        self.conn.commit()
+
+    def refresh(self, key, headers, entry):
+        """Record a 304: bump Expires and count the reused body."""
+        self.not_modified += 1
+        self.bytes_saved += len(entry[3])
+        expires = parse_expires(headers.get('Expires'))
+        if expires is not None:
+            self.conn.execute(
+                "UPDATE esi_http_cache SET expires = ? WHERE cache_key = ?", (expires, key)
+            )
+            self.conn.commit()
+
+    def hit(self, entry):
+        """Record a fresh hit (no request sent)."""
+        self.fresh_hits += 1
+        self.bytes_saved += len(entry[3])
+
+    def report(self):
+        """Print hit/miss counters for the run."""
+        hits = self.fresh_hits + self.not_modified
+        total = hits + self.misses
+        rate = (hits / total * 100) if total else 0
+        print(
+            f"\nESI cache: {hits} hit(s) ({self.fresh_hits} fresh, {self.not_modified} not modified), "
+            f"{self.misses} miss(es) - {rate:.1f}% hit rate, "
+            f"{self.bytes_saved / 1_048_576:.1f} MB not re-downloaded"
+        )
+
+    def close(self):
+        self.conn.close()
+
+
+def parse_expires(value):
+    """Convert an HTTP Expires header to epoch seconds (None if absent/invalid)."""
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+# ============================================
+# REQUESTS HELPER
+# ============================================
+
+class CachedResponse:
+    """Minimal stand-in for requests.Response built from a cache entry."""
+
+    def __init__(self, entry):
+        self.status_code = 200
+        self.content = entry[3]
+        self.headers = {'X-Pages': str(entry[2])} if entry[2] else {}
+        self.from_cache = True
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+def cached_get(cache, url, params=None, headers=None, timeout=REQUEST_TIMEOUT):
+    """
+    requests.get() with ETag / Expires handling. With cache=None this is a
+    plain requests.get(). Returns a requests.Response for 200 downloads and
+    errors, or a CachedResponse when the cached body was reused.
+    """
+    if cache is None:
+        response = requests.get(url, params=params, headers=headers, timeout=timeout)
+        record_http(requests=1, bytes=len(response.content))
+        return response
+
+    key = ESICache.make_key(url, params)
+    entry = cache.lookup(key)
+
+    if cache.is_fresh(entry):
+        cache.hit(entry)
+        return CachedResponse(entry)
+
+    request_headers = dict(headers or {})
+    request_headers.update(ESICache.conditional_headers(entry))
+    response = requests.get(url, params=params, headers=request_headers, timeout=timeout)
+    record_http(requests=1, bytes=len(response.content))
+
+    if response.status_code == 304 and entry is not None:
+        cache.refresh(key, response.headers, entry)
+        return CachedResponse(entry)
+
+    if response.status_code == 200:
+        cache.store(key, response.headers, response.content)
+
+    return response
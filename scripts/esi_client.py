@@ -0,0 +1,328 @@
+"""
+esi_client.py
+
+Shared async ESI client. Replaces the per-script retry/back-off copies
+(request_structure_orders_page, fetch_type, fetch_orders_for_type, ...).
+
+Every request made through one ESIClient shares:
+  - one aiohttp session / connection pool (bounded by `concurrency`)
+  - a token-bucket rate limit (requests per second across all tasks)
+  - a global ESI error budget: X-ESI-Error-Limit-Remain is tracked on every
+    response, and when it runs low *all* requests pause until the window
+    resets, instead of each task backing off on its own
+  - retries with exponential back-off + jitter for 420/429/5xx and
+    connection errors
+  - optional ETag / Expires caching through esi_cache.ESICache
+  - Authorization header injection through token_manager (auth=True)
+
+Usage:
+    async with ESIClient(concurrency=20) as esi:
+        item = await esi.get_json(f'/universe/types/{type_id}/')
+        orders = await esi.get_pages(f'/markets/{region_id}/orders/', {'order_type': 'all'})
+        await esi.stream_pages(path, params, on_page=handle_page)   # page-by-page
+        rows = await esi.get_pages(path, params, decode=decode_orders)  # esi_decode tuples
+    esi.report()
+"""
+
+import asyncio
+import os
+import random
+import time
+
+import aiohttp
+
+from esi_cache import ESICache
+from esi_decode import loads
+from script_utils import record_http
+
+# ============================================
+# CONFIGURATION
+# ============================================
+ESI_BASE_URL = os.environ.get('ESI_BASE_URL', 'https://esi.evetech.net/latest')
+REQUEST_TIMEOUT = 30
+
+# Maximum simultaneous requests per client
+MAX_CONCURRENCY = 20
+
+# Sustained requests per second across all tasks (burst up to the same amount)
+RATE_LIMIT = 50
+
+# Minimum remaining ESI error-limit budget before every request pauses
+ESI_ERROR_LIMIT_THRESHOLD = 10
+
+# Maximum attempts for transient errors
+MAX_RETRIES = 5
+
+RETRYABLE_STATUSES = {420, 429, 500, 502, 503, 504}
+
+# ============================================
+# ERRORS
+# ============================================
+
+class ESIError(RuntimeError):
+    """Non-retryable ESI response, or a request that kept failing."""
+
+    def __init__(self, status, url, message=''):
+        self.status = status
+        self.url = url
+        super().__init__(f"ESI {status} for {url}{': ' + message if message else ''}")
+
+# ============================================
+# RATE LIMITING
+# ============================================
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+# ============================================
+# CLIENT
+# ============================================
+
+class ESIClient:
+    """Async ESI client with shared pool, rate limit, error budget and cache."""
+
+    def __init__(self, concurrency=MAX_CONCURRENCY, rate_limit=RATE_LIMIT, cache=None,
+                 base_url=ESI_BASE_URL, timeout=REQUEST_TIMEOUT, max_retries=MAX_RETRIES):
+        self.concurrency = concurrency
+        self.rate_limit = rate_limit
+        self.cache = cache
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+        self._session = None
+        self._semaphore = None
+        self._bucket = None
+        self._token = None
+        self._paused_until = 0.0
+
+        # Run statistics
+        self.requests = 0
+        self.retries = 0
+        self.bytes = 0
+        self.error_limit_low_water = None
+
+    async def __aenter__(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._bucket = TokenBucket(self.rate_limit)
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+
+    # ---- internals ----
+
+    def _url(self, path):
+        return path if path.startswith('http') else f'{self.base_url}{path}'
+
+    def _auth_headers(self, refresh=False):
+        """Bearer token from token_manager (config/ must be on sys.path)."""
+        if self._token is None or refresh:
+            from token_manager import get_token
+            self._token = get_token()
+        return {'Authorization': f'Bearer {self._token}'}
+
+    def _track_error_limit(self, headers):
+        """Record the error budget; pause every request when it runs low."""
+        remain = headers.get('X-ESI-Error-Limit-Remain')
+        if remain is None:
+            return
+        remain = int(remain)
+        if self.error_limit_low_water is None or remain < self.error_limit_low_water:
+            self.error_limit_low_water = remain
+
+        if remain < ESI_ERROR_LIMIT_THRESHOLD:
+            reset = int(headers.get('X-ESI-Error-Limit-Reset', 60))
+            until = time.monotonic() + reset
+            if until > self._paused_until:
+                print(f"  [ESI] Error budget low ({remain} remaining). Pausing all requests {reset}s...")
+                self._paused_until = until
+
+    async def _wait_for_error_budget(self):
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _backoff(self, attempt, reason, target):
+        self.retries += 1
+        record_http(retries=1)
+        wait = (2 ** attempt) + random.uniform(0, 1)
+        print(f"  [{reason}] {target} – retry {attempt + 1}/{self.max_retries} in {wait:.1f}s")
+        await asyncio.sleep(wait)
+
+    # ---- public API ----
+
+    async def request(self, path, params=None, auth=False):
+        """
+        GET a path (or absolute URL). Returns (status, body_bytes, headers).
+        200s (including cache hits and 304 revalidations) carry the body;
+        other non-retryable statuses come back with body None.
+        Raises ESIError when retries are exhausted.
+        """
+        url = self._url(path)
+        cache_key = ESICache.make_key(url, params)
+        entry = self.cache.lookup(cache_key) if self.cache else None
+
+        if self.cache and self.cache.is_fresh(entry):
+            self.cache.hit(entry)
+            return 200, entry[3], {'X-Pages': str(entry[2] or 1)}
+
+        last_error = None
+        refreshed_token = False
+
+        async with self._semaphore:
+            for attempt in range(self.max_retries):
+                await self._wait_for_error_budget()
+                await self._bucket.acquire()
+
+                headers = dict(ESICache.conditional_headers(entry))
+                if auth:
+                    headers.update(self._auth_headers())
+
+                try:
+                    async with self._session.get(url, params=params, headers=headers) as response:
+                        self.requests += 1
+                        record_http(requests=1)
+                        self._track_error_limit(response.headers)
+
+                        if response.status == 200:
+                            body = await response.read()
+                            self.bytes += len(body)
+                            record_http(bytes=len(body))
+                            if self.cache:
+                                self.cache.store(cache_key, response.headers, body)
+                            return 200, body, response.headers
+
+                        if response.status == 304 and entry is not None:
+                            self.cache.refresh(cache_key, response.headers, entry)
+                            return 200, entry[3], {'X-Pages': str(entry[2] or 1)}
+
+                        if response.status == 401 and auth and not refreshed_token:
+                            # Token may have expired mid-run - fetch a fresh one once
+                            self._auth_headers(refresh=True)
+                            refreshed_token = True
+                            continue
+
+                        if response.status in RETRYABLE_STATUSES:
+                            last_error = f"HTTP {response.status}"
+                            await self._backoff(attempt, f"HTTP {response.status}", cache_key)
+                            continue
+
+                        return response.status, None, response.headers
+
+                except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                    last_error = exc
+                    await self._backoff(attempt, f"ClientError: {exc}", cache_key)
+
+        raise ESIError(0, url, f"failed after {self.max_retries} attempts ({last_error})")
+
+    async def get_json(self, path, params=None, auth=False, decode=loads):
+        """
+        GET and decode JSON (or pass the body bytes to `decode`, e.g. an
+        esi_decode row decoder). Returns None on 404, raises ESIError on
+        other errors.
+        """
+        status, body, _ = await self.request(path, params, auth)
+        if status == 200:
+            return decode(body)
+        if status == 404:
+            return None
+        raise ESIError(status, self._url(path))
+
+    async def stream_pages(self, path, params=None, on_page=None, auth=False, progress_every=50,
+                           decode=loads):
+        """
+        X-Pages fan-out: read page 1, then fetch the remaining pages with a
+        fixed pool of workers, handing each decoded page to
+        on_page(page, data) as soon as it arrives (so at most `concurrency`
+        pages are in memory). decode(body_bytes) turns a page into `data`;
+        pass an esi_decode row decoder to skip the list of dicts.
+        Returns the total number of pages.
+        """
+        params = dict(params or {})
+
+        status, body, headers = await self.request(path, {**params, 'page': 1}, auth)
+        if status == 404:
+            return 0
+        if status != 200:
+            raise ESIError(status, self._url(path))
+
+        total_pages = int(headers.get('X-Pages', 1))
+        first_page = decode(body)
+        print(f"  Page 1/{total_pages}: {len(first_page)} records")
+        on_page(1, first_page)
+
+        queue = asyncio.Queue()
+        for page in range(2, total_pages + 1):
+            queue.put_nowait(page)
+
+        completed = 1
+
+        async def worker():
+            nonlocal completed
+            while not queue.empty():
+                page = queue.get_nowait()
+                status, body, _ = await self.request(path, {**params, 'page': page}, auth)
+                if status == 404:
+                    # Book shrank while paging
+                    data = []
+                elif status != 200:
+                    raise ESIError(status, self._url(path), f"page {page}")
+                else:
+                    data = decode(body)
+                on_page(page, data)
+                completed += 1
+                if completed % progress_every == 0 or completed == total_pages:
+                    print(f"  Progress: {completed}/{total_pages} pages fetched...")
+
+        workers = [
+            asyncio.ensure_future(worker())
+            for _ in range(min(self.concurrency, max(total_pages - 1, 0)))
+        ]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            # Abandon outstanding pages if any page failed for good
+            for task in workers:
+                task.cancel()
+
+        return total_pages
+
+    async def get_pages(self, path, params=None, auth=False, decode=loads):
+        """All pages of a paginated endpoint, flattened in page order."""
+        pages = {}
+        await self.stream_pages(path, params, pages.__setitem__, auth, decode=decode)
+        records = []
+        for page in sorted(pages):
+            records.extend(pages[page])
+        return records
+
+    def report(self):
+        """Print request statistics for the run (the cache reports separately)."""
+        low_water = self.error_limit_low_water if self.error_limit_low_water is not None else 'n/a'
+        print(
+            f"\nESI client: {self.requests:,} request(s), {self.retries:,} retr(ies), "
+            f"{self.bytes / 1_048_576:.1f} MB downloaded, error budget low-water: {low_water}"
+        )
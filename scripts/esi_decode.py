@@ -0,0 +1,167 @@
+"""
+esi_decode.py
+
+Decoding layer for large ESI pages (market orders, market history,
+character assets).
+
+A region order page is ~1,000 records, and the old path kept each one as
+a dict only long enough to copy its fields into an insert tuple. Here the
+page bytes go through orjson when it is installed (the stdlib json module
+otherwise) and every record is turned straight into a tuple in the
+column order the loaders insert, with operator.itemgetter doing the field
+lookups in C. Callers never see the list of dicts.
+
+Fields ESI sometimes leaves out (range, min_volume, quantity, the
+history values) fall back to the same defaults as the dict path, record
+by record, but only for pages where a fast lookup actually hit a missing
+key.
+
+Usage:
+    rows = decode_orders(body)                        # ORDER_FIELDS tuples
+    rows = decode_orders(body, location_id=60003760)  # one station only
+    rows = decode_history(body, type_id, region_id, since='2024-01-01')
+
+    # Through the ESI client: on_page receives decoded rows
+    await esi.stream_pages(path, params, on_page, decode=decode_orders)
+    loader.load_rows(rows)
+"""
+
+import json
+from bisect import bisect_left
+from operator import itemgetter
+
+try:
+    import orjson
+    loads = orjson.loads
+    PARSER = 'orjson'
+except ImportError:
+    # Same results, roughly 2-3x the CPU time per page
+    loads = json.loads
+    PARSER = 'json'
+
+# ============================================
+# COLUMN ORDER
+# ============================================
+
+# Market orders, as staged by order_loader (region_id and last_updated are
+# the same for a whole run, so the loader supplies them)
+ORDER_FIELDS = (
+    'order_id', 'type_id', 'location_id', 'is_buy_order', 'price', 'volume_remain',
+    'volume_total', 'issued', 'duration', 'range', 'min_volume',
+)
+ORDER_LOCATION = ORDER_FIELDS.index('location_id')
+
+# Daily market history, prefixed with (type_id, region_id)
+HISTORY_FIELDS = ('date', 'average', 'highest', 'lowest', 'order_count', 'volume')
+
+# Character / corporation assets
+ASSET_FIELDS = ('item_id', 'type_id', 'location_id', 'location_flag', 'quantity', 'is_singleton')
+
+_order_row = itemgetter(*ORDER_FIELDS)
+_history_row = itemgetter(*HISTORY_FIELDS)
+_asset_row = itemgetter(*ASSET_FIELDS)
+
+# ============================================
+# FALLBACKS (records with missing fields)
+# ============================================
+
+def _order_row_lenient(order):
+    return (
+        order['order_id'],
+        order['type_id'],
+        order['location_id'],
+        order['is_buy_order'],
+        order['price'],
+        order['volume_remain'],
+        order['volume_total'],
+        order['issued'],
+        order['duration'],
+        order.get('range', 'station'),
+        order.get('min_volume', 1),
+    )
+
+
+def _history_row_lenient(record):
+    return (
+        record['date'],
+        record.get('average'),
+        record.get('highest'),
+        record.get('lowest'),
+        record.get('order_count'),
+        record.get('volume'),
+    )
+
+
+def _asset_row_lenient(asset):
+    return (
+        asset['item_id'],
+        asset['type_id'],
+        asset['location_id'],
+        asset['location_flag'],
+        asset.get('quantity', 1),
+        asset['is_singleton'],
+    )
+
+
+def _rows(records, getter, lenient):
+    """Map records through the C getter; redo the page leniently on a missing key."""
+    try:
+        return list(map(getter, records))
+    except KeyError:
+        return list(map(lenient, records))
+
+# ============================================
+# ORDERS
+# ============================================
+
+def order_rows(records, location_id=None):
+    """
+    ORDER_FIELDS tuples for a decoded order page, optionally only the
+    orders at one location. is_buy_order stays a bool (sqlite3 stores it
+    as 0/1).
+    """
+    if location_id is not None:
+        records = [order for order in records if order['location_id'] == location_id]
+    return _rows(records, _order_row, _order_row_lenient)
+
+
+def decode_orders(body, location_id=None):
+    """Raw /markets/{region}/orders/ or /markets/structures/{id}/ page -> ORDER_FIELDS tuples."""
+    return order_rows(loads(body), location_id)
+
+# ============================================
+# HISTORY
+# ============================================
+
+def history_rows(records, type_id, region_id, since=None):
+    """
+    (type_id, region_id, *HISTORY_FIELDS) tuples for a decoded history
+    array, optionally only the days on or after `since` (YYYY-MM-DD).
+    ESI returns the days oldest first, so the window is a bisect away.
+    """
+    if since is not None:
+        records = records[bisect_left(records, since, key=itemgetter('date')):]
+    prefix = (type_id, region_id)
+    return [prefix + row for row in _rows(records, _history_row, _history_row_lenient)]
+
+
+def decode_history(body, type_id, region_id, since=None):
+    """Raw /markets/{region}/history/ response -> history tuples."""
+    return history_rows(loads(body), type_id, region_id, since)
+
+# ============================================
+# ASSETS
+# ============================================
+
+def asset_rows(records, location_id=None, location_flag=None):
+    """ASSET_FIELDS tuples for a decoded asset page, optionally filtered by location and flag."""
+    if location_id is not None:
+        records = [asset for asset in records if asset['location_id'] == location_id]
+    if location_flag is not None:
+        records = [asset for asset in records if asset['location_flag'] == location_flag]
+    return _rows(records, _asset_row, _asset_row_lenient)
+
+
+def decode_assets(body, location_id=None, location_flag=None):
+    """Raw /characters/{id}/assets/ page -> ASSET_FIELDS tuples."""
+    return asset_rows(loads(body), location_id, location_flag)
@@ -0,0 +1,611 @@
+"""
+esi_simulator.py
+
+Local stand-in for ESI, for offline and replayable load testing of the
+fetch scripts.
+
+Serves deterministic synthetic responses (or recorded ones, see --replay /
+--record) for the endpoints the fetchers use:
+
+    /markets/{region_id}/orders/               paginated, order_type / type_id filters
+    /markets/structures/{structure_id}/        paginated
+    /markets/{region_id}/history/?type_id=     400 days, 404 for unknown types
+    /characters|corporations/{id}/assets/      paginated
+    /characters/{id}/blueprints/               paginated
+    /characters/{id}/orders/, /orders/history/
+    /characters/{id}/wallet/transactions/, /wallet/journal/, /industry/jobs/
+    /contracts/public/{region_id}/             paginated
+    /contracts/public/items/{contract_id}/
+    /universe/types/, /universe/types/{type_id}/, /universe/groups/{id}/,
+    /universe/categories/{id}/, /markets/groups/{id}/
+    /verify/                                   token check used by the structure fetchers
+
+and behaves like ESI where it matters for throughput and retry logic:
+
+  - X-Pages on paginated routes, 404 past the last page
+  - ETag / Expires / Last-Modified, and 304 for a matching If-None-Match
+  - X-ESI-Error-Limit-Remain / -Reset on every response; every 4xx/5xx
+    spends the budget and an exhausted budget answers 420 until the
+    window resets
+  - configurable latency + jitter, random 5xx (--error-rate), hung
+    requests (--hang-rate) and a requests/second cap answered with 429
+
+Point the fetchers at it with the ESI_BASE_URL / ESI_VERIFY_URL
+environment variables (printed on start-up), or --esi-base-url on
+update_market_orders.py and market_history_ingest.py. Request counters
+are at /_simulator/stats and /_simulator/reset.
+
+Recording: --record DIR --upstream https://esi.evetech.net proxies every
+request the simulator has no recording for to the real ESI and saves the
+response under DIR (Authorization is forwarded, never stored). --replay DIR
+serves those files first and falls back to synthetic data.
+
+Usage:
+    python esi_simulator.py                                     # http://127.0.0.1:8765/latest
+    python esi_simulator.py --latency 0.2 --error-rate 0.02
+    python esi_simulator.py --record esi_recordings --upstream https://esi.evetech.net
+    python esi_simulator.py --replay esi_recordings
+"""
+
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import math
+import random
+import re
+import time
+import zlib
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from email.utils import formatdate
+from functools import lru_cache
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────────
+
+DEFAULT_PORT = 8765
+
+PAGE_SIZE = 1000
+
+JITA = 60003760
+THE_FORGE = 10000002
+CHARACTER_ID = 2114278577
+
+# Query parameters that don't change the response (auth, cache busting)
+IGNORED_PARAMS = {'datasource', 'token', 'language'}
+
+RETRYABLE_ERRORS = (500, 502, 503, 504)
+
+# ─── SYNTHETIC DATA ───────────────────────────────────────────────────────────
+
+class SyntheticESI:
+    """
+    Deterministic responses: every (route, ids, page) is generated from
+    its own seeded RNG, so the same request always returns the same body
+    and ETag - across restarts too.
+    """
+
+    def __init__(self, seed=1, types=4000, order_pages=380, structure_pages=8, contracts=3000,
+                 assets=5000, blueprints=1000, journal_pages=5):
+        self.seed = seed
+        self.types = types
+        self.order_pages = order_pages
+        self.structure_pages = structure_pages
+        self.contracts = contracts
+        self.assets = assets
+        self.blueprints = blueprints
+        self.journal_pages = journal_pages
+        self.popularity = list(itertools.accumulate(1 / (rank + 1) ** 0.8 for rank in range(types)))
+
+        # Route table: (pattern, handler). Handlers return (pages, body) or None for 404.
+        self.routes = [
+            (r'/markets/structures/(\d+)/', self.structure_orders),
+            (r'/markets/groups/(\d+)/', self.market_group),
+            (r'/markets/(\d+)/orders/', self.region_orders),
+            (r'/markets/(\d+)/history/', self.history),
+            (r'/(characters|corporations)/(\d+)/assets/', self.assets_page),
+            (r'/characters/(\d+)/blueprints/', self.blueprints_page),
+            (r'/characters/(\d+)/orders/history/', self.character_order_history),
+            (r'/characters/(\d+)/orders/', self.character_orders),
+            (r'/characters/(\d+)/wallet/transactions/', self.wallet_transactions),
+            (r'/characters/(\d+)/wallet/journal/', self.wallet_journal),
+            (r'/characters/(\d+)/industry/jobs/', self.industry_jobs),
+            (r'/contracts/public/items/(\d+)/', self.contract_items),
+            (r'/contracts/public/(\d+)/', self.public_contracts),
+            (r'/universe/types/', self.type_ids),
+            (r'/universe/types/(\d+)/', self.universe_type),
+            (r'/universe/groups/(\d+)/', self.universe_group),
+            (r'/universe/categories/(\d+)/', self.universe_category),
+        ]
+        self.routes = [(re.compile(pattern + '$'), handler) for pattern, handler in self.routes]
+
+    def rng(self, *key):
+        return random.Random(zlib.crc32(repr((self.seed, *key)).encode()))
+
+    def base_price(self, type_id):
+        return math.exp(self.rng('price', type_id).uniform(0, math.log(5e9)))
+
+    def popular_types(self, rng, count):
+        """Zipf-ish: low type_ids carry most of the book, like the fixtures."""
+        return rng.choices(range(1, self.types + 1), cum_weights=self.popularity, k=count)
+
+    def respond(self, path, params, page):
+        """(pages, body) for a request path (after the version prefix), or None for 404."""
+        for pattern, handler in self.routes:
+            match = pattern.match(path)
+            if match:
+                return handler(*match.groups(), params=params, page=page)
+        return None
+
+    # ── markets ──
+
+    def make_order(self, rng, order_id, type_id, location_id, system_id, is_buy=None):
+        if is_buy is None:
+            is_buy = rng.random() < 0.45
+        base = self.base_price(type_id)
+        volume_total = rng.choice((1, 1, 5, 10, 100, 1000, 100_000))
+        issued = datetime(2026, 10, 1, tzinfo=timezone.utc) - timedelta(seconds=rng.randint(0, 90 * 86400))
+        return {
+            'order_id': order_id, 'type_id': type_id, 'location_id': location_id, 'system_id': system_id,
+            'is_buy_order': is_buy,
+            'price': round(base * (rng.uniform(0.6, 0.99) if is_buy else rng.uniform(1.01, 1.6)), 2),
+            'volume_remain': rng.randint(1, volume_total), 'volume_total': volume_total,
+            'issued': issued.strftime('%Y-%m-%dT%H:%M:%SZ'), 'duration': rng.choice((30, 90, 90, 90)),
+            'range': rng.choice(('station', 'region', 'solarsystem')) if is_buy else 'region',
+            'min_volume': 1,
+        }
+
+    def region_orders(self, region_id, params, page):
+        region_id = int(region_id)
+        order_type = params.get('order_type', 'all')
+        wanted = {'buy': True, 'sell': False}.get(order_type)
+
+        if 'type_id' in params:
+            type_id = int(params['type_id'])
+            if not 1 <= type_id <= self.types:
+                return 1, []
+            rng = self.rng('type_orders', region_id, type_id)
+            orders = [
+                self.make_order(rng, 3_000_000_000 + type_id * 1000 + n, type_id,
+                                JITA if rng.random() < 0.55 else 60000000 + rng.randint(1, 40), 30000142)
+                for n in range(rng.randint(5, 200))
+            ]
+            return 1, [o for o in orders if wanted is None or o['is_buy_order'] == wanted]
+
+        if page > self.order_pages:
+            return None
+        rng = self.rng('orders', region_id, page)
+        first_id = 6_000_000_000 + page * PAGE_SIZE
+        orders = []
+        for n, type_id in enumerate(self.popular_types(rng, PAGE_SIZE)):
+            location_id = JITA if rng.random() < 0.55 else 60000000 + rng.randint(1, 40)
+            order = self.make_order(rng, first_id + n, type_id, location_id, 30000142)
+            if wanted is None or order['is_buy_order'] == wanted:
+                orders.append(order)
+        return self.order_pages, orders
+
+    def structure_orders(self, structure_id, params, page):
+        if page > self.structure_pages:
+            return None
+        structure_id = int(structure_id)
+        rng = self.rng('structure_orders', structure_id, page)
+        first_id = 7_000_000_000 + page * PAGE_SIZE
+        orders = [
+            self.make_order(rng, first_id + n, type_id, structure_id, 30004759)
+            for n, type_id in enumerate(self.popular_types(rng, PAGE_SIZE))
+        ]
+        for order in orders:
+            del order['system_id']
+        return self.structure_pages, orders
+
+    def history(self, region_id, params, page):
+        type_id = int(params.get('type_id', 0))
+        if not 1 <= type_id <= self.types:
+            return None
+        rng = self.rng('history', int(region_id), type_id)
+        price = self.base_price(type_id)
+        volume = max(1, int(1e6 / math.sqrt(price)))
+        end = date.today() - timedelta(days=1)
+        rows = []
+        for days_ago in range(400, -1, -1):
+            price *= rng.uniform(0.97, 1.03)
+            rows.append({
+                'date': (end - timedelta(days=days_ago)).isoformat(),
+                'average': round(price, 2), 'highest': round(price * 1.05, 2), 'lowest': round(price * 0.95, 2),
+                'order_count': rng.randint(1, 500), 'volume': rng.randint(0, volume * 2),
+            })
+        return 1, rows
+
+    def market_group(self, group_id, params, page):
+        group_id = int(group_id)
+        return 1, {
+            'market_group_id': group_id, 'name': f"Market Group {group_id}", 'description': '',
+            'parent_group_id': None if group_id <= 15 else group_id % 15 + 1,
+            'types': [t for t in range(1, self.types + 1) if t % 150 + 1 == group_id],
+        }
+
+    # ── character / corporation ──
+
+    def paginate(self, total, page, make):
+        pages = max(1, math.ceil(total / PAGE_SIZE))
+        if page > pages:
+            return None
+        start = (page - 1) * PAGE_SIZE
+        return pages, [make(n) for n in range(start, min(total, start + PAGE_SIZE))]
+
+    def assets_page(self, owner_kind, owner_id, params, page):
+        rng = self.rng('assets', owner_kind, int(owner_id), page)
+        return self.paginate(self.assets, page, lambda n: {
+            'item_id': 1_000_000_000_000 + n, 'type_id': self.popular_types(rng, 1)[0],
+            'location_id': rng.choice((JITA, 1027625808467, 1051346234914)),
+            'location_flag': 'Hangar', 'location_type': 'item' if n % 3 else 'station',
+            'quantity': rng.randint(1, 100_000), 'is_singleton': False,
+        })
+
+    def blueprints_page(self, character_id, params, page):
+        rng = self.rng('blueprints', int(character_id), page)
+        return self.paginate(self.blueprints, page, lambda n: {
+            'item_id': 1_100_000_000_000 + n, 'type_id': rng.randint(1, self.types),
+            'location_id': 1027625808467, 'location_flag': 'Hangar',
+            'quantity': -1 if n % 2 else -2, 'time_efficiency': rng.choice((0, 10, 20)),
+            'material_efficiency': rng.choice((0, 5, 10)), 'runs': -1 if n % 2 else rng.randint(1, 10),
+        })
+
+    def character_orders(self, character_id, params, page):
+        rng = self.rng('character_orders', int(character_id))
+        orders = []
+        for n in range(50):
+            order = self.make_order(rng, 5_000_000_000 + n, rng.randint(1, 500), JITA, 30000142)
+            order.update(region_id=THE_FORGE, is_corporation=False, escrow=None)
+            del order['system_id']
+            orders.append(order)
+        return 1, orders
+
+    def character_order_history(self, character_id, params, page):
+        rng = self.rng('character_order_history', int(character_id), page)
+        result = self.paginate(2 * PAGE_SIZE, page, lambda n: dict(
+            self.make_order(rng, 4_000_000_000 + n, rng.randint(1, 500), JITA, 30000142),
+            region_id=THE_FORGE, is_corporation=False, state=rng.choice(('expired', 'cancelled')),
+        ))
+        return result
+
+    def wallet_transactions(self, character_id, params, page):
+        rng = self.rng('transactions', int(character_id), params.get('from_id'))
+        now = datetime(2026, 10, 1, tzinfo=timezone.utc)
+        rows = []
+        for n in range(2500):
+            type_id = self.popular_types(rng, 1)[0]
+            rows.append({
+                'transaction_id': 6_000_000_000 - n,
+                'date': (now - timedelta(minutes=n * 17)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'type_id': type_id, 'location_id': JITA, 'quantity': rng.randint(1, 1000),
+                'unit_price': round(self.base_price(type_id) * rng.uniform(0.9, 1.1), 2),
+                'client_id': 90_000_000 + rng.randint(0, 5000), 'is_buy': rng.random() < 0.5,
+                'is_personal': True, 'journal_ref_id': 20_000_000_000 - n,
+            })
+        return 1, rows
+
+    def wallet_journal(self, character_id, params, page):
+        if page > self.journal_pages:
+            return None
+        rng = self.rng('journal', int(character_id), page)
+        now = datetime(2026, 10, 1, tzinfo=timezone.utc)
+        start = (page - 1) * PAGE_SIZE
+        return self.journal_pages, [{
+            'id': 20_000_000_000 - n,
+            'date': (now - timedelta(minutes=n * 7)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'ref_type': rng.choice(('market_transaction', 'brokers_fee', 'transaction_tax')),
+            'amount': round(rng.uniform(-1e9, 1e9), 2), 'balance': round(rng.uniform(0, 1e11), 2),
+            'description': 'Simulated', 'first_party_id': int(character_id), 'second_party_id': 1000132,
+        } for n in range(start, start + PAGE_SIZE)]
+
+    def industry_jobs(self, character_id, params, page):
+        rng = self.rng('jobs', int(character_id))
+        return 1, [{
+            'job_id': 500_000_000 + n, 'installer_id': int(character_id), 'activity_id': rng.choice((1, 3, 4)),
+            'blueprint_id': 1_100_000_000_000 + n, 'blueprint_type_id': rng.randint(1, self.types),
+            'status': 'active', 'runs': 1, 'duration': 86400, 'facility_id': 1027625808467,
+            'start_date': '2026-10-01T00:00:00Z', 'end_date': '2026-10-02T00:00:00Z',
+        } for n in range(10)]
+
+    # ── contracts ──
+
+    def public_contracts(self, region_id, params, page):
+        rng = self.rng('contracts', int(region_id), page)
+        now = datetime(2026, 10, 1, tzinfo=timezone.utc)
+        return self.paginate(self.contracts, page, lambda n: {
+            'contract_id': 200_000_000 + n, 'type': rng.choice(('item_exchange', 'item_exchange', 'auction', 'courier')),
+            'price': round(rng.uniform(1e5, 5e9), 2), 'reward': 0.0, 'collateral': 0.0,
+            'volume': round(rng.uniform(1, 300_000), 2), 'issuer_id': 90_000_000 + n % 5000,
+            'issuer_corporation_id': 98_000_000 + n % 500, 'for_corporation': False,
+            'date_issued': (now - timedelta(hours=n % 500)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'date_expired': (now + timedelta(days=14)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'start_location_id': JITA, 'end_location_id': JITA, 'title': '', 'days_to_complete': 0,
+        })
+
+    def contract_items(self, contract_id, params, page):
+        rng = self.rng('contract_items', int(contract_id))
+        return 1, [{
+            'record_id': int(contract_id) * 100 + n, 'type_id': self.popular_types(rng, 1)[0],
+            'quantity': rng.randint(1, 100), 'is_included': True, 'is_singleton': False,
+        } for n in range(rng.randint(1, 10))]
+
+    # ── universe ──
+
+    def type_ids(self, params=None, page=1):
+        pages = max(1, math.ceil(self.types / PAGE_SIZE))
+        if page > pages:
+            return None
+        start = (page - 1) * PAGE_SIZE + 1
+        return pages, list(range(start, min(self.types, start + PAGE_SIZE - 1) + 1))
+
+    def universe_type(self, type_id, params, page):
+        type_id = int(type_id)
+        if not 1 <= type_id <= self.types:
+            return None
+        rng = self.rng('type', type_id)
+        volume = round(math.exp(rng.uniform(math.log(0.01), math.log(5000))), 2)
+        return 1, {
+            'type_id': type_id, 'name': f"Item {type_id}", 'description': '', 'published': True,
+            'group_id': type_id % 200 + 1, 'market_group_id': type_id % 150 + 1,
+            'volume': volume, 'packaged_volume': volume, 'mass': 1.0, 'capacity': 0.0, 'portion_size': 1,
+        }
+
+    def universe_group(self, group_id, params, page):
+        group_id = int(group_id)
+        return 1, {
+            'group_id': group_id, 'name': f"Group {group_id}", 'category_id': group_id % 10 + 1,
+            'published': True, 'types': [t for t in range(1, self.types + 1) if t % 200 + 1 == group_id],
+        }
+
+    def universe_category(self, category_id, params, page):
+        category_id = int(category_id)
+        return 1, {
+            'category_id': category_id, 'name': f"Category {category_id}", 'published': True,
+            'groups': [g for g in range(1, 201) if g % 10 + 1 == category_id],
+        }
+
+# ─── RECORDINGS ───────────────────────────────────────────────────────────────
+
+def recording_path(root, path, params, page):
+    """File a response is recorded under: <root>/<path>/<params>page<N>.json"""
+    query = '&'.join(f"{k}={v}" for k, v in sorted(params.items()))
+    slug = re.sub(r'[^A-Za-z0-9=&_.-]', '_', query)
+    return Path(root) / path.strip('/') / f"{slug + '_' if slug else ''}page{page}.json"
+
+
+def load_recording(root, path, params, page):
+    """(status, headers, body bytes) from a recording, or None."""
+    file = recording_path(root, path, params, page)
+    if not file.exists():
+        return None
+    saved = json.loads(file.read_text(encoding='utf-8'))
+    return saved['status'], saved.get('headers', {}), json.dumps(saved['body']).encode()
+
+
+def save_recording(root, path, params, page, status, headers, body):
+    file = recording_path(root, path, params, page)
+    file.parent.mkdir(parents=True, exist_ok=True)
+    kept = {k: v for k, v in headers.items() if k in ('X-Pages', 'Last-Modified')}
+    file.write_text(json.dumps({'status': status, 'headers': kept, 'body': json.loads(body)}), encoding='utf-8')
+
+# ─── SERVER ───────────────────────────────────────────────────────────────────
+
+class Simulator:
+    """aiohttp handler with ESI's caching, paging and error-limit behaviour."""
+
+    def __init__(self, data, args):
+        self.data = data
+        self.args = args
+        self.stats = Counter()
+        self.routes = Counter()
+        self.started = time.time()
+        self.error_remain = args.error_limit
+        self.error_window_start = time.time()
+        self.rate_window = (int(time.time()), 0)
+        self.upstream = None
+
+        # Bodies are generated once per (path, params, page) and reused
+        self.render = lru_cache(maxsize=2048)(self._render)
+
+    def _render(self, path, params_key, page):
+        result = self.data.respond(path, dict(params_key), page)
+        if result is None:
+            return None
+        pages, body = result
+        return pages, json.dumps(body, separators=(',', ':')).encode()
+
+    # ── ESI behaviours ──
+
+    def error_headers(self):
+        now = time.time()
+        if now - self.error_window_start >= self.args.error_window:
+            self.error_window_start = now
+            self.error_remain = self.args.error_limit
+        reset = max(0, int(self.args.error_window - (now - self.error_window_start)))
+        return {'X-ESI-Error-Limit-Remain': str(max(0, self.error_remain)), 'X-ESI-Error-Limit-Reset': str(reset)}
+
+    def error(self, status, message, extra_headers=None):
+        if status >= 400 and status != 420:
+            self.error_remain -= 1
+        headers = self.error_headers()
+        headers.update(extra_headers or {})
+        self.stats[str(status)] += 1
+        return web.json_response({'error': message}, status=status, headers=headers)
+
+    def over_rate_limit(self):
+        if not self.args.rate_limit:
+            return False
+        second = int(time.time())
+        window, count = self.rate_window
+        count = count + 1 if window == second else 1
+        self.rate_window = (second, count)
+        return count > self.args.rate_limit
+
+    async def handle(self, request):
+        if request.path.startswith('/_simulator/'):
+            return self.control(request)
+
+        # Strip the version prefix: /latest/..., /v1/..., /dev/...
+        match = re.match(r'/(latest|legacy|dev|v\d+)(/.*)$', request.path)
+        path = match.group(2) if match else request.path
+        params = {k: v for k, v in request.query.items() if k not in IGNORED_PARAMS and k != 'page'}
+        try:
+            page = int(request.query.get('page', 1))
+        except ValueError:
+            return self.error(400, 'page must be an integer')
+        self.routes[re.sub(r'\d+', '{id}', path)] += 1
+
+        # Error-limited clients are refused before anything else, like ESI
+        self.error_headers()
+        if self.error_remain <= 0:
+            return self.error(420, 'This software has exceeded the error limit for ESI.')
+        if self.over_rate_limit():
+            return self.error(429, 'Too many requests', {'Retry-After': '1'})
+
+        delay = max(0.0, random.gauss(self.args.latency, self.args.jitter)) if self.args.latency else 0.0
+        if self.args.hang_rate and random.random() < self.args.hang_rate:
+            delay = self.args.hang
+        if delay:
+            await asyncio.sleep(delay)
+
+        if self.args.error_rate and random.random() < self.args.error_rate:
+            return self.error(random.choice(RETRYABLE_ERRORS), 'Simulated failure')
+
+        if path == '/verify/' or request.path.rstrip('/') == '/verify':
+            self.stats['200'] += 1
+            return web.json_response({
+                'CharacterID': CHARACTER_ID, 'CharacterName': 'Simulated Character',
+                'Scopes': ' '.join(self.args.scopes), 'TokenType': 'Character',
+            }, headers=self.error_headers())
+
+        status, headers, payload = await self.lookup(request, path, params, page)
+        if status != 200:
+            return self.error(status, payload.decode() if payload else 'Not found')
+
+        etag = '"%s"' % hashlib.md5(payload).hexdigest()
+        headers = {
+            **headers,
+            **self.error_headers(),
+            'ETag': etag,
+            'Expires': formatdate(time.time() + self.args.expires, usegmt=True),
+            'Last-Modified': formatdate(self.started, usegmt=True),
+            'Cache-Control': 'public',
+        }
+        if request.headers.get('If-None-Match') == etag:
+            self.stats['304'] += 1
+            return web.Response(status=304, headers=headers)
+
+        self.stats['200'] += 1
+        self.stats['bytes'] += len(payload)
+        return web.Response(body=payload, content_type='application/json', headers=headers)
+
+    async def lookup(self, request, path, params, page):
+        """(status, headers, payload): recording, then upstream (recording mode), then synthetic."""
+        for root in filter(None, (self.args.replay, self.args.record)):
+            recorded = load_recording(root, path, params, page)
+            if recorded:
+                return recorded
+
+        if self.args.record and self.args.upstream:
+            return await self.fetch_upstream(request, path, params, page)
+
+        rendered = self.render(path, tuple(sorted(params.items())), page)
+        if rendered is None:
+            return 404, {}, b'Not found'
+        pages, payload = rendered
+        return 200, {'X-Pages': str(pages)}, payload
+
+    async def fetch_upstream(self, request, path, params, page):
+        if self.upstream is None:
+            self.upstream = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60))
+        headers = {k: v for k, v in request.headers.items() if k in ('Authorization', 'Accept-Language')}
+        url = f"{self.args.upstream.rstrip('/')}/latest{path}"
+        async with self.upstream.get(url, params={**params, 'page': page}, headers=headers) as response:
+            body = await response.read()
+            kept = {k: v for k, v in response.headers.items() if k in ('X-Pages', 'Last-Modified')}
+            if response.status == 200:
+                save_recording(self.args.record, path, params, page, 200, kept, body)
+            return response.status, kept, body
+
+    def control(self, request):
+        if request.path.rstrip('/') == '/_simulator/reset':
+            self.stats.clear()
+            self.routes.clear()
+            self.error_remain = self.args.error_limit
+            self.error_window_start = time.time()
+            return web.json_response({'reset': True})
+        return web.json_response({
+            'uptime_s': round(time.time() - self.started, 1),
+            'responses': dict(self.stats),
+            'routes': dict(self.routes.most_common()),
+            'error_limit_remain': self.error_remain,
+        })
+
+    async def close(self, app):
+        if self.upstream is not None:
+            await self.upstream.close()
+
+# ─── MAIN ─────────────────────────────────────────────────────────────────────
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Local ESI simulator for offline load testing.")
+    parser.add_argument("--host",            default='127.0.0.1')
+    parser.add_argument("--port",            type=int,   default=DEFAULT_PORT)
+    parser.add_argument("--seed",            type=int,   default=1,     help="Seed for synthetic data")
+    parser.add_argument("--latency",         type=float, default=0.05,  help="Mean response latency in seconds")
+    parser.add_argument("--jitter",          type=float, default=0.02,  help="Latency standard deviation in seconds")
+    parser.add_argument("--error-rate",      type=float, default=0.0,   help="Fraction of requests answered with a random 5xx")
+    parser.add_argument("--hang-rate",       type=float, default=0.0,   help="Fraction of requests that stall for --hang seconds")
+    parser.add_argument("--hang",            type=float, default=60.0,  help="Stall length for --hang-rate")
+    parser.add_argument("--rate-limit",      type=int,   default=0,     help="Requests per second before 429s (0 = off)")
+    parser.add_argument("--error-limit",     type=int,   default=100,   help="Errors allowed per window before 420s")
+    parser.add_argument("--error-window",    type=int,   default=60,    help="Error-limit window in seconds")
+    parser.add_argument("--expires",         type=int,   default=300,   help="Seconds until responses expire")
+    parser.add_argument("--types",           type=int,   default=4000,  help="Number of synthetic type_ids")
+    parser.add_argument("--order-pages",     type=int,   default=380,   help="Pages per region order book (1000 orders each)")
+    parser.add_argument("--structure-pages", type=int,   default=8,     help="Pages per structure order book")
+    parser.add_argument("--scopes",          nargs='+',  default=['esi-markets.structure_markets.v1'],
+                        help="Scopes reported by /verify/")
+    parser.add_argument("--replay",          type=str,   default=None,  help="Serve recorded responses from this directory first")
+    parser.add_argument("--record",          type=str,   default=None,  help="Save upstream responses to this directory")
+    parser.add_argument("--upstream",        type=str,   default=None,  help="Real ESI root to record from, e.g. https://esi.evetech.net")
+    args = parser.parse_args()
+    if args.record and not args.upstream:
+        parser.error("--record needs --upstream")
+    return args
+
+
+def main():
+    args = parse_args()
+    data = SyntheticESI(seed=args.seed, types=args.types, order_pages=args.order_pages,
+                        structure_pages=args.structure_pages)
+    simulator = Simulator(data, args)
+
+    app = web.Application()
+    app.router.add_route('*', '/{tail:.*}', simulator.handle)
+    app.on_cleanup.append(simulator.close)
+
+    root = f"http://{args.host}:{args.port}"
+    print(f"\n  ESI simulator on {root}")
+    print(f"  latency {args.latency * 1000:.0f}±{args.jitter * 1000:.0f} ms, error rate {args.error_rate:.1%}, "
+          f"error limit {args.error_limit}/{args.error_window}s"
+          + (f", {args.rate_limit} req/s" if args.rate_limit else ''))
+    if args.replay:
+        print(f"  replaying {args.replay}")
+    if args.record:
+        print(f"  recording {args.upstream} -> {args.record}")
+    print(f"\n  export ESI_BASE_URL={root}/latest")
+    print(f"  export ESI_VERIFY_URL={root}/verify/")
+    print(f"  stats: {root}/_simulator/stats\n")
+
+    web.run_app(app, host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
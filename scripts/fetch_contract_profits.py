@@ -13,15 +13,16 @@ sys.path.insert(0, SCRIPT_DIR)
 
 import requests
 import sqlite3
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 from token_manager import get_token, character_id
+from price_averages import get_price_average
 
 # ============================================
 # CONFIGURATION
 # ============================================
 PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
 DB_PATH = os.path.join(PROJECT_DIR, 'mydatabase.db')
-ESI_BASE_URL = 'https://esi.evetech.net/latest'
+ESI_BASE_URL = os.environ.get('ESI_BASE_URL', 'https://esi.evetech.net/latest')
 
 
 def create_table(conn):
@@ -118,7 +119,7 @@ def get_item_name(conn, type_id):
 def get_avg_buy_cost(conn, type_id):
     """
     Get weighted average buy price from wallet_transactions (last 90 days).
-    Falls back to market_price_snapshots if no buy history.
+    Falls back to the cached 7-day Jita average if no buy history.
     """
     # Try wallet buy history first (90-day window)
     row = conn.execute("""
@@ -131,16 +132,11 @@ def get_avg_buy_cost(conn, type_id):
     if row and row[0] is not None and row[1] > 0:
         return row[0], 'buy_history'
 
-    # Fall back to 7-day avg Jita buy from snapshots
-    seven_days_ago = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
-    row = conn.execute("""
-        SELECT AVG(best_buy) as avg_buy
-        FROM market_price_snapshots
-        WHERE type_id = ? AND timestamp >= ? AND best_buy IS NOT NULL
-    """, (type_id, seven_days_ago)).fetchone()
+    # Fall back to 7-day avg Jita buy from the price_averages cache
+    averages = get_price_average(conn, type_id, 7)
 
-    if row and row[0] is not None:
-        return row[0], 'jita_avg'
+    if averages and averages['avg_buy'] is not None:
+        return averages['avg_buy'], 'jita_avg'
 
     return 0, 'unknown'
 
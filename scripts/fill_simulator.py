@@ -0,0 +1,198 @@
+"""
+fill_simulator.py
+
+Depth-aware pricing: what a quantity actually costs (or fetches) when it
+walks the order book, instead of the single best price.
+
+market_book_levels (top_of_book.py) holds every price level of each book,
+best first, with the running volume and ISK value through each level, and
+is rebuilt with the book at every market refresh. Pricing a fill is then a
+seek rather than a walk: the first level whose cum_volume reaches the
+quantity is the marginal level, and
+
+    value = cum_value of the level before + (quantity - its cum_volume) * price
+
+All the lines of a quote go through one query.
+
+Each fill is a dict:
+    type_id, quantity
+    filled          units the book can supply
+    shortfall       units beyond the whole side of the book
+    value           ISK for the filled units
+    fill_price      volume-weighted average price of the filled units
+    marginal_price  price of the last level touched
+    best_price      price of the first level
+    levels          price levels consumed
+    slippage_pct    fill_price against best_price (positive = worse)
+
+side is what you are doing: 'buy' walks the sell orders (lowest first),
+'sell' walks the buy orders (highest first).
+
+Usage:
+    fill = simulate_fill(conn, 34, 5_000_000)                  # buy Tritanium
+    fill = simulate_fill(conn, 34, 5_000_000, side='sell')     # dump it into buy orders
+    fills = simulate_fills(conn, [(34, 5_000_000), (35, 1_000_000)])
+
+    python fill_simulator.py --type 34 --quantity 5000000 [--side sell]
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = SCRIPT_DIR.parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from script_utils import timed_script
+import db
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────────
+
+DB_PATH = str(PROJECT_DIR / 'mydatabase.db')
+
+JITA_STATION_ID = 60003760
+
+# is_buy_order of the orders each side consumes
+BOOK_SIDES = {'buy': 0, 'sell': 1}
+
+# ─── SIMULATION ───────────────────────────────────────────────────────────────
+
+FILL_SQL = """
+    WITH lines AS (
+        SELECT
+            key                         AS line,
+            json_extract(value, '$[0]') AS type_id,
+            json_extract(value, '$[1]') AS quantity
+        FROM json_each(:lines)
+    )
+    SELECT
+        l.line, fill.level, fill.price, fill.cum_volume,
+        COALESCE(prev.cum_volume, 0), COALESCE(prev.cum_value, 0.0), best.price
+    FROM lines l
+    LEFT JOIN market_book_levels fill
+        ON  fill.location_id  = :location_id
+        AND fill.type_id      = l.type_id
+        AND fill.is_buy_order = :is_buy_order
+        AND fill.level = COALESCE(
+            -- marginal level: the first one deep enough for the quantity
+            (SELECT level FROM market_book_levels
+             WHERE location_id = :location_id AND type_id = l.type_id
+               AND is_buy_order = :is_buy_order AND cum_volume >= l.quantity
+             ORDER BY level LIMIT 1),
+            -- otherwise the whole side, and the rest is shortfall
+            (SELECT level FROM market_book_levels
+             WHERE location_id = :location_id AND type_id = l.type_id
+               AND is_buy_order = :is_buy_order
+             ORDER BY level DESC LIMIT 1)
+        )
+    LEFT JOIN market_book_levels prev
+        ON  prev.location_id  = :location_id
+        AND prev.type_id      = l.type_id
+        AND prev.is_buy_order = :is_buy_order
+        AND prev.level        = fill.level - 1
+    LEFT JOIN market_book_levels best
+        ON  best.location_id  = :location_id
+        AND best.type_id      = l.type_id
+        AND best.is_buy_order = :is_buy_order
+        AND best.level        = 1
+"""
+
+
+def build_fill(type_id, quantity, side, level, price, cum_volume, prev_volume, prev_value, best_price):
+    """
+    Fill dict for one line from its marginal level and the running totals
+    before it (level None = no orders on that side).
+    """
+    if level is None:
+        return {
+            'type_id': type_id, 'quantity': quantity, 'filled': 0, 'shortfall': quantity,
+            'value': 0.0, 'fill_price': None, 'marginal_price': None, 'best_price': None,
+            'levels': 0, 'slippage_pct': None,
+        }
+
+    filled = min(quantity, cum_volume)
+    value = prev_value + (filled - prev_volume) * price
+    fill_price = value / filled if filled > 0 else None
+    slippage_pct = None
+    if fill_price is not None and best_price:
+        slippage_pct = (fill_price - best_price) / best_price * 100
+        if side == 'sell':
+            slippage_pct = -slippage_pct
+
+    return {
+        'type_id': type_id,
+        'quantity': quantity,
+        'filled': filled,
+        'shortfall': quantity - filled,
+        'value': value,
+        'fill_price': fill_price,
+        'marginal_price': price,
+        'best_price': best_price,
+        'levels': level,
+        'slippage_pct': slippage_pct,
+    }
+
+
+def simulate_fills(conn, lines, side='buy', location_id=JITA_STATION_ID):
+    """
+    Walk the book for many (type_id, quantity) lines in one query.
+    Returns fill dicts in the same order as `lines`.
+    """
+    if side not in BOOK_SIDES:
+        raise ValueError(f"side must be 'buy' or 'sell', not {side!r}")
+    lines = [(int(type_id), quantity) for type_id, quantity in lines]
+    if not lines:
+        return []
+
+    cursor = conn.execute(FILL_SQL, {
+        'lines': json.dumps(lines),
+        'location_id': location_id,
+        'is_buy_order': BOOK_SIDES[side],
+    })
+    fills = [None] * len(lines)
+    for line, *level_row in cursor:
+        fills[line] = build_fill(*lines[line], side, *level_row)
+    return fills
+
+
+def simulate_fill(conn, type_id, quantity, side='buy', location_id=JITA_STATION_ID):
+    """Walk the book for one type. Returns a fill dict."""
+    return simulate_fills(conn, [(type_id, quantity)], side, location_id)[0]
+
+# ─── MAIN ─────────────────────────────────────────────────────────────────────
+
+@timed_script
+def main():
+    parser = argparse.ArgumentParser(
+        description="Price a quantity against the full depth of the order book."
+    )
+    parser.add_argument("--type",     type=int,   required=True,          help="type_id to price")
+    parser.add_argument("--quantity", type=int,   required=True,          help="Units to buy or sell")
+    parser.add_argument("--side",     choices=sorted(BOOK_SIDES), default='buy',
+                        help="buy = take sell orders, sell = hit buy orders (default: buy)")
+    parser.add_argument("--location", type=int,   default=JITA_STATION_ID, help="Station / structure ID (default: Jita 4-4)")
+    args = parser.parse_args()
+
+    conn = db.connect(DB_PATH)
+    fill = simulate_fill(conn, args.type, args.quantity, args.side, args.location)
+    conn.close()
+
+    if fill['levels'] == 0:
+        print(f"\n  [WARNING] No {'sell' if args.side == 'buy' else 'buy'} orders for type {args.type} at {args.location}\n")
+        return
+
+    print(f"\n  {args.side.title()} {fill['quantity']:,} x type {args.type} @ {args.location}")
+    print(f"    Filled:         {fill['filled']:>18,}")
+    print(f"    Shortfall:      {fill['shortfall']:>18,}")
+    print(f"    Levels used:    {fill['levels']:>18,}")
+    print(f"    Best price:     {fill['best_price']:>18,.2f}")
+    print(f"    Fill price:     {fill['fill_price'] or 0:>18,.2f}  (VWAP)")
+    print(f"    Marginal price: {fill['marginal_price']:>18,.2f}")
+    print(f"    Slippage:       {fill['slippage_pct'] or 0:>17,.2f}%")
+    print(f"    Total ISK:      {fill['value']:>18,.2f}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -37,11 +37,29 @@ EXAMPLES:
 - Medium margin (2.5-5%): Partial coverage, hit 2.5% target ✅
 - Low margin (<2.5%): Charge full shipping, maximize profit ⚠️
 ==========================================
+
+USAGE:
+  python generate_quote_v4.py                        # interactive
+  python generate_quote_v4.py --batch orders/        # every orders/*.txt -> orders/quotes/
+  python generate_quote_v4.py --serve --port 8780    # POST /quote on localhost
+
+Pricing comes from quote_engine.QuoteEngine, which caches names, prices
+and freight rates between quotes until the next market refresh. Item
+names go through name_resolver: case and spacing don't matter, unique
+prefixes are matched (and reported); typos, ambiguous and unknown names
+are skipped, with the closest item or the candidates listed.
+==========================================
 """
 
-import sqlite3
+import argparse
+import json
 import os
+import traceback
 from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from name_resolver import CONFIDENT, describe
+from quote_engine import get_engine
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
@@ -53,36 +71,13 @@ SHIPPING_BUFFER = 0.10  # 10% safety margin
 # Minimum profit threshold - guarantee at least this % of order value as profit
 MINIMUM_PROFIT_PERCENT = 0.025  # 2.5% of order value
 
+# --serve defaults (local only)
+HTTP_HOST = '127.0.0.1'
+HTTP_PORT = 8780
+
 def get_freight_service(db_path):
     """Get TEST Freight service details from database."""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT 
-            service_name,
-            cost_per_m3,
-            collateral_fee_percent,
-            minimum_reward
-        FROM freighting_services
-        WHERE service_name = 'TEST Freight'
-          AND route_from = 'Jita'
-          AND route_to = 'BWF-ZZ'
-          AND is_active = 1
-    """)
-    
-    result = cursor.fetchone()
-    conn.close()
-    
-    if not result:
-        raise Exception("TEST Freight service not found in database!")
-    
-    return {
-        'name': result[0],
-        'cost_per_m3': result[1],
-        'collateral_fee_percent': result[2],
-        'minimum_reward': result[3]
-    }
+    return get_engine(db_path).freight_service()
 
 def calculate_shipping(total_volume_m3, total_value_isk, freight_service):
     """Calculate total shipping cost: (volume × rate) + (value × collateral%), with minimum."""
@@ -96,155 +91,36 @@ def calculate_shipping(total_volume_m3, total_value_isk, freight_service):
     
     return total_shipping, volume_cost, collateral_cost
 
-def generate_quote(items_list, customer_name="Corp Member"):
-    """Generate a quote with per-item shipping decisions."""
-    
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # Build the order list for SQL
-    order_items = []
-    for i, (item_name, qty) in enumerate(items_list):
-        safe_name = item_name.replace("'", "''")
-        if i == 0:
-            order_items.append(f"SELECT '{safe_name}' AS item_name, {qty} AS quantity")
-        else:
-            order_items.append(f"UNION ALL SELECT '{safe_name}', {qty}")
-    
-    order_list_sql = '\n    '.join(order_items)
-
-    # The quote query
-    query = f"""
-WITH order_list AS (
-    {order_list_sql}
-),
-
-my_fees AS (
-    -- Get YOUR actual trading fees
-    SELECT 
-        broker_fee_percent,
-        sales_tax_percent,
-        buy_cost_multiplier,
-        sell_revenue_multiplier
-    FROM v_my_trading_fees
-    WHERE character_id = 2114278577
-),
-
-jita_prices AS (
-    SELECT
-        it.type_id,
-        it.type_name,
-        COALESCE(st.packaged_volume, it.volume) as volume,
-        MAX(CASE WHEN mo.is_buy_order = 1 THEN mo.price END) as buy_order_price,
-        MIN(CASE WHEN mo.is_buy_order = 0 THEN mo.price END) as sell_order_price,
-        (SELECT broker_fee_percent FROM my_fees) as broker_fee_pct
-    FROM inv_types it
-    LEFT JOIN sde_types st ON st.type_id = it.type_id
-    LEFT JOIN market_orders mo ON mo.type_id = it.type_id
-        AND mo.location_id = 60003760
-        AND mo.region_id = 10000002
-    WHERE it.type_name IN (SELECT item_name FROM order_list)
-    GROUP BY it.type_id, it.type_name, it.volume, st.packaged_volume
-),
-
-bwf_prices AS (
-    SELECT
-        it.type_id,
-        MIN(CASE WHEN bmo.is_buy_order = 0 THEN bmo.price END) as lowest_sell_price
-    FROM inv_types it
-    LEFT JOIN bwf_market_orders bmo ON bmo.type_id = it.type_id
-    WHERE it.type_name IN (SELECT item_name FROM order_list)
-    GROUP BY it.type_id
-),
-
-item_calculations AS (
-    SELECT
-        ol.item_name,
-        ol.quantity,
-        jp.volume,
-        jp.buy_order_price,
-        jp.sell_order_price,
-        jp.broker_fee_pct,
-        
-        -- Customer pays sell price
-        jp.sell_order_price AS customer_price_per_unit,
-        jp.sell_order_price * ol.quantity AS line_total,
-        
-        -- Volume calculations
-        jp.volume * ol.quantity AS total_volume_m3,
-        
-        -- Your gross margin per unit
-        CASE
-            WHEN jp.buy_order_price IS NOT NULL
-            THEN jp.sell_order_price - jp.buy_order_price
-            ELSE NULL
-        END AS gross_margin_per_unit,
-        
-        -- Broker fee amount per unit
-        CASE
-            WHEN jp.buy_order_price IS NOT NULL
-            THEN jp.buy_order_price * (jp.broker_fee_pct / 100.0)
-            ELSE NULL
-        END AS broker_fee_per_unit,
-        
-        -- Your NET margin per unit (after broker fees)
-        CASE
-            WHEN jp.buy_order_price IS NOT NULL
-            THEN (jp.sell_order_price - jp.buy_order_price) - (jp.buy_order_price * jp.broker_fee_pct / 100.0)
-            ELSE NULL
-        END AS net_margin_per_unit,
-        
-        -- Total NET margin for this line
-        CASE
-            WHEN jp.buy_order_price IS NOT NULL
-            THEN ((jp.sell_order_price - jp.buy_order_price) - (jp.buy_order_price * jp.broker_fee_pct / 100.0)) * ol.quantity
-            ELSE NULL
-        END AS net_margin_total,
-        
-        -- Collateral per unit
-        jp.sell_order_price * 0.01 AS collateral_per_unit,
-        (jp.sell_order_price * 0.01) * ol.quantity AS item_collateral,
-        
-        -- BWF comparison
-        bp.lowest_sell_price,
-        bp.lowest_sell_price * ol.quantity AS bwf_total_cost
-        
-    FROM order_list ol
-    JOIN jita_prices jp ON jp.type_name = ol.item_name
-    LEFT JOIN bwf_prices bp ON bp.type_id = jp.type_id
-)
-
-SELECT 
-    item_name,
-    quantity,
-    volume,
-    buy_order_price,
-    sell_order_price,
-    broker_fee_pct,
-    customer_price_per_unit,
-    line_total,
-    total_volume_m3,
-    gross_margin_per_unit,
-    broker_fee_per_unit,
-    net_margin_per_unit,
-    net_margin_total,
-    collateral_per_unit,
-    item_collateral,
-    lowest_sell_price,
-    bwf_total_cost
-FROM item_calculations;
-"""
-    
-    cursor.execute(query)
-    results = cursor.fetchall()
+def generate_quote(items_list, customer_name="Corp Member", engine=None):
+    """
+    Generate a quote with per-item shipping decisions. Pricing comes from
+    a QuoteEngine (the shared one for DB_PATH unless one is passed in).
+    
+    Returns (quote_text, profit_text, receipt_text, grand_total,
+    your_net_profit, resolutions, unpriced), where resolutions is
+    {item_name: resolution} and unpriced lists the resolved items left
+    out for lack of a Jita sell price or volume; None if nothing is quotable.
+    """
+    engine = engine or get_engine(DB_PATH)
+    results, resolutions = engine.quote_rows(items_list)
+    for resolution in resolutions.values():
+        if resolution['match'] == 'prefix':
+            print(f"[INFO] Matched {describe(resolution)}")
+        elif resolution['match'] not in CONFIDENT:
+            print(f"[WARNING] Skipped {describe(resolution)}")
+    
+    # No Jita sell orders (or no volume) -> the line can't be priced
+    unpriced = [row[0] for row in results if row[7] is None or row[8] is None]
+    for item_name in unpriced:
+        print(f"[WARNING] Skipped '{item_name}': no Jita sell price or volume")
+    results = [row for row in results if row[7] is not None and row[8] is not None]
     
     if not results:
         print("[ERROR] No items found in database!")
-        conn.close()
         return None
     
     # Get TEST Freight service details
-    freight_service = get_freight_service(DB_PATH)
+    freight_service = engine.freight_service()
     
     # Calculate totals
     total_items_cost = sum(row[7] for row in results)  # line_total
@@ -701,12 +577,193 @@ FROM item_calculations;
     
     receipt_text = "\n".join(receipt_lines)
 
-    conn.close()
+    return quote_text, profit_text, receipt_text, grand_total, your_net_profit, resolutions, unpriced
 
-    return quote_text, profit_text, receipt_text, grand_total, your_net_profit
 
+# ==========================================
+# ORDER INPUT / OUTPUT
+# ==========================================
 
-def main():
+def parse_order_line(line):
+    """'Item Name, Quantity' -> (item_name, quantity), or None if malformed."""
+    if ',' not in line:
+        return None
+    try:
+        parts = line.rsplit(',', 1)
+        item_name, quantity = parts[0].strip(), int(parts[1].strip())
+    except (ValueError, IndexError):
+        return None
+    return (item_name, quantity) if quantity > 0 else None
+
+def save_quote_files(result, customer_name, out_dir=PROJECT_DIR):
+    """Write the quote, profit and receipt files. Returns their paths."""
+    quote_text, profit_text, receipt_text = result[:3]
+    
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    safe_name = customer_name.replace(' ', '_').replace('/', '_')
+    
+    quote_path = os.path.join(out_dir, f"quote_{safe_name}_{timestamp}.txt")
+    profit_path = os.path.join(out_dir, f"profit_{safe_name}_{timestamp}.txt")
+    receipt_path = os.path.join(out_dir, f"receipt_{safe_name}_{timestamp}.txt")
+    
+    with open(quote_path, 'w', encoding='utf-8') as f:
+        f.write(quote_text)
+    
+    with open(profit_path, 'w', encoding='utf-8') as f:
+        f.write(quote_text)
+        f.write(profit_text)
+    
+    with open(receipt_path, 'w', encoding='utf-8') as f:
+        f.write(receipt_text)
+    
+    return quote_path, profit_path, receipt_path
+
+# ==========================================
+# BATCH MODE
+# ==========================================
+
+def run_batch(order_dir, out_dir=None):
+    """
+    Quote every *.txt order file in order_dir ('Item Name, Quantity' per
+    line; the file name is the customer name). Files are written to
+    out_dir (default: order_dir/quotes). Returns the number of quotes.
+    """
+    out_dir = out_dir or os.path.join(order_dir, 'quotes')
+    os.makedirs(out_dir, exist_ok=True)
+    
+    order_files = sorted(f for f in os.listdir(order_dir) if f.lower().endswith('.txt'))
+    print(f"Quoting {len(order_files)} order file(s) from {order_dir}\n")
+    
+    quoted = 0
+    for filename in order_files:
+        customer_name = os.path.splitext(filename)[0]
+        with open(os.path.join(order_dir, filename), encoding='utf-8') as f:
+            lines = [line.strip() for line in f if line.strip()]
+        
+        items = []
+        for line in lines:
+            item = parse_order_line(line)
+            if item is None:
+                print(f"[SKIP] {filename}: invalid format: {line}")
+            else:
+                items.append(item)
+        
+        result = generate_quote(items, customer_name) if items else None
+        if result is None:
+            print(f"[ERROR] {filename}: no quotable items")
+            continue
+        
+        save_quote_files(result, customer_name, out_dir)
+        quoted += 1
+        print(f"[OK] {filename}: {len(items)} items, total {result[3]:,.2f} ISK, profit {result[4]:,.2f} ISK")
+    
+    print(f"\n[OK] {quoted}/{len(order_files)} quotes written to {out_dir}")
+    return quoted
+
+# ==========================================
+# HTTP MODE
+# ==========================================
+
+class QuoteRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /quote   {"customer": "Name", "items": [["Tritanium", 1000], ...]}
+                  or {"customer": "Name", "order": "Tritanium, 1000\\n..."}
+    GET  /health  engine status
+    """
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/health':
+            self.send_json(404, {'error': 'not found'})
+            return
+        engine = get_engine(DB_PATH)
+        self.send_json(200, {
+            'status': 'ok',
+            'refresh_id': engine.latest_refresh(),
+            'cached_types': len(engine.prices),
+        })
+
+    def do_POST(self):
+        if self.path != '/quote':
+            self.send_json(404, {'error': 'not found'})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            if not isinstance(request, dict):
+                raise ValueError("body must be a JSON object")
+            if 'order' in request:
+                items = [parse_order_line(line) for line in request['order'].splitlines() if line.strip()]
+            else:
+                items = [(str(name), int(qty)) for name, qty in request.get('items', [])]
+                if any(qty <= 0 for _, qty in items):
+                    raise ValueError("quantities must be positive")
+            customer_name = str(request.get('customer') or "Corp Member")
+        except (ValueError, TypeError, AttributeError) as e:
+            self.send_json(400, {'error': f"invalid request: {e}"})
+            return
+        
+        invalid = items.count(None)
+        items = [item for item in items if item is not None]
+        
+        try:
+            result = generate_quote(items, customer_name) if items else None
+        except Exception as e:
+            print(f"[ERROR] Quote for {customer_name} failed: {e}")
+            traceback.print_exc()
+            self.send_json(500, {'error': f"quote failed: {e}"})
+            return
+        if result is None:
+            self.send_json(422, {'error': 'no quotable items', 'invalid_lines': invalid})
+            return
+        
+        quote_text, profit_text, receipt_text, grand_total, your_profit, resolutions, unpriced = result
+        self.send_json(200, {
+            'customer': customer_name,
+            'grand_total': grand_total,
+            'net_profit': your_profit,
+            'quote': quote_text,
+            'profit': profit_text,
+            'receipt': receipt_text,
+            'matched_items': {
+                name: resolution['type_name'] for name, resolution in resolutions.items()
+                if resolution['match'] == 'prefix'
+            },
+            'suggested_items': {
+                name: resolution['type_name'] for name, resolution in resolutions.items()
+                if resolution['match'] == 'fuzzy'
+            },
+            'ambiguous_items': {
+                name: [candidate for _, candidate, _ in resolution['candidates']]
+                for name, resolution in resolutions.items() if resolution['match'] == 'ambiguous'
+            },
+            'unknown_items': [name for name, resolution in resolutions.items() if resolution['match'] == 'unknown'],
+            'unpriced_items': unpriced,
+            'invalid_lines': invalid,
+        })
+
+def serve(host=HTTP_HOST, port=HTTP_PORT):
+    """Serve quotes over HTTP until interrupted (one request at a time)."""
+    server = HTTPServer((host, port), QuoteRequestHandler)
+    print(f"[OK] Quote server on http://{host}:{port}/quote (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+# ==========================================
+# INTERACTIVE MODE
+# ==========================================
+
+def interactive():
     print("=" * 110)
     print("JITA SOURCING SERVICE - QUOTE GENERATOR v4 (Smart Shipping)")
     print("=" * 110)
@@ -753,18 +810,13 @@ def main():
         
         # Parse pasted lines
         for line in lines:
-            if ',' not in line:
+            item = parse_order_line(line)
+            if item is None:
                 print(f"[SKIP] Invalid format: {line}")
                 continue
             
-            try:
-                parts = line.rsplit(',', 1)
-                item_name = parts[0].strip()
-                quantity = int(parts[1].strip())
-                items.append((item_name, quantity))
-                print(f"  [OK] Added: {quantity}x {item_name}")
-            except (ValueError, IndexError):
-                print(f"[SKIP] Invalid format: {line}")
+            items.append(item)
+            print(f"  [OK] Added: {item[1]}x {item[0]}")
     
     else:  # manual mode
         print("\nEnter items one at a time:")
@@ -778,14 +830,13 @@ def main():
                 print("[ERROR] Format should be: Item Name, Quantity")
                 continue
             
-            try:
-                parts = item_input.rsplit(',', 1)
-                item_name = parts[0].strip()
-                quantity = int(parts[1].strip())
-                items.append((item_name, quantity))
-                print(f"  [OK] Added: {quantity}x {item_name}")
-            except (ValueError, IndexError):
+            item = parse_order_line(item_input)
+            if item is None:
                 print("[ERROR] Invalid format. Try again.")
+                continue
+            
+            items.append(item)
+            print(f"  [OK] Added: {item[1]}x {item[0]}")
     
     if not items:
         print("\n[ERROR] No items entered!")
@@ -799,36 +850,17 @@ def main():
     if result is None:
         return
     
-    quote_text, profit_text, receipt_text, grand_total, your_profit = result
+    quote_text, profit_text, receipt_text, grand_total, your_profit = result[:5]
     
     # Save to files
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    safe_name = customer_name.replace(' ', '_').replace('/', '_')
-    
-    quote_filename = f"quote_{safe_name}_{timestamp}.txt"
-    profit_filename = f"profit_{safe_name}_{timestamp}.txt"
-    receipt_filename = f"receipt_{safe_name}_{timestamp}.txt"
-    
-    quote_path = os.path.join(PROJECT_DIR, quote_filename)
-    profit_path = os.path.join(PROJECT_DIR, profit_filename)
-    receipt_path = os.path.join(PROJECT_DIR, receipt_filename)
-    
-    with open(quote_path, 'w', encoding='utf-8') as f:
-        f.write(quote_text)
-    
-    with open(profit_path, 'w', encoding='utf-8') as f:
-        f.write(quote_text)
-        f.write(profit_text)
-    
-    with open(receipt_path, 'w', encoding='utf-8') as f:
-        f.write(receipt_text)
+    quote_path, profit_path, receipt_path = save_quote_files(result, customer_name)
     
     print("\n" + "=" * 110)
     print("[OK] Quote generated successfully!")
     print("=" * 110)
-    print(f"\nCustomer Quote:   {quote_filename}")
-    print(f"Your Profit:      {profit_filename}")
-    print(f"Delivery Receipt: {receipt_filename}")
+    print(f"\nCustomer Quote:   {os.path.basename(quote_path)}")
+    print(f"Your Profit:      {os.path.basename(profit_path)}")
+    print(f"Delivery Receipt: {os.path.basename(receipt_path)}")
     print(f"\nCustomer Total: {grand_total:,.2f} ISK")
     print(f"Your Net Profit: {your_profit:,.2f} ISK")
     print("\n" + "=" * 110)
@@ -841,5 +873,24 @@ def main():
     print("Send the customer quote file, and the receipt when order is complete!")
 
 
+def main():
+    parser = argparse.ArgumentParser(
+        description="Jita sourcing quotes: interactive (default), a directory of order files, or a local HTTP endpoint."
+    )
+    parser.add_argument("--batch", metavar="DIR",          help="Quote every *.txt order file in DIR")
+    parser.add_argument("--out",   metavar="DIR",          help="Output directory for --batch (default: DIR/quotes)")
+    parser.add_argument("--serve", action="store_true",    help="Serve POST /quote over HTTP")
+    parser.add_argument("--host",  default=HTTP_HOST,      help=f"--serve bind address (default {HTTP_HOST})")
+    parser.add_argument("--port",  type=int, default=HTTP_PORT, help=f"--serve port (default {HTTP_PORT})")
+    args = parser.parse_args()
+    
+    if args.batch:
+        run_batch(args.batch, args.out)
+    elif args.serve:
+        serve(args.host, args.port)
+    else:
+        interactive()
+
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
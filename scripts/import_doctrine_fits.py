@@ -12,8 +12,13 @@ Imports doctrine fits and items into database tables:
 import sqlite3
 import csv
 import os
+import sys
 from datetime import datetime, timezone
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from name_resolver import CONFIDENT, describe, load_name_index
+
 def create_tables(conn):
     """Create doctrine fits tables."""
     cursor = conn.cursor()
@@ -77,6 +82,20 @@ def import_fits(conn, csv_path):
     
     fit_id_map = {}  # fit_name -> fit_id
     
+    # Names resolve through the name index: case, spacing and unique
+    # prefixes are matched; typos (with the suggested item) and ambiguous
+    # names (with their candidates) are reported and not imported
+    name_index = load_name_index(conn)
+    resolutions = {}
+    
+    def lookup(name):
+        if name not in resolutions:
+            resolutions[name] = name_index.resolve_one(name)
+            if resolutions[name]['match'] == 'prefix':
+                print(f"[INFO] Matched {describe(resolutions[name])}")
+        result = resolutions[name]
+        return result['type_id'] if result['match'] in CONFIDENT else None
+    
     with open(csv_path, 'r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         
@@ -100,11 +119,9 @@ def import_fits(conn, csv_path):
                 fits_created += 1
                 
                 # ADD THE SHIP HULL ITSELF (1x ship hull)
-                cursor.execute('SELECT type_id FROM inv_types WHERE type_name = ?', (ship_type,))
-                hull_result = cursor.fetchone()
+                hull_type_id = lookup(ship_type)
                 
-                if hull_result:
-                    hull_type_id = hull_result[0]
+                if hull_type_id:
                     cursor.execute('''
                         INSERT INTO doctrine_fit_items (fit_id, type_id, quantity)
                         VALUES (?, ?, 1)
@@ -116,13 +133,10 @@ def import_fits(conn, csv_path):
             else:
                 fit_id = fit_id_map[fit_name]
             
-            # Look up type_id from inv_types
-            cursor.execute('SELECT type_id FROM inv_types WHERE type_name = ?', (item_name,))
-            result = cursor.fetchone()
+            # Look up type_id from the name index
+            type_id = lookup(item_name)
             
-            if result:
-                type_id = result[0]
-                
+            if type_id:
                 cursor.execute('''
                     INSERT INTO doctrine_fit_items (fit_id, type_id, quantity)
                     VALUES (?, ?, ?)
@@ -139,7 +153,7 @@ def import_fits(conn, csv_path):
     print(f"[OK] Imported {items_imported} items")
     
     if items_not_found:
-        print(f"\n[WARNING] {len(items_not_found)} items not found in inv_types:")
+        print(f"\n[WARNING] {len(items_not_found)} items not imported (typo, ambiguous or unknown name):")
         # Group by item name
         missing_items = {}
         for fit_name, item_name in items_not_found:
@@ -149,7 +163,11 @@ def import_fits(conn, csv_path):
         
         for item_name in list(missing_items.keys())[:10]:
             fits = missing_items[item_name]
-            print(f"  - {item_name} (in {len(fits)} fits)")
+            result = resolutions.get(item_name.removesuffix(' (HULL)'))
+            if result and result['match'] in ('fuzzy', 'ambiguous'):
+                print(f"  - {describe(result)} (in {len(fits)} fits)")
+            else:
+                print(f"  - {item_name} (in {len(fits)} fits)")
         
         if len(missing_items) > 10:
             print(f"  ... and {len(missing_items) - 10} more unique items")
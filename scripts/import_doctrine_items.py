@@ -10,10 +10,15 @@ Table contains only type_id and last_updated.
 import sqlite3
 import csv
 import os
+import sys
 from datetime import datetime, timezone
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
+sys.path.insert(0, SCRIPT_DIR)
+
+from name_resolver import CONFIDENT, describe, load_name_index
+
 DB_PATH = os.path.join(PROJECT_DIR, 'mydatabase.db')
 
 # Use the cleaned CSV
@@ -51,37 +56,35 @@ def import_csv(conn, csv_path):
     with open(csv_path, 'r', encoding='utf-8') as f:
         reader = csv.reader(f)
         next(reader)  # Skip header
+        item_names = [row[0].strip().strip('"') for row in reader if row]
+    
+    # Resolve the whole list at once: case, spacing and unique prefixes are
+    # matched; typos (with the suggested item) and ambiguous names (with
+    # their candidates) are reported and not imported
+    resolutions = load_name_index(conn).resolve(item_names)
+    
+    imported = 0
+    not_found = []
+    duplicates = 0
+    
+    for result in resolutions:
+        if result['match'] == 'prefix':
+            print(f"[INFO] Matched {describe(result)}")
         
-        imported = 0
-        not_found = []
-        duplicates = 0
-        
-        for row in reader:
-            if not row:
-                continue
-                
-            item_name = row[0].strip().strip('"')
-            
-            # Look up type_id from inv_types
-            cursor.execute('SELECT type_id FROM inv_types WHERE type_name = ?', (item_name,))
-            result = cursor.fetchone()
-            
-            if result:
-                type_id = result[0]
-                
-                try:
-                    cursor.execute('''
-                        INSERT INTO doctrine_items (type_id, last_updated)
-                        VALUES (?, ?)
-                    ''', (type_id, current_time))
-                    imported += 1
-                except sqlite3.IntegrityError:
-                    # Duplicate type_id
-                    duplicates += 1
-            else:
-                not_found.append(item_name)
-        
-        conn.commit()
+        if result['match'] in CONFIDENT:
+            try:
+                cursor.execute('''
+                    INSERT INTO doctrine_items (type_id, last_updated)
+                    VALUES (?, ?)
+                ''', (result['type_id'], current_time))
+                imported += 1
+            except sqlite3.IntegrityError:
+                # Duplicate type_id
+                duplicates += 1
+        else:
+            not_found.append(result)
+    
+    conn.commit()
     
     print(f"\n[OK] Imported {imported} unique items")
     
@@ -89,9 +92,9 @@ def import_csv(conn, csv_path):
         print(f"[INFO] Skipped {duplicates} duplicate entries")
     
     if not_found:
-        print(f"\n[WARNING] {len(not_found)} items not found in inv_types:")
-        for item in not_found[:10]:  # Show first 10
-            print(f"  - {item}")
+        print(f"\n[WARNING] {len(not_found)} items not imported (typo, ambiguous or unknown name):")
+        for result in not_found[:10]:  # Show first 10
+            print(f"  - {describe(result)}")
         if len(not_found) > 10:
             print(f"  ... and {len(not_found) - 10} more")
     
@@ -2,12 +2,15 @@
 """
 Import typeMaterials.jsonl as raw data into database.
 Simple table: type_id -> JSON materials data
+The sparse yield matrix (yield_matrix.py) is recompiled after the import.
 """
 
 import sqlite3
 import json
 import os
 
+from yield_matrix import compile_yield_matrix
+
 # Configuration
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
@@ -84,6 +87,14 @@ def import_raw_data(conn, jsonl_path):
     
     return added
 
+def show_summary(conn):
+    """Compile the yield matrix from the imported rows and summarize it."""
+    print("\nCompiling reprocessing yield matrix...")
+    matrix = compile_yield_matrix(conn)
+    print(f"[OK] {len(matrix)} reprocessable types, {len(matrix.material_ids)} yields, "
+          f"{len(matrix.material_type_ids)} distinct materials")
+
+
 def main():
     print("=" * 70)
     print("EVE ONLINE - RAW IMPORT OF typeMaterials.jsonl")
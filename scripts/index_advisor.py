@@ -0,0 +1,431 @@
+"""
+index_advisor.py
+
+Query-plan audit for the analytics SQL.
+
+Runs EXPLAIN QUERY PLAN over every statement in queries/*.sql and every
+SELECT/WITH query embedded in the project's Python scripts, and flags the
+two things that hurt on the big tables:
+
+    SCAN <table>          full table scan (no index used at all)
+    USE TEMP B-TREE       a sort/GROUP BY/DISTINCT that no index satisfies
+
+For a flagged table it proposes a covering index built from the columns
+the query touches (equality filters first, then range filters, then
+GROUP BY / ORDER BY columns, then the remaining selected columns), builds
+it, re-plans and re-times the query, and keeps it only if the planner
+actually uses it. Without --apply every trial index is rolled back.
+
+Each audited query is recorded in query_plan_audit with its flags, the
+proposed index and the before/after latency. Queries with parameters are
+planned with NULLs bound and are not timed.
+
+Usage:
+    python index_advisor.py                      # audit, try indexes, roll back
+    python index_advisor.py --apply              # keep the indexes that help
+    python index_advisor.py --match "Fat Fingers"
+"""
+
+import argparse
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = SCRIPT_DIR.parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from script_utils import timed_script
+import db
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────────
+
+DB_PATH = str(PROJECT_DIR / 'mydatabase.db')
+QUERIES_DIR = PROJECT_DIR / 'queries'
+
+# Where embedded SQL is looked for (config/ holds credentials, TBD/ is scratch)
+PYTHON_DIRS = ['.', 'scripts', 'scripts/initialization', 'market', 'blueprint', 'buyback']
+
+# f-string placeholders that can be filled in statically; any other {...}
+# in a query means it is assembled at runtime and is skipped
+PLACEHOLDERS = {
+    'RAW_TABLE': 'market_price_snapshots_raw',
+    'placeholders': '?',
+}
+
+# Tables smaller than this are scanned faster than they are indexed
+MIN_TABLE_ROWS = 1000
+
+# Widest index the advisor will propose; past this only key columns are used
+MAX_INDEX_COLUMNS = 6
+
+ADVISOR_INDEX_PREFIX = 'idx_advisor'
+
+# ─── COLLECT QUERIES ──────────────────────────────────────────────────────────
+
+def split_statements(text):
+    """Splits a .sql file into complete statements."""
+    statements, buffer = [], ''
+    for line in text.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            statements.append(buffer.strip())
+            buffer = ''
+    if buffer.strip():
+        statements.append(buffer.strip())
+    return statements
+
+
+def is_query(sql):
+    """True for a statement that only reads (SELECT or WITH ... SELECT)."""
+    body = re.sub(r'--[^\n]*', '', sql).strip()
+    return bool(re.match(r'(SELECT|WITH)\b', body, re.IGNORECASE)) and \
+        not re.search(r'\b(INSERT|UPDATE|DELETE|REPLACE)\s+(INTO|OR|FROM)?\b', body, re.IGNORECASE)
+
+
+def fill_placeholders(sql):
+    """Substitutes known f-string placeholders; None if any others remain."""
+    def sub(match):
+        return PLACEHOLDERS.get(match.group(1), match.group(0))
+    sql = re.sub(r'\{(\w+)\}', sub, sql)
+    return None if re.search(r'\{[^{}]*\}', sql) else sql
+
+
+def collect_queries():
+    """Returns [(source, sql)] from queries/*.sql and embedded script SQL, plus a skip count."""
+    queries, skipped = [], 0
+
+    for path in sorted(QUERIES_DIR.glob('*.sql')):
+        statements = [s for s in split_statements(path.read_text(encoding='utf-8', errors='ignore')) if is_query(s)]
+        for n, sql in enumerate(statements, 1):
+            source = f"queries/{path.name}" + (f" #{n}" if len(statements) > 1 else '')
+            queries.append((source, sql))
+
+    for folder in PYTHON_DIRS:
+        for path in sorted((PROJECT_DIR / folder).glob('*.py')):
+            if path.resolve() == Path(__file__).resolve():
+                continue
+            text = path.read_text(encoding='utf-8', errors='ignore')
+            for match in re.finditer(r'("""|\'\'\')(.*?)\1', text, re.DOTALL):
+                sql = match.group(2).strip()
+                if not is_query(sql):
+                    continue
+                sql = fill_placeholders(sql)
+                if sql is None:
+                    skipped += 1
+                    continue
+                line = text.count('\n', 0, match.start()) + 1
+                queries.append((f"{path.relative_to(PROJECT_DIR).as_posix()}:{line}", sql))
+
+    return queries, skipped
+
+
+# Everything that can contain a stray ? or :word without being a parameter:
+# comments, string literals and quoted identifiers (e.g. AS "BWF?"). One
+# alternation, so whichever starts first wins (a ' inside a comment is not
+# a string, a -- inside a string is not a comment).
+NON_CODE = re.compile(r"""--[^\n]*|/\*.*?(?:\*/|$)|'(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\]""", re.DOTALL)
+
+
+def null_params(sql):
+    """Binds every ? / ?NNN / :name parameter to NULL so the statement can be planned."""
+    code = NON_CODE.sub(' ', sql)
+    names = set(re.findall(r"(?<![:\w]):([A-Za-z_]\w*)", code))
+    if names:
+        return {name: None for name in names}
+    numbered = [int(n) for n in re.findall(r'\?(\d+)', code)]
+    return (None,) * max(numbered + [len(re.findall(r'\?(?!\d)', code))])
+
+# ─── PLAN ANALYSIS ────────────────────────────────────────────────────────────
+
+def explain(conn, sql, params):
+    """EXPLAIN QUERY PLAN detail lines."""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+
+
+def table_aliases(sql):
+    """{alias_or_name: table} for every FROM/JOIN reference in the query."""
+    aliases = {}
+    for table, alias in re.findall(
+        r'\b(?:FROM|JOIN)\s+([A-Za-z_]\w*)(?:\s+(?:AS\s+)?([A-Za-z_]\w*))?', sql, re.IGNORECASE
+    ):
+        aliases[table] = table
+        if alias and alias.upper() not in SQL_KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+
+SQL_KEYWORDS = {
+    'WHERE', 'JOIN', 'LEFT', 'RIGHT', 'INNER', 'OUTER', 'CROSS', 'ON', 'USING', 'GROUP',
+    'ORDER', 'LIMIT', 'UNION', 'HAVING', 'WINDOW', 'NATURAL', 'AS', 'SELECT', 'EXCEPT',
+    'INTERSECT', 'WITH', 'AND', 'OR', 'NOT', 'IN', 'IS', 'NULL', 'OFFSET', 'INDEXED',
+}
+
+
+def find_issues(conn, plan, aliases, row_counts):
+    """
+    Full scans of real tables with at least MIN_TABLE_ROWS rows, and temp
+    B-trees in queries that read such a table. Returns (issues, scanned_tables).
+    """
+    for table in set(aliases.values()):
+        if table not in row_counts:
+            row_counts[table] = table_rows(conn, table)
+    large = {t for t in aliases.values() if (row_counts[t] or 0) >= MIN_TABLE_ROWS}
+
+    issues, scanned = [], []
+    for detail in plan:
+        if detail.startswith('USE TEMP B-TREE') and large:
+            issues.append(detail)
+            continue
+        match = re.match(r'SCAN (\w+)$', detail)
+        if not match:
+            continue
+        table = aliases.get(match.group(1), match.group(1))
+        if table in large:
+            issues.append(f"SCAN {table} ({row_counts[table]:,} rows)")
+            scanned.append(table)
+    return issues, scanned
+
+
+def table_rows(conn, table):
+    """Row count of a real table, None for views, CTEs and subqueries."""
+    kind = conn.execute("SELECT type FROM sqlite_master WHERE name = ?", (table,)).fetchone()
+    if not kind or kind[0] != 'table':
+        return None
+    return conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+
+
+def propose_index(conn, sql, table, aliases):
+    """
+    Column list for a covering index on `table`, or None when the query
+    gives nothing to seek or sort on (an unfiltered aggregate will scan
+    whatever we build).
+    """
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")').fetchall()]
+    names = [alias for alias, target in aliases.items() if target == table]
+    single_table = len(set(aliases.values())) == 1
+    sort_clauses = ' '.join(re.findall(
+        r'\b(?:GROUP|ORDER|PARTITION)\s+BY\s+(.*?)(?=\bHAVING\b|\bLIMIT\b|\bORDER\b|\bWINDOW\b|\)|;|$)',
+        sql, re.IGNORECASE | re.DOTALL
+    ))
+
+    equality, ranged, sorted_cols, covered = [], [], [], []
+    for column in columns:
+        refs = [rf'\b{re.escape(name)}\.{re.escape(column)}\b' for name in names]
+        if single_table:
+            refs.append(rf'(?<!\.)\b{re.escape(column)}\b')
+        ref = '(?:' + '|'.join(refs) + ')'
+        positions = [m.start() for m in re.finditer(ref, sql, re.IGNORECASE)]
+        if not positions:
+            continue
+        first = min(positions)
+        if re.search(ref + r'\s*(=|\bIN\b|\bIS\b(?!\s+NOT))|(?<![<>!])=\s*' + ref, sql, re.IGNORECASE):
+            equality.append((first, column))
+        elif re.search(ref + r'\s*(<|>|\bBETWEEN\b)|(<|>)=?\s*' + ref, sql, re.IGNORECASE):
+            ranged.append((first, column))
+        elif re.search(ref, sort_clauses, re.IGNORECASE):
+            sorted_cols.append((first, column))
+        else:
+            covered.append((first, column))
+
+    key = [c for _, c in sorted(equality)] + [c for _, c in sorted(sorted_cols)] + [c for _, c in sorted(ranged)[:1]]
+    if not key:
+        return None
+    rest = [c for _, c in sorted(ranged)[1:]] + [c for _, c in sorted(covered)]
+    if len(key) + len(rest) <= MAX_INDEX_COLUMNS:
+        return key + rest
+    return key[:MAX_INDEX_COLUMNS]
+
+
+def existing_index_columns(conn, table):
+    """Column lists of the indexes already on a table."""
+    indexes = []
+    for row in conn.execute(f'PRAGMA index_list("{table}")').fetchall():
+        indexes.append([info[2] for info in conn.execute(f'PRAGMA index_info("{row[1]}")').fetchall()])
+    return indexes
+
+
+def index_name(conn, table, columns):
+    """advisor index name that isn't taken yet."""
+    base = f"{ADVISOR_INDEX_PREFIX}_{table}_{'_'.join(columns[:3])}"[:60]
+    name, n = base, 1
+    while conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone():
+        n += 1
+        name = f"{base}_{n}"
+    return name
+
+# ─── TIMING ───────────────────────────────────────────────────────────────────
+
+def time_query(conn, sql, repeat):
+    """Best-of-N wall time in milliseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql).fetchall()
+        best = min(best, time.perf_counter() - start)
+        if best > 5:  # a slow query is measured once
+            break
+    return best * 1000
+
+# ─── AUDIT ────────────────────────────────────────────────────────────────────
+
+def init_audit_table(conn):
+    """Creates the query_plan_audit table if it doesn't exist."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS query_plan_audit (
+            id           INTEGER PRIMARY KEY AUTOINCREMENT,
+            audited_at   TEXT NOT NULL,
+            source       TEXT NOT NULL,
+            issues       TEXT,
+            index_sql    TEXT,
+            index_used   INTEGER,
+            applied      INTEGER NOT NULL DEFAULT 0,
+            before_ms    REAL,
+            after_ms     REAL
+        )
+    """)
+    conn.commit()
+
+
+def audit_query(conn, source, sql, apply, repeat, row_counts):
+    """
+    Plans one query, tries covering indexes for its flagged tables and
+    returns a result dict (also the query_plan_audit row).
+    """
+    result = {'source': source, 'issues': [], 'index_sql': [], 'index_used': None,
+              'before_ms': None, 'after_ms': None, 'error': None}
+    params = null_params(sql)
+    try:
+        plan = explain(conn, sql, params)
+    except sqlite3.Error as e:
+        result['error'] = str(e)
+        return result
+
+    aliases = table_aliases(sql)
+    result['issues'], scanned = find_issues(conn, plan, aliases, row_counts)
+    if not result['issues']:
+        return result
+
+    timed = not params
+    if timed:
+        result['before_ms'] = time_query(conn, sql, repeat)
+
+    proposals = []
+    for table in dict.fromkeys(scanned):
+        columns = propose_index(conn, sql, table, aliases)
+        if not columns:
+            continue
+        if any(existing[:len(columns)] == columns for existing in existing_index_columns(conn, table)):
+            continue
+        proposals.append((table, columns))
+    if not proposals:
+        return result
+
+    conn.execute("SAVEPOINT advisor")
+    created = []
+    for table, columns in proposals:
+        name = index_name(conn, table, columns)
+        ddl = f"CREATE INDEX {name} ON {table} ({', '.join(columns)})"
+        conn.execute(ddl)
+        created.append((name, ddl))
+
+    new_plan = explain(conn, sql, params)
+    used = [(name, ddl) for name, ddl in created if any(name in detail for detail in new_plan)]
+    result['index_sql'] = [ddl for _, ddl in used]
+    result['index_used'] = bool(used)
+    if used and timed:
+        result['after_ms'] = time_query(conn, sql, repeat)
+
+    for name, ddl in created:
+        if (name, ddl) not in used:
+            conn.execute(f"DROP INDEX {name}")
+    if apply and used:
+        conn.execute("RELEASE SAVEPOINT advisor")
+        conn.commit()
+    else:
+        conn.execute("ROLLBACK TO SAVEPOINT advisor")
+        conn.execute("RELEASE SAVEPOINT advisor")
+    return result
+
+
+def record(conn, audited_at, result, applied):
+    """Writes one audit result to query_plan_audit."""
+    conn.execute("""
+        INSERT INTO query_plan_audit
+            (audited_at, source, issues, index_sql, index_used, applied, before_ms, after_ms)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        audited_at, result['source'], '; '.join(result['issues']) or None,
+        '; '.join(result['index_sql']) or None, result['index_used'],
+        int(applied and bool(result['index_used'])), result['before_ms'], result['after_ms'],
+    ))
+    conn.commit()
+
+# ─── MAIN ─────────────────────────────────────────────────────────────────────
+
+@timed_script
+def main():
+    parser = argparse.ArgumentParser(
+        description="EXPLAIN QUERY PLAN audit of the project's SQL, with covering-index proposals."
+    )
+    parser.add_argument("--db",     type=str, default=DB_PATH, help="Database to audit (default: mydatabase.db)")
+    parser.add_argument("--apply",  action="store_true",       help="Keep the proposed indexes the planner uses")
+    parser.add_argument("--match",  type=str, default=None,    help="Only audit sources containing this text")
+    parser.add_argument("--repeat", type=int, default=5,       help="Timing repetitions per query (best of N)")
+    args = parser.parse_args()
+
+    queries, skipped = collect_queries()
+    if args.match:
+        queries = [(source, sql) for source, sql in queries if args.match.lower() in source.lower()]
+    print(f"\n  {len(queries)} queries to audit ({skipped} runtime-assembled queries skipped)")
+
+    conn = db.connect(args.db)
+    init_audit_table(conn)
+    audited_at = datetime.now(timezone.utc).isoformat()
+    row_counts = {}
+    results = []
+
+    for source, sql in queries:
+        result = audit_query(conn, source, sql, args.apply, args.repeat, row_counts)
+        results.append(result)
+        if result['error']:
+            continue
+        record(conn, audited_at, result, args.apply)
+
+    conn.close()
+
+    flagged = [r for r in results if r['issues']]
+    errors = [r for r in results if r['error']]
+
+    print(f"\n  {'=' * 100}")
+    print(f"  FLAGGED QUERIES ({len(flagged)} of {len(results) - len(errors)} planned)")
+    print(f"  {'-' * 100}")
+    for r in flagged:
+        before = f"{r['before_ms']:.1f} ms" if r['before_ms'] is not None else 'plan only'
+        after = f"{r['after_ms']:.1f} ms" if r['after_ms'] is not None else ''
+        print(f"  {r['source']:<60} {before:>12} {after:>12}")
+        for issue in r['issues']:
+            print(f"      {issue}")
+        for ddl in r['index_sql']:
+            print(f"      -> {ddl}")
+        if r['index_used'] is False:
+            print(f"      -> proposed index not used by the planner, dropped")
+
+    if errors:
+        print(f"\n  [WARNING] {len(errors)} queries could not be planned against this database:")
+        for r in errors:
+            print(f"      {r['source']}: {r['error']}")
+
+    kept = sum(len(r['index_sql']) for r in flagged)
+    if args.apply:
+        print(f"\n  [OK] {kept} indexes created")
+    elif kept:
+        print(f"\n  [INFO] {kept} indexes would help - rerun with --apply to create them")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -189,23 +189,25 @@ TABLES += [
         )
     """),
 
-    ("character_orders_history", """
-        CREATE TABLE IF NOT EXISTS character_orders_history (
-            snapshot_date   TEXT NOT NULL,
+    # Epoch-second timestamps; read as ISO text through the
+    # character_orders_history view
+    ("character_order_snapshots", """
+        CREATE TABLE IF NOT EXISTS character_order_snapshots (
+            snapshot_ts     INTEGER NOT NULL,
             order_id        INTEGER NOT NULL,
             character_id    INTEGER NOT NULL,
             type_id         INTEGER NOT NULL,
             location_id     INTEGER NOT NULL,
-            region_id       INTEGER NOT NULL,
+            region_id       INTEGER,
             is_buy_order    INTEGER NOT NULL,
             price           REAL NOT NULL,
             volume_remain   INTEGER NOT NULL,
             volume_total    INTEGER NOT NULL,
-            issued          TEXT NOT NULL,
-            duration        INTEGER NOT NULL,
+            issued          INTEGER NOT NULL,
+            duration        INTEGER,
             state           TEXT NOT NULL,
-            PRIMARY KEY (snapshot_date, order_id)
-        )
+            PRIMARY KEY (order_id, snapshot_ts)
+        ) WITHOUT ROWID
     """),
 
     ("character_skills", """
@@ -277,17 +279,143 @@ TABLES += [
         )
     """),
 
-    ("market_price_snapshots", """
-        CREATE TABLE IF NOT EXISTS market_price_snapshots (
-            id           INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp    TEXT NOT NULL,
+    # Raw snapshot tier, epoch-second ts; read as ISO text through the
+    # market_price_snapshots view
+    ("market_price_snapshots_raw", """
+        CREATE TABLE IF NOT EXISTS market_price_snapshots_raw (
             type_id      INTEGER NOT NULL,
+            ts           INTEGER NOT NULL,
             best_buy     REAL,
             best_sell    REAL,
             spread_pct   REAL,
             buy_volume   INTEGER,
-            sell_volume  INTEGER
-        )
+            sell_volume  INTEGER,
+            PRIMARY KEY (type_id, ts)
+        ) WITHOUT ROWID
+    """),
+
+    # Hourly / daily rollups of market_price_snapshots (see scripts/snapshot_rollups.py)
+    ("market_price_snapshots_hourly", """
+        CREATE TABLE IF NOT EXISTS market_price_snapshots_hourly (
+            type_id          INTEGER NOT NULL,
+            bucket           INTEGER NOT NULL,
+            samples          INTEGER NOT NULL,
+            buy_min          REAL,
+            buy_max          REAL,
+            buy_avg          REAL,
+            buy_count        INTEGER NOT NULL DEFAULT 0,
+            sell_min         REAL,
+            sell_max         REAL,
+            sell_avg         REAL,
+            sell_count       INTEGER NOT NULL DEFAULT 0,
+            spread_avg       REAL,
+            spread_count     INTEGER NOT NULL DEFAULT 0,
+            buy_volume_avg   REAL,
+            sell_volume_avg  REAL,
+            PRIMARY KEY (type_id, bucket)
+        ) WITHOUT ROWID
+    """),
+
+    ("market_price_snapshots_daily", """
+        CREATE TABLE IF NOT EXISTS market_price_snapshots_daily (
+            type_id          INTEGER NOT NULL,
+            bucket           INTEGER NOT NULL,
+            samples          INTEGER NOT NULL,
+            buy_min          REAL,
+            buy_max          REAL,
+            buy_avg          REAL,
+            buy_count        INTEGER NOT NULL DEFAULT 0,
+            sell_min         REAL,
+            sell_max         REAL,
+            sell_avg         REAL,
+            sell_count       INTEGER NOT NULL DEFAULT 0,
+            spread_avg       REAL,
+            spread_count     INTEGER NOT NULL DEFAULT 0,
+            buy_volume_avg   REAL,
+            sell_volume_avg  REAL,
+            PRIMARY KEY (type_id, bucket)
+        ) WITHOUT ROWID
+    """),
+
+    # Rolling 1d/7d/30d averages per item, refreshed after every snapshot
+    ("price_averages", """
+        CREATE TABLE IF NOT EXISTS price_averages (
+            type_id      INTEGER NOT NULL,
+            window_days  INTEGER NOT NULL,
+            avg_buy      REAL,
+            avg_sell     REAL,
+            min_buy      REAL,
+            max_buy      REAL,
+            min_sell     REAL,
+            max_sell     REAL,
+            avg_spread   REAL,
+            samples      INTEGER NOT NULL DEFAULT 0,
+            updated_at   TEXT NOT NULL,
+            PRIMARY KEY (type_id, window_days)
+        ) WITHOUT ROWID
+    """),
+
+    # Order-book change-event log — appended by every market_orders /
+    # bwf_market_orders refresh (see scripts/order_events.py)
+    ("order_book_refreshes", """
+        CREATE TABLE IF NOT EXISTS order_book_refreshes (
+            refresh_id      INTEGER PRIMARY KEY AUTOINCREMENT,
+            source          TEXT NOT NULL,
+            refreshed_at    TEXT NOT NULL,
+            new_count       INTEGER NOT NULL DEFAULT 0,
+            repriced_count  INTEGER NOT NULL DEFAULT 0,
+            filled_count    INTEGER NOT NULL DEFAULT 0,
+            cancelled_count INTEGER NOT NULL DEFAULT 0
+        )
+    """),
+
+    ("order_book_events", """
+        CREATE TABLE IF NOT EXISTS order_book_events (
+            refresh_id   INTEGER NOT NULL,
+            order_id     INTEGER NOT NULL,
+            type_id      INTEGER NOT NULL,
+            is_buy_order INTEGER NOT NULL,
+            kind         TEXT NOT NULL,
+            old_price    REAL,
+            new_price    REAL,
+            old_volume   INTEGER,
+            new_volume   INTEGER,
+            PRIMARY KEY (refresh_id, order_id)
+        ) WITHOUT ROWID
+    """),
+
+    # Materialized best buy/sell + full-depth price levels, rebuilt at each order refresh
+    ("market_top_of_book", """
+        CREATE TABLE IF NOT EXISTS market_top_of_book (
+            location_id  INTEGER NOT NULL,
+            type_id      INTEGER NOT NULL,
+            region_id    INTEGER NOT NULL,
+            source       TEXT NOT NULL,
+            best_buy     REAL,
+            best_sell    REAL,
+            buy_orders   INTEGER NOT NULL DEFAULT 0,
+            sell_orders  INTEGER NOT NULL DEFAULT 0,
+            buy_volume   INTEGER NOT NULL DEFAULT 0,
+            sell_volume  INTEGER NOT NULL DEFAULT 0,
+            updated_at   TEXT NOT NULL,
+            PRIMARY KEY (location_id, type_id)
+        ) WITHOUT ROWID
+    """),
+
+    ("market_book_levels", """
+        CREATE TABLE IF NOT EXISTS market_book_levels (
+            location_id  INTEGER NOT NULL,
+            type_id      INTEGER NOT NULL,
+            is_buy_order INTEGER NOT NULL,
+            level        INTEGER NOT NULL,
+            source       TEXT NOT NULL,
+            price        REAL NOT NULL,
+            volume       INTEGER NOT NULL,
+            orders       INTEGER NOT NULL,
+            cum_volume   INTEGER NOT NULL,
+            cum_value    REAL NOT NULL,
+            PRIMARY KEY (location_id, type_id, is_buy_order, level)
+        ) WITHOUT ROWID
     """),
 
     # Items to watch / trade (core config table for the site)
@@ -312,16 +440,16 @@ TABLES += [
 # ------------------------------------------------------------------
 
 TABLES += [
-    ("lx_zoj_inventory", """
-        CREATE TABLE IF NOT EXISTS lx_zoj_inventory (
-            id                 INTEGER PRIMARY KEY AUTOINCREMENT,
-            snapshot_timestamp TEXT NOT NULL,
+    # Epoch-second snapshot_ts; read with names and ISO text through the
+    # lx_zoj_inventory view
+    ("lx_zoj_inventory_snapshots", """
+        CREATE TABLE IF NOT EXISTS lx_zoj_inventory_snapshots (
+            snapshot_ts        INTEGER NOT NULL,
             type_id            INTEGER NOT NULL,
-            type_name          TEXT,
             quantity           INTEGER NOT NULL DEFAULT 0,
             location_id        INTEGER,
-            location_name      TEXT
-        )
+            PRIMARY KEY (snapshot_ts, type_id)
+        ) WITHOUT ROWID
     """),
 
     ("jita_hangar_inventory", """
@@ -367,6 +495,17 @@ TABLES += [
             materials_json TEXT NOT NULL
         )
     """),
+
+    # Sparse yield matrix compiled from type_materials (scripts/yield_matrix.py)
+    ("type_material_yields", """
+        CREATE TABLE IF NOT EXISTS type_material_yields (
+            type_id           INTEGER NOT NULL,
+            material_type_id  INTEGER NOT NULL,
+            quantity          INTEGER NOT NULL,
+            portion_size      INTEGER NOT NULL DEFAULT 1,
+            PRIMARY KEY (type_id, material_type_id)
+        ) WITHOUT ROWID
+    """),
 ]
 
 # ------------------------------------------------------------------
@@ -579,20 +718,95 @@ TABLES += [
     """),
 ]
 
+# ------------------------------------------------------------------
+# Script run metrics (written by @timed_script, see scripts/script_utils.py)
+# ------------------------------------------------------------------
+
+TABLES += [
+    ("script_runs", """
+        CREATE TABLE IF NOT EXISTS script_runs (
+            run_id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            script          TEXT NOT NULL,
+            started_at      INTEGER NOT NULL,
+            finished_at     INTEGER NOT NULL,
+            status          TEXT NOT NULL,
+            error           TEXT,
+            wall_seconds    REAL NOT NULL,
+            cpu_seconds     REAL NOT NULL,
+            rows            INTEGER NOT NULL DEFAULT 0,
+            http_requests   INTEGER NOT NULL DEFAULT 0,
+            http_bytes      INTEGER NOT NULL DEFAULT 0,
+            http_retries    INTEGER NOT NULL DEFAULT 0,
+            peak_rss_mb     REAL,
+            host            TEXT,
+            argv            TEXT
+        )
+    """),
+
+    ("script_run_stages", """
+        CREATE TABLE IF NOT EXISTS script_run_stages (
+            run_id          INTEGER NOT NULL,
+            seq             INTEGER NOT NULL,
+            stage           TEXT NOT NULL,
+            wall_seconds    REAL NOT NULL,
+            cpu_seconds     REAL NOT NULL,
+            rows            INTEGER NOT NULL DEFAULT 0,
+            http_requests   INTEGER NOT NULL DEFAULT 0,
+            http_bytes      INTEGER NOT NULL DEFAULT 0,
+            http_retries    INTEGER NOT NULL DEFAULT 0,
+            peak_rss_mb     REAL,
+            error           TEXT,
+            PRIMARY KEY (run_id, seq)
+        )
+    """),
+]
+
 
 # ============================================
 # VIEW DEFINITIONS
 # ============================================
 
 VIEWS = [
+    # Compatibility views over the epoch-second time-series tables: same
+    # column names as the old tables, timestamps rendered as ISO text
+    ("market_price_snapshots", """
+        CREATE VIEW IF NOT EXISTS market_price_snapshots AS
+        SELECT type_id, ts,
+               strftime('%Y-%m-%dT%H:%M:%S+00:00', ts, 'unixepoch') AS timestamp,
+               best_buy, best_sell, spread_pct, buy_volume, sell_volume
+        FROM market_price_snapshots_raw
+    """),
+
+    ("lx_zoj_inventory", """
+        CREATE VIEW IF NOT EXISTS lx_zoj_inventory AS
+        SELECT s.snapshot_ts,
+               strftime('%Y-%m-%dT%H:%M:%S+00:00', s.snapshot_ts, 'unixepoch') AS snapshot_timestamp,
+               s.type_id, t.type_name, s.quantity, s.location_id,
+               'LX-ZOJ' AS location_name
+        FROM lx_zoj_inventory_snapshots s
+        LEFT JOIN inv_types t ON t.type_id = s.type_id
+    """),
+
+    ("character_orders_history", """
+        CREATE VIEW IF NOT EXISTS character_orders_history AS
+        SELECT strftime('%Y-%m-%dT%H:%M:%S+00:00', snapshot_ts, 'unixepoch') AS snapshot_date,
+               order_id, character_id, type_id, location_id, region_id, is_buy_order,
+               price, volume_remain, volume_total,
+               strftime('%Y-%m-%dT%H:%M:%SZ', issued, 'unixepoch') AS issued,
+               duration, state, snapshot_ts
+        FROM character_order_snapshots
+    """),
+
     # Latest snapshot of LX-ZOJ inventory per type
     ("lx_zoj_current_inventory", """
         CREATE VIEW IF NOT EXISTS lx_zoj_current_inventory AS
-        SELECT type_id, type_name, quantity, location_id, location_name,
-               snapshot_timestamp
-        FROM lx_zoj_inventory
-        WHERE snapshot_timestamp = (
-            SELECT MAX(snapshot_timestamp) FROM lx_zoj_inventory
+        SELECT s.type_id, t.type_name, s.quantity, s.location_id,
+               'LX-ZOJ' AS location_name,
+               strftime('%Y-%m-%dT%H:%M:%S+00:00', s.snapshot_ts, 'unixepoch') AS snapshot_timestamp
+        FROM lx_zoj_inventory_snapshots s
+        LEFT JOIN inv_types t ON t.type_id = s.type_id
+        WHERE s.snapshot_ts = (
+            SELECT MAX(snapshot_ts) FROM lx_zoj_inventory_snapshots
         )
     """),
 ]
@@ -620,14 +834,20 @@ INDEXES = [
     "CREATE INDEX IF NOT EXISTS idx_wt_character     ON wallet_transactions (character_id)",
     "CREATE INDEX IF NOT EXISTS idx_wt_date          ON wallet_transactions (date)",
     "CREATE INDEX IF NOT EXISTS idx_wt_type          ON wallet_transactions (type_id)",
+    # covers the most-recent-purchase lookups in refresh_breakeven_cache / quotes
+    "CREATE INDEX IF NOT EXISTS idx_wt_char_buy_type ON wallet_transactions (character_id, is_buy, is_personal, type_id, date, unit_price)",
 
     # character_orders
     "CREATE INDEX IF NOT EXISTS idx_co_character     ON character_orders (character_id)",
     "CREATE INDEX IF NOT EXISTS idx_co_type          ON character_orders (type_id)",
+    "CREATE INDEX IF NOT EXISTS idx_co_char_state    ON character_orders (character_id, state, is_buy_order, type_id)",
 
     # lx_zoj_inventory
-    "CREATE INDEX IF NOT EXISTS idx_lz_snapshot      ON lx_zoj_inventory (snapshot_timestamp)",
-    "CREATE INDEX IF NOT EXISTS idx_lz_type          ON lx_zoj_inventory (type_id)",
+    "CREATE INDEX IF NOT EXISTS idx_lz_type          ON lx_zoj_inventory_snapshots (type_id, snapshot_ts)",
+
+    # character order history
+    "CREATE INDEX IF NOT EXISTS idx_cos_ts           ON character_order_snapshots (snapshot_ts)",
+    "CREATE INDEX IF NOT EXISTS idx_cos_type_ts      ON character_order_snapshots (type_id, snapshot_ts)",
 
     # raw killmails
     "CREATE INDEX IF NOT EXISTS idx_rkm_time         ON raw_killmails (killmail_time)",
@@ -643,7 +863,23 @@ INDEXES = [
     "CREATE INDEX IF NOT EXISTS idx_tmi_category     ON tracked_market_items (category)",
 
     # market_price_snapshots
-    "CREATE INDEX IF NOT EXISTS idx_mps_type_ts      ON market_price_snapshots (type_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_mpsr_ts          ON market_price_snapshots_raw (ts)",
+    "CREATE INDEX IF NOT EXISTS idx_market_price_snapshots_hourly_bucket ON market_price_snapshots_hourly (bucket)",
+    "CREATE INDEX IF NOT EXISTS idx_market_price_snapshots_daily_bucket  ON market_price_snapshots_daily (bucket)",
+
+    # order-book event log
+    "CREATE INDEX IF NOT EXISTS idx_obr_source_time  ON order_book_refreshes (source, refreshed_at)",
+    "CREATE INDEX IF NOT EXISTS idx_obe_type         ON order_book_events (type_id, refresh_id)",
+
+    # top of book
+    "CREATE INDEX IF NOT EXISTS idx_tob_source_type  ON market_top_of_book (source, type_id)",
+    "CREATE INDEX IF NOT EXISTS idx_mbl_source       ON market_book_levels (source)",
+
+    # reprocessing yields by material
+    "CREATE INDEX IF NOT EXISTS idx_tmy_material     ON type_material_yields (material_type_id)",
+
+    # script run metrics
+    "CREATE INDEX IF NOT EXISTS idx_script_runs_script ON script_runs (script, started_at)",
 ]
 
 
@@ -28,7 +28,7 @@ sys.path.insert(0, os.path.join(PROJECT_DIR, 'config'))
 from setup import CORPORATION_ID
 
 DB_PATH = os.path.join(PROJECT_DIR, 'mydatabase.db')
-ESI_BASE_URL = 'https://esi.evetech.net/latest'
+ESI_BASE_URL = os.environ.get('ESI_BASE_URL', 'https://esi.evetech.net/latest')
 
 # ============================================
 # FUNCTIONS
@@ -17,7 +17,7 @@ import requests
 INIT_DIR    = os.path.dirname(os.path.abspath(__file__))
 PROJECT_DIR = os.path.dirname(os.path.dirname(INIT_DIR))
 DB_PATH     = os.path.join(PROJECT_DIR, 'mydatabase.db')
-ESI_BASE_URL = 'https://esi.evetech.net/latest'
+ESI_BASE_URL = os.environ.get('ESI_BASE_URL', 'https://esi.evetech.net/latest')
 
 # Maximum simultaneous requests to ESI
 MAX_CONCURRENCY = 20
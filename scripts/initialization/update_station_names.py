@@ -24,7 +24,7 @@ sys.path.insert(0, SCRIPTS_DIR)
 from script_utils import timed_script
 
 DB_PATH      = os.path.join(PROJECT_DIR, 'mydatabase.db')
-ESI_BASE_URL = 'https://esi.evetech.net/latest'
+ESI_BASE_URL = os.environ.get('ESI_BASE_URL', 'https://esi.evetech.net/latest')
 
 # Maximum simultaneous requests to ESI
 MAX_CONCURRENCY = 20
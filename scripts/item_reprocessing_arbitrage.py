@@ -16,6 +16,12 @@ import sys
 from datetime import datetime
 from pathlib import Path
 
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from fill_simulator import simulate_fills
+from yield_matrix import load_yield_matrix
+
 # ============================================================================
 # CONFIGURABLE PARAMETERS - ADJUST THESE AS NEEDED
 # ============================================================================
@@ -39,6 +45,11 @@ CONFIG = {
     # FREIGHT COSTS
     'freight_cost_per_m3': 400.0,      # ISK per m³ to null-sec
     
+    # PURCHASE SIZE
+    'purchase_quantity': 1,            # Units bought per item; above 1 the cost
+                                       # walks the Jita sell book (average fill
+                                       # price) and thin books drop out
+    
     # FILTERS - Adjust these to show more/fewer results
     'min_profit_margin_pct': 5.0,      # Minimum profit margin to show
     'min_profit_per_unit': 10000.0,    # Minimum ISK profit per unit
@@ -135,24 +146,29 @@ def get_mineral_prices_7day(conn, config):
     return mineral_prices
 
 # ============================================================================
-# GET REPROCESSABLE ITEMS FROM JITA MARKET
+# LOAD REPROCESSABLE ITEMS FROM JITA MARKET (ONE QUERY)
 # ============================================================================
-def get_reprocessable_items(conn, config):
+def load_market_items(conn, config):
     """
-    Get all items currently on Jita market that have reprocessing yields.
+    All items currently on the Jita market, with their top-of-book prices.
+
+    Returns (items, best_sell, best_buy): item dicts in type_name order and
+    float vectors aligned with them (NaN where a side has no orders).
     """
     query = """
-        SELECT DISTINCT
+        SELECT
             it.type_id,
             it.type_name,
             it.volume,
             it.group_id,
-            ig.group_name
-        FROM market_orders mo
-        JOIN inv_types it ON it.type_id = mo.type_id
+            ig.group_name,
+            tob.best_sell,
+            tob.best_buy
+        FROM market_top_of_book tob
+        JOIN inv_types it ON it.type_id = tob.type_id
         JOIN inv_groups ig ON ig.group_id = it.group_id
-        WHERE mo.region_id = ?
-        AND mo.location_id = ?
+        WHERE tob.region_id = ?
+        AND tob.location_id = ?
         AND it.volume > 0
         AND it.volume <= ?
         ORDER BY it.type_name
@@ -164,121 +180,85 @@ def get_reprocessable_items(conn, config):
         config['jita_station_id'],
         config['max_item_volume_m3']
     ))
+    rows = cursor.fetchall()
     
-    items = []
-    for row in cursor.fetchall():
-        items.append({
+    items = [
+        {
             'type_id': row[0],
             'type_name': row[1],
             'volume': row[2],
             'group_id': row[3],
             'group_name': row[4]
-        })
+        }
+        for row in rows
+    ]
+    best_sell = np.array([row[5] for row in rows], dtype=float)
+    best_buy = np.array([row[6] for row in rows], dtype=float)
     
-    return items
+    return items, best_sell, best_buy
 
 # ============================================================================
-# GET ITEM REPROCESSING YIELDS
+# LOAD REPROCESSING YIELDS (ITEMS x MINERALS MATRIX)
 # ============================================================================
-def get_reprocessing_yields(conn, type_id):
-    """
-    Get reprocessing yields for a specific item.
-    
-    Returns dict: {mineral_name: quantity}
+def load_mineral_yields(conn, items, config):
     """
-    query = """
-        SELECT
-            tritanium_yield,
-            pyerite_yield,
-            mexallon_yield,
-            isogen_yield,
-            nocxium_yield,
-            zydrine_yield,
-            megacyte_yield,
-            morphite_yield
-        FROM item_reprocessing_yields
-        WHERE type_id = ?
+    Dense (items x minerals) matrix of per-unit base reprocessing yields,
+    rows aligned with `items`, columns in config['mineral_type_ids'] order.
+    Sliced from the compiled yield matrix (yield_matrix.py), which is
+    rebuilt first if type_materials has changed.
+
+    Returns (yields, has_yields): has_yields is False for items that
+    don't reprocess.
     """
+    matrix = load_yield_matrix(conn)
+    type_ids = [item['type_id'] for item in items]
     
-    cursor = conn.cursor()
-    cursor.execute(query, (type_id,))
-    result = cursor.fetchone()
-    
-    if not result:
-        return None
+    yields = matrix.dense(type_ids, list(config['mineral_type_ids'].values()))
+    has_yields = matrix.rows(type_ids) >= 0
     
-    return {
-        'Tritanium': result[0] or 0,
-        'Pyerite': result[1] or 0,
-        'Mexallon': result[2] or 0,
-        'Isogen': result[3] or 0,
-        'Nocxium': result[4] or 0,
-        'Zydrine': result[5] or 0,
-        'Megacyte': result[6] or 0,
-        'Morphite': result[7] or 0,
-    }
+    return yields, has_yields
 
 # ============================================================================
-# GET CURRENT JITA PRICES
+# DEPTH-AWARE PURCHASE COST
 # ============================================================================
-def get_jita_prices(conn, type_id, config):
-    """
-    Get current best buy and sell prices for an item in Jita.
+def load_fill_prices(conn, items, config):
     """
-    query = """
-        SELECT
-            MIN(CASE WHEN is_buy_order = 0 THEN price END) as best_sell_price,
-            MAX(CASE WHEN is_buy_order = 1 THEN price END) as best_buy_price
-        FROM market_orders
-        WHERE type_id = ?
-        AND region_id = ?
-        AND location_id = ?
+    Average price per unit of buying config['purchase_quantity'] of every
+    item off the Jita sell book, aligned with `items`. NaN where the book
+    can't supply the whole quantity.
     """
-    
-    cursor = conn.cursor()
-    cursor.execute(query, (type_id, config['jita_region_id'], config['jita_station_id']))
-    result = cursor.fetchone()
-    
-    if result:
-        return {
-            'best_sell_price': result[0],
-            'best_buy_price': result[1]
-        }
-    
-    return {'best_sell_price': None, 'best_buy_price': None}
+    quantity = config['purchase_quantity']
+    fills = simulate_fills(
+        conn, [(item['type_id'], quantity) for item in items], 'buy', config['jita_station_id']
+    )
+    return np.array([
+        fill['fill_price'] if fill['levels'] and not fill['shortfall'] else np.nan
+        for fill in fills
+    ], dtype=float)
 
 # ============================================================================
-# CALCULATE REPROCESSING PROFIT
+# CALCULATE REPROCESSING PROFIT (ALL ITEMS AT ONCE)
 # ============================================================================
-def calculate_reprocessing_profit(item, yields, mineral_prices, item_prices, config, efficiency):
+def calculate_reprocessing_profit(items, yields, item_cost, mineral_prices, config, efficiency):
     """
-    Calculate profit from buying item, reprocessing, and selling minerals.
+    Profit from buying every item, reprocessing, and selling the minerals,
+    as vectors aligned with `items`. item_cost is the per-unit purchase
+    price (best sell, or the depth-aware fill price).
+    
+    Mineral value is accumulated one mineral column at a time, in the same
+    order and with the same operations as the per-item calculation, so the
+    results are identical to it.
     """
-    if not yields or not item_prices['best_sell_price']:
-        return None
+    prices = [mineral_prices.get(name, {}).get('avg_price_7d', 0) for name in config['mineral_type_ids']]
     
     # Calculate mineral value (7-day average prices)
-    mineral_value = 0
-    mineral_breakdown = {}
-    
-    for mineral_name, base_yield in yields.items():
-        if base_yield > 0:
-            # Apply reprocessing efficiency
-            actual_yield = base_yield * efficiency
-            mineral_price = mineral_prices.get(mineral_name, {}).get('avg_price_7d', 0)
-            value = actual_yield * mineral_price
-            mineral_value += value
-            mineral_breakdown[mineral_name] = {
-                'base_yield': base_yield,
-                'actual_yield': actual_yield,
-                'price': mineral_price,
-                'value': value
-            }
+    mineral_value = np.zeros(len(items))
+    for column, price in enumerate(prices):
+        mineral_value += (yields[:, column] * efficiency) * price
     
     # Calculate costs
-    item_cost = item_prices['best_sell_price']  # Buy from sell orders (instant)
-    freight_cost = item['volume'] * config['freight_cost_per_m3']
-    broker_fee = item_cost * config['broker_fee_pct']  # If placing buy orders
+    volume = np.array([item['volume'] for item in items], dtype=float)
+    freight_cost = volume * config['freight_cost_per_m3']
     reprocess_tax = mineral_value * config['reprocessing_tax_pct']
     
     # Total cost (instant buy from sell orders)
@@ -289,9 +269,11 @@ def calculate_reprocessing_profit(item, yields, mineral_prices, item_prices, con
     
     # Profit calculation
     profit_per_unit = mineral_revenue_after_tax - total_cost
-    profit_margin_pct = (profit_per_unit / total_cost * 100) if total_cost > 0 else 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        profit_margin_pct = np.where(total_cost > 0, profit_per_unit / total_cost * 100, 0.0)
     
     return {
+        'mineral_prices': prices,
         'item_cost': item_cost,
         'freight_cost': freight_cost,
         'reprocess_tax': reprocess_tax,
@@ -300,10 +282,53 @@ def calculate_reprocessing_profit(item, yields, mineral_prices, item_prices, con
         'mineral_revenue_after_tax': mineral_revenue_after_tax,
         'profit_per_unit': profit_per_unit,
         'profit_margin_pct': profit_margin_pct,
-        'mineral_breakdown': mineral_breakdown,
-        'efficiency_used': efficiency
     }
 
+
+def build_result(i, items, yields, best_sell, best_buy, profit, config, efficiency):
+    """Result dict for one item (display / CSV shape), with its mineral breakdown."""
+    mineral_names = list(config['mineral_type_ids'])
+    yields_row = {name: as_number(yields[i, column]) for column, name in enumerate(mineral_names)}
+    
+    mineral_breakdown = {}
+    for column, name in enumerate(mineral_names):
+        base_yield = yields_row[name]
+        if base_yield > 0:
+            actual_yield = base_yield * efficiency
+            mineral_price = profit['mineral_prices'][column]
+            mineral_breakdown[name] = {
+                'base_yield': base_yield,
+                'actual_yield': actual_yield,
+                'price': mineral_price,
+                'value': actual_yield * mineral_price
+            }
+    
+    return {
+        'item': items[i],
+        'prices': {
+            'best_sell_price': float(best_sell[i]),
+            'best_buy_price': None if np.isnan(best_buy[i]) else float(best_buy[i])
+        },
+        'yields': yields_row,
+        'profit': {
+            'item_cost': float(profit['item_cost'][i]),
+            'freight_cost': float(profit['freight_cost'][i]),
+            'reprocess_tax': float(profit['reprocess_tax'][i]),
+            'total_cost': float(profit['total_cost'][i]),
+            'mineral_value_gross': float(profit['mineral_value_gross'][i]),
+            'mineral_revenue_after_tax': float(profit['mineral_revenue_after_tax'][i]),
+            'profit_per_unit': float(profit['profit_per_unit'][i]),
+            'profit_margin_pct': float(profit['profit_margin_pct'][i]),
+            'mineral_breakdown': mineral_breakdown,
+            'efficiency_used': efficiency
+        }
+    }
+
+
+def as_number(value):
+    """Whole yields back to ints, as the CSV has always shown them (fractions stay floats)."""
+    return int(value) if float(value).is_integer() else float(value)
+
 # ============================================================================
 # MAIN ANALYSIS
 # ============================================================================
@@ -334,19 +359,19 @@ def analyze_reprocessing_arbitrage(config):
         print(f"✗ Failed to connect: {e}")
         return
     
-    # Check if reprocessing yields table exists
+    # Check if the raw reprocessing data (source of the yield matrix) exists
     cursor = conn.cursor()
     cursor.execute("""
         SELECT name FROM sqlite_master 
-        WHERE type='table' AND name='item_reprocessing_yields'
+        WHERE type='table' AND name='type_materials'
     """)
     
     if not cursor.fetchone():
         print("=" * 80)
-        print("ERROR: item_reprocessing_yields table does not exist!")
+        print("ERROR: type_materials table does not exist!")
         print("=" * 80)
         print("\nYou need to run the setup script first:")
-        print("  python create_item_reprocessing_table_from_JSONL.py")
+        print("  python import_type_materials_raw.py")
         conn.close()
         return
     
@@ -355,72 +380,56 @@ def analyze_reprocessing_arbitrage(config):
     mineral_prices = get_mineral_prices_7day(conn, config)
     print()
     
-    # Get items on Jita market
+    # Get items on Jita market, with prices
     print("Fetching items from Jita market...")
-    items = get_reprocessable_items(conn, config)
+    items, best_sell, best_buy = load_market_items(conn, config)
     print(f"Found {len(items)} items on Jita market\n")
     
-    # Analyze each item
+    # Analyze every item at once
     print("Analyzing reprocessing opportunities...")
     print("-" * 80)
     
-    results = []
-    items_analyzed = 0
-    items_with_yields = 0
-    profitable_items = 0
+    yields, has_yields = load_mineral_yields(conn, items, config)
+    with_yields = has_yields & (yields.sum(axis=1) != 0)
     
-    for i, item in enumerate(items):
-        items_analyzed += 1
-        
-        # Progress indicator
-        if items_analyzed % 100 == 0:
-            print(f"  Analyzed {items_analyzed}/{len(items)} items... ({items_with_yields} with yields, {profitable_items} profitable)")
-        
-        # Get reprocessing yields
-        yields = get_reprocessing_yields(conn, item['type_id'])
-        if not yields or sum(yields.values()) == 0:
-            continue
-        
-        items_with_yields += 1
-        
-        # Get current Jita prices
-        item_prices = get_jita_prices(conn, item['type_id'], config)
-        if not item_prices['best_sell_price']:
-            continue
-        
-        # Calculate profit
-        profit_data = calculate_reprocessing_profit(
-            item, yields, mineral_prices, item_prices, config, efficiency
+    # Buy from sell orders (instant): at best sell, or walking the book
+    # when buying more than one unit
+    item_cost = best_sell
+    if config['purchase_quantity'] > 1:
+        print(f"Pricing {config['purchase_quantity']:,} units per item against Jita sell depth...")
+        item_cost = load_fill_prices(conn, items, config)
+    
+    # Items without sell orders (NULL or 0), or too few, can't be bought
+    priced = with_yields & (np.nan_to_num(item_cost) != 0)
+    
+    profit = calculate_reprocessing_profit(items, yields, item_cost, mineral_prices, config, efficiency)
+    
+    # Apply filters
+    selected = priced
+    if config['show_only_profitable']:
+        selected = (
+            selected
+            & (profit['profit_margin_pct'] >= config['min_profit_margin_pct'])
+            & (profit['profit_per_unit'] >= config['min_profit_per_unit'])
         )
-        
-        if not profit_data:
-            continue
-        
-        # Apply filters
-        if config['show_only_profitable']:
-            if profit_data['profit_margin_pct'] < config['min_profit_margin_pct']:
-                continue
-            if profit_data['profit_per_unit'] < config['min_profit_per_unit']:
-                continue
-        
-        profitable_items += 1
-        
-        # Store result
-        results.append({
-            'item': item,
-            'prices': item_prices,
-            'yields': yields,
-            'profit': profit_data
-        })
+    
+    items_analyzed = len(items)
+    items_with_yields = int(with_yields.sum())
+    profitable_items = int(selected.sum())
+    
+    # Sort by profit margin (stable, so ties keep type_name order)
+    indices = np.flatnonzero(selected)
+    indices = indices[np.argsort(-profit['profit_margin_pct'][indices], kind='stable')]
+    results = [
+        build_result(i, items, yields, best_sell, best_buy, profit, config, efficiency)
+        for i in indices
+    ]
     
     print(f"\n✓ Analysis complete!")
     print(f"  Items analyzed: {items_analyzed}")
     print(f"  Items with reprocessing yields: {items_with_yields}")
     print(f"  Profitable opportunities: {profitable_items}\n")
     
-    # Sort by profit margin
-    results.sort(key=lambda x: x['profit']['profit_margin_pct'], reverse=True)
-    
     # Display results
     display_results(results, config)
     
@@ -450,7 +459,10 @@ def display_results(results, config):
     print("\n" + "=" * 80)
     print("PROFITABLE REPROCESSING OPPORTUNITIES")
     print("=" * 80)
-    print(f"Showing top {min(50, len(results))} results (sorted by profit margin)\n")
+    print(f"Showing top {min(50, len(results))} results (sorted by profit margin)")
+    if config['purchase_quantity'] > 1:
+        print(f"Buy price is the average fill for {config['purchase_quantity']:,} units off the Jita sell book")
+    print()
     
     # Header
     print(f"{'Item Name':<40} {'Volume':>8} {'Buy':>12} {'Min Val':>12} {'Profit':>12} {'Margin':>8}")
@@ -464,7 +476,7 @@ def display_results(results, config):
         
         print(f"{item['type_name'][:40]:<40} "
               f"{item['volume']:>8.2f} "
-              f"{result['prices']['best_sell_price']:>12,.2f} "
+              f"{profit['item_cost']:>12,.2f} "
               f"{profit['mineral_value_gross']:>12,.2f} "
               f"{profit['profit_per_unit']:>12,.2f} "
               f"{profit['profit_margin_pct']:>8.1f}%")
@@ -536,7 +548,7 @@ def export_to_csv(results, config):
                     'type_name': item['type_name'],
                     'group_name': item['group_name'],
                     'volume_m3': item['volume'],
-                    'buy_price': result['prices']['best_sell_price'],
+                    'buy_price': profit['item_cost'],
                     'mineral_value': profit['mineral_value_gross'],
                     'total_cost': profit['total_cost'],
                     'revenue_after_tax': profit['mineral_revenue_after_tax'],
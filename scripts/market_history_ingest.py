@@ -0,0 +1,440 @@
+"""
+market_history_ingest.py
+
+Single-pass market history ingest.
+
+ESI's /markets/{region}/history/ returns the whole daily series for a type
+on every call. The old scripts each fetched it and kept a different slice
+(yesterday only, last 30 days for new items, everything, 30 days for
+BWF-ZZ). This engine fetches each (region, type_id) at most once per run
+and upserts every date inside the retention window that is missing or
+changed:
+
+  - yesterday's row for items already loaded     (was update_market_history_quick.py)
+  - the full window for newly prioritised items  (was update_market_history_backfill.py)
+  - the full window for every Jita-traded item   (was update_market_history.py)
+  - the full window for every BWF-ZZ item        (was update_bwf_market_history.py)
+
+New items are backfilled in the same pass they are discovered, so the
+needs_backfill flag in market_history_tracking is no longer needed (it
+is kept at 0 for compatibility).
+
+Item sets:
+    priority  your traded items + top 500 by volume in The Forge -> market_history
+    jita      every item with active orders in Jita 4-4          -> market_history
+    bwf       every item in bwf_market_orders (Geminate)         -> bwf_market_history
+
+Usage:
+    python market_history_ingest.py                    # priority + bwf
+    python market_history_ingest.py --sets jita bwf
+    python market_history_ingest.py --days 90 --force  # refetch even if current
+"""
+
+from script_utils import timed_script, stage
+import sys
+import os
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+import argparse
+import asyncio
+from datetime import datetime, timezone, timedelta
+from functools import partial
+
+# ============================================
+# CONFIGURATION
+# ============================================
+PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
+DB_PATH = os.path.join(PROJECT_DIR, 'mydatabase.db')
+ESI_BASE_URL = os.environ.get('ESI_BASE_URL', 'https://esi.evetech.net/latest')
+
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'config'))
+from setup import (
+    HOME_REGION_ID as THE_FORGE_REGION_ID,
+    HOME_STATION_ID as JITA_STATION_ID,
+    OPS_REGION_ID as GEMINATE_REGION_ID,
+)
+from esi_client import ESIClient, ESIError
+from esi_decode import decode_history
+import db
+
+# Days of history kept in market_history (older rows are pruned)
+HISTORY_DAYS = 30
+
+# Maximum simultaneous history requests (override with --concurrency)
+MAX_CONCURRENCY = 20
+
+ITEM_SETS = ('priority', 'jita', 'bwf')
+DEFAULT_SETS = ('priority', 'bwf')
+
+HISTORY_COLUMNS = ('type_id', 'region_id', 'date', 'average', 'highest', 'lowest', 'order_count', 'volume')
+VALUE_COLUMNS = ('average', 'highest', 'lowest', 'order_count', 'volume')
+
+# ============================================
+# TABLES
+# ============================================
+
+def setup_tables(conn):
+    """Create tracking and BWF history tables if they don't exist."""
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS market_history_tracking (
+            type_id INTEGER PRIMARY KEY,
+            first_loaded_date TEXT,
+            last_updated_date TEXT,
+            is_priority INTEGER DEFAULT 1,
+            needs_backfill INTEGER DEFAULT 0
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bwf_market_history (
+            type_id INTEGER NOT NULL,
+            region_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            average REAL,
+            highest REAL,
+            lowest REAL,
+            order_count INTEGER,
+            volume INTEGER,
+            PRIMARY KEY (type_id, region_id, date)
+        )
+    ''')
+
+    conn.commit()
+
+# ============================================
+# ITEM SETS
+# ============================================
+
+def get_priority_type_ids(conn):
+    """Your traded items plus the top 500 most traded items in The Forge."""
+    cursor = conn.cursor()
+
+    # Your traded items
+    cursor.execute('''
+        SELECT DISTINCT type_id
+        FROM character_orders
+        WHERE character_id = 2114278577
+    ''')
+    your_items = set(row[0] for row in cursor.fetchall())
+
+    # Top 500 most traded items
+    cursor.execute('''
+        SELECT type_id, SUM(volume) as total_volume
+        FROM market_history
+        WHERE region_id = 10000002
+        AND date >= date('now', '-30 days')
+        GROUP BY type_id
+        ORDER BY total_volume DESC
+        LIMIT 500
+    ''')
+    top_volume_items = set(row[0] for row in cursor.fetchall())
+
+    print(f"  priority: {len(your_items)} of your items, {len(top_volume_items)} top volume items")
+    return your_items | top_volume_items
+
+def get_jita_traded_type_ids(conn):
+    """Type IDs that currently have active orders in Jita 4-4."""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT DISTINCT type_id
+        FROM market_orders
+        WHERE location_id = ?
+        AND region_id = ?
+    ''', (JITA_STATION_ID, THE_FORGE_REGION_ID))
+
+    type_ids = set(row[0] for row in cursor.fetchall())
+    print(f"  jita: {len(type_ids)} items with active orders in Jita 4-4")
+    return type_ids
+
+def get_bwf_traded_type_ids(conn):
+    """All type IDs currently traded in BWF-ZZ Keepstar."""
+    cursor = conn.cursor()
+    cursor.execute('SELECT DISTINCT type_id FROM bwf_market_orders')
+
+    type_ids = set(row[0] for row in cursor.fetchall())
+    print(f"  bwf: {len(type_ids)} items in BWF-ZZ market")
+    return type_ids
+
+# Item set -> (loader, region_id, history table)
+SET_SOURCES = {
+    'priority': (get_priority_type_ids, THE_FORGE_REGION_ID, 'market_history'),
+    'jita':     (get_jita_traded_type_ids, THE_FORGE_REGION_ID, 'market_history'),
+    'bwf':      (get_bwf_traded_type_ids, GEMINATE_REGION_ID, 'bwf_market_history'),
+}
+
+def get_latest_dates(conn, table, region_id):
+    """Latest stored history date per type_id for one table/region."""
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT type_id, MAX(date)
+        FROM {table}
+        WHERE region_id = ?
+        GROUP BY type_id
+    ''', (region_id,))
+    return dict(cursor.fetchall())
+
+def plan_jobs(conn, sets, target_date, force=False):
+    """
+    Build the de-duplicated fetch list: one (table, region_id, type_id) job
+    per pair, skipping pairs whose table already holds target_date unless
+    force is set. Returns (jobs, skipped_count, new_type_ids).
+    """
+    wanted = {}
+    for name in sets:
+        loader, region_id, table = SET_SOURCES[name]
+        wanted.setdefault((table, region_id), set()).update(loader(conn))
+
+    jobs = []
+    skipped = 0
+    new_type_ids = set()
+
+    for (table, region_id), type_ids in wanted.items():
+        latest = get_latest_dates(conn, table, region_id)
+        for type_id in sorted(type_ids):
+            last_date = latest.get(type_id)
+            if last_date is None:
+                new_type_ids.add(type_id)
+            elif last_date >= target_date and not force:
+                skipped += 1
+                continue
+            jobs.append((table, region_id, type_id))
+
+    return jobs, skipped, new_type_ids
+
+# ============================================
+# FETCH
+# ============================================
+
+async def fetch_job(esi, job, cutoff_date):
+    """Fetch one (table, region_id, type_id). Returns (job, rows, failed)."""
+    table, region_id, type_id = job
+    try:
+        # Decoded straight into HISTORY_COLUMNS tuples inside the retention window
+        rows = await esi.get_json(
+            f'/markets/{region_id}/history/', {'type_id': type_id},
+            decode=partial(decode_history, type_id=type_id, region_id=region_id, since=cutoff_date)
+        )
+    except ESIError as e:
+        print(f"\n[WARNING] type_id {type_id} (region {region_id}): {e}")
+        return job, [], True
+
+    return job, rows or [], False
+
+async def fetch_jobs(jobs, cutoff_date, concurrency=MAX_CONCURRENCY):
+    """
+    Fetch every job concurrently on one ESI client (bounded parallelism,
+    shared error budget and retries). Returns (rows_by_table, fetched_jobs,
+    failed_jobs).
+    """
+    rows_by_table = {}
+    fetched = []
+    failed = []
+    total = len(jobs)
+
+    async with ESIClient(concurrency=concurrency, base_url=ESI_BASE_URL) as esi:
+        tasks = [asyncio.ensure_future(fetch_job(esi, job, cutoff_date)) for job in jobs]
+
+        for index, task in enumerate(asyncio.as_completed(tasks), 1):
+            job, rows, error = await task
+            if error:
+                failed.append(job)
+            else:
+                fetched.append((job, rows))
+                rows_by_table.setdefault(job[0], []).extend(rows)
+
+            if index % 100 == 0 or index == total:
+                print(f"Progress: {index}/{total} items... ({len(failed)} failed)")
+
+    esi.report()
+    return rows_by_table, fetched, failed
+
+# ============================================
+# WRITE
+# ============================================
+
+def upsert_history(conn, table, rows):
+    """
+    Upsert history rows with one executemany(). Rows that already exist
+    with identical values are left untouched. Returns rows written.
+    """
+    updates = ', '.join(f'{col} = excluded.{col}' for col in VALUE_COLUMNS)
+    changed = ' OR '.join(f'{col} IS NOT excluded.{col}' for col in VALUE_COLUMNS)
+
+    before = conn.total_changes
+    conn.executemany(f'''
+        INSERT INTO {table} ({', '.join(HISTORY_COLUMNS)})
+        VALUES ({', '.join('?' * len(HISTORY_COLUMNS))})
+        ON CONFLICT (type_id, region_id, date) DO UPDATE SET {updates}
+        WHERE {changed}
+    ''', rows)
+    return conn.total_changes - before
+
+def update_tracking(conn, fetched, today):
+    """
+    Record every fetched The Forge item in market_history_tracking in bulk.
+    New items get first_loaded_date; all get last_updated_date set to their
+    newest history day. Backfill happens inline, so needs_backfill stays 0.
+    """
+    rows = []
+    for (table, region_id, type_id), history_rows in fetched:
+        if table != 'market_history' or region_id != THE_FORGE_REGION_ID:
+            continue
+        last_date = max((row[2] for row in history_rows), default=None)
+        rows.append((type_id, today, last_date))
+
+    conn.executemany('''
+        INSERT INTO market_history_tracking
+            (type_id, first_loaded_date, last_updated_date, needs_backfill)
+        VALUES (?, ?, ?, 0)
+        ON CONFLICT (type_id) DO UPDATE SET
+            last_updated_date = COALESCE(excluded.last_updated_date, last_updated_date),
+            needs_backfill = 0
+    ''', rows)
+    return len(rows)
+
+def cleanup_old_history(conn, days=HISTORY_DAYS):
+    """Delete market_history older than X days. Very fast - takes <1 second."""
+    cursor = conn.cursor()
+
+    cutoff_date = (datetime.now(timezone.utc) - timedelta(days=days)).date().isoformat()
+
+    print(f"\n>>> Cleaning up history older than {cutoff_date}...")
+
+    cursor.execute('''
+        DELETE FROM market_history
+        WHERE date < ?
+    ''', (cutoff_date,))
+
+    deleted = cursor.rowcount
+    conn.commit()
+
+    print(f"[OK] Deleted {deleted:,} old records")
+
+    return deleted
+
+# ============================================
+# ENGINE
+# ============================================
+
+def run_ingest(sets=DEFAULT_SETS, days=HISTORY_DAYS, concurrency=MAX_CONCURRENCY, force=False):
+    """
+    Fetch and upsert history for the given item sets in a single pass.
+    Returns a summary dict.
+    """
+    now = datetime.now(timezone.utc)
+    target_date = (now - timedelta(days=1)).date().isoformat()
+    cutoff_date = (now - timedelta(days=days)).date().isoformat()
+
+    print(f"\nConnecting to database: {DB_PATH}")
+    conn = db.connect(DB_PATH)
+
+    try:
+        setup_tables(conn)
+
+        print(f"\nItem sets: {', '.join(sets)}")
+        print(f"Window: {cutoff_date} .. {target_date} ({days} days)")
+        with stage('plan') as s:
+            jobs, skipped, new_type_ids = plan_jobs(conn, sets, target_date, force)
+            s.rows = len(jobs)
+
+        print(f"\n>>> Fetching history for {len(jobs)} items "
+              f"({len(new_type_ids)} new, backfilled inline; {skipped} already current)")
+
+        rows_by_table, fetched, failed = {}, [], []
+        if jobs:
+            with stage('fetch') as s:
+                rows_by_table, fetched, failed = asyncio.run(fetch_jobs(jobs, cutoff_date, concurrency))
+                s.rows = sum(len(rows) for rows in rows_by_table.values())
+
+        # Write everything in one transaction
+        written = {}
+        with stage('load') as s:
+            for table, rows in rows_by_table.items():
+                written[table] = upsert_history(conn, table, rows)
+            tracked = update_tracking(conn, fetched, now.date().isoformat())
+            conn.commit()
+            s.rows = sum(written.values())
+
+        deleted = 0
+        if 'priority' in sets or 'jita' in sets:
+            with stage('cleanup') as s:
+                deleted = s.rows = cleanup_old_history(conn, days)
+
+    finally:
+        conn.close()
+
+    summary = {
+        'requests': len(jobs),
+        'skipped': skipped,
+        'new_items': len(new_type_ids),
+        'failed': len(failed),
+        'rows_written': written,
+        'tracked': tracked,
+        'deleted': deleted,
+    }
+
+    print(f"\n{'=' * 80}")
+    print("SUMMARY:")
+    print(f"{'=' * 80}")
+    print(f"History requests: {len(jobs)} ({skipped} items already current)")
+    print(f"New items backfilled: {len(new_type_ids)}")
+    for table, count in written.items():
+        print(f"Rows inserted/changed in {table}: {count:,}")
+    print(f"Failed: {len(failed)}")
+    print(f"Old records deleted: {deleted:,}")
+
+    return summary
+
+# ============================================
+# MAIN SCRIPT
+# ============================================
+
+def parse_args(default_sets=DEFAULT_SETS):
+    parser = argparse.ArgumentParser(
+        description="Single-pass market history ingest (daily, backfill and BWF-ZZ)."
+    )
+    parser.add_argument(
+        "--sets", nargs='+', choices=ITEM_SETS, default=list(default_sets),
+        help=f"Item sets to ingest (default: {' '.join(default_sets)})"
+    )
+    parser.add_argument(
+        "--days", type=int, default=HISTORY_DAYS,
+        help=f"Days of history to keep and backfill (default: {HISTORY_DAYS})"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=MAX_CONCURRENCY,
+        help=f"Maximum simultaneous ESI history requests (default: {MAX_CONCURRENCY})"
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="Refetch items that already have yesterday's row"
+    )
+    parser.add_argument(
+        "--esi-base-url", default=ESI_BASE_URL,
+        help="ESI root URL, e.g. a local esi_simulator.py (default: $ESI_BASE_URL or the live ESI)"
+    )
+    args = parser.parse_args()
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.days < 1:
+        parser.error("--days must be at least 1")
+    return args
+
+@timed_script
+def main(default_sets=DEFAULT_SETS):
+    global ESI_BASE_URL
+    args = parse_args(default_sets)
+    ESI_BASE_URL = args.esi_base_url
+
+    print("=" * 80)
+    print("MARKET HISTORY INGEST")
+    print("=" * 80)
+
+    run_ingest(args.sets, args.days, args.concurrency, args.force)
+
+if __name__ == '__main__':
+    main()
@@ -60,7 +60,7 @@ def run(min_margin=MIN_NET_MARGIN_PCT, min_vol=MIN_AVG_DAILY_VOL, limit=50):
     conn.row_factory = sqlite3.Row
     c = conn.cursor()
 
-    snap_cutoff = (datetime.now(timezone.utc) - timedelta(days=SNAPSHOT_LOOKBACK_DAYS)).isoformat()
+    snap_cutoff = int((datetime.now(timezone.utc) - timedelta(days=SNAPSHOT_LOOKBACK_DAYS)).timestamp())
 
     params = {
         "sell_rev":        SELL_REV_MULT,
@@ -81,22 +81,21 @@ def run(min_margin=MIN_NET_MARGIN_PCT, min_vol=MIN_AVG_DAILY_VOL, limit=50):
 
     c.execute("""
         WITH
-        -- ── Live spread from current market orders ──────────────────────────
+        -- ── Live spread from the materialized top of book ───────────────────
         spread AS (
             SELECT
                 type_id,
-                MAX(CASE WHEN is_buy_order = 1 THEN price END) AS best_buy,
-                MIN(CASE WHEN is_buy_order = 0 THEN price END) AS best_sell,
-                COUNT(CASE WHEN is_buy_order = 1 THEN 1 END)   AS buy_orders,
-                COUNT(CASE WHEN is_buy_order = 0 THEN 1 END)   AS sell_orders,
-                SUM(CASE WHEN is_buy_order = 1 THEN volume_remain END) AS buy_vol_available,
-                SUM(CASE WHEN is_buy_order = 0 THEN volume_remain END) AS sell_vol_available
-            FROM market_orders
+                best_buy,
+                best_sell,
+                buy_orders,
+                sell_orders,
+                buy_volume  AS buy_vol_available,
+                sell_volume AS sell_vol_available
+            FROM market_top_of_book
             WHERE location_id = :jita AND region_id = :forge
-            GROUP BY type_id
-            HAVING best_buy IS NOT NULL
-               AND best_sell IS NOT NULL
-               AND best_sell > best_buy
+              AND best_buy IS NOT NULL
+              AND best_sell IS NOT NULL
+              AND best_sell > best_buy
         ),
 
         -- ── Historical volume (from market_history — may be a few weeks old) ─
@@ -127,8 +126,8 @@ def run(min_margin=MIN_NET_MARGIN_PCT, min_vol=MIN_AVG_DAILY_VOL, limit=50):
                 CASE WHEN AVG(best_sell) > 0
                      THEN (MAX(best_sell) - MIN(best_sell)) / AVG(best_sell) * 100
                      ELSE NULL END                                AS sell_volatility_pct
-            FROM market_price_snapshots
-            WHERE timestamp >= :snap_cutoff
+            FROM market_price_snapshots_raw
+            WHERE ts >= :snap_cutoff
             GROUP BY type_id
             HAVING COUNT(*) >= :min_snaps
         )
@@ -0,0 +1,425 @@
+"""
+name_resolver.py
+
+Item-name resolution for pasted orders, doctrine fits and searches.
+
+Every place that turns a typed item name into a type_id used to match
+the exact inv_types.type_name with a query per line, so "tritanium" or
+"Large Shield Extendr II" dropped the line without saying why. This
+module compiles the published type names once into an index and
+resolves names against it in memory, in order of confidence:
+
+    exact       the name as typed
+    casefold    ignoring case and repeated whitespace
+    prefix      the only name starting with what was typed
+    fuzzy       best trigram (Dice) similarity, clear of the runner-up
+
+A name that fits several types equally well comes back 'ambiguous' with
+the candidates, one that fits nothing 'unknown'; neither gets a type_id.
+So does a fuzzy match whose runner-up is the same item in another tech
+level or numbered variant ('hobgoblin 2' -> Hobgoblin I / Hobgoblin II)
+unless the typed tier token is exactly the best match's.
+
+Only CONFIDENT matches (exact / casefold / prefix) should be used
+unattended: a fuzzy match is a suggestion, and quotes and imports list
+it as unresolved with the name it would have been.
+
+The index is written to name_index.npz (names sorted by their casefolded
+key, plus a CSR trigram -> names posting list), so a process loads it
+with load_name_index() instead of re-reading inv_types. A signature of the published
+inv_types names is stored with it, so load_name_index(conn) rebuilds it
+when the names change.
+
+Each resolution is a dict:
+    name        what was asked for
+    match       exact / casefold / prefix / fuzzy / ambiguous / unknown
+    type_id     the matched type (None unless resolved)
+    type_name   its canonical name
+    score       1.0 for exact / casefold / prefix, Dice similarity for fuzzy
+    candidates  [(type_id, type_name, score), ...] best first, for
+                ambiguous and fuzzy matches
+
+Usage:
+    python name_resolver.py --build                      # rebuild name_index.npz
+    python name_resolver.py "tritanum" "Large Shield Ext"
+    python name_resolver.py --file order.txt             # one name per line
+
+    index = load_name_index(conn)
+    index.resolve(['Tritanium', 'rifter', 'Larg Shield Extender II'])
+    index.type_ids(names)                                # {name: type_id} of the confident ones
+    index.search('caldari navy', limit=20)               # ranked (type_id, type_name, score)
+"""
+
+import argparse
+import hashlib
+import sys
+from bisect import bisect_left
+from pathlib import Path
+
+import numpy as np
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = SCRIPT_DIR.parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from script_utils import timed_script
+import db
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────────
+
+DB_PATH = str(PROJECT_DIR / 'mydatabase.db')
+NAME_INDEX_PATH = PROJECT_DIR / 'name_index.npz'
+
+# Bump when the .npz layout changes; older files are rebuilt
+INDEX_VERSION = 1
+
+# Shortest input tried as a prefix of a longer name
+MIN_PREFIX_LENGTH = 4
+
+# Lowest trigram similarity accepted as a fuzzy match
+FUZZY_MIN_SCORE = 0.6
+
+# A fuzzy match closer than this to the runner-up is ambiguous
+AMBIGUITY_MARGIN = 0.05
+
+# Candidates reported with ambiguous and fuzzy matches
+MAX_CANDIDATES = 5
+
+RESOLVED = ('exact', 'casefold', 'prefix', 'fuzzy')
+
+# Matches safe to apply without someone confirming them
+CONFIDENT = ('exact', 'casefold', 'prefix')
+
+# Trailing tokens that tell variants of one item apart (meta / tech level, numbers)
+TIER_TOKENS = frozenset(('i', 'ii', 'iii', 'iv', 'v', 'vi', 'vii', 'viii', 'ix', 'x'))
+
+# ─── NORMALIZATION ────────────────────────────────────────────────────────────
+
+def fold(name):
+    """Lookup key of a name: casefolded, whitespace collapsed."""
+    return ' '.join(name.split()).casefold()
+
+
+def split_tier(key):
+    """(stem, tier) of a folded key: tier is a trailing roman numeral or number, else ''."""
+    stem, _, last = key.rpartition(' ')
+    if stem and (last in TIER_TOKENS or last.isdigit()):
+        return stem, last
+    return key, ''
+
+
+def trigrams(key):
+    """Distinct trigrams of a folded key, padded so short names and word starts count."""
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def source_signature(conn):
+    """
+    Fingerprint of the published type names the index was built from: a
+    64-bit digest of every (type_id, type_name) in type_id order, so a
+    rename is caught even when the name keeps its length.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    count = 0
+    for type_id, name in conn.execute("""
+        SELECT type_id, type_name FROM inv_types
+        WHERE published = 1 AND type_name IS NOT NULL AND type_name != ''
+        ORDER BY type_id
+    """):
+        digest.update(f"{type_id}\t{name}\n".encode('utf-8'))
+        count += 1
+    return [INDEX_VERSION, count, int.from_bytes(digest.digest(), 'little', signed=True)]
+
+# ─── INDEX ────────────────────────────────────────────────────────────────────
+
+class NameIndex:
+    """
+    Published type names sorted by folded key. The names sharing trigram
+    grams[g] are rows postings[indptr[g]:indptr[g + 1]]; gram_counts
+    holds how many distinct trigrams each name has.
+    """
+
+    def __init__(self, type_ids, names, grams, indptr, postings, gram_counts, signature=None):
+        self.type_ids = type_ids
+        self.names = names
+        self.indptr = indptr
+        self.postings = postings
+        self.gram_counts = gram_counts
+        self.signature = signature
+
+        self.keys = [fold(name) for name in names]
+        self.gram_rows = {gram: i for i, gram in enumerate(grams)}
+        self.exact = {}
+        self.folded = {}
+        for row, (name, key) in enumerate(zip(names, self.keys)):
+            # Rows are in key order and then type_id, so the lowest type_id wins a duplicate
+            self.exact.setdefault(name, row)
+            self.folded.setdefault(key, []).append(row)
+
+    def __len__(self):
+        return len(self.names)
+
+    def candidate(self, row, score=1.0):
+        return (int(self.type_ids[row]), self.names[row], round(score, 3))
+
+    def result(self, name, match, row=None, score=1.0, candidates=()):
+        return {
+            'name': name,
+            'match': match,
+            'type_id': int(self.type_ids[row]) if row is not None else None,
+            'type_name': self.names[row] if row is not None else None,
+            'score': round(score, 3) if row is not None else 0.0,
+            'candidates': list(candidates),
+        }
+
+    def prefixed(self, key, limit):
+        """Rows whose key starts with key, up to limit."""
+        rows = []
+        row = bisect_left(self.keys, key)
+        while row < len(self.keys) and self.keys[row].startswith(key) and len(rows) < limit:
+            rows.append(row)
+            row += 1
+        return rows
+
+    def similar(self, key, limit=MAX_CANDIDATES, min_score=FUZZY_MIN_SCORE):
+        """
+        [(row, score), ...] best first: the names sharing most trigrams
+        with key, scoring at least min_score.
+        """
+        query = trigrams(key)
+        gram_ids = [self.gram_rows[gram] for gram in query if gram in self.gram_rows]
+        if not gram_ids:
+            return []
+        rows = np.concatenate([self.postings[self.indptr[g]:self.indptr[g + 1]] for g in gram_ids])
+        shared = np.bincount(rows, minlength=len(self.names))
+        scores = 2.0 * shared / (len(query) + self.gram_counts)
+
+        top = np.argpartition(-scores, limit)[:limit] if len(scores) > limit else np.arange(len(scores))
+        top = top[np.lexsort((top, -scores[top]))]
+        return [(int(row), float(scores[row])) for row in top if scores[row] >= min_score]
+
+    def resolve_one(self, name):
+        """Resolution dict for one name."""
+        if name in self.exact:
+            return self.result(name, 'exact', self.exact[name])
+
+        key = fold(name)
+        if not key:
+            return self.result(name, 'unknown')
+
+        rows = self.folded.get(key)
+        if rows:
+            if len(rows) == 1:
+                return self.result(name, 'casefold', rows[0])
+            return self.result(name, 'ambiguous', candidates=[self.candidate(row) for row in rows])
+
+        if len(key) >= MIN_PREFIX_LENGTH:
+            rows = self.prefixed(key, MAX_CANDIDATES + 1)
+            if len(rows) == 1:
+                return self.result(name, 'prefix', rows[0])
+            if rows:
+                return self.result(name, 'ambiguous', candidates=[self.candidate(row) for row in rows[:MAX_CANDIDATES]])
+
+        similar = self.similar(key)
+        if not similar:
+            return self.result(name, 'unknown')
+        candidates = [self.candidate(row, score) for row, score in similar]
+        best_row, best_score = similar[0]
+        if len(similar) > 1 and best_score - similar[1][1] < AMBIGUITY_MARGIN:
+            return self.result(name, 'ambiguous', candidates=candidates)
+
+        # Never pick a tier for the user: I vs II, 2 vs II, III vs II
+        best_stem, best_tier = split_tier(self.keys[best_row])
+        variants = [row for row, _ in similar[1:] if split_tier(self.keys[row])[0] == best_stem]
+        if variants and split_tier(key)[1] != best_tier:
+            return self.result(name, 'ambiguous', candidates=candidates)
+        return self.result(name, 'fuzzy', best_row, best_score, candidates)
+
+    def resolve(self, names):
+        """Resolution dicts for names, in order (repeated names are resolved once)."""
+        names = list(names)
+        seen = {}
+        for name in names:
+            if name not in seen:
+                seen[name] = self.resolve_one(name)
+        return [seen[name] for name in names]
+
+    def type_ids(self, names):
+        """{name: type_id} for the names that resolve confidently (no fuzzy guesses)."""
+        return {
+            result['name']: result['type_id']
+            for result in self.resolve(names) if result['match'] in CONFIDENT
+        }
+
+    def search(self, text, limit=20):
+        """
+        Ranked (type_id, type_name, score) for a search box: names
+        containing the text first, then the closest by trigrams.
+        """
+        key = fold(text)
+        if not key:
+            return []
+        found = [(row, 1.0) for row, name_key in enumerate(self.keys) if key in name_key][:limit]
+        if len(found) < limit:
+            found_rows = {row for row, _ in found}
+            found += [match for match in self.similar(key, limit) if match[0] not in found_rows][:limit - len(found)]
+        return [self.candidate(row, score) for row, score in found]
+
+
+def describe(result):
+    """One-line note on a resolution that wasn't exact (for [INFO] / [WARNING] output)."""
+    match = result['match']
+    if match in ('casefold', 'prefix'):
+        return f"'{result['name']}' -> '{result['type_name']}' ({match})"
+    if match == 'fuzzy':
+        return f"'{result['name']}' is not an item name - did you mean '{result['type_name']}' ({result['score']:.2f})?"
+    if match == 'ambiguous':
+        options = ', '.join(f"'{name}'" for _, name, _ in result['candidates'])
+        return f"'{result['name']}' is ambiguous: {options}"
+    if match == 'unknown':
+        return f"'{result['name']}' matches no item"
+    return f"'{result['name']}'"
+
+# ─── BUILD ────────────────────────────────────────────────────────────────────
+
+def pack(strings):
+    """Newline-joined UTF-8 bytes as a uint8 array (names never contain newlines)."""
+    return np.frombuffer('\n'.join(strings).encode('utf-8'), dtype=np.uint8)
+
+
+def unpack(array):
+    text = array.tobytes().decode('utf-8')
+    return text.split('\n') if text else []
+
+
+def build_name_index(conn, path=None):
+    """Index every published type name and write the .npz. Returns the NameIndex."""
+    path = Path(path or NAME_INDEX_PATH)
+    signature = source_signature(conn)
+    rows = conn.execute("""
+        SELECT type_id, type_name FROM inv_types
+        WHERE published = 1 AND type_name IS NOT NULL AND type_name != ''
+    """).fetchall()
+    rows = [(type_id, ' '.join(name.split())) for type_id, name in rows]
+    rows.sort(key=lambda row: (fold(row[1]), row[0]))
+
+    postings = {}
+    gram_counts = []
+    for row, (_, name) in enumerate(rows):
+        grams = trigrams(fold(name))
+        gram_counts.append(len(grams))
+        for gram in grams:
+            postings.setdefault(gram, []).append(row)
+
+    grams = sorted(postings)
+    indptr = np.zeros(len(grams) + 1, dtype=np.int32)
+    indptr[1:] = np.cumsum([len(postings[gram]) for gram in grams])
+
+    index = NameIndex(
+        np.array([type_id for type_id, _ in rows], dtype=np.int32),
+        [name for _, name in rows],
+        grams,
+        indptr,
+        np.array([row for gram in grams for row in postings[gram]], dtype=np.int32),
+        np.array(gram_counts, dtype=np.int32),
+        signature,
+    )
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.stem + '.tmp.npz')
+    np.savez(
+        tmp_path,
+        type_ids=index.type_ids, names=pack(index.names), grams=pack(grams),
+        indptr=index.indptr, postings=index.postings, gram_counts=index.gram_counts,
+        signature=np.array(signature, dtype=np.int64),
+    )
+    tmp_path.replace(path)
+
+    _loaded.clear()
+    return index
+
+# ─── LOAD ─────────────────────────────────────────────────────────────────────
+
+# Loaded indexes by (path, mtime), so repeated calls in one process are free
+_loaded = {}
+
+
+def read_name_index(path=None):
+    """Load a built .npz, or None if it is missing or from an older layout."""
+    path = Path(path or NAME_INDEX_PATH)
+    if not path.exists():
+        return None
+    key = (str(path), path.stat().st_mtime_ns)
+    if key not in _loaded:
+        with np.load(path) as data:
+            signature = data['signature'].tolist()
+            if signature[0] != INDEX_VERSION:
+                return None
+            _loaded.clear()
+            _loaded[key] = NameIndex(
+                data['type_ids'], unpack(data['names']), unpack(data['grams']),
+                data['indptr'], data['postings'], data['gram_counts'], signature,
+            )
+    return _loaded[key]
+
+
+def load_name_index(conn=None, path=None):
+    """
+    The name index. With a connection, it is (re)built first when it is
+    missing or the published names have changed since it was built;
+    without one, the file is used as it is.
+    """
+    index = read_name_index(path)
+    if conn is not None and (index is None or index.signature != source_signature(conn)):
+        index = build_name_index(conn, path)
+    if index is None:
+        raise FileNotFoundError(f"No name index at {path or NAME_INDEX_PATH} - run name_resolver.py --build")
+    return index
+
+# ─── MAIN ─────────────────────────────────────────────────────────────────────
+
+@timed_script
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build the item-name index or resolve names against it."
+    )
+    parser.add_argument("names",   nargs='*',                help="Item names to resolve")
+    parser.add_argument("--build", action="store_true",      help="Rebuild name_index.npz")
+    parser.add_argument("--file",  type=Path, default=None,  help="Resolve the names in a file, one per line")
+    args = parser.parse_args()
+
+    conn = db.connect(DB_PATH)
+
+    if args.build:
+        index = build_name_index(conn)
+        size_kb = NAME_INDEX_PATH.stat().st_size / 1024
+        print(f"\n  [OK] {len(index):,} names, {len(index.gram_rows):,} trigrams -> "
+              f"{NAME_INDEX_PATH.name} ({size_kb:,.0f} KB)\n")
+
+    names = list(args.names)
+    if args.file:
+        names += [line.strip() for line in args.file.read_text(encoding='utf-8').splitlines() if line.strip()]
+
+    if names:
+        index = load_name_index(conn)
+        results = index.resolve(names)
+        print()
+        for result in results:
+            type_id = result['type_id'] if result['type_id'] is not None else '-'
+            print(f"  {result['match']:<10} {type_id:>10}  {result['name']}"
+                  + (f"  ->  {result['type_name']}" if result['type_name'] not in (None, result['name']) else ""))
+            if result['match'] == 'ambiguous':
+                for candidate_id, candidate_name, score in result['candidates']:
+                    print(f"  {'':<10} {candidate_id:>10}    ? {candidate_name} ({score:.2f})")
+        resolved = sum(result['match'] in CONFIDENT for result in results)
+        suggested = sum(result['match'] == 'fuzzy' for result in results)
+        print(f"\n  [OK] {resolved}/{len(results)} names resolved, {suggested} fuzzy suggestion(s)\n")
+    elif not args.build:
+        parser.print_help()
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
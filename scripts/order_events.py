@@ -0,0 +1,313 @@
+"""
+order_events.py
+
+Append-only change-event log for the order-book tables (market_orders and
+bwf_market_orders). Every refresh compares the freshly loaded staging table
+against the live table and appends one compact row per changed order to
+order_book_events, grouped under a row in order_book_refreshes.
+
+market_price_snapshots only keeps the top of book per tracked item; the
+event log keeps everything in between, so past book state can be rebuilt
+and fill velocity measured without storing full copies of the book.
+
+Event kinds:
+    new        - order_id appeared
+    repriced   - price changed (volume may also have changed)
+    filled     - volume_remain dropped at the same price
+    cancelled  - order_id vanished. ESI cannot tell a cancel, an expiry and
+                 a final fill apart, so all vanished orders land here.
+
+Each changed order gets exactly one event, so the per-refresh counts add
+up to the number of orders that changed; a repriced order whose volume
+also dropped counts as repriced only (its fill still shows up in
+fill_velocity, which reads the volumes rather than the kind).
+
+Retention is time-partitioned: refresh_id grows with time and clusters the
+WITHOUT ROWID event table, so pruning old refreshes is a range delete on
+the primary key.
+
+Usage:
+    python order_events.py --refreshes                       # recent refreshes + counts
+    python order_events.py --velocity 34 --days 7            # Tritanium fill velocity
+    python order_events.py --book 1234 --source market_orders  # rebuild book at refresh 1234
+    python order_events.py --prune 30                        # drop events older than 30 days
+"""
+
+import argparse
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = SCRIPT_DIR.parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from script_utils import timed_script
+import db
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────────
+
+DB_PATH = str(PROJECT_DIR / 'mydatabase.db')
+
+# Events older than this are pruned after each refresh
+EVENT_RETENTION_DAYS = 30
+
+# ─── DATABASE ─────────────────────────────────────────────────────────────────
+
+def init_event_tables(conn):
+    """Creates the refresh and event tables if they don't exist."""
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS order_book_refreshes (
+            refresh_id      INTEGER PRIMARY KEY AUTOINCREMENT,
+            source          TEXT NOT NULL,
+            refreshed_at    TEXT NOT NULL,
+            new_count       INTEGER NOT NULL DEFAULT 0,
+            repriced_count  INTEGER NOT NULL DEFAULT 0,
+            filled_count    INTEGER NOT NULL DEFAULT 0,
+            cancelled_count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS order_book_events (
+            refresh_id   INTEGER NOT NULL,
+            order_id     INTEGER NOT NULL,
+            type_id      INTEGER NOT NULL,
+            is_buy_order INTEGER NOT NULL,
+            kind         TEXT NOT NULL,
+            old_price    REAL,
+            new_price    REAL,
+            old_volume   INTEGER,
+            new_volume   INTEGER,
+            PRIMARY KEY (refresh_id, order_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_obr_source_time ON order_book_refreshes(source, refreshed_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_obe_type        ON order_book_events(type_id, refresh_id)")
+
+# ─── RECORDING ────────────────────────────────────────────────────────────────
+
+def record_order_events(conn, source, staging_table, live_table):
+    """
+    Appends change events between staging_table (new book) and live_table
+    (current book) and returns {'new', 'repriced', 'filled', 'cancelled'}
+    counts plus the refresh_id the events were logged under. Must run before the live table is swapped or merged, and is
+    meant to be called inside the caller's refresh transaction.
+
+    Returns None if the live table does not exist yet (first refresh - the
+    book itself is the baseline).
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (live_table,)
+    )
+    if cursor.fetchone() is None:
+        return None
+
+    init_event_tables(conn)
+
+    cursor.execute(
+        "INSERT INTO order_book_refreshes (source, refreshed_at) VALUES (?, ?)",
+        (source, datetime.now(timezone.utc).isoformat())
+    )
+    refresh_id = cursor.lastrowid
+
+    cursor.execute(f"""
+        INSERT INTO order_book_events (
+            refresh_id, order_id, type_id, is_buy_order, kind,
+            old_price, new_price, old_volume, new_volume
+        )
+        SELECT :refresh_id, s.order_id, s.type_id, s.is_buy_order, 'new',
+               NULL, s.price, NULL, s.volume_remain
+        FROM {staging_table} s
+        WHERE NOT EXISTS (SELECT 1 FROM {live_table} l WHERE l.order_id = s.order_id)
+
+        UNION ALL
+
+        SELECT :refresh_id, s.order_id, s.type_id, s.is_buy_order,
+               CASE WHEN s.price <> l.price THEN 'repriced' ELSE 'filled' END,
+               l.price, s.price, l.volume_remain, s.volume_remain
+        FROM {staging_table} s
+        JOIN {live_table} l ON l.order_id = s.order_id
+        WHERE s.price <> l.price OR s.volume_remain <> l.volume_remain
+
+        UNION ALL
+
+        SELECT :refresh_id, l.order_id, l.type_id, l.is_buy_order, 'cancelled',
+               l.price, NULL, l.volume_remain, NULL
+        FROM {live_table} l
+        WHERE NOT EXISTS (SELECT 1 FROM {staging_table} s WHERE s.order_id = l.order_id)
+    """, {'refresh_id': refresh_id})
+
+    cursor.execute("""
+        SELECT
+            COALESCE(SUM(kind = 'new'), 0),
+            COALESCE(SUM(kind = 'repriced'), 0),
+            COALESCE(SUM(kind = 'filled'), 0),
+            COALESCE(SUM(kind = 'cancelled'), 0)
+        FROM order_book_events
+        WHERE refresh_id = ?
+    """, (refresh_id,))
+    new, repriced, filled, cancelled = cursor.fetchone()
+
+    cursor.execute("""
+        UPDATE order_book_refreshes
+        SET new_count = ?, repriced_count = ?, filled_count = ?, cancelled_count = ?
+        WHERE refresh_id = ?
+    """, (new, repriced, filled, cancelled, refresh_id))
+
+    prune_order_events(conn, EVENT_RETENTION_DAYS)
+
+    return {'new': new, 'repriced': repriced, 'filled': filled, 'cancelled': cancelled,
+            'refresh_id': refresh_id}
+
+
+def prune_order_events(conn, days):
+    """
+    Drops refreshes (and their events) older than N days.
+    refresh_id is monotonic in time, so this is a primary-key range delete.
+    Does not commit - runs inside the caller's transaction.
+    """
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT MAX(refresh_id) FROM order_book_refreshes WHERE refreshed_at < ?", (cutoff,)
+    )
+    last_expired = cursor.fetchone()[0]
+    if last_expired is None:
+        return 0
+
+    cursor.execute("DELETE FROM order_book_events WHERE refresh_id <= ?", (last_expired,))
+    deleted = cursor.rowcount
+    cursor.execute("DELETE FROM order_book_refreshes WHERE refresh_id <= ?", (last_expired,))
+    return deleted
+
+# ─── ANALYSIS ─────────────────────────────────────────────────────────────────
+
+def reconstruct_book(conn, source, refresh_id):
+    """
+    Rebuilds the order book as it stood right after refresh_id.
+
+    Starts from the live table and undoes every later event, newest first.
+    Returns {order_id: (type_id, is_buy_order, price, volume_remain)}.
+    Only works back to the oldest retained refresh.
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT order_id, type_id, is_buy_order, price, volume_remain FROM {source}")
+    book = {row[0]: row[1:] for row in cursor.fetchall()}
+
+    cursor.execute("""
+        SELECT e.order_id, e.type_id, e.is_buy_order, e.kind, e.old_price, e.old_volume
+        FROM order_book_events e
+        JOIN order_book_refreshes r ON r.refresh_id = e.refresh_id
+        WHERE r.source = ? AND e.refresh_id > ?
+        ORDER BY e.refresh_id DESC
+    """, (source, refresh_id))
+
+    for order_id, type_id, is_buy, kind, old_price, old_volume in cursor:
+        if kind == 'new':
+            book.pop(order_id, None)
+        else:
+            book[order_id] = (type_id, is_buy, old_price, old_volume)
+
+    return book
+
+
+def fill_velocity(conn, source, type_id, days):
+    """
+    Units filled per hour for a type over the last N days, split by side.
+    Only counts volume_remain drops on orders that are still live (partial
+    fills); vanished orders are excluded because ESI doesn't say whether
+    they filled or were cancelled.
+    Returns {'buy': units_per_hour, 'sell': units_per_hour, 'hours': window}.
+    """
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        SELECT MIN(refreshed_at), MAX(refreshed_at)
+        FROM order_book_refreshes
+        WHERE source = ? AND refreshed_at >= ?
+    """, (source, cutoff))
+    first, last = cursor.fetchone()
+    if not first or first == last:
+        return {'buy': 0.0, 'sell': 0.0, 'hours': 0.0}
+
+    hours = (datetime.fromisoformat(last) - datetime.fromisoformat(first)).total_seconds() / 3600
+
+    cursor.execute("""
+        SELECT e.is_buy_order, SUM(e.old_volume - e.new_volume)
+        FROM order_book_events e
+        JOIN order_book_refreshes r ON r.refresh_id = e.refresh_id
+        WHERE r.source = ? AND r.refreshed_at > ? AND e.type_id = ?
+          AND e.new_volume < e.old_volume
+        GROUP BY e.is_buy_order
+    """, (source, first, type_id))
+    filled = dict(cursor.fetchall())
+
+    return {
+        'buy': (filled.get(1) or 0) / hours,
+        'sell': (filled.get(0) or 0) / hours,
+        'hours': hours,
+    }
+
+
+def show_refreshes(conn, limit=20):
+    """Prints the most recent refreshes and their change counts."""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT refresh_id, source, refreshed_at, new_count, repriced_count,
+               filled_count, cancelled_count
+        FROM order_book_refreshes
+        ORDER BY refresh_id DESC
+        LIMIT ?
+    """, (limit,))
+    rows = cursor.fetchall()
+
+    print(f"\n  {'ID':>8} {'Source':<20} {'Refreshed':<17} {'New':>8} {'Repriced':>9} {'Filled':>8} {'Cancelled':>10}")
+    print(f"  {'-' * 86}")
+    for refresh_id, source, ts, new, repriced, filled, cancelled in rows:
+        ts_short = ts[:16].replace("T", " ")
+        print(f"  {refresh_id:>8} {source:<20} {ts_short:<17} {new:>8,} {repriced:>9,} {filled:>8,} {cancelled:>10,}")
+    print(f"  {'-' * 86}\n")
+
+# ─── MAIN ─────────────────────────────────────────────────────────────────────
+
+@timed_script
+def main():
+    parser = argparse.ArgumentParser(
+        description="Inspect and maintain the order-book change-event log."
+    )
+    parser.add_argument("--source",    type=str, default="market_orders", help="Order table the events came from (default: market_orders)")
+    parser.add_argument("--refreshes", action="store_true",               help="List recent refreshes with change counts")
+    parser.add_argument("--velocity",  type=int, default=None,            help="Show fill velocity for a type_id")
+    parser.add_argument("--book",      type=int, default=None,            help="Rebuild the book as of a refresh_id and summarize it")
+    parser.add_argument("--days",      type=int, default=7,               help="Window for --velocity (default: 7)")
+    parser.add_argument("--prune",     type=int, default=None,            help="Delete events older than N days")
+    args = parser.parse_args()
+
+    conn = db.connect(DB_PATH)
+    init_event_tables(conn)
+
+    if args.prune is not None:
+        deleted = prune_order_events(conn, args.prune)
+        conn.commit()
+        print(f"\n  Pruned {deleted:,} events older than {args.prune} days\n")
+    elif args.velocity:
+        velocity = fill_velocity(conn, args.source, args.velocity, args.days)
+        print(f"\n  Fill velocity for type {args.velocity} over {velocity['hours']:.1f}h ({args.source}):")
+        print(f"    Buy orders filled:  {velocity['buy']:>14,.1f} units/hour")
+        print(f"    Sell orders filled: {velocity['sell']:>14,.1f} units/hour\n")
+    elif args.book:
+        book = reconstruct_book(conn, args.source, args.book)
+        buys = sum(1 for _, is_buy, _, _ in book.values() if is_buy)
+        print(f"\n  {args.source} after refresh {args.book}: {len(book):,} orders "
+              f"({buys:,} buy, {len(book) - buys:,} sell)\n")
+    else:
+        show_refreshes(conn)
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
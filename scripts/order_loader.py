@@ -0,0 +1,359 @@
+"""
+order_loader.py
+
+Bulk loader shared by update_market_orders.py and update_bwf_market_orders.py.
+
+Both scripts stage ESI market orders in a *_temp table before swapping it
+into production. This module owns the staging table layout and writes
+orders in large executemany() chunks with one last_updated timestamp per
+run. Indexes are built after the load, and the fast-load PRAGMAs are only
+in effect while the staging table is being filled.
+
+Instead of swapping, sync_orders_diff() can apply only the differences
+between the staging table and the live table (keyed on order_id), so write
+volume shrinks to the size of the changes.
+
+Usage:
+    create_staging_table(conn, 'market_orders_temp')
+    loader = OrderBulkLoader(conn, 'market_orders_temp', region_id)
+    loader.load(orders)          # any iterable of ESI order dicts, call repeatedly
+    loader.load_rows(rows)       # or esi_decode.decode_orders() tuples
+    loader.finish('idx_temp_market_orders')
+
+    # Diff mode: stage in the TEMP schema, then merge into the live table
+    create_staging_table(conn, 'market_orders_temp', temporary=True)
+    ...
+    loader.finish()              # no secondary indexes needed
+    counts = sync_orders_diff(conn, 'market_orders_temp', 'market_orders')
+"""
+
+import time
+from datetime import datetime, timezone
+
+from esi_decode import ORDER_FIELDS
+from order_events import record_order_events
+from top_of_book import rebuild_top_of_book
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+# Rows per executemany() call
+CHUNK_SIZE = 10000
+
+# PRAGMAs used while filling a staging table. The staging table is thrown
+# away on failure, so durability can be relaxed until the load is done.
+# (temp_store is left alone: changing it drops every TEMP table on the
+# connection, including a diff-mode staging table.)
+FAST_LOAD_PRAGMAS = {
+    'synchronous': 'OFF',
+    'cache_size': -65536,   # 64 MB page cache
+}
+
+ORDER_COLUMNS = (
+    'order_id', 'region_id', 'type_id', 'location_id', 'is_buy_order', 'price',
+    'volume_remain', 'volume_total', 'issued', 'duration', 'range', 'min_volume',
+    'last_updated',
+)
+
+# ============================================
+# STAGING TABLE
+# ============================================
+
+def table_exists(conn, table):
+    """Check whether a table exists in the main database."""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    return row is not None
+
+
+def create_staging_table(conn, table, temporary=False):
+    """
+    (Re)create a staging table with the same structure as market_orders.
+    Indexes are deliberately left out - they are built by
+    OrderBulkLoader.finish() once all rows are in.
+
+    temporary=True puts the table in SQLite's TEMP schema (connection-local,
+    never written to the main database file or WAL). Use it for diff mode,
+    where the staging table is merged rather than renamed into production.
+    """
+    cursor = conn.cursor()
+    schema = 'temp.' if temporary else ''
+
+    # Drop temp table if it exists from a previous failed run
+    cursor.execute(f'DROP TABLE IF EXISTS {schema}{table}')
+
+    cursor.execute(f'''
+        CREATE {'TEMP ' if temporary else ''}TABLE {table} (
+            order_id INTEGER PRIMARY KEY,
+            region_id INTEGER NOT NULL,
+            type_id INTEGER NOT NULL,
+            location_id INTEGER NOT NULL,
+            is_buy_order INTEGER NOT NULL,
+            price REAL NOT NULL,
+            volume_remain INTEGER NOT NULL,
+            volume_total INTEGER NOT NULL,
+            issued TEXT NOT NULL,
+            duration INTEGER NOT NULL,
+            range TEXT NOT NULL,
+            min_volume INTEGER,
+            last_updated TEXT NOT NULL
+        )
+    ''')
+    conn.commit()
+
+
+def free_index_name(conn, table, name):
+    """
+    Index names are global in SQLite and survive ALTER TABLE ... RENAME, so
+    the live table still owns the names used on the previous run's staging
+    table (and CREATE INDEX IF NOT EXISTS would silently skip them).
+    Alternate between two names so both tables stay indexed.
+    """
+    candidates = (name, f'{name}_alt')
+    for candidate in candidates:
+        row = conn.execute(
+            "SELECT tbl_name FROM sqlite_master WHERE type = 'index' AND name = ?",
+            (candidate,)
+        ).fetchone()
+        if row is None or row[0] == table:
+            return candidate
+
+    # Both names taken by other tables (left over from a manual rename)
+    conn.execute(f'DROP INDEX IF EXISTS {candidates[1]}')
+    return candidates[1]
+
+
+def create_staging_indexes(conn, table, index_prefix):
+    """
+    Create the lookup indexes on a filled staging table. Both end in price
+    so best-price lookups (MIN/MAX per type and side, at a station or
+    region-wide) are answered from the index alone.
+    """
+    cursor = conn.cursor()
+    type_region_index = free_index_name(conn, table, f'{index_prefix}_type_region')
+    location_index = free_index_name(conn, table, f'{index_prefix}_location')
+    cursor.execute(f'''
+        CREATE INDEX IF NOT EXISTS {type_region_index}
+        ON {table}(type_id, is_buy_order, region_id, price)
+    ''')
+    cursor.execute(f'''
+        CREATE INDEX IF NOT EXISTS {location_index}
+        ON {table}(location_id, region_id, type_id, is_buy_order, price)
+    ''')
+    conn.commit()
+
+# ============================================
+# PRAGMAS
+# ============================================
+
+def apply_pragmas(conn, pragmas):
+    """Set PRAGMAs and return their previous values so they can be restored."""
+    previous = {}
+    for name, value in pragmas.items():
+        previous[name] = conn.execute(f'PRAGMA {name}').fetchone()[0]
+        conn.execute(f'PRAGMA {name} = {value}')
+    return previous
+
+# ============================================
+# LOADER
+# ============================================
+
+def order_to_row(order, region_id, loaded_at):
+    """Convert one ESI order dict into a staging-table row tuple."""
+    return (
+        order['order_id'],
+        region_id,
+        order['type_id'],
+        order['location_id'],
+        1 if order['is_buy_order'] else 0,
+        order['price'],
+        order['volume_remain'],
+        order['volume_total'],
+        order['issued'],
+        order['duration'],
+        order.get('range', 'station'),
+        order.get('min_volume', 1),
+        loaded_at,
+    )
+
+
+class OrderBulkLoader:
+    """
+    Writes ESI order dicts into a staging table in executemany() chunks.
+
+    One loader is used per run: every row gets the same last_updated
+    timestamp, fast-load PRAGMAs are applied on construction and restored
+    by finish() (db resets them anyway when a pooled connection is closed
+    without it), and rows/second is reported so load cost is measurable.
+    """
+
+    def __init__(self, conn, table, region_id, chunk_size=CHUNK_SIZE):
+        self.conn = conn
+        self.table = table
+        self.region_id = region_id
+        self.chunk_size = chunk_size
+        self.loaded_at = datetime.now(timezone.utc).isoformat()
+        self.rows = 0
+        self.seconds = 0.0
+        self._sql = (
+            f"INSERT OR REPLACE INTO {table} ({', '.join(ORDER_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(ORDER_COLUMNS))})"
+        )
+        # Decoded rows carry only the ESI fields; the per-run constants are
+        # written as literals (both are generated here, never from ESI)
+        self._rows_sql = (
+            f"INSERT OR REPLACE INTO {table} ({', '.join(ORDER_FIELDS)}, region_id, last_updated) "
+            f"VALUES ({', '.join('?' * len(ORDER_FIELDS))}, {int(region_id)}, '{self.loaded_at}')"
+        )
+        self._saved_pragmas = apply_pragmas(conn, FAST_LOAD_PRAGMAS)
+
+    def load(self, orders):
+        """
+        Insert an iterable of ESI order dicts. Can be called repeatedly
+        (e.g. once per page when streaming). Returns rows written by this call.
+        """
+        start = time.perf_counter()
+        cursor = self.conn.cursor()
+        written = 0
+        chunk = []
+
+        for order in orders:
+            chunk.append(order_to_row(order, self.region_id, self.loaded_at))
+            if len(chunk) >= self.chunk_size:
+                cursor.executemany(self._sql, chunk)
+                written += len(chunk)
+                chunk = []
+
+        if chunk:
+            cursor.executemany(self._sql, chunk)
+            written += len(chunk)
+
+        self.conn.commit()
+        self.rows += written
+        self.seconds += time.perf_counter() - start
+        return written
+
+    def load_rows(self, rows):
+        """
+        Insert a page of esi_decode.ORDER_FIELDS tuples with one
+        executemany() - no per-order conversion. Returns rows written.
+        """
+        start = time.perf_counter()
+        self.conn.executemany(self._rows_sql, rows)
+        self.conn.commit()
+        self.rows += len(rows)
+        self.seconds += time.perf_counter() - start
+        return len(rows)
+
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def finish(self, index_prefix=None):
+        """
+        Build indexes (skipped when index_prefix is None), restore normal
+        PRAGMAs and report load throughput.
+        """
+        start = time.perf_counter()
+        if index_prefix:
+            create_staging_indexes(self.conn, self.table, index_prefix)
+        index_seconds = time.perf_counter() - start
+
+        apply_pragmas(self.conn, self._saved_pragmas)
+
+        print(
+            f"[OK] Loaded {self.rows:,} rows into {self.table} in {self.seconds:.2f}s "
+            f"({self.rows_per_second():,.0f} rows/s), indexes built in {index_seconds:.2f}s"
+        )
+
+# ============================================
+# DIFF SYNC
+# ============================================
+
+# Columns that change on a live order. Everything else is fixed at issue time.
+MUTABLE_COLUMNS = ('price', 'volume_remain', 'issued', 'last_updated')
+
+
+def sync_orders_diff(conn, staging_table, live_table):
+    """
+    Merge a staging table into the live table instead of swapping it in:
+    insert new orders, update changed orders and delete vanished ones,
+    all inside one transaction. Only inserted and changed rows are
+    written (and carry the run's last_updated), so MAX(last_updated) still
+    dates the refresh; when the whole book was last seen is
+    order_book_refreshes.refreshed_at.
+    The changes are appended to the order-book event log, and the top of
+    book is rebuilt for the (location, type) pairs they touch, in the
+    same transaction. Returns the per-run change counts (new, repriced, filled,
+    cancelled - see order_events.py).
+    """
+    cursor = conn.cursor()
+
+    print(f"\n>>> Applying order-book diff to {live_table}...")
+
+    cursor.execute('BEGIN IMMEDIATE')
+
+    try:
+        counts = record_order_events(conn, live_table, staging_table, live_table)
+
+        # (location, type) pairs with an event this refresh - read before the
+        # merge, while vanished orders are still in the live table
+        cursor.execute(f'''
+            SELECT location_id, type_id FROM {staging_table}
+            WHERE order_id IN (SELECT order_id FROM order_book_events WHERE refresh_id = :refresh_id)
+            UNION
+            SELECT location_id, type_id FROM {live_table}
+            WHERE order_id IN (
+                SELECT order_id FROM order_book_events
+                WHERE refresh_id = :refresh_id AND kind = 'cancelled'
+            )
+        ''', {'refresh_id': counts['refresh_id']})
+        changed_pairs = cursor.fetchall()
+
+        cursor.execute(f'''
+            DELETE FROM {live_table}
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {staging_table} s WHERE s.order_id = {live_table}.order_id
+            )
+        ''')
+
+        assignments = ', '.join(f'{col} = s.{col}' for col in MUTABLE_COLUMNS)
+        cursor.execute(f'''
+            UPDATE {live_table}
+            SET {assignments}
+            FROM {staging_table} s
+            WHERE s.order_id = {live_table}.order_id
+              AND (s.price <> {live_table}.price
+                   OR s.volume_remain <> {live_table}.volume_remain
+                   OR s.issued <> {live_table}.issued)
+        ''')
+        updated = cursor.rowcount
+
+        cursor.execute(f'''
+            INSERT INTO {live_table} ({', '.join(ORDER_COLUMNS)})
+            SELECT {', '.join(ORDER_COLUMNS)}
+            FROM {staging_table} s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {live_table} l WHERE l.order_id = s.order_id
+            )
+        ''')
+
+        # Rebuild best buy/sell and price levels where the book changed
+        rebuild_top_of_book(conn, live_table, pairs=changed_pairs)
+
+        cursor.execute(f'DROP TABLE IF EXISTS temp.{staging_table}')
+
+        conn.commit()
+
+    except Exception as e:
+        conn.rollback()
+        print(f"[ERROR] Error during diff sync: {e}")
+        raise
+
+    print(
+        f"[OK] Diff applied - {counts['new']:,} new, {counts['repriced']:,} repriced, "
+        f"{counts['filled']:,} filled, {counts['cancelled']:,} cancelled "
+        f"({updated:,} rows updated in place)"
+    )
+    return counts
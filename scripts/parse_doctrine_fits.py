@@ -5,11 +5,21 @@ PARSE DOCTRINE FITS TO CSV
 ==========================================
 Extracts all fits from TEST_Doctrine_Fits.txt
 Creates a CSV with: fit_name, item_name, quantity
+Item names are checked against the name index (name_resolver) when one
+has been built: case and unique prefixes are corrected to the canonical
+name; typos, ambiguous and unknown names are listed (with suggestions)
+and left as they are for someone to fix before the import.
 ==========================================
 """
 
 import re
 import csv
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from name_resolver import CONFIDENT, describe, read_name_index
 
 def parse_fits_file(filename):
     """
@@ -62,6 +72,38 @@ def parse_fits_file(filename):
     return fits_data
 
 
+def check_item_names(fits_data):
+    """
+    Resolve hull and item names against the built name index and return
+    fits_data with canonical names. Unchanged if there is no index yet
+    (import_doctrine_fits.py builds one).
+    """
+    name_index = read_name_index()
+    if name_index is None:
+        print("[SKIP] No name index - run name_resolver.py --build to check item names")
+        return fits_data
+    
+    hulls = [fit_name.split(' - ')[0] for fit_name, _, _ in fits_data]
+    items = [item_name for _, item_name, _ in fits_data]
+    resolutions = {result['name']: result for result in name_index.resolve(hulls + items)}
+    
+    for result in resolutions.values():
+        if result['match'] == 'prefix':
+            print(f"[INFO] Matched {describe(result)}")
+        elif result['match'] not in CONFIDENT:
+            print(f"[WARNING] {describe(result)}")
+    
+    def canonical(name):
+        result = resolutions[name]
+        return result['type_name'] if result['match'] in CONFIDENT else name
+    
+    checked = []
+    for fit_name, item_name, quantity in fits_data:
+        hull, _, rest = fit_name.partition(' - ')
+        checked.append((f"{canonical(hull)} - {rest}", canonical(item_name), quantity))
+    return checked
+
+
 def write_to_csv(fits_data, output_filename):
     """Write fits data to CSV file."""
     
@@ -125,6 +167,9 @@ def main():
     print("Parsing fits file...")
     fits_data = parse_fits_file(input_file)
     
+    # Check item names against the name index
+    fits_data = check_item_names(fits_data)
+    
     # Write to CSV
     write_to_csv(fits_data, output_file)
     
@@ -0,0 +1,173 @@
+"""
+price_averages.py
+
+Precomputed rolling price averages per item.
+
+Buyback pricing, BPC pricing and contract costing all want "average best
+buy / best sell over the last N days". Instead of each of them aggregating
+snapshots on every run (contract costing did it once per item per
+contract), track_market_orders.py refreshes this cache after every
+snapshot and consumers read one row per item:
+
+    price_averages   (type_id, window_days) -> avg/min/max best buy and sell,
+                     average spread, sample count, updated_at
+
+Each window is recomputed from the cheapest snapshot tier that covers it
+(see snapshot_rollups.py), so a refresh reads a few hundred rollup rows per
+item rather than every raw snapshot.
+
+Usage:
+    python price_averages.py --refresh              # recompute all windows
+    python price_averages.py --type 34              # show cached averages for Tritanium
+"""
+
+import argparse
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = SCRIPT_DIR.parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from script_utils import timed_script
+from snapshot_rollups import get_snapshot_stats
+import db
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────────
+
+DB_PATH = str(PROJECT_DIR / 'mydatabase.db')
+
+# Rolling windows kept in the cache, in days
+AVERAGE_WINDOWS = (1, 7, 30)
+
+STAT_COLUMNS = ('avg_buy', 'avg_sell', 'min_buy', 'max_buy', 'min_sell', 'max_sell', 'avg_spread', 'samples')
+
+# ─── DATABASE ─────────────────────────────────────────────────────────────────
+
+def init_price_averages_table(conn):
+    """Creates the price_averages table if it doesn't exist."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS price_averages (
+            type_id      INTEGER NOT NULL,
+            window_days  INTEGER NOT NULL,
+            avg_buy      REAL,
+            avg_sell     REAL,
+            min_buy      REAL,
+            max_buy      REAL,
+            min_sell     REAL,
+            max_sell     REAL,
+            avg_spread   REAL,
+            samples      INTEGER NOT NULL DEFAULT 0,
+            updated_at   TEXT NOT NULL,
+            PRIMARY KEY (type_id, window_days)
+        ) WITHOUT ROWID
+    """)
+
+# ─── REFRESH ──────────────────────────────────────────────────────────────────
+
+def refresh_price_averages(conn, windows=AVERAGE_WINDOWS, type_ids=None):
+    """
+    Recomputes the cached averages for each window (optionally only for
+    some type_ids) and drops rows for items with no snapshots left in a
+    window. Does not commit. Returns the number of rows written.
+    """
+    init_price_averages_table(conn)
+    cursor = conn.cursor()
+    updated_at = datetime.now(timezone.utc).isoformat()
+    written = 0
+    if type_ids is not None:
+        type_ids = list(type_ids)
+
+    for window in windows:
+        stats = get_snapshot_stats(conn, window, type_ids)
+
+        if type_ids is None:
+            cursor.execute("DELETE FROM price_averages WHERE window_days = ?", (window,))
+        else:
+            cursor.execute(
+                f"DELETE FROM price_averages WHERE window_days = ? AND type_id IN ({','.join('?' * len(type_ids))})",
+                (window, *type_ids)
+            )
+
+        cursor.executemany(f"""
+            INSERT INTO price_averages (type_id, window_days, {', '.join(STAT_COLUMNS)}, updated_at)
+            VALUES (?, ?, {', '.join('?' * len(STAT_COLUMNS))}, ?)
+        """, [
+            (type_id, window, *(row[col] for col in STAT_COLUMNS), updated_at)
+            for type_id, row in stats.items()
+        ])
+        written += len(stats)
+
+    return written
+
+# ─── LOOKUPS ──────────────────────────────────────────────────────────────────
+
+def get_price_averages(conn, window_days, type_ids=None):
+    """
+    Cached averages for one window: {type_id: {'avg_buy', 'avg_sell', ...}}.
+    Items without snapshots in the window are absent.
+    """
+    init_price_averages_table(conn)
+    sql = f"SELECT type_id, {', '.join(STAT_COLUMNS)} FROM price_averages WHERE window_days = ?"
+    params = [window_days]
+    if type_ids is not None:
+        type_ids = list(type_ids)
+        if not type_ids:
+            return {}
+        sql += f" AND type_id IN ({','.join('?' * len(type_ids))})"
+        params.extend(type_ids)
+
+    return {
+        type_id: dict(zip(STAT_COLUMNS, values))
+        for type_id, *values in conn.execute(sql, params).fetchall()
+    }
+
+
+def get_price_average(conn, type_id, window_days):
+    """Point lookup of one item's cached averages, or None."""
+    init_price_averages_table(conn)
+    row = conn.execute(f"""
+        SELECT {', '.join(STAT_COLUMNS)}
+        FROM price_averages
+        WHERE type_id = ? AND window_days = ?
+    """, (type_id, window_days)).fetchone()
+    return dict(zip(STAT_COLUMNS, row)) if row else None
+
+# ─── MAIN ─────────────────────────────────────────────────────────────────────
+
+@timed_script
+def main():
+    parser = argparse.ArgumentParser(
+        description="Refresh or inspect the rolling price-average cache."
+    )
+    parser.add_argument("--refresh", action="store_true",    help="Recompute every window from the snapshot tiers")
+    parser.add_argument("--type",    type=int, default=None, help="Show cached averages for a type_id")
+    args = parser.parse_args()
+
+    conn = db.connect(DB_PATH)
+    init_price_averages_table(conn)
+
+    if args.refresh:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = refresh_price_averages(conn)
+        conn.commit()
+        print(f"\n  {rows:,} price_averages rows for windows {', '.join(f'{w}d' for w in AVERAGE_WINDOWS)}\n")
+    elif args.type:
+        print()
+        for window in AVERAGE_WINDOWS:
+            row = get_price_average(conn, args.type, window)
+            if not row:
+                print(f"  {window:>3}d  -- no data --")
+                continue
+            print(f"  {window:>3}d  avg buy {row['avg_buy'] or 0:>14,.2f}  avg sell {row['avg_sell'] or 0:>14,.2f}"
+                  f"  spread {row['avg_spread'] or 0:>6.2f}%  ({row['samples']:,} samples)")
+        print()
+    else:
+        parser.print_help()
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+quote_engine.py
+
+Pricing engine behind generate_quote_v4: turns an item list into the
+per-line quote rows, keeping everything that doesn't change between
+quotes cached on one open connection:
+
+  - the item-name index (name_resolver), re-checked against inv_types
+    with each order-book refresh, so order lines match by exact name,
+    case or unique prefix (typos are only suggested)
+  - a price snapshot per type (packaged volume, Jita best buy / best sell,
+    lowest BWF sell), filled on demand through the quote_types temp table
+    and dropped when a new order-book refresh lands in
+    order_book_refreshes, so it never outlives the book it came from
+  - the broker fee and TEST Freight rates, reloaded with the snapshot
+
+Only the depth-aware fill price (fill_simulator) is priced per quote,
+since it depends on each line's quantity. A warm engine prices a quote
+with two small queries and no SQL text built from the order.
+
+quote_rows() returns the same 17 columns (QUOTE_COLUMNS) the quote query
+used to, one row per resolved line in order (under the item's canonical
+name), plus the resolution of every name in the order.
+
+Usage:
+    engine = get_engine()                       # shared, one per database
+    rows, resolutions = engine.quote_rows([('Tritanium', 100000), ('rifter', 5)])
+    freight = engine.freight_service()
+
+    engine = QuoteEngine('/path/to/mydatabase.db')   # private instance
+    ...
+    engine.close()
+"""
+
+import atexit
+import sqlite3
+import sys
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = SCRIPT_DIR.parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from fill_simulator import JITA_STATION_ID, simulate_fills
+from name_resolver import CONFIDENT, load_name_index
+import db
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────────
+
+DB_PATH = str(PROJECT_DIR / 'mydatabase.db')
+
+# Whose trading fees (v_my_trading_fees) the margins are computed with
+CHARACTER_ID = 2114278577
+
+# Freight service the shipping is quoted with (freighting_services)
+FREIGHT_SERVICE = ('TEST Freight', 'Jita', 'BWF-ZZ')
+
+QUOTE_COLUMNS = (
+    'item_name', 'quantity', 'volume', 'buy_order_price', 'sell_order_price', 'broker_fee_pct',
+    'customer_price_per_unit', 'line_total', 'total_volume_m3', 'gross_margin_per_unit',
+    'broker_fee_per_unit', 'net_margin_per_unit', 'net_margin_total', 'collateral_per_unit',
+    'item_collateral', 'lowest_sell_price', 'bwf_total_cost',
+)
+
+# ─── LINE PRICING ─────────────────────────────────────────────────────────────
+
+def price_line(item_name, qty, prices, fill_price, broker_fee_pct):
+    """
+    One quote row. prices is the type's snapshot (volume, best_buy,
+    best_sell, bwf_lowest_sell). Missing prices propagate as None the way
+    NULLs did through the old SQL.
+    """
+    volume, buy, best_sell, bwf_sell = prices
+    sell = fill_price if fill_price is not None else best_sell
+
+    has_buy = buy is not None and sell is not None
+    has_fee = has_buy and broker_fee_pct is not None
+    return (
+        item_name,
+        qty,
+        volume,
+        buy,
+        sell,
+        broker_fee_pct,
+        sell,                                                               # customer price per unit
+        sell * qty if sell is not None else None,                           # line total
+        volume * qty if volume is not None else None,                       # total m3
+        sell - buy if has_buy else None,                                    # gross margin per unit
+        buy * (broker_fee_pct / 100.0) if buy is not None and broker_fee_pct is not None else None,
+        (sell - buy) - (buy * broker_fee_pct / 100.0) if has_fee else None,        # net per unit
+        ((sell - buy) - (buy * broker_fee_pct / 100.0)) * qty if has_fee else None,  # net total
+        sell * 0.01 if sell is not None else None,                          # collateral per unit
+        (sell * 0.01) * qty if sell is not None else None,                  # item collateral
+        bwf_sell,
+        bwf_sell * qty if bwf_sell is not None else None,
+    )
+
+# ─── ENGINE ───────────────────────────────────────────────────────────────────
+
+class QuoteEngine:
+    """Cached quote pricing over one database connection (not thread-safe)."""
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self.conn = db.connect(db_path)
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS quote_types (type_id INTEGER PRIMARY KEY)")
+        self.names = None
+        self.refresh_id = None
+        self.snapshot_loaded = False
+        self.prices = {}
+        self.broker_fee_pct = None
+        self._freight_service = None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    # ---- caches ----
+
+    def resolve(self, names):
+        """{name: resolution dict} (see name_resolver) for each name."""
+        if self.names is None:
+            self.names = load_name_index(self.conn)
+        return {result['name']: result for result in self.names.resolve(names)}
+
+    def latest_refresh(self):
+        """Newest order-book refresh id (None before the first diffed refresh)."""
+        try:
+            return self.conn.execute("SELECT MAX(refresh_id) FROM order_book_refreshes").fetchone()[0]
+        except sqlite3.OperationalError:
+            return None
+
+    def _check_refresh(self):
+        """Drop the price snapshot (and fee / freight) once a newer book is in."""
+        refresh_id = self.latest_refresh()
+        if self.snapshot_loaded and refresh_id == self.refresh_id:
+            return
+        self.refresh_id = refresh_id
+        self.prices.clear()
+        # Re-checked against inv_types on next use (rebuilt if names changed)
+        self.names = None
+        fee = self.conn.execute(
+            "SELECT broker_fee_percent FROM v_my_trading_fees WHERE character_id = ?", (CHARACTER_ID,)
+        ).fetchone()
+        self.broker_fee_pct = fee[0] if fee else None
+        self._freight_service = None
+        self.snapshot_loaded = True
+
+    def _load_prices(self, type_ids):
+        """Fill the snapshot for the types it doesn't have yet."""
+        missing = [(type_id,) for type_id in set(type_ids) if type_id not in self.prices]
+        if not missing:
+            return
+        cursor = self.conn.cursor()
+        cursor.execute("DELETE FROM quote_types")
+        cursor.executemany("INSERT INTO quote_types (type_id) VALUES (?)", missing)
+        cursor.execute("""
+            SELECT
+                qt.type_id,
+                COALESCE(st.packaged_volume, it.volume),
+                tob.best_buy,
+                tob.best_sell,
+                (SELECT MIN(bwf.best_sell) FROM market_top_of_book bwf
+                 WHERE bwf.source = 'bwf_market_orders' AND bwf.type_id = qt.type_id)
+            FROM quote_types qt
+            JOIN inv_types it ON it.type_id = qt.type_id
+            LEFT JOIN sde_types st ON st.type_id = it.type_id
+            LEFT JOIN market_top_of_book tob ON tob.type_id = it.type_id
+                AND tob.location_id = ?
+        """, (JITA_STATION_ID,))
+        for type_id, *prices in cursor:
+            self.prices[type_id] = tuple(prices)
+        self.conn.commit()
+
+    # ---- public API ----
+
+    def fill_prices(self, lines):
+        """
+        Per-unit price of buying each (item_name, type_id, quantity) line
+        off the Jita sell book. None where there are no sell orders (the
+        quote then uses best sell). A line deeper than the whole book
+        prices its shortfall at the last level.
+        """
+        fills = simulate_fills(self.conn, [(type_id, qty) for _, type_id, qty in lines], 'buy', JITA_STATION_ID)
+        prices = []
+        for (item_name, _, qty), fill in zip(lines, fills):
+            if fill['levels'] == 0 or qty <= 0:
+                prices.append(None)
+                continue
+            if fill['shortfall']:
+                print(f"[WARNING] Jita sell book only covers {fill['filled']:,} of {qty:,} {item_name}")
+            prices.append((fill['value'] + fill['shortfall'] * fill['marginal_price']) / qty)
+        return prices
+
+    def quote_rows(self, items_list):
+        """
+        Quote rows (QUOTE_COLUMNS) for [(item_name, quantity), ...].
+        Returns (rows, {item_name: resolution}); lines whose name is
+        only a fuzzy match, ambiguous or unknown get no row.
+        """
+        self._check_refresh()
+        resolutions = self.resolve(name for name, _ in items_list)
+        known = [
+            (resolutions[name]['type_name'], resolutions[name]['type_id'], qty)
+            for name, qty in items_list if resolutions[name]['match'] in CONFIDENT
+        ]
+
+        self._load_prices(type_id for _, type_id, _ in known)
+        fill_prices = self.fill_prices(known)
+
+        rows = [
+            price_line(name, qty, self.prices[type_id], fill_price, self.broker_fee_pct)
+            for (name, type_id, qty), fill_price in zip(known, fill_prices)
+        ]
+        return rows, resolutions
+
+    def freight_service(self):
+        """TEST Freight Jita -> BWF-ZZ rates, cached until the next refresh."""
+        if self._freight_service is None:
+            result = self.conn.execute("""
+                SELECT
+                    service_name,
+                    cost_per_m3,
+                    collateral_fee_percent,
+                    minimum_reward
+                FROM freighting_services
+                WHERE service_name = ?
+                  AND route_from = ?
+                  AND route_to = ?
+                  AND is_active = 1
+            """, FREIGHT_SERVICE).fetchone()
+
+            if not result:
+                raise Exception(f"{FREIGHT_SERVICE[0]} service not found in database!")
+
+            self._freight_service = {
+                'name': result[0],
+                'cost_per_m3': result[1],
+                'collateral_fee_percent': result[2],
+                'minimum_reward': result[3]
+            }
+        return self._freight_service
+
+
+_engines = {}
+
+
+def get_engine(db_path=DB_PATH):
+    """Shared engine for a database path, created on first use."""
+    engine = _engines.get(db_path)
+    if engine is None:
+        engine = _engines[db_path] = QuoteEngine(db_path)
+    return engine
+
+
+def close_engines():
+    """Close every shared engine (their connections go back to the pool)."""
+    while _engines:
+        _engines.popitem()[1].close()
+
+
+atexit.register(close_engines)
@@ -1,12 +1,16 @@
 import requests
-import sqlite3
+import sys
 import time
 import os
 from datetime import datetime, timezone, timedelta
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(SCRIPT_DIR, 'mydatabase.db')
-ESI_BASE_URL = 'https://esi.evetech.net/latest'
+sys.path.insert(0, SCRIPT_DIR)
+
+import db
+from top_of_book import get_top_of_book
+
+ESI_BASE_URL = os.environ.get('ESI_BASE_URL', 'https://esi.evetech.net/latest')
 THE_FORGE_REGION = 10000002
 
 
@@ -67,7 +71,7 @@ def get_contract_items(contract_id):
 
 def get_item_info(type_id):
     """Get item name and group from local database."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = db.connect(readonly=True)
     cursor = conn.cursor()
     cursor.execute('''
         SELECT t.type_name, g.group_name
@@ -83,18 +87,10 @@ def get_item_info(type_id):
 
 def get_market_price(type_id):
     """Get Jita sell price from local database."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT MIN(price) 
-        FROM market_orders 
-        WHERE type_id = ? 
-        AND is_buy_order = 0 
-        AND location_id = 60003760
-    ''', (type_id,))
-    result = cursor.fetchone()
+    conn = db.connect(readonly=True)
+    top = get_top_of_book(conn, 60003760, type_id)
     conn.close()
-    return result[0] if result and result[0] else 0
+    return top[1] if top and top[1] else 0
 
 def is_rig(item_name, item_group):
     """Check if item is a rig."""
@@ -1,44 +1,342 @@
+"""
+script_utils.py
+
+@timed_script prints the start/finish banner every script uses, and
+records each run as metrics:
+
+  - one row per run in script_runs, one row per stage in
+    script_run_stages (in the script's own DB_PATH database)
+  - the same record as one JSON line in logs/script_runs.jsonl
+
+Scripts mark the parts of a run with stage(). Each stage records wall
+time, CPU time, rows handled, HTTP requests / bytes / retries (counted by
+esi_client.ESIClient and esi_cache.cached_get through record_http()) and
+the peak RSS of the process at the end of the stage.
+
+Usage:
+    @timed_script
+    def main():
+        with stage('fetch') as s:
+            orders = fetch_orders()
+            s.rows = len(orders)
+        with stage('load', rows=len(orders)):
+            load(orders)
+
+Outside a @timed_script run stage() still times its block; nothing is
+recorded. Set SCRIPT_METRICS=0 to turn recording off.
+"""
+
+import json
+import os
+import socket
+import sys
 import time
+from contextlib import contextmanager
 from datetime import datetime
 from functools import wraps
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:
+    # Windows: peak working set comes from psapi instead
+    resource = None
+
+import db
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = SCRIPT_DIR.parent
+
+# ============================================
+# CONFIGURATION
+# ============================================
+METRICS_LOG = PROJECT_DIR / 'logs' / 'script_runs.jsonl'
+METRICS_ENABLED = os.environ.get('SCRIPT_METRICS', '1') != '0'
+
+# script_run_stages columns, in Stage.as_dict() order
+STAGE_COLUMNS = (
+    'stage', 'wall_seconds', 'cpu_seconds', 'rows', 'http_requests', 'http_bytes',
+    'http_retries', 'peak_rss_mb', 'error',
+)
+
+# ============================================
+# RESOURCE USAGE
+# ============================================
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (None if unavailable)."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is KB on Linux, bytes on macOS
+        return round(peak / (1048576 if sys.platform == 'darwin' else 1024), 1)
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage',
+                    'QuotaPagedPoolUsage', 'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage',
+                    'PagefileUsage', 'PeakPagefileUsage',
+                )
+            ]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return round(counters.PeakWorkingSetSize / 1048576, 1)
+    except (ImportError, AttributeError, OSError):
+        pass
+    return None
+
+# ============================================
+# STAGES
+# ============================================
+
+class Stage:
+    """One named part of a run. Set .rows (or add to it) inside the block."""
+
+    def __init__(self, name, rows=0):
+        self.name = name
+        self.rows = rows
+        self.http_requests = 0
+        self.http_bytes = 0
+        self.http_retries = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.peak_rss_mb = None
+        self.error = None
+
+    def as_dict(self):
+        return dict(zip(STAGE_COLUMNS, (
+            self.name, round(self.wall_seconds, 3), round(self.cpu_seconds, 3), self.rows,
+            self.http_requests, self.http_bytes, self.http_retries, self.peak_rss_mb, self.error,
+        )))
+
+
+class ScriptRun:
+    """Metrics for one @timed_script call: totals plus the stages in order."""
+
+    def __init__(self, script, db_path):
+        self.script = script
+        self.db_path = db_path
+        self.started_at = time.time()
+        self.stages = []
+        self.open_stages = []
+        self.http_requests = 0
+        self.http_bytes = 0
+        self.http_retries = 0
+
+    def as_dict(self, status, error, wall_seconds, cpu_seconds):
+        return {
+            'script': self.script,
+            'started_at': int(self.started_at),
+            'finished_at': int(time.time()),
+            'status': status,
+            'error': error,
+            'wall_seconds': round(wall_seconds, 3),
+            'cpu_seconds': round(cpu_seconds, 3),
+            # Stages usually pass the same rows along (fetch -> load -> swap)
+            'rows': max((stage.rows for stage in self.stages), default=0),
+            'http_requests': self.http_requests,
+            'http_bytes': self.http_bytes,
+            'http_retries': self.http_retries,
+            'peak_rss_mb': peak_rss_mb(),
+            'host': socket.gethostname(),
+            'argv': ' '.join(sys.argv[1:]),
+            'stages': [stage.as_dict() for stage in self.stages],
+        }
+
+
+_current_run = None
+
+
+def record_http(requests=0, bytes=0, retries=0):
+    """Count HTTP traffic against the current run and every open stage."""
+    if _current_run is None:
+        return
+    for target in (_current_run, *_current_run.open_stages):
+        target.http_requests += requests
+        target.http_bytes += bytes
+        target.http_retries += retries
+
+
+@contextmanager
+def stage(name, rows=0):
+    """
+    Time a named stage of the current run. Yields the Stage, so the block
+    can set .rows once it knows how many it handled. Stages may nest;
+    each records its own totals.
+    """
+    current = Stage(name, rows)
+    run = _current_run
+    if run is not None:
+        run.open_stages.append(current)
+    start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.wall_seconds = time.perf_counter() - start
+        current.cpu_seconds = time.process_time() - cpu_start
+        current.peak_rss_mb = peak_rss_mb()
+        if run is not None:
+            run.open_stages.remove(current)
+            run.stages.append(current)
+
+# ============================================
+# RECORDING
+# ============================================
+
+def init_script_runs_tables(conn):
+    """Create script_runs / script_run_stages if missing (also in init_database.py)."""
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS script_runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            script TEXT NOT NULL,
+            started_at INTEGER NOT NULL,
+            finished_at INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            error TEXT,
+            wall_seconds REAL NOT NULL,
+            cpu_seconds REAL NOT NULL,
+            rows INTEGER NOT NULL DEFAULT 0,
+            http_requests INTEGER NOT NULL DEFAULT 0,
+            http_bytes INTEGER NOT NULL DEFAULT 0,
+            http_retries INTEGER NOT NULL DEFAULT 0,
+            peak_rss_mb REAL,
+            host TEXT,
+            argv TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_script_runs_script ON script_runs (script, started_at);
+
+        CREATE TABLE IF NOT EXISTS script_run_stages (
+            run_id INTEGER NOT NULL,
+            seq INTEGER NOT NULL,
+            stage TEXT NOT NULL,
+            wall_seconds REAL NOT NULL,
+            cpu_seconds REAL NOT NULL,
+            rows INTEGER NOT NULL DEFAULT 0,
+            http_requests INTEGER NOT NULL DEFAULT 0,
+            http_bytes INTEGER NOT NULL DEFAULT 0,
+            http_retries INTEGER NOT NULL DEFAULT 0,
+            peak_rss_mb REAL,
+            error TEXT,
+            PRIMARY KEY (run_id, seq)
+        );
+    ''')
+
+
+def save_run(record, db_path, log_path=METRICS_LOG):
+    """Append a run record to the JSON-lines log and the script_runs tables."""
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(log_path, 'a', encoding='utf-8') as log:
+        log.write(json.dumps(record) + '\n')
+
+    with db.connection(db_path) as conn:
+        init_script_runs_tables(conn)
+        columns = [key for key in record if key != 'stages']
+        cursor = conn.execute(
+            f"INSERT INTO script_runs ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [record[key] for key in columns]
+        )
+        conn.executemany(
+            f"INSERT INTO script_run_stages (run_id, seq, {', '.join(STAGE_COLUMNS)}) "
+            f"VALUES (?, ?, {', '.join('?' * len(STAGE_COLUMNS))})",
+            [
+                (cursor.lastrowid, seq, *(stage[key] for key in STAGE_COLUMNS))
+                for seq, stage in enumerate(record['stages'], 1)
+            ]
+        )
+
+
+def print_stages(stages):
+    """Per-stage summary printed under the finish banner."""
+    print(f"{'Stage':<16} {'Wall':>9} {'CPU':>9} {'Rows':>10} {'HTTP':>7} {'MB in':>8}")
+    for s in stages:
+        print(f"{s.name:<16} {s.wall_seconds:>8.1f}s {s.cpu_seconds:>8.1f}s {s.rows:>10,} "
+              f"{s.http_requests:>7,} {s.http_bytes / 1048576:>8.1f}")
+
+# ============================================
+# DECORATOR
+# ============================================
+
+def script_name(func):
+    """Name of the script a function lives in (its file name when run as __main__)."""
+    module = func.__module__.split('.')[-1]
+    if module == '__main__' and func.__globals__.get('__file__'):
+        return Path(func.__globals__['__file__']).stem
+    return module
+
 
 def timed_script(func):
-    """Decorator to add timing and headers to scripts."""
+    """Decorator to add timing and headers to scripts, and record the run's metrics."""
     @wraps(func)
     def wrapper(*args, **kwargs):
-        script_name = func.__module__.split('.')[-1]
-        
+        global _current_run
+        name = script_name(func)
+
         print("=" * 60)
-        print(f"{script_name.upper()}")
+        print(f"{name.upper()}")
         print(f"Started: {datetime.now().strftime('%I:%M:%S %p')}")
         print("=" * 60)
-        
-        start = time.time()
-        
+
+        # Nested @timed_script calls (one script's main() calling another's)
+        # are recorded as part of the outer run
+        outer = _current_run
+        run = outer or ScriptRun(name, func.__globals__.get('DB_PATH'))
+        _current_run = run
+        start, cpu_start = time.time(), time.process_time()
+        status, error = 'ok', None
+
         try:
             result = func(*args, **kwargs)
             elapsed = time.time() - start
-            
+
             print("\n" + "=" * 60)
             print("COMPLETED SUCCESSFULLY")  # Removed checkmark
             print(f"Duration: {format_duration(elapsed)}")
             print(f"Finished: {datetime.now().strftime('%I:%M:%S %p')}")
             print("=" * 60)
-            
+
             return result
-            
+
         except Exception as e:
             elapsed = time.time() - start
-            
+            status, error = 'failed', f"{type(e).__name__}: {e}"
+
             print("\n" + "=" * 60)
             print("FAILED")  # Removed X mark
             print(f"Error: {e}")
             print(f"Duration: {format_duration(elapsed)}")
             print(f"Finished: {datetime.now().strftime('%I:%M:%S %p')}")
             print("=" * 60)
-            
+
+            raise
+
+        except BaseException as e:
+            # sys.exit() / Ctrl+C: no banner, but the run is still recorded
+            if not (isinstance(e, SystemExit) and not e.code):
+                status, error = 'interrupted', f"{type(e).__name__}: {e}"
             raise
-    
+
+        finally:
+            _current_run = outer
+            if outer is None:
+                if run.stages:
+                    print_stages(run.stages)
+                if METRICS_ENABLED:
+                    record = run.as_dict(status, error, time.time() - start, time.process_time() - cpu_start)
+                    try:
+                        save_run(record, run.db_path)
+                    except Exception as e:
+                        # Metrics must never fail the script itself
+                        print(f"[WARNING] Could not record run metrics: {e}")
+
     return wrapper
 
 def format_duration(seconds):
@@ -50,4 +348,4 @@ def format_duration(seconds):
         return f"{minutes:.1f}m ({seconds:.0f}s)"
     else:
         hours = seconds / 3600
-        return f"{hours:.1f}h ({seconds:.0f}s)"
\ No newline at end of file
+        return f"{hours:.1f}h ({seconds:.0f}s)"
@@ -0,0 +1,317 @@
+"""
+snapshot_rollups.py
+
+Tiered retention for market_price_snapshots.
+
+track_market_orders.py appends one raw row per tracked item every refresh,
+and every "7-day average" consumer used to scan all of them. Snapshots are
+now kept in three tiers:
+
+    market_price_snapshots_raw      raw rows, kept for RAW_RETENTION_DAYS
+    market_price_snapshots_hourly   one row per (type_id, hour), kept for
+                                    HOURLY_RETENTION_DAYS
+    market_price_snapshots_daily    one row per (type_id, day), kept forever
+
+Timestamps and bucket keys are INTEGER epoch seconds (a bucket is keyed by
+its start), and every tier is clustered on (type_id, ts/bucket).
+
+Each rollup bucket stores min/max/avg of best_buy and best_sell, the average
+spread and volumes, and the counts behind each average so buckets can be
+combined exactly. Rollups are refreshed from raw rows for the current hour
+and day whenever a snapshot is taken, so every tier is complete over its own
+retention window. Pruning cuts on UTC day boundaries, which keeps every raw
+day that remains complete and lets --rebuild recompute rollups from raw at
+any time.
+
+get_snapshot_stats() answers "averages over the last N days" from the
+coarsest tier that still covers the window at a reasonable resolution.
+
+Usage:
+    python snapshot_rollups.py --rebuild        # recompute rollups from raw rows
+    python snapshot_rollups.py --prune          # apply retention
+    python snapshot_rollups.py --stats          # row counts per tier
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = SCRIPT_DIR.parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from script_utils import timed_script
+import db
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────────
+
+DB_PATH = str(PROJECT_DIR / 'mydatabase.db')
+
+RAW_RETENTION_DAYS = 14
+HOURLY_RETENTION_DAYS = 90
+
+# A tier is only used when its bucket is at most this fraction of the window,
+# so the partially covered first bucket can't skew the result much
+MAX_BUCKET_FRACTION = 1 / 24
+
+RAW_TABLE = 'market_price_snapshots_raw'
+
+MIGRATION_FILE = PROJECT_DIR / 'migrations' / '2026-10-17_epoch_timestamps.sql'
+
+# name -> (table, bucket width in seconds)
+ROLLUP_TIERS = {
+    'hourly': ('market_price_snapshots_hourly', 3600),
+    'daily':  ('market_price_snapshots_daily',  86400),
+}
+
+ROLLUP_COLUMNS = """
+            type_id          INTEGER NOT NULL,
+            bucket           INTEGER NOT NULL,
+            samples          INTEGER NOT NULL,
+            buy_min          REAL,
+            buy_max          REAL,
+            buy_avg          REAL,
+            buy_count        INTEGER NOT NULL DEFAULT 0,
+            sell_min         REAL,
+            sell_max         REAL,
+            sell_avg         REAL,
+            sell_count       INTEGER NOT NULL DEFAULT 0,
+            spread_avg       REAL,
+            spread_count     INTEGER NOT NULL DEFAULT 0,
+            buy_volume_avg   REAL,
+            sell_volume_avg  REAL,
+            PRIMARY KEY (type_id, bucket)
+"""
+
+# ─── DATABASE ─────────────────────────────────────────────────────────────────
+
+def init_snapshot_tables(conn):
+    """
+    Creates the raw snapshot table, its market_price_snapshots compatibility
+    view (ISO-text timestamp, for ad-hoc SQL) and the rollup tables.
+    Refuses to run against a database that still has the old text-timestamp
+    market_price_snapshots table.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT type FROM sqlite_master WHERE name = 'market_price_snapshots'")
+    row = cursor.fetchone()
+    if row and row[0] == 'table':
+        raise RuntimeError(
+            f"market_price_snapshots still uses text timestamps - apply {MIGRATION_FILE.name} first"
+        )
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {RAW_TABLE} (
+            type_id      INTEGER NOT NULL,
+            ts           INTEGER NOT NULL,
+            best_buy     REAL,
+            best_sell    REAL,
+            spread_pct   REAL,
+            buy_volume   INTEGER,
+            sell_volume  INTEGER,
+            PRIMARY KEY (type_id, ts)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_mpsr_ts ON {RAW_TABLE}(ts)")
+    cursor.execute(f"""
+        CREATE VIEW IF NOT EXISTS market_price_snapshots AS
+        SELECT type_id, ts,
+               strftime('%Y-%m-%dT%H:%M:%S+00:00', ts, 'unixepoch') AS timestamp,
+               best_buy, best_sell, spread_pct, buy_volume, sell_volume
+        FROM {RAW_TABLE}
+    """)
+    for table, _ in ROLLUP_TIERS.values():
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} ({ROLLUP_COLUMNS}) WITHOUT ROWID")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_bucket ON {table}(bucket)")
+
+# ─── ROLLUP ───────────────────────────────────────────────────────────────────
+
+def refresh_rollups(conn, since):
+    """
+    Recomputes every hourly and daily bucket from the bucket containing
+    `since` (epoch seconds) onwards, straight from the raw rows. Does not
+    commit. Raw rows must be complete from the start of that day (always
+    true after prune_snapshots).
+    """
+    init_snapshot_tables(conn)
+    cursor = conn.cursor()
+
+    for table, width in ROLLUP_TIERS.values():
+        start = since - since % width
+        cursor.execute(f"DELETE FROM {table} WHERE bucket >= ?", (start,))
+        cursor.execute(f"""
+            INSERT INTO {table} (
+                type_id, bucket, samples,
+                buy_min, buy_max, buy_avg, buy_count,
+                sell_min, sell_max, sell_avg, sell_count,
+                spread_avg, spread_count, buy_volume_avg, sell_volume_avg
+            )
+            SELECT
+                type_id,
+                ts - ts % {width} AS bucket,
+                COUNT(*),
+                MIN(best_buy),  MAX(best_buy),  AVG(best_buy),  COUNT(best_buy),
+                MIN(best_sell), MAX(best_sell), AVG(best_sell), COUNT(best_sell),
+                AVG(spread_pct), COUNT(spread_pct),
+                AVG(buy_volume), AVG(sell_volume)
+            FROM {RAW_TABLE}
+            WHERE ts >= ?
+            GROUP BY type_id, bucket
+        """, (start,))
+
+
+def prune_snapshots(conn, raw_days=RAW_RETENTION_DAYS, hourly_days=HOURLY_RETENTION_DAYS):
+    """
+    Deletes raw rows and hourly buckets that have aged out of their tier.
+    Cuts are aligned to the start of a UTC day so the oldest remaining raw
+    day is still complete. Does not commit. Returns (raw, hourly) rows deleted.
+    """
+    init_snapshot_tables(conn)
+    now = int(time.time())
+    day = ROLLUP_TIERS['daily'][1]
+    raw_cutoff = now - raw_days * day
+    raw_cutoff -= raw_cutoff % day
+    hourly_cutoff = now - hourly_days * day
+    hourly_cutoff -= hourly_cutoff % day
+
+    cursor = conn.cursor()
+    cursor.execute(f"DELETE FROM {RAW_TABLE} WHERE ts < ?", (raw_cutoff,))
+    raw_deleted = cursor.rowcount
+    cursor.execute(f"DELETE FROM {ROLLUP_TIERS['hourly'][0]} WHERE bucket < ?", (hourly_cutoff,))
+    return raw_deleted, cursor.rowcount
+
+# ─── QUERY ────────────────────────────────────────────────────────────────────
+
+def pick_tier(days, raw_days=RAW_RETENTION_DAYS, hourly_days=HOURLY_RETENTION_DAYS):
+    """
+    Coarsest tier that still covers a window of `days` and whose buckets are
+    no wider than MAX_BUCKET_FRACTION of it. Returns 'raw', 'hourly' or 'daily'.
+    """
+    window = days * 86400
+    retention = {'hourly': hourly_days, 'daily': None}
+
+    for name in ('daily', 'hourly'):
+        width = ROLLUP_TIERS[name][1]
+        kept = retention[name]
+        if width <= window * MAX_BUCKET_FRACTION and (kept is None or days <= kept):
+            return name
+
+    if days <= raw_days:
+        return 'raw'
+    # Window reaches past raw retention but is too short for clean buckets -
+    # hourly is the finest tier that still has the data
+    return 'hourly' if days <= hourly_days else 'daily'
+
+
+def get_snapshot_stats(conn, days, type_ids=None, tier=None):
+    """
+    Price statistics per item over the last `days` days, read from the
+    cheapest tier that covers the window (or the named tier).
+
+    Returns {type_id: {'avg_buy', 'avg_sell', 'min_buy', 'max_buy',
+    'min_sell', 'max_sell', 'avg_spread', 'samples'}}. Averages ignore
+    missing prices, like AVG() over the raw rows.
+    """
+    tier = tier or pick_tier(days)
+    cutoff = int(time.time() - days * 86400)
+    type_filter = ""
+    params = []
+
+    if tier == 'raw':
+        where = "ts >= ?"
+        params.append(cutoff)
+        select = f"""
+            SELECT type_id,
+                   AVG(best_buy), AVG(best_sell),
+                   MIN(best_buy), MAX(best_buy), MIN(best_sell), MAX(best_sell),
+                   AVG(spread_pct), COUNT(*)
+            FROM {RAW_TABLE}
+        """
+    else:
+        init_snapshot_tables(conn)
+        table, width = ROLLUP_TIERS[tier]
+        where = "bucket >= ?"
+        params.append(cutoff - cutoff % width)
+        # Averages are weighted back up by the count each bucket was built from
+        select = f"""
+            SELECT type_id,
+                   SUM(buy_avg * buy_count)   / NULLIF(SUM(buy_count), 0),
+                   SUM(sell_avg * sell_count) / NULLIF(SUM(sell_count), 0),
+                   MIN(buy_min), MAX(buy_max), MIN(sell_min), MAX(sell_max),
+                   SUM(spread_avg * spread_count) / NULLIF(SUM(spread_count), 0),
+                   SUM(samples)
+            FROM {table}
+        """
+
+    if type_ids is not None:
+        type_ids = list(type_ids)
+        if not type_ids:
+            return {}
+        type_filter = f" AND type_id IN ({','.join('?' * len(type_ids))})"
+        params.extend(type_ids)
+
+    cursor = conn.cursor()
+    cursor.execute(f"{select} WHERE {where}{type_filter} GROUP BY type_id", params)
+
+    return {
+        type_id: {
+            'avg_buy': avg_buy, 'avg_sell': avg_sell,
+            'min_buy': min_buy, 'max_buy': max_buy,
+            'min_sell': min_sell, 'max_sell': max_sell,
+            'avg_spread': avg_spread, 'samples': samples,
+        }
+        for type_id, avg_buy, avg_sell, min_buy, max_buy, min_sell, max_sell, avg_spread, samples
+        in cursor.fetchall()
+    }
+
+# ─── MAIN ─────────────────────────────────────────────────────────────────────
+
+@timed_script
+def main():
+    parser = argparse.ArgumentParser(
+        description="Maintain hourly/daily rollups of market_price_snapshots."
+    )
+    parser.add_argument("--rebuild", action="store_true", help="Recompute all rollups from the raw snapshots")
+    parser.add_argument("--prune",   action="store_true", help="Delete raw rows and hourly buckets past retention")
+    parser.add_argument("--stats",   action="store_true", help="Show row counts per tier")
+    args = parser.parse_args()
+
+    if not (args.rebuild or args.prune or args.stats):
+        parser.print_help()
+        return
+
+    conn = db.connect(DB_PATH)
+    init_snapshot_tables(conn)
+
+    if args.rebuild:
+        oldest = conn.execute(f"SELECT MIN(ts) FROM {RAW_TABLE}").fetchone()[0]
+        if oldest:
+            conn.execute("BEGIN IMMEDIATE")
+            refresh_rollups(conn, oldest)
+            conn.commit()
+            print(f"\n  Rollups rebuilt from raw snapshots since {db.format_ts(oldest)[:10]}")
+        else:
+            print("\n  No raw snapshots to roll up")
+
+    if args.prune:
+        conn.execute("BEGIN IMMEDIATE")
+        raw_deleted, hourly_deleted = prune_snapshots(conn)
+        conn.commit()
+        print(f"\n  Pruned {raw_deleted:,} raw rows (> {RAW_RETENTION_DAYS} days) "
+              f"and {hourly_deleted:,} hourly buckets (> {HOURLY_RETENTION_DAYS} days)")
+
+    if args.stats:
+        print()
+        for name, table in [('raw', RAW_TABLE)] + [(n, t[0]) for n, t in ROLLUP_TIERS.items()]:
+            key = 'ts' if name == 'raw' else 'bucket'
+            count, first, last = conn.execute(f"SELECT COUNT(*), MIN({key}), MAX({key}) FROM {table}").fetchone()
+            first = db.format_ts(first)[:16] if first else '-'
+            last = db.format_ts(last)[:16] if last else '-'
+            print(f"  {name:<7} {count:>12,} rows   {first:<16} .. {last}")
+
+    print()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
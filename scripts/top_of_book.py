@@ -0,0 +1,274 @@
+"""
+top_of_book.py
+
+Materialized top of book for the order-book tables (market_orders and
+bwf_market_orders).
+
+Consumers used to recompute best buy / best sell with
+MAX(CASE WHEN is_buy_order ...) / MIN(...) GROUP BY over the whole order
+table on every query. This module builds the aggregates once per refresh,
+inside the same transaction that swaps or merges the new book in, so
+readers never see a top of book that disagrees with the orders:
+
+    market_top_of_book   one row per (location_id, type_id):
+                         best buy/sell, order counts, total volume per side
+    market_book_levels   every price level per side, best first:
+                         (location_id, type_id, is_buy_order, level) ->
+                         price, volume at that price, order count, and the
+                         running volume / ISK value through that level
+                         (what fill_simulator walks to price a quantity)
+
+Both tables are keyed for point lookups by location and type, with a
+secondary index on (source, type_id) for callers that don't know the
+location.
+
+A swap refresh rebuilds a source's rows from scratch. A diff refresh
+(order_loader.sync_orders_diff) passes the (location, type) pairs its
+events touched, and only those are rebuilt, so its writes stay
+proportional to the changes.
+
+Usage:
+    python top_of_book.py --rebuild                  # rebuild from both order tables
+    python top_of_book.py --type 34                  # show Tritanium top of book + levels
+"""
+
+import argparse
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = SCRIPT_DIR.parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from script_utils import timed_script
+import db
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────────
+
+DB_PATH = str(PROJECT_DIR / 'mydatabase.db')
+
+# Price levels kept per side in market_book_levels (None = the full book)
+BOOK_DEPTH_LEVELS = None
+
+# Levels shown per side by --type / returned by get_book_levels
+TOP_N_LEVELS = 5
+
+ORDER_TABLES = ('market_orders', 'bwf_market_orders')
+
+# ─── DATABASE ─────────────────────────────────────────────────────────────────
+
+def init_top_of_book_tables(conn):
+    """Creates the top-of-book tables if they don't exist."""
+    cursor = conn.cursor()
+
+    # Levels tables from before the cumulative columns are rebuilt on the
+    # next refresh anyway, so drop rather than migrate them
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(market_book_levels)")}
+    if columns and 'cum_volume' not in columns:
+        cursor.execute("DROP TABLE market_book_levels")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS market_top_of_book (
+            location_id  INTEGER NOT NULL,
+            type_id      INTEGER NOT NULL,
+            region_id    INTEGER NOT NULL,
+            source       TEXT NOT NULL,
+            best_buy     REAL,
+            best_sell    REAL,
+            buy_orders   INTEGER NOT NULL DEFAULT 0,
+            sell_orders  INTEGER NOT NULL DEFAULT 0,
+            buy_volume   INTEGER NOT NULL DEFAULT 0,
+            sell_volume  INTEGER NOT NULL DEFAULT 0,
+            updated_at   TEXT NOT NULL,
+            PRIMARY KEY (location_id, type_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS market_book_levels (
+            location_id  INTEGER NOT NULL,
+            type_id      INTEGER NOT NULL,
+            is_buy_order INTEGER NOT NULL,
+            level        INTEGER NOT NULL,
+            source       TEXT NOT NULL,
+            price        REAL NOT NULL,
+            volume       INTEGER NOT NULL,
+            orders       INTEGER NOT NULL,
+            cum_volume   INTEGER NOT NULL,
+            cum_value    REAL NOT NULL,
+            PRIMARY KEY (location_id, type_id, is_buy_order, level)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tob_source_type ON market_top_of_book(source, type_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_mbl_source      ON market_book_levels(source)")
+
+# ─── BUILD ────────────────────────────────────────────────────────────────────
+
+def rebuild_top_of_book(conn, source, levels=BOOK_DEPTH_LEVELS, pairs=None):
+    """
+    Replaces the top-of-book and level rows for one order table (source)
+    with fresh aggregates of its current contents. Does not commit - meant
+    to run inside the caller's swap/merge transaction, after the new book
+    is in place. Returns the number of (location, type) rows written.
+
+    pairs limits the rebuild to those (location_id, type_id) pairs (diff
+    mode); the default rebuilds the whole source.
+    """
+    init_top_of_book_tables(conn)
+    cursor = conn.cursor()
+    updated_at = datetime.now(timezone.utc).isoformat()
+
+    scope = ""
+    if pairs is not None:
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS top_of_book_scope (
+                location_id INTEGER NOT NULL,
+                type_id     INTEGER NOT NULL,
+                PRIMARY KEY (location_id, type_id)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("DELETE FROM top_of_book_scope")
+        cursor.executemany("INSERT OR IGNORE INTO top_of_book_scope VALUES (?, ?)", pairs)
+        scope = "AND (location_id, type_id) IN (SELECT location_id, type_id FROM top_of_book_scope)"
+
+    cursor.execute(f"DELETE FROM market_top_of_book WHERE source = ? {scope}", (source,))
+    cursor.execute(f"DELETE FROM market_book_levels WHERE source = ? {scope}", (source,))
+
+    cursor.execute(f"""
+        INSERT INTO market_top_of_book (
+            location_id, type_id, region_id, source, best_buy, best_sell,
+            buy_orders, sell_orders, buy_volume, sell_volume, updated_at
+        )
+        SELECT
+            location_id,
+            type_id,
+            MAX(region_id),
+            :source,
+            MAX(CASE WHEN is_buy_order = 1 THEN price END),
+            MIN(CASE WHEN is_buy_order = 0 THEN price END),
+            COUNT(CASE WHEN is_buy_order = 1 THEN 1 END),
+            COUNT(CASE WHEN is_buy_order = 0 THEN 1 END),
+            COALESCE(SUM(CASE WHEN is_buy_order = 1 THEN volume_remain END), 0),
+            COALESCE(SUM(CASE WHEN is_buy_order = 0 THEN volume_remain END), 0),
+            :updated_at
+        FROM {source}
+        WHERE 1 {scope}
+        GROUP BY location_id, type_id
+    """, {'source': source, 'updated_at': updated_at})
+    written = cursor.rowcount
+
+    # Best price first on each side: highest buy, lowest sell. The running
+    # sums make any fill quantity a seek on cum_volume instead of a walk.
+    cursor.execute(f"""
+        INSERT INTO market_book_levels (
+            location_id, type_id, is_buy_order, level, source, price, volume, orders,
+            cum_volume, cum_value
+        )
+        SELECT
+            location_id, type_id, is_buy_order, level, :source, price, volume, orders,
+            SUM(volume)         OVER depth,
+            SUM(price * volume) OVER depth
+        FROM (
+            SELECT
+                location_id, type_id, is_buy_order, price,
+                SUM(volume_remain) AS volume,
+                COUNT(*)           AS orders,
+                ROW_NUMBER() OVER (
+                    PARTITION BY location_id, type_id, is_buy_order
+                    ORDER BY CASE WHEN is_buy_order = 1 THEN -price ELSE price END
+                ) AS level
+            FROM {source}
+            WHERE 1 {scope}
+            GROUP BY location_id, type_id, is_buy_order, price
+        )
+        WHERE :levels IS NULL OR level <= :levels
+        WINDOW depth AS (
+            PARTITION BY location_id, type_id, is_buy_order
+            ORDER BY level
+            ROWS UNBOUNDED PRECEDING
+        )
+    """, {'source': source, 'levels': levels})
+
+    if pairs is not None:
+        cursor.execute("DROP TABLE temp.top_of_book_scope")
+
+    return written
+
+# ─── LOOKUPS ──────────────────────────────────────────────────────────────────
+
+def get_top_of_book(conn, location_id, type_id):
+    """
+    Point lookup of one item's top of book.
+    Returns (best_buy, best_sell, buy_orders, sell_orders, buy_volume,
+    sell_volume), or None if the item has no orders at that location.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT best_buy, best_sell, buy_orders, sell_orders, buy_volume, sell_volume
+        FROM market_top_of_book
+        WHERE location_id = ? AND type_id = ?
+    """, (location_id, type_id))
+    return cursor.fetchone()
+
+
+def get_book_levels(conn, location_id, type_id, is_buy_order, limit=TOP_N_LEVELS):
+    """
+    Best price levels for one side, best first: [(price, volume, orders), ...].
+    limit=None returns the whole side.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT price, volume, orders
+        FROM market_book_levels
+        WHERE location_id = :location_id AND type_id = :type_id AND is_buy_order = :is_buy_order
+          AND (:limit IS NULL OR level <= :limit)
+        ORDER BY level
+    """, {'location_id': location_id, 'type_id': type_id,
+          'is_buy_order': 1 if is_buy_order else 0, 'limit': limit})
+    return cursor.fetchall()
+
+# ─── MAIN ─────────────────────────────────────────────────────────────────────
+
+@timed_script
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rebuild or inspect the materialized top of book."
+    )
+    parser.add_argument("--rebuild", action="store_true",      help="Rebuild from market_orders and bwf_market_orders")
+    parser.add_argument("--type",    type=int, default=None,   help="Show top of book and levels for a type_id")
+    args = parser.parse_args()
+
+    conn = db.connect(DB_PATH)
+    init_top_of_book_tables(conn)
+
+    if args.rebuild:
+        for source in ORDER_TABLES:
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (source,)).fetchone():
+                conn.execute("BEGIN IMMEDIATE")
+                rows = rebuild_top_of_book(conn, source)
+                conn.commit()
+                print(f"\n  {source}: {rows:,} top-of-book rows")
+        print()
+    elif args.type:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT location_id, source, best_buy, best_sell, buy_orders, sell_orders, buy_volume, sell_volume
+            FROM market_top_of_book
+            WHERE type_id = ?
+        """, (args.type,))
+        for location_id, source, best_buy, best_sell, buy_orders, sell_orders, buy_vol, sell_vol in cursor.fetchall():
+            print(f"\n  {source} @ {location_id}")
+            print(f"    Best buy:  {best_buy or 0:>14,.2f}  ({buy_orders:,} orders, {buy_vol:,} units)")
+            print(f"    Best sell: {best_sell or 0:>14,.2f}  ({sell_orders:,} orders, {sell_vol:,} units)")
+            for is_buy, label in ((0, 'Sell'), (1, 'Buy')):
+                for level, (price, volume, orders) in enumerate(get_book_levels(conn, location_id, args.type, is_buy), 1):
+                    print(f"      {label} L{level}: {price:>14,.2f} x {volume:>12,} ({orders} orders)")
+        print()
+    else:
+        parser.print_help()
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,12 @@
 from script_utils import timed_script
+import os
 import requests
 import sqlite3
 import time
-from datetime import datetime
+from datetime import datetime, timezone
 
 DB_PATH = r'F:\infinite-solutions\mydatabase.db'
-ESI_BASE_URL = 'https://esi.evetech.net/latest'
+ESI_BASE_URL = os.environ.get('ESI_BASE_URL', 'https://esi.evetech.net/latest')
 
 def get_character_token():
     """Get valid access token for character."""
@@ -38,32 +39,38 @@ def save_orders_snapshot():
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
-    # Create history table if it doesn't exist
+    # Create history table if it doesn't exist. Timestamps are epoch
+    # seconds; the character_orders_history view shows them as ISO text.
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS character_orders_history (
-            snapshot_date TEXT NOT NULL,
+        CREATE TABLE IF NOT EXISTS character_order_snapshots (
+            snapshot_ts INTEGER NOT NULL,
             order_id INTEGER NOT NULL,
             character_id INTEGER NOT NULL,
             type_id INTEGER NOT NULL,
             location_id INTEGER NOT NULL,
-            region_id INTEGER NOT NULL,
+            region_id INTEGER,
             is_buy_order INTEGER NOT NULL,
             price REAL NOT NULL,
             volume_remain INTEGER NOT NULL,
             volume_total INTEGER NOT NULL,
-            issued TEXT NOT NULL,
+            issued INTEGER NOT NULL,
+            duration INTEGER,
             state TEXT NOT NULL,
-            PRIMARY KEY (snapshot_date, order_id)
-        )
+            PRIMARY KEY (order_id, snapshot_ts)
+        ) WITHOUT ROWID
     ''')
     
     # Copy current orders to history
-    snapshot_time = datetime.now().isoformat()
+    snapshot_ts = int(time.time())
+    snapshot_time = datetime.fromtimestamp(snapshot_ts, timezone.utc).isoformat()
     
     cursor.execute('''
-        INSERT OR IGNORE INTO character_orders_history
+        INSERT OR IGNORE INTO character_order_snapshots (
+            snapshot_ts, order_id, character_id, type_id, location_id, region_id,
+            is_buy_order, price, volume_remain, volume_total, issued, duration, state
+        )
         SELECT 
-            ? as snapshot_date,
+            ?,
             order_id,
             character_id,
             type_id,
@@ -73,12 +80,12 @@ def save_orders_snapshot():
             price,
             volume_remain,
             volume_total,
-            issued,
-            state,
-            last_updated
+            CAST(strftime('%s', issued) AS INTEGER),
+            duration,
+            COALESCE(state, 'active')
         FROM character_orders
         WHERE character_id = 2114278577
-    ''', (snapshot_time,))
+    ''', (snapshot_ts,))
     
     rows_added = cursor.rowcount
     
@@ -21,17 +21,17 @@ import os
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, SCRIPT_DIR)
 
-import requests
 import sqlite3
 from datetime import datetime, timezone
 from token_manager import get_token
+from esi_cache import ESICache, cached_get
 
 # ============================================
 # CONFIGURATION
 # ============================================
 PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
 DB_PATH     = os.path.join(PROJECT_DIR, 'mydatabase.db')
-ESI_BASE_URL = 'https://esi.evetech.net/latest'
+ESI_BASE_URL = os.environ.get('ESI_BASE_URL', 'https://esi.evetech.net/latest')
 
 sys.path.insert(0, os.path.join(PROJECT_DIR, 'config'))
 from setup import CORPORATION_ID
@@ -40,7 +40,7 @@ from setup import CORPORATION_ID
 # ESI HELPERS
 # ============================================
 
-def get_observers(corporation_id, token):
+def get_observers(corporation_id, token, cache=None):
     """
     GET /corporation/{corporation_id}/mining/observers/
     Returns list of dicts: { observer_id, last_updated }
@@ -50,7 +50,7 @@ def get_observers(corporation_id, token):
     headers = {'Authorization': f'Bearer {token}'}
 
     print(f"  Fetching observers for corp {corporation_id}...")
-    resp = requests.get(url, headers=headers)
+    resp = cached_get(cache, url, headers=headers)
 
     if resp.status_code == 200:
         observers = resp.json()
@@ -61,7 +61,7 @@ def get_observers(corporation_id, token):
         return []
 
 
-def get_mining_ledger(corporation_id, observer_id, token):
+def get_mining_ledger(corporation_id, observer_id, token, cache=None):
     """
     GET /corporation/{corporation_id}/mining/observers/{observer_id}/
     Paginated.  Pulls every page until ESI stops returning results.
@@ -73,7 +73,7 @@ def get_mining_ledger(corporation_id, observer_id, token):
     page = 1
 
     while True:
-        resp = requests.get(url, headers=headers, params={'page': page})
+        resp = cached_get(cache, url, params={'page': page}, headers=headers)
 
         if resp.status_code == 200:
             events = resp.json()
@@ -149,10 +149,14 @@ def main():
     token = get_token()
 
     # ---- observers ----
+    cache = ESICache()
+
     print("\nStep 1: Get list of refineries (observers)...")
-    observers = get_observers(CORPORATION_ID, token)
+    observers = get_observers(CORPORATION_ID, token, cache)
     if not observers:
         print("No observers returned — nothing to do.")
+        cache.report()
+        cache.close()
         return
 
     # ---- connect DB ----
@@ -169,7 +173,7 @@ def main():
         last_updated = obs.get('last_updated', 'unknown')
         print(f"\n  Observer {observer_id}  (last_updated: {last_updated})")
 
-        events = get_mining_ledger(CORPORATION_ID, observer_id, token)
+        events = get_mining_ledger(CORPORATION_ID, observer_id, token, cache)
 
         if events:
             inserted = upsert_events(conn, observer_id, events, fetched_at)
@@ -194,6 +198,9 @@ def main():
     print(f"  Fetched at         : {fetched_at}")
     print("=" * 60)
 
+    cache.report()
+    cache.close()
+
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -21,7 +21,7 @@ from token_manager import get_token, character_id
 # CONFIGURATION
 # ============================================
 DB_PATH = os.path.join(PROJECT_DIR, 'mydatabase.db')
-ESI_BASE_URL = 'https://esi.evetech.net/latest'
+ESI_BASE_URL = os.environ.get('ESI_BASE_URL', 'https://esi.evetech.net/latest')
 
 # Jita 4-4 station ID
 JITA_STATION_ID = 60003760
@@ -8,9 +8,9 @@ Run on-demand before checking arbitrage opportunities
 ==========================================
 """
 
-import requests
+import asyncio
 import sqlite3
-import time
+import sys
 from datetime import datetime, timezone
 import os
 
@@ -18,10 +18,16 @@ SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
 DB_PATH = os.path.join(PROJECT_DIR, 'mydatabase.db')
 
-ESI_BASE_URL = 'https://esi.evetech.net/latest'
+sys.path.insert(0, SCRIPT_DIR)
+from esi_client import ESIClient, ESIError
+
+ESI_BASE_URL = os.environ.get('ESI_BASE_URL', 'https://esi.evetech.net/latest')
 JITA_REGION = 10000002
 JITA_4_4 = 60003760
 
+# Maximum simultaneous requests to ESI
+MAX_CONCURRENCY = 10
+
 def get_ore_type_ids(conn):
     """Get list of ore type IDs to update."""
     cursor = conn.cursor()
@@ -34,43 +40,27 @@ def get_ore_type_ids(conn):
     
     return type_ids
 
-def fetch_orders_for_type(type_id, max_retries=3):
-    """Fetch market orders for a specific type from ESI."""
-    url = f'{ESI_BASE_URL}/markets/{JITA_REGION}/orders/'
-    
-    params = {
-        'datasource': 'tranquility',
-        'order_type': 'all',
-        'type_id': type_id
-    }
-    
-    for attempt in range(max_retries):
-        try:
-            response = requests.get(url, params=params, timeout=10)
-            
-            if response.status_code == 200:
-                return response.json()
-            elif response.status_code == 404:
-                # No orders for this item
-                return []
-            elif response.status_code == 420:
-                # Rate limited
-                print(f"[WARN] Rate limited, waiting 60 seconds...")
-                time.sleep(60)
-                continue
-            else:
-                print(f"[WARN] Status {response.status_code} for type {type_id}")
-                return []
-                
-        except Exception as e:
-            if attempt < max_retries - 1:
-                print(f"[WARN] Error on attempt {attempt + 1}: {e}")
-                time.sleep(2)
-            else:
-                print(f"[ERROR] Failed after {max_retries} attempts: {e}")
-                return []
-    
-    return []
+async def fetch_orders_for_type(esi, type_id):
+    """Fetch market orders for a specific type from ESI (all pages)."""
+    try:
+        return await esi.get_pages(
+            f'/markets/{JITA_REGION}/orders/',
+            {'datasource': 'tranquility', 'order_type': 'all', 'type_id': type_id}
+        )
+    except ESIError as e:
+        print(f"[WARN] {e}")
+        return []
+
+async def fetch_all_ore_orders(type_ids):
+    """
+    Fetch orders for every ore type concurrently on one ESI client.
+    The client's token bucket and error budget replace the fixed sleep
+    between requests. Returns {type_id: orders}.
+    """
+    async with ESIClient(concurrency=MAX_CONCURRENCY, base_url=ESI_BASE_URL) as esi:
+        results = await asyncio.gather(*(fetch_orders_for_type(esi, tid) for tid in type_ids))
+    esi.report()
+    return dict(zip(type_ids, results))
 
 def filter_jita_orders(orders):
     """Filter orders to only Jita 4-4."""
@@ -127,14 +117,14 @@ def main():
         
         # Fetch prices from ESI
         print(f"\n[3/4] Fetching prices from ESI ({len(type_ids)} ore types)...")
-        print("This will take ~40-80 seconds with rate limiting...\n")
+        orders_by_type = asyncio.run(fetch_all_ore_orders(type_ids))
+        print()
         
         updated = 0
         errors = 0
         
         for i, type_id in enumerate(type_ids, 1):
-            # Fetch orders
-            orders = fetch_orders_for_type(type_id)
+            orders = orders_by_type[type_id]
             
             # Filter to Jita 4-4
             jita_orders = filter_jita_orders(orders)
@@ -152,9 +142,6 @@ def main():
                 updated += 1
             else:
                 errors += 1
-            
-            # Rate limiting (ESI allows ~150 requests per second, but be conservative)
-            time.sleep(0.2)  # 5 requests per second
         
         conn.commit()
         
@@ -0,0 +1,332 @@
+"""
+yield_matrix.py
+
+Precompiled reprocessing yield matrix (type_id x material_type_id).
+
+type_materials stores each item's reprocessing output as a JSON blob
+(imported by import_type_materials_raw.py), and item_reprocessing_yields
+only covers the eight minerals. This module parses the blobs once and
+compiles them into a sparse matrix covering every material - minerals,
+moon materials, ice products, salvage - in two forms:
+
+    yield_matrix.npz       CSR arrays (type_ids, indptr, material_ids,
+                           quantities, portion_sizes) loaded by
+                           load_yield_matrix() in a few milliseconds
+    type_material_yields   the same entries as a WITHOUT ROWID table,
+                           (type_id, material_type_id) -> quantity,
+                           portion_size, for SQL consumers
+
+Quantities are per reprocessing batch (portion_size units of the input,
+100 for ores); the loader returns per-unit yields unless asked otherwise.
+A signature of type_materials + inv_types.portion_size is stored with the
+matrix, so load_yield_matrix(conn) recompiles it when the source changes.
+
+Usage:
+    python yield_matrix.py --compile                # rebuild the matrix and table
+    python yield_matrix.py --type 18                # show Plagioclase's yields
+
+    matrix = load_yield_matrix(conn)
+    matrix.materials(18)                            # {34: 1.75, 36: 0.7}
+    matrix.dense(type_ids, mineral_ids)             # (items x minerals) array
+    matrix.value(type_ids, {34: 4.1, 35: 8.2})      # per-unit value vector
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = SCRIPT_DIR.parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from script_utils import timed_script
+import db
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────────
+
+DB_PATH = str(PROJECT_DIR / 'mydatabase.db')
+YIELD_MATRIX_PATH = PROJECT_DIR / 'yield_matrix.npz'
+
+# Bump when the .npz layout changes; older files are recompiled
+MATRIX_VERSION = 1
+
+# ─── DATABASE ─────────────────────────────────────────────────────────────────
+
+def init_yield_table(conn):
+    """Creates the type_material_yields table if it doesn't exist."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS type_material_yields (
+            type_id           INTEGER NOT NULL,
+            material_type_id  INTEGER NOT NULL,
+            quantity          INTEGER NOT NULL,
+            portion_size      INTEGER NOT NULL DEFAULT 1,
+            PRIMARY KEY (type_id, material_type_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tmy_material ON type_material_yields (material_type_id)")
+
+
+def source_signature(conn):
+    """
+    Fingerprint of type_materials and the portion sizes the matrix was
+    built from: a 64-bit digest of every (type_id, portion_size,
+    materials_json) in type_id order, so any yield rebalance is caught.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    count = 0
+    for type_id, portion_size, materials_json in conn.execute("""
+        SELECT tm.type_id, COALESCE(it.portion_size, 1), tm.materials_json
+        FROM type_materials tm
+        LEFT JOIN inv_types it ON it.type_id = tm.type_id
+        ORDER BY tm.type_id
+    """):
+        digest.update(f"{type_id}\t{portion_size}\t{materials_json}\n".encode('utf-8'))
+        count += 1
+    return [MATRIX_VERSION, count, int.from_bytes(digest.digest(), 'little', signed=True)]
+
+# ─── MATRIX ───────────────────────────────────────────────────────────────────
+
+def positions(keys, values):
+    """Index of each value in the sorted array keys (-1 where absent)."""
+    values = np.asarray(values, dtype=np.int64)
+    if not len(keys):
+        return np.full(len(values), -1)
+    found = np.minimum(np.searchsorted(keys, values), len(keys) - 1)
+    return np.where(keys[found] == values, found, -1)
+
+
+class YieldMatrix:
+    """
+    Sparse reprocessing yields in CSR form: the materials of type_ids[i]
+    are material_ids[indptr[i]:indptr[i + 1]], with batch quantities in
+    `quantities`. type_ids is sorted, so lookups are binary searches.
+    """
+
+    def __init__(self, type_ids, indptr, material_ids, quantities, portion_sizes, signature=None):
+        self.type_ids = type_ids
+        self.indptr = indptr
+        self.material_ids = material_ids
+        self.quantities = quantities
+        self.portion_sizes = portion_sizes
+        self.signature = signature
+
+        # Row of every stored entry, and its per-unit quantity
+        counts = np.diff(indptr)
+        self.entry_rows = np.repeat(np.arange(len(type_ids)), counts)
+        self.per_unit = quantities / np.repeat(portion_sizes, counts)
+
+    def __len__(self):
+        return len(self.type_ids)
+
+    def __contains__(self, type_id):
+        return self.rows([type_id])[0] >= 0
+
+    @property
+    def material_type_ids(self):
+        """Every material any type reprocesses into, sorted."""
+        return np.unique(self.material_ids)
+
+    def rows(self, type_ids):
+        """Matrix row of each type_id (-1 where the type has no materials)."""
+        return positions(self.type_ids, type_ids)
+
+    def materials(self, type_id, per_unit=True):
+        """{material_type_id: quantity} for one type (empty if it doesn't reprocess)."""
+        row = self.rows([type_id])[0]
+        if row < 0:
+            return {}
+        entries = slice(self.indptr[row], self.indptr[row + 1])
+        quantities = self.per_unit[entries] if per_unit else self.quantities[entries]
+        return dict(zip(self.material_ids[entries].tolist(), quantities.tolist()))
+
+    def _entries(self, type_ids):
+        """Stored entries belonging to type_ids: (entry indices, output row of each)."""
+        rows = self.rows(type_ids)
+        output_row = np.full(len(self.type_ids), -1)
+        present = rows >= 0
+        output_row[rows[present]] = np.flatnonzero(present)
+        entry_output = output_row[self.entry_rows]
+        entries = np.flatnonzero(entry_output >= 0)
+        return entries, entry_output[entries]
+
+    def dense(self, type_ids, material_ids, per_unit=True):
+        """
+        Dense (len(type_ids) x len(material_ids)) yields. Types without
+        materials are zero rows; materials outside material_ids are dropped.
+        """
+        material_ids = np.asarray(material_ids, dtype=np.int64)
+        out = np.zeros((len(type_ids), len(material_ids)))
+        entries, out_rows = self._entries(type_ids)
+
+        order = np.argsort(material_ids)
+        found = positions(material_ids[order], self.material_ids[entries])
+        keep = found >= 0
+
+        quantities = self.per_unit if per_unit else self.quantities
+        np.add.at(out, (out_rows[keep], order[found[keep]]), quantities[entries[keep]])
+        return out
+
+    def value(self, type_ids, prices, per_unit=True):
+        """
+        Reprocessed value of each type: sum of yield x price over its
+        materials, with prices a {material_type_id: price} dict (missing
+        materials count as 0).
+        """
+        entries, out_rows = self._entries(type_ids)
+        price_ids = np.fromiter(prices.keys(), dtype=np.int64, count=len(prices))
+        price_values = np.fromiter(prices.values(), dtype=float, count=len(prices))
+        order = np.argsort(price_ids)
+        price_ids, price_values = price_ids[order], price_values[order]
+
+        found = positions(price_ids, self.material_ids[entries])
+        entry_prices = np.zeros(len(entries))
+        entry_prices[found >= 0] = price_values[found[found >= 0]]
+
+        quantities = self.per_unit if per_unit else self.quantities
+        return np.bincount(out_rows, weights=quantities[entries] * entry_prices, minlength=len(type_ids))
+
+# ─── COMPILE ──────────────────────────────────────────────────────────────────
+
+def compile_yield_matrix(conn, path=YIELD_MATRIX_PATH):
+    """
+    Parse every type_materials blob once, write the .npz and refresh
+    type_material_yields in one transaction. Returns the YieldMatrix.
+    """
+    signature = source_signature(conn)
+    rows = conn.execute("""
+        SELECT tm.type_id, tm.materials_json, COALESCE(it.portion_size, 1)
+        FROM type_materials tm
+        LEFT JOIN inv_types it ON it.type_id = tm.type_id
+        ORDER BY tm.type_id
+    """).fetchall()
+
+    type_ids, indptr, material_ids, quantities, portion_sizes = [], [0], [], [], []
+    for type_id, materials_json, portion_size in rows:
+        # Sum duplicate materials so (type_id, material_type_id) is unique
+        merged = {}
+        for material in json.loads(materials_json):
+            material_id = material['materialTypeID']
+            merged[material_id] = merged.get(material_id, 0) + material['quantity']
+        if not merged:
+            continue
+        type_ids.append(type_id)
+        portion_sizes.append(portion_size or 1)
+        for material_id in sorted(merged):
+            material_ids.append(material_id)
+            quantities.append(merged[material_id])
+        indptr.append(len(material_ids))
+
+    matrix = YieldMatrix(
+        np.array(type_ids, dtype=np.int32),
+        np.array(indptr, dtype=np.int32),
+        np.array(material_ids, dtype=np.int32),
+        np.array(quantities, dtype=np.int32),
+        np.array(portion_sizes, dtype=np.int32),
+        signature,
+    )
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.stem + '.tmp.npz')
+    np.savez(
+        tmp_path,
+        type_ids=matrix.type_ids, indptr=matrix.indptr, material_ids=matrix.material_ids,
+        quantities=matrix.quantities, portion_sizes=matrix.portion_sizes,
+        signature=np.array(signature, dtype=np.int64),
+    )
+    tmp_path.replace(path)
+
+    init_yield_table(conn)
+    conn.execute("DELETE FROM type_material_yields")
+    conn.executemany(
+        "INSERT INTO type_material_yields (type_id, material_type_id, quantity, portion_size) VALUES (?, ?, ?, ?)",
+        zip(
+            np.repeat(matrix.type_ids, np.diff(matrix.indptr)).tolist(),
+            matrix.material_ids.tolist(),
+            matrix.quantities.tolist(),
+            np.repeat(matrix.portion_sizes, np.diff(matrix.indptr)).tolist(),
+        )
+    )
+    conn.commit()
+
+    _loaded.clear()
+    return matrix
+
+# ─── LOAD ─────────────────────────────────────────────────────────────────────
+
+# Loaded matrices by (path, mtime), so repeated calls in one process are free
+_loaded = {}
+
+
+def read_yield_matrix(path=YIELD_MATRIX_PATH):
+    """Load a compiled .npz, or None if it is missing or from an older layout."""
+    path = Path(path)
+    if not path.exists():
+        return None
+    key = (str(path), path.stat().st_mtime_ns)
+    if key not in _loaded:
+        with np.load(path) as data:
+            signature = data['signature'].tolist()
+            if signature[0] != MATRIX_VERSION:
+                return None
+            _loaded.clear()
+            _loaded[key] = YieldMatrix(
+                data['type_ids'], data['indptr'], data['material_ids'],
+                data['quantities'], data['portion_sizes'], signature,
+            )
+    return _loaded[key]
+
+
+def load_yield_matrix(conn=None, path=YIELD_MATRIX_PATH):
+    """
+    The compiled yield matrix. With a connection, the matrix is
+    (re)compiled first when it is missing or type_materials has changed
+    since it was built; without one, the file is used as it is.
+    """
+    matrix = read_yield_matrix(path)
+    if conn is not None and (matrix is None or matrix.signature != source_signature(conn)):
+        matrix = compile_yield_matrix(conn, path)
+    if matrix is None:
+        raise FileNotFoundError(f"No compiled yield matrix at {path} - run yield_matrix.py --compile")
+    return matrix
+
+# ─── MAIN ─────────────────────────────────────────────────────────────────────
+
+@timed_script
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compile or inspect the sparse reprocessing yield matrix."
+    )
+    parser.add_argument("--compile", action="store_true",    help="Rebuild yield_matrix.npz and type_material_yields")
+    parser.add_argument("--type",    type=int, default=None, help="Show the per-unit yields of a type_id")
+    args = parser.parse_args()
+
+    conn = db.connect(DB_PATH)
+
+    if args.compile:
+        matrix = compile_yield_matrix(conn)
+        size_kb = YIELD_MATRIX_PATH.stat().st_size / 1024
+        print(f"\n  [OK] {len(matrix):,} types, {len(matrix.material_ids):,} yields, "
+              f"{len(matrix.material_type_ids):,} distinct materials -> {YIELD_MATRIX_PATH.name} ({size_kb:,.0f} KB)\n")
+    elif args.type:
+        matrix = load_yield_matrix(conn)
+        names = dict(conn.execute("SELECT type_id, type_name FROM inv_types"))
+        print(f"\n  {names.get(args.type, f'Type {args.type}')}:")
+        materials = matrix.materials(args.type)
+        if not materials:
+            print("    -- does not reprocess --")
+        for material_id, quantity in materials.items():
+            print(f"    {names.get(material_id, f'Type {material_id}'):<32} {quantity:>14,.2f} per unit")
+        print()
+    else:
+        parser.print_help()
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,18 +3,23 @@ Update LX-ZOJ Inventory
 Fetches inventory from a LX-ZOJ structure via ESI, stores snapshot in database,
 and updates index.html with current stock levels.
 """
-import requests
 import sqlite3
 import os
 import sys
-from datetime import datetime, timezone
+import time
+from datetime import datetime
 
-# Add config directory to path for imports
+# Add config and scripts directories to path for imports
 CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config')
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts')
 sys.path.insert(0, CONFIG_DIR)
+sys.path.insert(0, SCRIPTS_DIR)
 
 # Import token manager and script utils
 from token_manager import get_token, CHARACTER_ID as character_id
+from esi_cache import ESICache, cached_get
+from esi_decode import decode_assets
+import db
 
 # ============================================
 # CONFIGURATION
@@ -24,7 +29,7 @@ DB_PATH = os.path.join(PROJECT_DIR, 'mydatabase.db')
 HTML_PATH = os.path.join(PROJECT_DIR, 'index.html')
 HTML_BACKUP_PATH = os.path.join(PROJECT_DIR, 'index.backup.html')
 ENABLE_GITHUB_COMMIT = False
-ESI_BASE_URL = 'https://esi.evetech.net/latest'
+ESI_BASE_URL = os.environ.get('ESI_BASE_URL', 'https://esi.evetech.net/latest')
 
 # LX-ZOJ Structure ID
 LX_ZOJ_STRUCTURE_ID = 1027625808467 #T2 Reactions - Tatara
@@ -44,8 +49,12 @@ def get_authenticated_headers():
         print(f"[ERROR] Failed to get access token: {e}")
         return None
 
-def get_character_assets(headers):
-    """Get all character assets from ESI."""
+def get_character_assets(headers, cache=None):
+    """
+    Get all character assets from ESI as esi_decode.ASSET_FIELDS tuples
+    (item_id, type_id, location_id, location_flag, quantity, is_singleton).
+    With an ESICache, unchanged pages are answered from disk (ETag / Expires).
+    """
     all_assets = []
     page = 1
 
@@ -55,10 +64,10 @@ def get_character_assets(headers):
         url = f'{ESI_BASE_URL}/characters/{character_id}/assets/'
         params = {'page': page}
 
-        response = requests.get(url, params=params, headers=headers)
+        response = cached_get(cache, url, params=params, headers=headers)
 
         if response.status_code == 200:
-            assets = response.json()
+            assets = decode_assets(response.content)
 
             if not assets:
                 break
@@ -80,8 +89,7 @@ def filter_lx_zoj_items(assets):
     """Filter assets to only LX-ZOJ structure hangar."""
     lx_zoj_items = [
         asset for asset in assets
-        if asset.get('location_id') == LX_ZOJ_STRUCTURE_ID
-        and asset.get('location_flag') == 'Hangar'
+        if asset[2] == LX_ZOJ_STRUCTURE_ID and asset[3] == 'Hangar'  # location_id, location_flag
     ]
 
     print(f"[OK] Filtered to LX-ZOJ hangar: {len(lx_zoj_items)} items")
@@ -102,10 +110,7 @@ def match_tracked_inventory(lx_zoj_items, tracked_items):
     """
     inventory = {}
 
-    for asset in lx_zoj_items:
-        type_id = asset.get('type_id')
-        quantity = asset.get('quantity', 1)
-
+    for _, type_id, _, _, quantity, _ in lx_zoj_items:
         if type_id in tracked_items:
             # Aggregate quantities for same type
             if type_id in inventory:
@@ -117,53 +122,29 @@ def match_tracked_inventory(lx_zoj_items, tracked_items):
     return inventory
 
 def store_inventory_snapshot(conn, inventory, tracked_items):
-    """Store inventory snapshot in lx_zoj_inventory table."""
+    """
+    Store inventory snapshot in lx_zoj_inventory_snapshots (epoch-second
+    snapshot_ts; names come from inv_types via the lx_zoj_inventory view).
+    Tracked items not in the hangar are stored with quantity 0.
+    """
     cursor = conn.cursor()
-    snapshot_time = datetime.now(timezone.utc).isoformat()
+    snapshot_ts = int(time.time())
 
     print(f"\n>>> Storing inventory snapshot...")
 
-    items_inserted = 0
-
-    for type_id, quantity in inventory.items():
-        type_name = tracked_items[type_id]
-
-        cursor.execute('''
-            INSERT INTO lx_zoj_inventory (
-                snapshot_timestamp, type_id, type_name,
-                quantity, location_id, location_name
-            ) VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
-            snapshot_time,
-            type_id,
-            type_name,
-            quantity,
-            LX_ZOJ_STRUCTURE_ID,
-            'LX-ZOJ'
-        ))
-
-        items_inserted += 1
-
-    # Insert 0 quantities for tracked items not in inventory
-    for type_id, type_name in tracked_items.items():
-        if type_id not in inventory:
-            cursor.execute('''
-                INSERT INTO lx_zoj_inventory (
-                    snapshot_timestamp, type_id, type_name,
-                    quantity, location_id, location_name
-                ) VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                snapshot_time,
-                type_id,
-                type_name,
-                0,
-                LX_ZOJ_STRUCTURE_ID,
-                'LX-ZOJ'
-            ))
-            items_inserted += 1
+    rows = [
+        (snapshot_ts, type_id, inventory.get(type_id, 0), LX_ZOJ_STRUCTURE_ID)
+        for type_id in set(tracked_items) | set(inventory)
+    ]
+    cursor.executemany('''
+        INSERT OR REPLACE INTO lx_zoj_inventory_snapshots (
+            snapshot_ts, type_id, quantity, location_id
+        ) VALUES (?, ?, ?, ?)
+    ''', rows)
 
     conn.commit()
-    print(f"[OK] Snapshot stored: {items_inserted} items at {snapshot_time}")
+    snapshot_time = db.format_ts(snapshot_ts)
+    print(f"[OK] Snapshot stored: {len(rows)} items at {snapshot_time}")
 
     return snapshot_time
 
@@ -342,13 +323,14 @@ def main():
 
     # Connect to database
     conn = sqlite3.connect(DB_PATH)
+    cache = ESICache()
 
     try:
         # Get tracked items list
         tracked_items = get_tracked_items(conn)
 
         # Fetch all character assets
-        all_assets = get_character_assets(headers)
+        all_assets = get_character_assets(headers, cache)
 
         if not all_assets:
             print("\n[WARNING] No assets found")
@@ -399,5 +381,9 @@ def main():
         conn.close()
         raise
 
+    finally:
+        cache.report()
+        cache.close()
+
 if __name__ == '__main__':
     main()